@@ -60,17 +60,21 @@ from extensions.mapeditor_settings import MAPEDITOR_UI_SETTINGS, MapEditorSettin
 from extensions.pico_rooftoppv_potential import PICORooftopPVPotential
 from extensions.port_profile_viewer import PortProfileViewer
 from src.edr_client import EDRClient
+from extensions.profiler_api import ProfilerAPI
 from extensions.profiles import Profiles
 from extensions.session_manager import del_session, delete_sessions_on_disk, get_handler, get_session, \
-    get_session_for_esid, schedule_session_clean_up, set_handler, set_session, set_session_for_esid, valid_session
+    get_session_for_esid, get_socketio_client_manager, init_session_store, schedule_session_clean_up, session_writer, \
+    set_handler, set_session, set_session_for_esid, valid_session
 from extensions.settings_storage import SettingsStorage
 from extensions.shapefile_converter import ShapefileConverter
 from extensions.spatial_operations import SpatialOperations
 from extensions.time_dimension import TimeDimension
 from extensions.tooltip_info import TooltipInfo
+from extensions.vector_tiles import VectorTiles
 # from extensions.vesta import Vesta
 from extensions.workflow import Workflow
 from src.asset_draw_toolbar import AssetDrawToolbar
+from src.command_registry import command_registry
 from src.assets_to_be_added import AssetsToBeAdded
 from src.datalayer_api import DataLayerAPI
 from src.esdl2shapefile import ESDL2Shapefile
@@ -81,9 +85,11 @@ from src.esdl_services import ESDLServices
 from src.essim_kpis import ESSIM_KPIs
 from src.essim_validation import validate_ESSIM
 from src.log import get_logger
+from src.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, socketio_json, track_executor
 from src.process_es_area_bld import get_building_information, process_energy_system, get_building_connections, \
-    find_area_location_based
+    find_area_location_based, emit_area_lod_update
 from src.shape import Shape
+from src.ui_delta import emit_ui_delta, emit_ui_full, ui_delta_sent, CONNECTIONS_LAYER, ASSETS_LAYER
 from src.user_logging import UserLogging
 from src.version import __long_version__ as mapeditor_long_version
 from src.version import __version__ as mapeditor_version
@@ -152,7 +158,8 @@ app.config['EXECUTOR_PROPAGATE_EXCEPTIONS'] = True # make sure errors are logged
 logger.info("Socket.IO Async mode: {}".format(settings.ASYNC_MODE))
 logger.info('Running inside uWSGI: {}'.format(is_running_in_uwsgi()))
 
-socketio = SocketIO(app, async_mode=settings.ASYNC_MODE, manage_session=False, path='/socket.io', logger=settings.FLASK_DEBUG)
+socketio = SocketIO(app, async_mode=settings.ASYNC_MODE, manage_session=False, path='/socket.io', logger=settings.FLASK_DEBUG,
+                    client_manager=get_socketio_client_manager(), json=socketio_json)
 # logging.getLogger('engineio').setLevel(logging.WARNING)  # don't print all the messages
 
 # remove existing sessions when restarting, existing sessions will give errors
@@ -161,9 +168,12 @@ delete_sessions_on_disk(app.config['SESSION_FILE_DIR'])
 
 # fix sessions with socket.io. see: https://blog.miguelgrinberg.com/post/flask-socketio-and-the-user-session
 Session(app)
+init_session_store(app)
 
 
 executor = Executor(app)
+# _self is the ThreadPoolExecutor of Flask-Executor, which is not public: without it there is no queue depth metric
+track_executor('jobs', getattr(executor, '_self', None))
 
 #extensions
 schedule_session_clean_up()
@@ -205,6 +215,8 @@ ESDL2Shapefile(app)
 custom_icons = CustomIcons(app, socketio, settings_storage)
 KPIDashboard(app, socketio, settings_storage)
 TooltipInfo(app, socketio)
+VectorTiles(app, socketio)
+ProfilerAPI(app, socketio)
 
 
 #TODO: check secret key with itsdangerous error and testing and debug here
@@ -416,6 +428,12 @@ def auth_status():
         # return status  # returns a redirect, but that is consumed by the browser because of a 302 status
 
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Returns the metrics of this worker in the text format of Prometheus"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/logout')
 def logout():
     """Performs local logout by removing the session cookie. and does a logout at the IDM"""
@@ -447,6 +465,7 @@ def logout():
 # Now we send manually the ESDL as string, which is (probably) not efficient.
 # This still works with a 1.6 MB file... Not sure if this scales any further...
 @app.route('/esdl')
+@session_writer
 def download_esdl():
     """Sends the current ESDL file to the browser as an attachment"""
     esh = get_handler()
@@ -870,15 +889,15 @@ def update_asset_connection_locations(asset: esdl.Asset, lat, lon):
         if c['to-asset-id'] == ass_id:
             c['to-asset-coord'] = (lat, lon)
 
-    emit('clear_connections')   # clear current active layer connections
-    add_to_building = False
     if asset.containingBuilding:
         # building editor is open, so only update building connections.
+        emit('clear_connections')   # clear current active layer connections
         building = asset.containingBuilding
         bld_info = get_building_information(building)
         conn_list = bld_info["conn_list"]
-        add_to_building = True
-    emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list, 'add_to_building': add_to_building})
+        emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list, 'add_to_building': True})
+    else:
+        emit_ui_delta(get_handler(), active_es_id, layers=(CONNECTIONS_LAYER,))
 
 
 def update_transport_connection_locations(ass_id, asset, coords):
@@ -897,8 +916,7 @@ def update_transport_connection_locations(ass_id, asset, coords):
             port_ass_map = get_asset_and_coord_from_port_id(esh, active_es_id, port_id)
             c['to-asset-coord'] = port_ass_map['coord']
 
-    emit('clear_connections')   # clear current active layer connections
-    emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list})
+    emit_ui_delta(esh, active_es_id, layers=(CONNECTIONS_LAYER,))
 
 
 def update_polygon_asset_connection_locations(ass_id, coords):
@@ -910,10 +928,8 @@ def update_polygon_asset_connection_locations(ass_id, coords):
         if c['to-asset-id'] == ass_id:
             c['to-asset-coord'] = coords
 
-    emit('clear_connections')   # clear current active layer connections
-    emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list})
-
     set_session_for_esid(active_es_id, 'conn_list', conn_list)
+    emit_ui_delta(get_handler(), active_es_id, layers=(CONNECTIONS_LAYER,))
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -1174,6 +1190,7 @@ def split_conductor(conductor, location, mode, conductor_container):
         emit('clear_connections')   # clear current active layer connections
         emit('delete_esdl_object', {'asset_id': conductor.id}) # remove original condutor from map
         emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list})
+        ui_delta_sent(active_es_id, CONNECTIONS_LAYER, conn_list, replace=True)
     else:
         send_alert('UNSUPPORTED: Conductor is not of type esdl.Line!')
 
@@ -1182,6 +1199,7 @@ def split_conductor(conductor, location, mode, conductor_container):
 #  Update ESDL coordinates on movement of assets in browser
 # ---------------------------------------------------------------------------------------------------------------------
 @socketio.on('update-coord', namespace='/esdl')
+@session_writer
 def update_coordinates(message):
     # This function can also be called when the geometry of an asset is of type esdl.Polygon, because
     # the asset on the leaflet map is both represented as a Polygon and a Point (to connect, to attach menus)
@@ -1227,6 +1245,7 @@ def update_coordinates(message):
 
 
 @socketio.on('update-line-coord', namespace='/esdl')
+@session_writer
 def update_line_coordinates(message):
     # logger.debug ('received polyline: ' + str(message['id']) + ':' + str(message['polyline']))
     ass_id = message['id']
@@ -1261,6 +1280,7 @@ def update_line_coordinates(message):
 
 
 @socketio.on('update-polygon-coord', namespace='/esdl')
+@session_writer
 def update_polygon_coordinates(message):
     # logger.debug ('received polygon: ' + str(message['id']) + ':' + str(message['polygon']))
     ass_id = message['id']
@@ -1537,6 +1557,7 @@ def call_process_energy_system(esh, filename=None, es_title=None, app_context=No
 #  React on commands from the browser (add, remove, ...)
 # ---------------------------------------------------------------------------------------------------------------------
 @socketio.on('command', namespace='/esdl')
+@session_writer
 def process_command(message):
     logger.info('received: ' + message['cmd'])
     if not valid_session():
@@ -1563,1509 +1584,1621 @@ def process_command(message):
     #  session.modified = True
     # logger.debug (get_handler().instance[0].area.name)
 
-    if message['cmd'] == 'add_object':
-        area_bld_id = message['area_bld_id']
-        asset_id = message['asset_id']
-        object_type = message['object']
-        asset_name = message['asset_name']
-        asset = None
+    result = command_registry.dispatch(message['cmd'], message, esh=esh, es_edit=es_edit, active_es_id=active_es_id,
+                                       area_bld_list=area_bld_list, user_email=user_email)
 
-        shape = message['shape']
-        geometry = ESDLGeometry.create_ESDL_geometry(shape)
+    set_handler(esh)
+    session.modified = True
+    return result
 
-        if area_bld_id == 'find_area_location_based':
-            area_bld_id = find_area_location_based(esh, active_es_id, geometry)
 
-        if object_type == 'Area':
-            if not isinstance(geometry, esdl.Polygon):
-                send_alert('Areas with geometries other than polygons are not supported')
-            else:
-                if isinstance(geometry, esdl.Polygon):
-                    new_area = esdl.Area(id=asset_id, name=asset_name)
-                    new_area.geometry = geometry
-
-                    # Update shape dictionary
-                    shape_dictionary = get_session('shape_dictionary')
-                    shape_dictionary[new_area.id] = Shape.create(geometry)
-                    set_session('shape_dictionary', shape_dictionary)
-
-                    # Update drop down list with areas and buildings
-                    add_area_to_area_bld_list(new_area, area_bld_id, area_bld_list)
-                    emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
-
-                    # Add area to the indicated area
-                    if not ESDLEnergySystem.add_area_to_area(es_edit, new_area, area_bld_id):
-                        send_alert('Can not add area to building')
-
-                    # Send new area shapes to the browser
-                    area_list = []
-                    boundary_wgs = ESDLGeometry.create_boundary_from_geometry(geometry)
-                    area_list.append(ESDLGeometry.create_geojson(new_area.id, new_area.name, [], boundary_wgs))
-                    esh.add_object_to_dict(active_es_id, new_area)
-                    emit('geojson', {"layer": "area_layer", "geojson": area_list})
-                else:
-                    send_alert('Can not add an area with another shap than a Polygon')
+@command_registry.command('add_object')
+def cmd_add_object(message, esh, es_edit, active_es_id, area_bld_list, user_email):
+    area_bld_id = message['area_bld_id']
+    asset_id = message['asset_id']
+    object_type = message['object']
+    asset_name = message['asset_name']
+    asset = None
+
+    shape = message['shape']
+    geometry = ESDLGeometry.create_ESDL_geometry(shape)
+
+    if area_bld_id == 'find_area_location_based':
+        area_bld_id = find_area_location_based(esh, active_es_id, geometry)
+
+    if object_type == 'Area':
+        if not isinstance(geometry, esdl.Polygon):
+            send_alert('Areas with geometries other than polygons are not supported')
         else:
-            edr_asset_str = get_session('adding_edr_assets')
-            if edr_asset_str:
-                asset = ESDLAsset.load_asset_from_string(edr_asset_str)
-                # TODO: deepcopy does not work.
-                # asset = copy.deepcopy(edr_asset)
-                # Quick fix: session variable adding_edr_assets now contains ESDL string
-                class_ = type(asset)
-                object_type = class_.__name__
-                print(asset)
-                # Check if any IDs were 'accidentally' set in EDR model template and replace them by a new unique ID
-                # If no ID was set, assign no new ID either
-                for c in asset.eContents:
-                    if c.eClass.findEStructuralFeature('id'):
-                        if c.eGet('id'):
-                            c.eSet('id', str(uuid.uuid4()))
-            else:
-                asset_drawing_mode = get_session('asset_drawing_mode')
-                if asset_drawing_mode == 'asset_from_measures':
-                    asset_from_measure_id = get_session('asset_from_measure_id')
-                    asset = AssetsToBeAdded.get_instance_of_measure_with_asset_id(es_edit, asset_from_measure_id)
-                    atba = AssetsToBeAdded.get_instance()
-                    atba.reduce_ui_asset_count(es_edit, asset_from_measure_id)
-                    class_ = type(asset)
-                    object_type = class_.__name__
-                else:
-                    module = importlib.import_module('esdl.esdl')
-                    class_ = getattr(module, object_type)
-                    asset = class_()
-
-            if issubclass(class_, esdl.Potential):
-                potential = class_()
-                potential.id = asset_id
-                potential.name = asset_name
-                potential.geometry = geometry
-
-                add_to_building = False
-                if not ESDLAsset.add_object_to_area(es_edit, potential, area_bld_id):
-                    ESDLAsset.add_object_to_building(es_edit, potential, area_bld_id)
-                    add_to_building = True
-
-                potentials_to_be_added = []
-                if isinstance(geometry, esdl.Point):
-                    potentials_to_be_added.append(
-                        ['point', 'potential', potential.name, potential.id, type(potential).__name__,
-                         [geometry.lat, geometry.lon]])
-                elif isinstance(geometry, esdl.Polygon):
-                    coords = ESDLGeometry.parse_esdl_subpolygon(potential.geometry.exterior, False)  # [lon, lat]
-                    coords = ESDLGeometry.exchange_coordinates(coords)
-                    potentials_to_be_added.append(
-                        ['polygon', 'potential', potential.name, potential.id, type(potential).__name__, coords])
+            if isinstance(geometry, esdl.Polygon):
+                new_area = esdl.Area(id=asset_id, name=asset_name)
+                new_area.geometry = geometry
 
-                if potentials_to_be_added:
-                    emit('add_esdl_objects', {'es_id': es_edit.id, 'add_to_building': add_to_building,
-                                              'asset_pot_list': potentials_to_be_added, 'zoom': False})
+                # Update shape dictionary
+                shape_dictionary = get_session('shape_dictionary')
+                shape_dictionary[new_area.id] = Shape.create(geometry)
+                set_session('shape_dictionary', shape_dictionary)
 
-                esh.add_object_to_dict(active_es_id, potential)
-            else:
-                asset.id = asset_id
-                asset.name = asset_name
-                asset.geometry = geometry
+                # Update drop down list with areas and buildings
+                add_area_to_area_bld_list(new_area, area_bld_id, area_bld_list)
+                emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
 
-                if isinstance(geometry, esdl.Point):
-                    port_loc = (shape['coordinates']['lat'], shape['coordinates']['lng'])
-                elif isinstance(geometry, esdl.Polygon):
-                    port_loc = ESDLGeometry.calculate_polygon_center(geometry)
+                # Add area to the indicated area
+                if not ESDLEnergySystem.add_area_to_area(es_edit, new_area, area_bld_id):
+                    send_alert('Can not add area to building')
 
-                    polygon_area = int(shape['polygon_area'])
+                # Send new area shapes to the browser
+                area_list = []
+                boundary_wgs = ESDLGeometry.create_boundary_from_geometry(geometry)
+                area_list.append(ESDLGeometry.create_geojson(new_area.id, new_area.name, [], boundary_wgs))
+                esh.add_object_to_dict(active_es_id, new_area)
+                emit('geojson', {"layer": "area_layer", "geojson": area_list})
+            else:
+                send_alert('Can not add an area with another shap than a Polygon')
+    else:
+        edr_asset_str = get_session('adding_edr_assets')
+        if edr_asset_str:
+            asset = ESDLAsset.load_asset_from_string(edr_asset_str)
+            # TODO: deepcopy does not work.
+            # asset = copy.deepcopy(edr_asset)
+            # Quick fix: session variable adding_edr_assets now contains ESDL string
+            class_ = type(asset)
+            object_type = class_.__name__
+            print(asset)
+            # Check if any IDs were 'accidentally' set in EDR model template and replace them by a new unique ID
+            # If no ID was set, assign no new ID either
+            for c in asset.eContents:
+                if c.eClass.findEStructuralFeature('id'):
+                    if c.eGet('id'):
+                        c.eSet('id', str(uuid.uuid4()))
+        else:
+            asset_drawing_mode = get_session('asset_drawing_mode')
+            if asset_drawing_mode == 'asset_from_measures':
+                asset_from_measure_id = get_session('asset_from_measure_id')
+                asset = AssetsToBeAdded.get_instance_of_measure_with_asset_id(es_edit, asset_from_measure_id)
+                atba = AssetsToBeAdded.get_instance()
+                atba.reduce_ui_asset_count(es_edit, asset_from_measure_id)
+                class_ = type(asset)
+                object_type = class_.__name__
+            else:
+                module = importlib.import_module('esdl.esdl')
+                class_ = getattr(module, object_type)
+                asset = class_()
+
+        if issubclass(class_, esdl.Potential):
+            potential = class_()
+            potential.id = asset_id
+            potential.name = asset_name
+            potential.geometry = geometry
+
+            add_to_building = False
+            if not ESDLAsset.add_object_to_area(es_edit, potential, area_bld_id):
+                ESDLAsset.add_object_to_building(es_edit, potential, area_bld_id)
+                add_to_building = True
+
+            potentials_to_be_added = []
+            if isinstance(geometry, esdl.Point):
+                potentials_to_be_added.append(
+                    ['point', 'potential', potential.name, potential.id, type(potential).__name__,
+                     [geometry.lat, geometry.lon]])
+            elif isinstance(geometry, esdl.Polygon):
+                coords = ESDLGeometry.parse_esdl_subpolygon(potential.geometry.exterior, False)  # [lon, lat]
+                coords = ESDLGeometry.exchange_coordinates(coords)
+                potentials_to_be_added.append(
+                    ['polygon', 'potential', potential.name, potential.id, type(potential).__name__, coords])
+
+            if potentials_to_be_added:
+                emit('add_esdl_objects', {'es_id': es_edit.id, 'add_to_building': add_to_building,
+                                          'asset_pot_list': potentials_to_be_added, 'zoom': False})
+
+            esh.add_object_to_dict(active_es_id, potential)
+        else:
+            asset.id = asset_id
+            asset.name = asset_name
+            asset.geometry = geometry
 
-                    if not isinstance(asset, esdl.AbstractBuilding):
-                        if asset.surfaceArea:
-                            if asset.power:
-                                asset.power = asset.power * polygon_area / asset.surfaceArea
-                                asset.surfaceArea = polygon_area
-                        else:
-                            asset.surfaceArea = polygon_area
+            if isinstance(geometry, esdl.Point):
+                port_loc = (shape['coordinates']['lat'], shape['coordinates']['lng'])
+            elif isinstance(geometry, esdl.Polygon):
+                port_loc = ESDLGeometry.calculate_polygon_center(geometry)
 
-                # Set port existence booleans
-                no_out_port = True
-                no_in_port = True
-                if isinstance(asset, esdl.EnergyAsset):
-                    for p in asset.port:
-                        if isinstance(p, esdl.OutPort):
-                            no_out_port = False
-                        if isinstance(p, esdl.InPort):
-                            no_in_port = False
+                polygon_area = int(shape['polygon_area'])
 
                 if not isinstance(asset, esdl.AbstractBuilding):
-                    # -------------------------------------------------------------------------------------------------------------
-                    #  Add assets with a polyline geometry and an InPort and an OutPort
-                    # -------------------------------------------------------------------------------------------------------------
-                    if object_type in ['ElectricityCable', 'Pipe']:
-                        # Assume pipes and cables never have ports (coming out of the EDR)
-                        inp = esdl.InPort(id=str(uuid.uuid4()), name='In')
-                        asset.port.append(inp)
-                        outp = esdl.OutPort(id=str(uuid.uuid4()), name='Out')
-                        asset.port.append(outp)
-                        asset.length = float(shape['length']) if 'length' in shape else 0.0
-                        print(message)
-                        # automatically connect the conductor to the ports that have been clicked
-                        if 'connect_ports' in message and message['connect_ports'] != '':
-                            connect_ports_msg = message['connect_ports']
-                            start_port = None
-                            end_port = None
-                            from_port1 = None
-                            to_port1 = None
-                            from_port2 = None
-                            to_port2 = None
-                            if 'asset_start_port' in connect_ports_msg:
-                                asset_start_port = connect_ports_msg['asset_start_port']
-                                start_port = esh.get_by_id(active_es_id, asset_start_port)
-                            if 'asset_end_port' in connect_ports_msg:
-                                asset_end_port = connect_ports_msg['asset_end_port']
-                                end_port = esh.get_by_id(active_es_id, asset_end_port)
-
-                            # cannot connect to same port type
-                            if start_port is not None and end_port is not None and \
-                                    type(start_port) == type(end_port):
-                                other_type = esdl.InPort.eClass.name if isinstance(start_port, esdl.OutPort) \
-                                    else esdl.OutPort.eClass.name
-                                send_alert(
-                                    "Please connect the {} to an {}".format(object_type, other_type))
-                                return
-
-                            require_reversed = False  # to indicate the coordinates of the line need reversal
-                            if start_port is not None:
-                                if isinstance(start_port, esdl.OutPort):
-                                    inp.connectedTo.append(start_port)
-                                    from_port1 = inp
-                                    to_port1 = start_port
-                                elif isinstance(start_port, esdl.InPort):
-                                    outp.connectedTo.append(start_port)
-                                    from_port1 = outp
-                                    to_port1 = start_port
-                                    require_reversed = True
-                            if end_port is not None:
-                                if isinstance(end_port, esdl.InPort):
-                                    outp.connectedTo.append(end_port)
-                                    from_port2 = outp
-                                    to_port2 = end_port
-                                elif isinstance(end_port, esdl.OutPort):
-                                    inp.connectedTo.append(end_port)
-                                    from_port2 = inp
-                                    to_port2 = end_port
-                                    require_reversed = True
-
-                            if require_reversed:
-                                line: esdl.Line = asset.geometry  # reverse coordinate to change direction of line
-                                point = list(line.point)  # copy list
-                                line.point.clear()
-                                for p in point:
-                                    line.point.insert(0, p)  # reverse list of coordinates
-
-                            # Send connections
-                            add_to_building = False  # TODO: Fix using this inside buildings
-                            conn_list = get_session_for_esid(active_es_id, 'conn_list')
-                            carrier_id = None
-                            if start_port:
-                                if isinstance(start_port, esdl.InPort):
-                                    asset1_port_location = asset.geometry.point[-1]
-                                else:
-                                    asset1_port_location = asset.geometry.point[0]
-                                if start_port.carrier is not None:
-                                    carrier_id = start_port.carrier.id
-                                    inp.carrier = start_port.carrier
-                                    outp.carrier = start_port.carrier
-                                    if end_port is not None and end_port.carrier is None:
-                                        # in case of a joint: set the carrier for all ports
-                                        if isinstance(end_port.energyasset, esdl.Joint):
-                                            for p in end_port.energyasset.port:
-                                                p.carrier = start_port.carrier if p.carrier is None else p.carrier
-                                        else:
-                                            end_port.carrier = start_port.carrier
-
-                            if end_port:
-                                if isinstance(end_port, esdl.InPort):
-                                    asset2_port_location = asset.geometry.point[-1]
-                                else:
-                                    asset2_port_location = asset.geometry.point[0]
-                                if end_port.carrier is not None and carrier_id is None:  # no start_port carrier
-                                    carrier_id = end_port.carrier.id
-                                    inp.carrier = end_port.carrier
-                                    outp.carrier = end_port.carrier
-                                    if start_port is not None and start_port.carrier is None:
-                                        # in case of a joint: set the carrier for all ports
-                                        if isinstance(start_port.energyasset, esdl.Joint):
-                                            for p in start_port.energyasset.port:
-                                                p.carrier = end_port.carrier if p.carrier is None else p.carrier
-                                        else:
-                                            start_port.carrier = end_port.carrier
-
-                            # send messages to update connections and start port / end port marker colors based on
-                            # the carriers
-                            if start_port:
-                                conn_message = {'from-port-id': from_port1.id,
-                                                'from-port-carrier': from_port1.carrier.id if from_port1.carrier else None,
-                                                'from-asset-id': from_port1.eContainer().id,
-                                                'from-asset-coord': [asset1_port_location.lat, asset1_port_location.lon],
-                                                'to-port-id': to_port1.id,
-                                                'to-port-carrier': to_port1.carrier.id if to_port1.carrier else None,
-                                                'to-asset-id': to_port1.eContainer().id,
-                                                'to-asset-coord': [asset1_port_location.lat, asset1_port_location.lon]}
-                                conn_list.append(conn_message)
-                                emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message]})
-
-                                # update ports of from_port asset
-                                from_asset = start_port.eContainer()
-                                port_list = []
-                                for p in from_asset.port:
-                                    port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
-                                                      'conn_to': [pt.id for pt in p.connectedTo],
-                                                      'carrier': p.carrier.id if p.carrier else None})
-                                emit('update_asset', {'asset_id': from_asset.id, 'ports': port_list})
-
-                            if end_port:
-                                conn_message = {'from-port-id': from_port2.id,
-                                     'from-port-carrier': from_port2.carrier.id if from_port2.carrier else None,
-                                     'from-asset-id': from_port2.eContainer().id,
-                                     'from-asset-coord': [asset2_port_location.lat, asset2_port_location.lon],
-                                     'to-port-id': to_port2.id,
-                                     'to-port-carrier': to_port2.carrier.id if to_port2.carrier else None,
-                                     'to-asset-id': to_port2.eContainer().id,
-                                     'to-asset-coord': [asset2_port_location.lat, asset2_port_location.lon]}
-                                conn_list.append(conn_message)
-                                emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message]})
-
-                                # update ports of from_port asset
-                                to_asset = end_port.eContainer()
-                                port_list = []
-                                for p in to_asset.port:
-                                    port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
-                                                      'conn_to': [pt.id for pt in p.connectedTo],
-                                                      'carrier': p.carrier.id if p.carrier else None})
-                                emit('update_asset', {'asset_id': to_asset.id, 'ports': port_list})
-
-                    # -------------------------------------------------------------------------------------------------------------
-                    #  Add assets with an InPort and two OutPorts (either point or polygon)
-                    # -------------------------------------------------------------------------------------------------------------
-                    elif object_type in ['CHP', 'FuelCell']:
-                        # Assume CHPs and FuelCells never have ports (coming out of the EDR)
-                        inp = esdl.InPort(id=str(uuid.uuid4()), name='In')
-                        asset.port.append(inp)
-
-                        e_outp = esdl.OutPort(id=str(uuid.uuid4()), name='E Out')
-                        asset.port.append(e_outp)
-                        h_outp = esdl.OutPort(id=str(uuid.uuid4()), name='H Out')
-                        asset.port.append(h_outp)
-
+                    if asset.surfaceArea:
+                        if asset.power:
+                            asset.power = asset.power * polygon_area / asset.surfaceArea
+                            asset.surfaceArea = polygon_area
                     else:
-                        capability = ESDLAsset.get_asset_capability_type(asset)
+                        asset.surfaceArea = polygon_area
 
-                        # The view mode influences if single or double ports are added
-                        double_line_mode = False
-                        view_modes = ViewModes.get_instance()
-                        if view_modes.get_user_settings(user_email)['mode'] == 'CHESS':
-                            double_line_mode = True
+            # Set port existence booleans
+            no_out_port = True
+            no_in_port = True
+            if isinstance(asset, esdl.EnergyAsset):
+                for p in asset.port:
+                    if isinstance(p, esdl.OutPort):
+                        no_out_port = False
+                    if isinstance(p, esdl.InPort):
+                        no_in_port = False
+
+            if not isinstance(asset, esdl.AbstractBuilding):
+                # -------------------------------------------------------------------------------------------------------------
+                #  Add assets with a polyline geometry and an InPort and an OutPort
+                # -------------------------------------------------------------------------------------------------------------
+                if object_type in ['ElectricityCable', 'Pipe']:
+                    # Assume pipes and cables never have ports (coming out of the EDR)
+                    inp = esdl.InPort(id=str(uuid.uuid4()), name='In')
+                    asset.port.append(inp)
+                    outp = esdl.OutPort(id=str(uuid.uuid4()), name='Out')
+                    asset.port.append(outp)
+                    asset.length = float(shape['length']) if 'length' in shape else 0.0
+                    print(message)
+                    # automatically connect the conductor to the ports that have been clicked
+                    if 'connect_ports' in message and message['connect_ports'] != '':
+                        connect_ports_msg = message['connect_ports']
+                        start_port = None
+                        end_port = None
+                        from_port1 = None
+                        to_port1 = None
+                        from_port2 = None
+                        to_port2 = None
+                        if 'asset_start_port' in connect_ports_msg:
+                            asset_start_port = connect_ports_msg['asset_start_port']
+                            start_port = esh.get_by_id(active_es_id, asset_start_port)
+                        if 'asset_end_port' in connect_ports_msg:
+                            asset_end_port = connect_ports_msg['asset_end_port']
+                            end_port = esh.get_by_id(active_es_id, asset_end_port)
+
+                        # cannot connect to same port type
+                        if start_port is not None and end_port is not None and \
+                                type(start_port) == type(end_port):
+                            other_type = esdl.InPort.eClass.name if isinstance(start_port, esdl.OutPort) \
+                                else esdl.OutPort.eClass.name
+                            send_alert(
+                                "Please connect the {} to an {}".format(object_type, other_type))
+                            return
+
+                        require_reversed = False  # to indicate the coordinates of the line need reversal
+                        if start_port is not None:
+                            if isinstance(start_port, esdl.OutPort):
+                                inp.connectedTo.append(start_port)
+                                from_port1 = inp
+                                to_port1 = start_port
+                            elif isinstance(start_port, esdl.InPort):
+                                outp.connectedTo.append(start_port)
+                                from_port1 = outp
+                                to_port1 = start_port
+                                require_reversed = True
+                        if end_port is not None:
+                            if isinstance(end_port, esdl.InPort):
+                                outp.connectedTo.append(end_port)
+                                from_port2 = outp
+                                to_port2 = end_port
+                            elif isinstance(end_port, esdl.OutPort):
+                                inp.connectedTo.append(end_port)
+                                from_port2 = inp
+                                to_port2 = end_port
+                                require_reversed = True
+
+                        if require_reversed:
+                            line: esdl.Line = asset.geometry  # reverse coordinate to change direction of line
+                            point = list(line.point)  # copy list
+                            line.point.clear()
+                            for p in point:
+                                line.point.insert(0, p)  # reverse list of coordinates
+
+                        # Send connections
+                        add_to_building = False  # TODO: Fix using this inside buildings
+                        conn_list = get_session_for_esid(active_es_id, 'conn_list')
+                        carrier_id = None
+                        if start_port:
+                            if isinstance(start_port, esdl.InPort):
+                                asset1_port_location = asset.geometry.point[-1]
+                            else:
+                                asset1_port_location = asset.geometry.point[0]
+                            if start_port.carrier is not None:
+                                carrier_id = start_port.carrier.id
+                                inp.carrier = start_port.carrier
+                                outp.carrier = start_port.carrier
+                                if end_port is not None and end_port.carrier is None:
+                                    # in case of a joint: set the carrier for all ports
+                                    if isinstance(end_port.energyasset, esdl.Joint):
+                                        for p in end_port.energyasset.port:
+                                            p.carrier = start_port.carrier if p.carrier is None else p.carrier
+                                    else:
+                                        end_port.carrier = start_port.carrier
+
+                        if end_port:
+                            if isinstance(end_port, esdl.InPort):
+                                asset2_port_location = asset.geometry.point[-1]
+                            else:
+                                asset2_port_location = asset.geometry.point[0]
+                            if end_port.carrier is not None and carrier_id is None:  # no start_port carrier
+                                carrier_id = end_port.carrier.id
+                                inp.carrier = end_port.carrier
+                                outp.carrier = end_port.carrier
+                                if start_port is not None and start_port.carrier is None:
+                                    # in case of a joint: set the carrier for all ports
+                                    if isinstance(start_port.energyasset, esdl.Joint):
+                                        for p in start_port.energyasset.port:
+                                            p.carrier = end_port.carrier if p.carrier is None else p.carrier
+                                    else:
+                                        start_port.carrier = end_port.carrier
+
+                        # send messages to update connections and start port / end port marker colors based on
+                        # the carriers
+                        if start_port:
+                            conn_message = {'from-port-id': from_port1.id,
+                                            'from-port-carrier': from_port1.carrier.id if from_port1.carrier else None,
+                                            'from-asset-id': from_port1.eContainer().id,
+                                            'from-asset-coord': [asset1_port_location.lat, asset1_port_location.lon],
+                                            'to-port-id': to_port1.id,
+                                            'to-port-carrier': to_port1.carrier.id if to_port1.carrier else None,
+                                            'to-asset-id': to_port1.eContainer().id,
+                                            'to-asset-coord': [asset1_port_location.lat, asset1_port_location.lon]}
+                            conn_list.append(conn_message)
+                            emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message]})
+                            ui_delta_sent(active_es_id, CONNECTIONS_LAYER, [conn_message])
+
+                            # update ports of from_port asset
+                            from_asset = start_port.eContainer()
+                            port_list = []
+                            for p in from_asset.port:
+                                port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
+                                                  'conn_to': [pt.id for pt in p.connectedTo],
+                                                  'carrier': p.carrier.id if p.carrier else None})
+                            emit('update_asset', {'asset_id': from_asset.id, 'ports': port_list})
+
+                        if end_port:
+                            conn_message = {'from-port-id': from_port2.id,
+                                 'from-port-carrier': from_port2.carrier.id if from_port2.carrier else None,
+                                 'from-asset-id': from_port2.eContainer().id,
+                                 'from-asset-coord': [asset2_port_location.lat, asset2_port_location.lon],
+                                 'to-port-id': to_port2.id,
+                                 'to-port-carrier': to_port2.carrier.id if to_port2.carrier else None,
+                                 'to-asset-id': to_port2.eContainer().id,
+                                 'to-asset-coord': [asset2_port_location.lat, asset2_port_location.lon]}
+                            conn_list.append(conn_message)
+                            emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message]})
+                            ui_delta_sent(active_es_id, CONNECTIONS_LAYER, [conn_message])
+
+                            # update ports of from_port asset
+                            to_asset = end_port.eContainer()
+                            port_list = []
+                            for p in to_asset.port:
+                                port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
+                                                  'conn_to': [pt.id for pt in p.connectedTo],
+                                                  'carrier': p.carrier.id if p.carrier else None})
+                            emit('update_asset', {'asset_id': to_asset.id, 'ports': port_list})
+
+                # -------------------------------------------------------------------------------------------------------------
+                #  Add assets with an InPort and two OutPorts (either point or polygon)
+                # -------------------------------------------------------------------------------------------------------------
+                elif object_type in ['CHP', 'FuelCell']:
+                    # Assume CHPs and FuelCells never have ports (coming out of the EDR)
+                    inp = esdl.InPort(id=str(uuid.uuid4()), name='In')
+                    asset.port.append(inp)
+
+                    e_outp = esdl.OutPort(id=str(uuid.uuid4()), name='E Out')
+                    asset.port.append(e_outp)
+                    h_outp = esdl.OutPort(id=str(uuid.uuid4()), name='H Out')
+                    asset.port.append(h_outp)
 
-                        # For producers, consumers (and storage) check if a port already exists (coming from the EDR)
-                        if capability == 'Producer':
-                            if no_out_port:
-                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
-                            if double_line_mode:
-                                if no_in_port:
-                                    asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
-                        elif capability in ['Consumer', 'Storage']:
+                else:
+                    capability = ESDLAsset.get_asset_capability_type(asset)
+
+                    # The view mode influences if single or double ports are added
+                    double_line_mode = False
+                    view_modes = ViewModes.get_instance()
+                    if view_modes.get_user_settings(user_email)['mode'] == 'CHESS':
+                        double_line_mode = True
+
+                    # For producers, consumers (and storage) check if a port already exists (coming from the EDR)
+                    if capability == 'Producer':
+                        if no_out_port:
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
+                        if double_line_mode:
                             if no_in_port:
                                 asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
+                    elif capability in ['Consumer', 'Storage']:
+                        if no_in_port:
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
+                        if double_line_mode:
+                            if no_out_port:
+                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
+                    elif capability == 'Conversion':
+                        if object_type == "HeatPump" and double_line_mode:
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='PrimIn'))
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='PrimOut'))
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='SecIn'))
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='SecOut'))
+                        else:
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
+                    elif capability == 'Transport':
+                        if object_type == 'HeatExchange' or object_type == 'Transformer':
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='PrimIn'))
                             if double_line_mode:
-                                if no_out_port:
-                                    asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
-                        elif capability == 'Conversion':
-                            if object_type == "HeatPump" and double_line_mode:
-                                asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='PrimIn'))
                                 asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='PrimOut'))
+
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='SecOut'))
+                            if double_line_mode:
                                 asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='SecIn'))
-                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='SecOut'))
-                            else:
-                                asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
-                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
-                        elif capability == 'Transport':
-                            if object_type == 'HeatExchange' or object_type == 'Transformer':
-                                asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='PrimIn'))
-                                if double_line_mode:
-                                    asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='PrimOut'))
-
-                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='SecOut'))
-                                if double_line_mode:
-                                    asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='SecIn'))
-                            else:
-                                asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
-                                asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
                         else:
-                            logger.error('Unknown asset capability {}'.format(capability))
-                else:
-                    # Update drop down list with areas and buildings
-                    add_bld_to_area_bld_list(asset, area_bld_id, area_bld_list)
-                    emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
+                            asset.port.append(esdl.InPort(id=str(uuid.uuid4()), name='In'))
+                            asset.port.append(esdl.OutPort(id=str(uuid.uuid4()), name='Out'))
+                    else:
+                        logger.error('Unknown asset capability {}'.format(capability))
+            else:
+                # Update drop down list with areas and buildings
+                add_bld_to_area_bld_list(asset, area_bld_id, area_bld_list)
+                emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
 
-                add_to_building = False
-                if not ESDLAsset.add_object_to_area(es_edit, asset, area_bld_id):
-                    ESDLAsset.add_object_to_building(es_edit, asset, area_bld_id)
-                    add_to_building = True
+            add_to_building = False
+            if not ESDLAsset.add_object_to_area(es_edit, asset, area_bld_id):
+                ESDLAsset.add_object_to_building(es_edit, asset, area_bld_id)
+                add_to_building = True
 
-                asset_to_be_added_list = []
-                buildings_to_be_added_list = []
+            asset_to_be_added_list = []
+            buildings_to_be_added_list = []
+
+            # TODO: check / solve cable as Point issue?
+            if not isinstance(asset, esdl.AbstractBuilding):
+                port_list = []
+                ports = asset.port
+                for p in ports:
+                    connTo_ids = list(o.id for o in p.connectedTo)
+                    carrier_id = p.carrier.id if p.carrier else None
+                    port_list.append(
+                        {'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': connTo_ids,
+                         'carrier': carrier_id})
+
+            # Collect extra attributes that might be required to draw specific icons, ...
+            extra_attributes = dict()
+            extra_attributes['assetType'] = asset.assetType
 
-                # TODO: check / solve cable as Point issue?
-                if not isinstance(asset, esdl.AbstractBuilding):
-                    port_list = []
-                    ports = asset.port
-                    for p in ports:
-                        connTo_ids = list(o.id for o in p.connectedTo)
-                        carrier_id = p.carrier.id if p.carrier else None
-                        port_list.append(
-                            {'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': connTo_ids,
-                             'carrier': carrier_id})
-
-                # Collect extra attributes that might be required to draw specific icons, ...
-                extra_attributes = dict()
-                extra_attributes['assetType'] = asset.assetType
-
-                if isinstance(asset, esdl.AbstractBuilding):
-                    if isinstance(geometry, esdl.Point):
-                        buildings_to_be_added_list.append(['point', asset.name, asset.id, type(asset).__name__,
-                                                           [shape['coordinates']['lat'], shape['coordinates']['lng']],
-                                                           False, {}, extra_attributes])
-                    elif isinstance(geometry, esdl.Polygon):
-                        coords = ESDLGeometry.parse_esdl_subpolygon(asset.geometry.exterior, False)  # [lon, lat]
-                        coords = ESDLGeometry.exchange_coordinates(coords)                           # --> [lat, lon]
-                        boundary = ESDLGeometry.create_boundary_from_geometry(geometry)
-                        buildings_to_be_added_list.append(['polygon', asset.name, asset.id, type(asset).__name__,
-                                                           boundary["coordinates"], False, {}, extra_attributes])
-                    emit('add_building_objects', {'es_id': es_edit.id, 'building_list': buildings_to_be_added_list,
-                                                  'zoom': False})
-                else:
-                    capability_type = ESDLAsset.get_asset_capability_type(asset)
-                    state = asset_state_to_ui(asset)
-                    if isinstance(geometry, esdl.Point):
-                        tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'marker')
-                        add_spatial_attributes(asset, tooltip_asset_attrs)
-                        asset_to_be_added_list.append(['point', 'asset', asset.name, asset.id, type(asset).__name__,
-                                                       [shape['coordinates']['lat'], shape['coordinates']['lng']],
-                                                       tooltip_asset_attrs, state, port_list, capability_type,
-                                                       extra_attributes])
-                    elif isinstance(geometry, esdl.Polygon):
-                        coords = ESDLGeometry.parse_esdl_subpolygon(asset.geometry.exterior, False)  # [lon, lat]
-                        coords = ESDLGeometry.exchange_coordinates(coords)                           # --> [lat, lon]
-                        # logger.debug(coords)
-                        tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'polygon')
-                        add_spatial_attributes(asset, tooltip_asset_attrs)
-                        asset_to_be_added_list.append(
-                            ['polygon', 'asset', asset.name, asset.id, type(asset).__name__, coords,
-                             tooltip_asset_attrs, state, port_list, capability_type, extra_attributes])
-                    elif isinstance(geometry, esdl.Line):
-                        coords = []
-                        for point in geometry.point:
-                            coords.append([point.lat, point.lon])
-                        tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'line')
-                        add_spatial_attributes(asset, tooltip_asset_attrs)
-                        asset_to_be_added_list.append(['line', 'asset', asset.name, asset.id, type(asset).__name__,
-                                                       coords, tooltip_asset_attrs, state, port_list])
-
-                    #logger.debug(asset_to_be_added_list)
-                    emit('add_esdl_objects', {'es_id': es_edit.id, 'add_to_building': add_to_building,
-                                              'asset_pot_list': asset_to_be_added_list, 'zoom': False})
-
-                    asset_list = get_session_for_esid(es_edit.id, 'asset_list')
-                    for al_asset in asset_to_be_added_list:
-                        asset_list.append(al_asset)
-
-                esh.add_object_to_dict(es_edit.id, asset)
-                if hasattr(asset, 'port'):
-                    for added_port in asset.port:
-                        esh.add_object_to_dict(es_edit.id, added_port)
-                set_handler(esh)
-
-    if message['cmd'] == 'remove_object':
-        # removes asset or potential from EnergySystem
-        obj_id = message['id']
-        if obj_id:
-            # asset = ESDLAsset.find_asset(es_edit.instance[0].area, obj_id)
-            # asset can also be any other object in ESDL
-            asset = esh.get_by_id(active_es_id, obj_id)
             if isinstance(asset, esdl.AbstractBuilding):
-                # Update drop down list with areas and buildings
-                remove_ab_from_area_bld_list(asset.id, area_bld_list)
-                emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
-            if asset:
-                # Try to remove control strategy for EnergyAssets (and not for buildings)
-                if isinstance(asset, esdl.EnergyAsset):
-                    remove_control_strategy_for_asset(asset.id)
-            ESDLAsset.remove_object_from_energysystem(es_edit, obj_id)
-            esh.remove_object_from_dict(es_edit.id, asset, True)
-            # remove from asset dict
-            asset_list = get_session_for_esid(active_es_id, 'asset_list')
-            asset_list[:] = [a for a in asset_list if a[3] != obj_id] # filter list in place
-            conn_list = get_session_for_esid(active_es_id, 'conn_list')
-            conn_list[:] = [c for c in conn_list
-                            if not ((c['from-asset-id'] == obj_id) or (c['to-asset-id'] == obj_id))]  # xor: filter list in place
+                if isinstance(geometry, esdl.Point):
+                    buildings_to_be_added_list.append(['point', asset.name, asset.id, type(asset).__name__,
+                                                       [shape['coordinates']['lat'], shape['coordinates']['lng']],
+                                                       False, {}, extra_attributes])
+                elif isinstance(geometry, esdl.Polygon):
+                    coords = ESDLGeometry.parse_esdl_subpolygon(asset.geometry.exterior, False)  # [lon, lat]
+                    coords = ESDLGeometry.exchange_coordinates(coords)                           # --> [lat, lon]
+                    boundary = ESDLGeometry.create_boundary_from_geometry(geometry)
+                    buildings_to_be_added_list.append(['polygon', asset.name, asset.id, type(asset).__name__,
+                                                       boundary["coordinates"], False, {}, extra_attributes])
+                emit('add_building_objects', {'es_id': es_edit.id, 'building_list': buildings_to_be_added_list,
+                                              'zoom': False})
+            else:
+                capability_type = ESDLAsset.get_asset_capability_type(asset)
+                state = asset_state_to_ui(asset)
+                if isinstance(geometry, esdl.Point):
+                    tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'marker')
+                    add_spatial_attributes(asset, tooltip_asset_attrs)
+                    asset_to_be_added_list.append(['point', 'asset', asset.name, asset.id, type(asset).__name__,
+                                                   [shape['coordinates']['lat'], shape['coordinates']['lng']],
+                                                   tooltip_asset_attrs, state, port_list, capability_type,
+                                                   extra_attributes])
+                elif isinstance(geometry, esdl.Polygon):
+                    coords = ESDLGeometry.parse_esdl_subpolygon(asset.geometry.exterior, False)  # [lon, lat]
+                    coords = ESDLGeometry.exchange_coordinates(coords)                           # --> [lat, lon]
+                    # logger.debug(coords)
+                    tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'polygon')
+                    add_spatial_attributes(asset, tooltip_asset_attrs)
+                    asset_to_be_added_list.append(
+                        ['polygon', 'asset', asset.name, asset.id, type(asset).__name__, coords,
+                         tooltip_asset_attrs, state, port_list, capability_type, extra_attributes])
+                elif isinstance(geometry, esdl.Line):
+                    coords = []
+                    for point in geometry.point:
+                        coords.append([point.lat, point.lon])
+                    tooltip_asset_attrs = get_tooltip_asset_attrs(asset, 'line')
+                    add_spatial_attributes(asset, tooltip_asset_attrs)
+                    asset_to_be_added_list.append(['line', 'asset', asset.name, asset.id, type(asset).__name__,
+                                                   coords, tooltip_asset_attrs, state, port_list])
+
+                #logger.debug(asset_to_be_added_list)
+                emit('add_esdl_objects', {'es_id': es_edit.id, 'add_to_building': add_to_building,
+                                          'asset_pot_list': asset_to_be_added_list, 'zoom': False})
+
+                asset_list = get_session_for_esid(es_edit.id, 'asset_list')
+                for al_asset in asset_to_be_added_list:
+                    asset_list.append(al_asset)
+                ui_delta_sent(es_edit.id, ASSETS_LAYER, asset_to_be_added_list)
+
+            esh.add_object_to_dict(es_edit.id, asset)
+            if hasattr(asset, 'port'):
+                for added_port in asset.port:
+                    esh.add_object_to_dict(es_edit.id, added_port)
+            set_handler(esh)
+
+
+@command_registry.command('remove_object')
+def cmd_remove_object(message, esh, es_edit, active_es_id, area_bld_list):
+    # removes asset or potential from EnergySystem
+    obj_id = message['id']
+    if obj_id:
+        # asset = ESDLAsset.find_asset(es_edit.instance[0].area, obj_id)
+        # asset can also be any other object in ESDL
+        asset = esh.get_by_id(active_es_id, obj_id)
+        if isinstance(asset, esdl.AbstractBuilding):
+            # Update drop down list with areas and buildings
+            remove_ab_from_area_bld_list(asset.id, area_bld_list)
+            emit('area_bld_list', {'es_id': active_es_id, 'area_bld_list': area_bld_list})
+        if asset:
+            # Try to remove control strategy for EnergyAssets (and not for buildings)
+            if isinstance(asset, esdl.EnergyAsset):
+                remove_control_strategy_for_asset(asset.id)
+        ESDLAsset.remove_object_from_energysystem(es_edit, obj_id)
+        esh.remove_object_from_dict(es_edit.id, asset, True)
+        # remove from asset dict
+        asset_list = get_session_for_esid(active_es_id, 'asset_list')
+        asset_list[:] = [a for a in asset_list if a[3] != obj_id] # filter list in place
+        conn_list = get_session_for_esid(active_es_id, 'conn_list')
+        conn_list[:] = [c for c in conn_list
+                        if not ((c['from-asset-id'] == obj_id) or (c['to-asset-id'] == obj_id))]  # xor: filter list in place
 
 
 
-        else:
-            send_alert('Asset or potential without an id cannot be removed')
+    else:
+        send_alert('Asset or potential without an id cannot be removed')
 
-    if message['cmd'] == 'add_note':
-        id = message['id']
-        location = message['location']
-        author = message['author']
-        note = esdl.Note(id=id, author=author)
 
-        dt = parse_date(message['date'])
-        if dt:
-            note.date = EDate.from_string(str(dt))
-        else:
-            send_alert('Invalid datetime format')
-        point = esdl.Point(lat=location['lat'], lon=location['lng'])
-        note.mapLocation = point
-        esh.add_object_to_dict(es_edit.id, note)
-
-        esi = es_edit.energySystemInformation
-        if not esi:
-            esi = esdl.EnergySystemInformation(id=str(uuid.uuid4()))
-            es_edit.energySystemInformation = esi
-            esh.add_object_to_dict(es_edit.id, esi)
-
-        notes = esi.notes
-        if not notes:
-            notes = esdl.Notes(id=str(uuid.uuid4()))
-            esi.notes = notes
-            esh.add_object_to_dict(es_edit.id, notes)
-
-        notes.note.append(note)
-        esh.add_object_to_dict(es_edit.id, note)
-
-    if message['cmd'] == 'remove_area':
-        area_id = message['id']
-        if area_id:
-            top_area = es_edit.instance[0].area
-            if top_area:
-                if top_area.id == area_id:
-                    send_alert('Can not remove top level area')
-                else:
-                    if not ESDLEnergySystem.remove_area(top_area, area_id):
-                        send_alert('Area could not be removed')
-                    else:
-                        # If the user removes an area with assets and connection, redraw everything
-                        call_process_energy_system.submit(esh, force_update_es_id=es_edit.id, zoom=False)
+@command_registry.command('add_note')
+def cmd_add_note(message, esh, es_edit):
+    id = message['id']
+    location = message['location']
+    author = message['author']
+    note = esdl.Note(id=id, author=author)
 
-    if message['cmd'] == 'get_asset_ports':
-        asset_id = message['id']
-        port_list = []
-        if asset_id:
-            asset = ESDLAsset.find_asset(es_edit.instance[0].area, asset_id)
-            ports = asset.port
-            for p in ports:
-                port_list.append({'id': p.id, 'type': type(p).__name__})
-            emit('portlist', port_list)
-
-    if message['cmd'] == 'connect_ports':
-        port1_id = message['port1id']
-        port2_id = message['port2id']
-
-        # still not optimal, but done to get rid of mapping, optimize later
-        asset_and_coord1 = get_asset_and_coord_from_port_id(esh, active_es_id, port1_id)
-        asset_and_coord2 = get_asset_and_coord_from_port_id(esh, active_es_id, port2_id)
-        asset1 = asset_and_coord1['asset']
-        asset2 = asset_and_coord2['asset']
-        asset1_port_location = asset_and_coord1['coord']
-        asset2_port_location = asset_and_coord2['coord']
-
-        port1 = None
-        port2 = None
-        for p in asset1.port:
-            if p.id == port1_id:
-                port1 = p
-                break
+    dt = parse_date(message['date'])
+    if dt:
+        note.date = EDate.from_string(str(dt))
+    else:
+        send_alert('Invalid datetime format')
+    point = esdl.Point(lat=location['lat'], lon=location['lng'])
+    note.mapLocation = point
+    esh.add_object_to_dict(es_edit.id, note)
+
+    esi = es_edit.energySystemInformation
+    if not esi:
+        esi = esdl.EnergySystemInformation(id=str(uuid.uuid4()))
+        es_edit.energySystemInformation = esi
+        esh.add_object_to_dict(es_edit.id, esi)
 
-        for p in asset2.port:
-            if p.id == port2_id:
-                port2 = p
-                break
+    notes = esi.notes
+    if not notes:
+        notes = esdl.Notes(id=str(uuid.uuid4()))
+        esi.notes = notes
+        esh.add_object_to_dict(es_edit.id, notes)
+
+    notes.note.append(note)
+    esh.add_object_to_dict(es_edit.id, note)
 
-        if port1 and port2:
-            # add type check on ports
-            if type(port1).__name__ == type(port2).__name__:
-                send_alert('Cannot connect ports of the same type. One should be an InPort and one should be an OutPort')
+
+@command_registry.command('remove_area')
+def cmd_remove_area(message, esh, es_edit):
+    area_id = message['id']
+    if area_id:
+        top_area = es_edit.instance[0].area
+        if top_area:
+            if top_area.id == area_id:
+                send_alert('Can not remove top level area')
             else:
-                connect_ports(port1, port2)
+                if not ESDLEnergySystem.remove_area(top_area, area_id):
+                    send_alert('Area could not be removed')
+                else:
+                    # If the user removes an area with assets and connection, redraw everything
+                    call_process_energy_system.submit(esh, force_update_es_id=es_edit.id, zoom=False)
 
-                add_to_building = False
+
+@command_registry.command('get_asset_ports')
+def cmd_get_asset_ports(message, es_edit):
+    asset_id = message['id']
+    port_list = []
+    if asset_id:
+        asset = ESDLAsset.find_asset(es_edit.instance[0].area, asset_id)
+        ports = asset.port
+        for p in ports:
+            port_list.append({'id': p.id, 'type': type(p).__name__})
+        emit('portlist', port_list)
+
+
+@command_registry.command('connect_ports')
+def cmd_connect_ports(message, esh, active_es_id):
+    port1_id = message['port1id']
+    port2_id = message['port2id']
+
+    # still not optimal, but done to get rid of mapping, optimize later
+    asset_and_coord1 = get_asset_and_coord_from_port_id(esh, active_es_id, port1_id)
+    asset_and_coord2 = get_asset_and_coord_from_port_id(esh, active_es_id, port2_id)
+    asset1 = asset_and_coord1['asset']
+    asset2 = asset_and_coord2['asset']
+    asset1_port_location = asset_and_coord1['coord']
+    asset2_port_location = asset_and_coord2['coord']
+
+    port1 = None
+    port2 = None
+    for p in asset1.port:
+        if p.id == port1_id:
+            port1 = p
+            break
+
+    for p in asset2.port:
+        if p.id == port2_id:
+            port2 = p
+            break
+
+    if port1 and port2:
+        # add type check on ports
+        if type(port1).__name__ == type(port2).__name__:
+            send_alert('Cannot connect ports of the same type. One should be an InPort and one should be an OutPort')
+        else:
+            connect_ports(port1, port2)
+
+            add_to_building = False
+            if asset1.containingBuilding:
+                asset1_bld_id = asset1.containingBuilding.id
+            if asset2.containingBuilding:
                 if asset1.containingBuilding:
-                    asset1_bld_id = asset1.containingBuilding.id
-                if asset2.containingBuilding:
-                    if asset1.containingBuilding:
-                        # assets both in buildings
-                        if asset1_bld_id == asset2.containingBuilding.id:
-                            # assets in same building
-                            add_to_building = True
-                        else:
-                            # assets in different buildings
-                            bld_asset1 = asset1.containingBuilding
-                            asset1_port_location = (bld_asset1.geometry.lat, bld_asset1.geometry.lon)
-                            bld_asset2 = asset2.containingBuilding
-                            asset2_port_location = (bld_asset2.geometry.lat, bld_asset2.geometry.lon)
-                            add_to_building = False
+                    # assets both in buildings
+                    if asset1_bld_id == asset2.containingBuilding.id:
+                        # assets in same building
+                        add_to_building = True
                     else:
-                        # asset2 in building and asset1 not in building
+                        # assets in different buildings
+                        bld_asset1 = asset1.containingBuilding
+                        asset1_port_location = (bld_asset1.geometry.lat, bld_asset1.geometry.lon)
                         bld_asset2 = asset2.containingBuilding
                         asset2_port_location = (bld_asset2.geometry.lat, bld_asset2.geometry.lon)
                         add_to_building = False
                 else:
-                    # asset2 not in building
-                    if asset1.containingBuilding:
-                        # asset1 in building and asset2 not in building
-                        bld_asset1 = asset1.containingBuilding
-                        asset1_port_location = (bld_asset1.geometry.lat, bld_asset1.geometry.lon)
-                        add_to_building = False
-                    else:
-                        # both assets not in building
-                        add_to_building = False
+                    # asset2 in building and asset1 not in building
+                    bld_asset2 = asset2.containingBuilding
+                    asset2_port_location = (bld_asset2.geometry.lat, bld_asset2.geometry.lon)
+                    add_to_building = False
+            else:
+                # asset2 not in building
+                if asset1.containingBuilding:
+                    # asset1 in building and asset2 not in building
+                    bld_asset1 = asset1.containingBuilding
+                    asset1_port_location = (bld_asset1.geometry.lat, bld_asset1.geometry.lon)
+                    add_to_building = False
+                else:
+                    # both assets not in building
+                    add_to_building = False
+
+            # emit('add_new_conn', {'es_id': es_edit.id, 'add_to_building': add_to_building,
+            #                       'from-port-id': port1_id, 'to-port-id': port2_id,
+            #                       'new_conn': [[asset1_port_location[0], asset1_port_location[1]],
+            #                                    [asset2_port_location[0], asset2_port_location[1]]]})
+
+            # propagate carrier
+            if not port2.carrier and port1.carrier:
+                if isinstance(port2.energyasset, esdl.Joint):
+                    for p in port2.energyasset.port:    # porpagate carrier in case of a joint
+                        p.carrier = port1.carrier if p.carrier is None else p.carrier
+                else:
+                    port2.carrier = port1.carrier
+            elif port2.carrier and not port1.carrier:
+                if isinstance(port1.energyasset, esdl.Joint):
+                    for p in port1.energyasset.port:    # porpagate carrier in case of a joint
+                        p.carrier = port1.carrier if p.carrier is None else p.carrier
+                else:
+                    port1.carrier = port2.carrier
 
-                # emit('add_new_conn', {'es_id': es_edit.id, 'add_to_building': add_to_building,
-                #                       'from-port-id': port1_id, 'to-port-id': port2_id,
-                #                       'new_conn': [[asset1_port_location[0], asset1_port_location[1]],
-                #                                    [asset2_port_location[0], asset2_port_location[1]]]})
+            p1_carr_id = port1.carrier.id if port1.carrier else None
+            p2_carr_id = port2.carrier.id if port2.carrier else None
 
-                # propagate carrier
-                if not port2.carrier and port1.carrier:
-                    if isinstance(port2.energyasset, esdl.Joint):
-                        for p in port2.energyasset.port:    # porpagate carrier in case of a joint
-                            p.carrier = port1.carrier if p.carrier is None else p.carrier
-                    else:
-                        port2.carrier = port1.carrier
-                elif port2.carrier and not port1.carrier:
-                    if isinstance(port1.energyasset, esdl.Joint):
-                        for p in port1.energyasset.port:    # porpagate carrier in case of a joint
-                            p.carrier = port1.carrier if p.carrier is None else p.carrier
-                    else:
-                        port1.carrier = port2.carrier
-
-                p1_carr_id = port1.carrier.id if port1.carrier else None
-                p2_carr_id = port2.carrier.id if port2.carrier else None
+            conn_list = get_session_for_esid(active_es_id, 'conn_list')
+            conn_message = {'from-port-id': port1_id, 'from-port-carrier': p1_carr_id, 'from-asset-id': asset1.id,
+                              'from-asset-coord': [asset1_port_location[0], asset1_port_location[1]],
+                              'to-port-id': port2_id, 'to-port-carrier': p2_carr_id, 'to-asset-id': asset2.id,
+                              'to-asset-coord': [asset2_port_location[0], asset2_port_location[1]]}
+            conn_list.append(conn_message)
+            emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message], "add_to_building": add_to_building})
+            ui_delta_sent(active_es_id, CONNECTIONS_LAYER, [conn_message])
 
-                conn_list = get_session_for_esid(active_es_id, 'conn_list')
-                conn_message = {'from-port-id': port1_id, 'from-port-carrier': p1_carr_id, 'from-asset-id': asset1.id,
-                                  'from-asset-coord': [asset1_port_location[0], asset1_port_location[1]],
-                                  'to-port-id': port2_id, 'to-port-carrier': p2_carr_id, 'to-asset-id': asset2.id,
-                                  'to-asset-coord': [asset2_port_location[0], asset2_port_location[1]]}
-                conn_list.append(conn_message)
-                emit('add_connections', {"es_id": active_es_id, "conn_list": [conn_message], "add_to_building": add_to_building})
+            # update ports of assets that are connected
 
-                # update ports of assets that are connected
+            port_list = []
+            for p in asset1.port:
+                port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
+                                  'conn_to': [pt.id for pt in p.connectedTo],
+                                  'carrier': p.carrier.id if p.carrier else None})
+            emit('update_asset', {'asset_id': asset1.id, 'ports': port_list})
+            port_list = []
+            for p in asset2.port:
+                port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
+                                  'conn_to': [pt.id for pt in p.connectedTo],
+                                  'carrier': p.carrier.id if p.carrier else None})
+            emit('update_asset', {'asset_id': asset2.id, 'ports': port_list})
 
-                port_list = []
-                for p in asset1.port:
-                    port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
-                                      'conn_to': [pt.id for pt in p.connectedTo],
-                                      'carrier': p.carrier.id if p.carrier else None})
-                emit('update_asset', {'asset_id': asset1.id, 'ports': port_list})
-                port_list = []
-                for p in asset2.port:
-                    port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__,
-                                      'conn_to': [pt.id for pt in p.connectedTo],
-                                      'carrier': p.carrier.id if p.carrier else None})
-                emit('update_asset', {'asset_id': asset2.id, 'ports': port_list})
+    else:
+        send_alert('Serious error connecting ports')
 
-        else:
-            send_alert('Serious error connecting ports')
 
-    if message['cmd'] == 'get_object_info':
-        object_id = message['id']
-        asspot = message['asspot']
-        area = es_edit.instance[0].area
-        connected_to_info = []
-        ctrl_strategy = None
+@command_registry.command('get_object_info')
+def cmd_get_object_info(message, esh, es_edit):
+    object_id = message['id']
+    asspot = message['asspot']
+    connected_to_info = []
+    ctrl_strategy = None
 
-        if asspot == 'asset':
-            # asset = ESDLAsset.find_asset(area, object_id)
-            asset = esh.get_by_id(es_edit.id, object_id)
-            logger.debug('Get info for asset ' + asset.id)
-            attrs_sorted = ESDLEcore.get_asset_attributes(asset, esdl_doc)
-            name = asset.name
-            if isinstance(asset, esdl.EnergyAsset):
-                connected_to_info = get_connected_to_info(asset)
-                if asset.controlStrategy:
-                    ctrl_strategy = asset.controlStrategy.name
-                else:
-                    ctrl_strategy = None
-                asset_class = 'EnergyAsset'
+    if asspot == 'asset':
+        # asset = ESDLAsset.find_asset(area, object_id)
+        asset = esh.get_by_id(es_edit.id, object_id)
+        logger.debug('Get info for asset ' + asset.id)
+        attrs_sorted = ESDLEcore.get_asset_attributes(asset, esdl_doc)
+        name = asset.name
+        if isinstance(asset, esdl.EnergyAsset):
+            connected_to_info = get_connected_to_info(asset)
+            if asset.controlStrategy:
+                ctrl_strategy = asset.controlStrategy.name
             else:
-                asset_class = 'AbstractBuilding'
-            asset_doc = asset.__doc__
+                ctrl_strategy = None
+            asset_class = 'EnergyAsset'
         else:
-            pot = esh.get_by_id(es_edit.id, object_id)
-            logger.debug('Get info for potential ' + pot.id)
-            attrs_sorted = ESDLEcore.get_asset_attributes(pot, esdl_doc)
-            name = pot.name
-            connected_to_info = []
-            ctrl_strategy = None
-            asset_doc = pot.__doc__
-
-        if name is None: name = ''
-        emit('asset_info', {'id': object_id, 'name': name, 'class': asset_class, 'attrs': attrs_sorted, 'connected_to_info': connected_to_info, 'ctrl_strategy': ctrl_strategy, 'asset_doc': asset_doc})
-
-    if message['cmd'] == 'get_conductor_info':
-        asset_id = message['id']
-        latlng = message['latlng']
-        area = es_edit.instance[0].area
-        asset = ESDLAsset.find_asset(area, asset_id)
-        connected_to_info = get_connected_to_info(asset)
-        logger.debug('Get info for conductor ' + asset.id)
+            asset_class = 'AbstractBuilding'
+        asset_doc = asset.__doc__
+    else:
+        pot = esh.get_by_id(es_edit.id, object_id)
+        logger.debug('Get info for potential ' + pot.id)
+        attrs_sorted = ESDLEcore.get_asset_attributes(pot, esdl_doc)
+        name = pot.name
+        connected_to_info = []
+        ctrl_strategy = None
+        asset_doc = pot.__doc__
+
+    if name is None: name = ''
+    emit('asset_info', {'id': object_id, 'name': name, 'class': asset_class, 'attrs': attrs_sorted, 'connected_to_info': connected_to_info, 'ctrl_strategy': ctrl_strategy, 'asset_doc': asset_doc})
+
+
+@command_registry.command('get_conductor_info')
+def cmd_get_conductor_info(message, es_edit):
+    asset_id = message['id']
+    latlng = message['latlng']
+    area = es_edit.instance[0].area
+    asset = ESDLAsset.find_asset(area, asset_id)
+    connected_to_info = get_connected_to_info(asset)
+    logger.debug('Get info for conductor ' + asset.id)
+    attrs_sorted = ESDLEcore.get_asset_attributes(asset, esdl_doc)
+    name = asset.name
+    if name is None: name = ''
+    asset_doc = asset.__doc__
+    emit('asset_info', {'id': asset_id, 'name': name, 'class': 'EnergyAsset', 'latlng': latlng, 'attrs': attrs_sorted, 'connected_to_info': connected_to_info, 'asset_doc': asset_doc})
+
+
+@command_registry.command('get_table_editor_info')
+def cmd_get_table_editor_info(message, esh, active_es_id):
+    producer_info_list = []
+    consumer_info_list = []
+    transport_info_list = []
+    storage_info_list = []
+    conversion_info_list = []
+
+    energy_assets = esh.get_all_instances_of_type(esdl.EnergyAsset, active_es_id)
+
+    for asset in energy_assets:
         attrs_sorted = ESDLEcore.get_asset_attributes(asset, esdl_doc)
+        connected_to_info = get_connected_to_info(asset)
+        strategy_info = get_control_strategy_info(asset)
+        profile_info = get_port_profile_info(asset)
+        mc_info = None
+        ci = asset.costInformation
+        if ci:
+            mc = ci.marginalCosts
+            if mc:
+                mc_info = mc.value
         name = asset.name
         if name is None: name = ''
         asset_doc = asset.__doc__
-        emit('asset_info', {'id': asset_id, 'name': name, 'class': 'EnergyAsset', 'latlng': latlng, 'attrs': attrs_sorted, 'connected_to_info': connected_to_info, 'asset_doc': asset_doc})
-
-    if message['cmd'] == 'get_table_editor_info':
-        producer_info_list = []
-        consumer_info_list = []
-        transport_info_list = []
-        storage_info_list = []
-        conversion_info_list = []
-
-        energy_assets = esh.get_all_instances_of_type(esdl.EnergyAsset, active_es_id)
+        asset_type = type(asset).__name__
+        asset_info = {
+            'id': asset.id,
+            'name': name,
+            'type': asset_type,
+            'attrs': attrs_sorted,
+            'connected_to_info': connected_to_info,
+            'control_strategy': strategy_info,
+            'marginal_costs': mc_info,
+            'profile_info': profile_info,
+            'asset_doc': asset_doc
+        }
+        if isinstance(asset, esdl.Producer):
+            producer_info_list.append(asset_info)
+        if isinstance(asset, esdl.Consumer):
+            consumer_info_list.append(asset_info)
+        if isinstance(asset, esdl.Transport):
+            transport_info_list.append(asset_info)
+        if isinstance(asset, esdl.Storage):
+            storage_info_list.append(asset_info)
+        if isinstance(asset, esdl.Conversion):
+            if not strategy_info:
+                logger.debug("================== NO CONTROL STRATEGY ===================")
+            conversion_info_list.append(asset_info)
+
+    # Sort arrays on asset_type
+    # attrs_sorted = sorted(attributes, key=lambda a: a['name'])
+    producer_info_list = sorted(producer_info_list, key=lambda a: (a['type'], a['name']))
+    consumer_info_list = sorted(consumer_info_list, key=lambda a: (a['type'], a['name']))
+    transport_info_list = sorted(transport_info_list, key=lambda a: (a['type'], a['name']))
+    storage_info_list = sorted(storage_info_list, key=lambda a: (a['type'], a['name']))
+    conversion_info_list = sorted(conversion_info_list, key=lambda a: (a['type'], a['name']))
+
+    emit('table_editor', {
+        'producer': producer_info_list,
+        'consumer': consumer_info_list,
+        'transport': transport_info_list,
+        'storage': storage_info_list,
+        'conversion': conversion_info_list
+    })
+
+
+@command_registry.command('set_asset_param')
+def cmd_set_asset_param(message, esh, active_es_id):
+    if 'id' not in message or message['id'] is None:
+        fragment = message['fragment']
+        asset_id = None
+    else:
+        fragment = None
+        asset_id = message['id']
+    param_name = message['param_name']
+    param_value = message['param_value']
 
-        for asset in energy_assets:
-            attrs_sorted = ESDLEcore.get_asset_attributes(asset, esdl_doc)
-            connected_to_info = get_connected_to_info(asset)
-            strategy_info = get_control_strategy_info(asset)
-            profile_info = get_port_profile_info(asset)
-            mc_info = None
-            ci = asset.costInformation
-            if ci:
-                mc = ci.marginalCosts
-                if mc:
-                    mc_info = mc.value
-            name = asset.name
-            if name is None: name = ''
-            asset_doc = asset.__doc__
-            asset_type = type(asset).__name__
-            asset_info = {
-                'id': asset.id,
-                'name': name,
-                'type': asset_type,
-                'attrs': attrs_sorted,
-                'connected_to_info': connected_to_info,
-                'control_strategy': strategy_info,
-                'marginal_costs': mc_info,
-                'profile_info': profile_info,
-                'asset_doc': asset_doc
-            }
-            if isinstance(asset, esdl.Producer):
-                producer_info_list.append(asset_info)
-            if isinstance(asset, esdl.Consumer):
-                consumer_info_list.append(asset_info)
-            if isinstance(asset, esdl.Transport):
-                transport_info_list.append(asset_info)
-            if isinstance(asset, esdl.Storage):
-                storage_info_list.append(asset_info)
-            if isinstance(asset, esdl.Conversion):
-                if not strategy_info:
-                    logger.debug("================== NO CONTROL STRATEGY ===================")
-                conversion_info_list.append(asset_info)
-
-        # Sort arrays on asset_type
-        # attrs_sorted = sorted(attributes, key=lambda a: a['name'])
-        producer_info_list = sorted(producer_info_list, key=lambda a: (a['type'], a['name']))
-        consumer_info_list = sorted(consumer_info_list, key=lambda a: (a['type'], a['name']))
-        transport_info_list = sorted(transport_info_list, key=lambda a: (a['type'], a['name']))
-        storage_info_list = sorted(storage_info_list, key=lambda a: (a['type'], a['name']))
-        conversion_info_list = sorted(conversion_info_list, key=lambda a: (a['type'], a['name']))
-
-        emit('table_editor', {
-            'producer': producer_info_list,
-            'consumer': consumer_info_list,
-            'transport': transport_info_list,
-            'storage': storage_info_list,
-            'conversion': conversion_info_list
-        })
-
-    if message['cmd'] == 'set_asset_param':
-        if 'id' not in message or message['id'] is None:
-            fragment = message['fragment']
-            asset_id = None
-        else:
-            fragment = None
-            asset_id = message['id']
-        param_name = message['param_name']
-        param_value = message['param_value']
-
-        if asset_id is None:
-            resource = esh.get_resource(active_es_id)
-            assets = [resource.resolve(fragment)]
+    if asset_id is None:
+        resource = esh.get_resource(active_es_id)
+        assets = [resource.resolve(fragment)]
+    else:
+        if isinstance(asset_id, list):
+            assets = []
+            for ass_id in asset_id:
+                assets.append(esh.get_by_id(active_es_id, ass_id))
         else:
-            if isinstance(asset_id, list):
-                assets = []
-                for ass_id in asset_id:
-                    assets.append(esh.get_by_id(active_es_id, ass_id))
-            else:
-                assets = [esh.get_by_id(active_es_id, asset_id)]
+            assets = [esh.get_by_id(active_es_id, asset_id)]
 
-        for asset in assets:
-            logger.debug('Set param '+ param_name + ' for class ' + asset.eClass.name + ' to value '+ str(param_value))
+    for asset in assets:
+        logger.debug('Set param '+ param_name + ' for class ' + asset.eClass.name + ' to value '+ str(param_value))
 
-            try:
-                attribute = asset.eClass.findEStructuralFeature(param_name)
-                if attribute is not None:
-                    if attribute.many:
-                        #length = len(param_value)
-                        eCollection = asset.eGet(param_name)
-                        eCollection.clear()  # TODO no support for multi-select of enums
-                        print('after clear', eCollection)
-                        if not isinstance(param_value, list):
-                            param_value = [param_value]
-                        for item in param_value:
-                            parsed_value = attribute.eType.from_string(item)
-                            eCollection.append(parsed_value)
+        try:
+            attribute = asset.eClass.findEStructuralFeature(param_name)
+            if attribute is not None:
+                if attribute.many:
+                    #length = len(param_value)
+                    eCollection = asset.eGet(param_name)
+                    eCollection.clear()  # TODO no support for multi-select of enums
+                    print('after clear', eCollection)
+                    if not isinstance(param_value, list):
+                        param_value = [param_value]
+                    for item in param_value:
+                        parsed_value = attribute.eType.from_string(item)
+                        eCollection.append(parsed_value)
+                else:
+                    if param_value == "" or param_value is None:
+                        parsed_value = attribute.eType.default_value
                     else:
-                        if param_value == "" or param_value is None:
-                            parsed_value = attribute.eType.default_value
-                        else:
-                            parsed_value = attribute.eType.from_string(param_value)
-                        if attribute.name == 'id':
-                            esh.remove_object_from_dict(active_es_id, asset)
-                            asset.eSet(param_name, parsed_value)
-                            esh.add_object_to_dict(active_es_id, asset)
-                        else:
-                            asset.eSet(param_name, parsed_value)
+                        parsed_value = attribute.eType.from_string(param_value)
+                    if attribute.name == 'id':
+                        esh.remove_object_from_dict(active_es_id, asset)
+                        asset.eSet(param_name, parsed_value)
+                        esh.add_object_to_dict(active_es_id, asset)
+                    else:
+                        asset.eSet(param_name, parsed_value)
 
-                else:
-                    send_alert('Error setting attribute {} of {} to {}, unknown attribute'.format(param_name, asset.name, param_value))
-            except Exception as e:
-                logger.error('Error setting attribute {} of {} to {}, caused by {}'.format(param_name, asset.name, param_value, str(e)))
-                send_alert('Error setting attribute {} of {} to {}, caused by {}'.format(param_name, asset.name, param_value, str(e)))
-                traceback.print_exc()
-
-        # update gui, only if necessary for EnergyAssets, and Ports
-        # and EnergySystem ans
-        # update_gui = False
-        # update_asset = asset
-        # if isinstance(asset, esdl.EnergySystem):
-        #     #emit()
-        #     # todo find out how to update energy system name and update Area name in dropdown
-        #     pass
-        # elif isinstance(asset, esdl.EnergyAsset):
-        #     if param_name == esdl.EnergyAsset.name.name:
-        #         update_gui = True
-        #     if param_name == esdl.EnergyAsset.state.name:
-        #         update_gui = True
-        # elif isinstance(asset, esdl.Port):
-        #     update_gui = True
-        #     update_asset = asset.energyasset
-        #
-        # if update_gui:
-        #     emit('delete_esdl_object', {'asset_id': update_asset.id})
-        #     asset_ui, conn_list = energy_asset_to_ui(esh, active_es_id, update_asset)
-        #     emit("add_esdl_objects",
-        #          {
-        #             "es_id": active_es_id,
-        #             "asset_pot_list": [asset_ui],
-        #             "zoom": False,
-        #          })
-        #     emit("add_connections",{"es_id": active_es_id, "conn_list": conn_list})
-
-    if message['cmd'] == 'set_area_bld_polygon':
-        area_bld_id = message['area_bld_id']
-        polygon_data = message['polygon']
+            else:
+                send_alert('Error setting attribute {} of {} to {}, unknown attribute'.format(param_name, asset.name, param_value))
+        except Exception as e:
+            logger.error('Error setting attribute {} of {} to {}, caused by {}'.format(param_name, asset.name, param_value, str(e)))
+            send_alert('Error setting attribute {} of {} to {}, caused by {}'.format(param_name, asset.name, param_value, str(e)))
+            traceback.print_exc()
+
+    # update gui, only if necessary for EnergyAssets, and Ports
+    # and EnergySystem ans
+    # update_gui = False
+    # update_asset = asset
+    # if isinstance(asset, esdl.EnergySystem):
+    #     #emit()
+    #     # todo find out how to update energy system name and update Area name in dropdown
+    #     pass
+    # elif isinstance(asset, esdl.EnergyAsset):
+    #     if param_name == esdl.EnergyAsset.name.name:
+    #         update_gui = True
+    #     if param_name == esdl.EnergyAsset.state.name:
+    #         update_gui = True
+    # elif isinstance(asset, esdl.Port):
+    #     update_gui = True
+    #     update_asset = asset.energyasset
+    #
+    # if update_gui:
+    #     emit('delete_esdl_object', {'asset_id': update_asset.id})
+    #     asset_ui, conn_list = energy_asset_to_ui(esh, active_es_id, update_asset)
+    #     emit("add_esdl_objects",
+    #          {
+    #             "es_id": active_es_id,
+    #             "asset_pot_list": [asset_ui],
+    #             "zoom": False,
+    #          })
+    #     emit("add_connections",{"es_id": active_es_id, "conn_list": conn_list})
+
+
+@command_registry.command('set_area_bld_polygon')
+def cmd_set_area_bld_polygon(message, es_edit):
+    area_bld_id = message['area_bld_id']
+    polygon_data = message['polygon']
+
+    polygon = esdl.Polygon()
+    exterior = esdl.SubPolygon()
+    polygon.exterior = exterior
 
-        polygon = esdl.Polygon()
-        exterior = esdl.SubPolygon()
-        polygon.exterior = exterior
-
-        i = 0
-        prev_lat = 0
-        prev_lng = 0
-        while i < len(polygon_data[0]):
-            coord = polygon_data[0][i]
-
-            if i == 0:
-                first = (coord['lat'], coord['lng'])
-            if i == len(polygon_data) - 1:
-                last = (coord['lat'], coord['lng'])
-
-            # Don't understand why, but sometimes coordinates come in twice
-            if prev_lat != coord['lat'] or prev_lng != coord['lng']:
-                point = esdl.Point(lat=coord['lat'], lon=coord['lng'])
-                exterior.point.append(point)
-                prev_lat = coord['lat']
-                prev_lng = coord['lng']
-            i += 1
-
-        area = es_edit.instance[0].area
-        area_selected = ESDLEnergySystem.find_area(area, area_bld_id)
-        if area_selected:
-            area_selected.geometry = polygon
+    i = 0
+    prev_lat = 0
+    prev_lng = 0
+    while i < len(polygon_data[0]):
+        coord = polygon_data[0][i]
+
+        if i == 0:
+            first = (coord['lat'], coord['lng'])
+        if i == len(polygon_data) - 1:
+            last = (coord['lat'], coord['lng'])
+
+        # Don't understand why, but sometimes coordinates come in twice
+        if prev_lat != coord['lat'] or prev_lng != coord['lng']:
+            point = esdl.Point(lat=coord['lat'], lon=coord['lng'])
+            exterior.point.append(point)
+            prev_lat = coord['lat']
+            prev_lng = coord['lng']
+        i += 1
+
+    area = es_edit.instance[0].area
+    area_selected = ESDLEnergySystem.find_area(area, area_bld_id)
+    if area_selected:
+        area_selected.geometry = polygon
+    else:
+        bld_selected = ESDLAsset.find_asset(area, area_bld_id)
+        if bld_selected:
+            bld_selected.geometry = polygon
         else:
-            bld_selected = ESDLAsset.find_asset(area, area_bld_id)
-            if bld_selected:
-                bld_selected.geometry = polygon
-            else:
-                send_alert('SERIOUS ERROR: set_area_bld_polygon - connot find area or building')
+            send_alert('SERIOUS ERROR: set_area_bld_polygon - connot find area or building')
 
-    if message['cmd'] == 'split_conductor':
-        cond_id = message['id']
-        mode = message['mode']      # connect, add_joint, no_connect
-        location_to_split = message['location']
 
-        area = es_edit.instance[0].area
-        conductor, container = ESDLAsset.find_asset_and_container(area, cond_id)
+@command_registry.command('split_conductor')
+def cmd_split_conductor(message, es_edit):
+    cond_id = message['id']
+    mode = message['mode']      # connect, add_joint, no_connect
+    location_to_split = message['location']
 
-        split_conductor(conductor, location_to_split, mode, container)
+    area = es_edit.instance[0].area
+    conductor, container = ESDLAsset.find_asset_and_container(area, cond_id)
 
-    if message['cmd'] == 'get_port_profile_info':
-        port_id = message['port_id']
+    split_conductor(conductor, location_to_split, mode, container)
 
-        asset = get_asset_from_port_id(esh, active_es_id, port_id)
-        if asset:
-            ports = asset.port
-            for p in ports:
-                if p.id == port_id:
-                    profile = p.profile
-                    if profile:
-                        profile_info_list = generate_profile_info(profile)
-                        emit('port_profile_info', {'port_id': port_id, 'profile_info': profile_info_list})
-                    else:
-                        emit('port_profile_info', {'port_id': port_id, 'profile_info': []})
 
-    if message['cmd'] == 'add_profile_to_port':
-        port_id = message['port_id']
-        profile_class = message['profile_class']
-        quap_type = message["qaup_type"]
-
-        if profile_class == 'SingleValue':
-            value = message['value']
-            esdl_profile = esdl.SingleValue()
-            esdl_profile.value = str2float(value)
-        elif profile_class == 'DateTimeProfile':
-            esdl_profile = esdl.DateTimeProfile()
-            # TODO: Determine how to deal with DateTimeProfiles in the UI
-        else:
-            # Assume all other options are InfluxDBProfiles
-            multiplier = message['multiplier']
-
-            profiles = Profiles.get_instance().get_profiles()['profiles']
-            for pkey in profiles:
-                p = profiles[pkey]
-
-                if p['profile_uiname'] == profile_class:
-                    esdl_profile = esdl.InfluxDBProfile()
-                    esdl_profile.multiplier = str2float(multiplier)
-
-                    esdl_profile.measurement = p['measurement']
-                    esdl_profile.field = p['field']
-                    if 'host' in p and p['host']:
-                        esdl_profile.host = p['host']
-                        if 'port' in p and p['port']:
-                           esdl_profile.port = int(p['port'])
-                    else:
-                        esdl_profile.host = settings.profile_database_config['protocol'] + "://" + \
-                            settings.profile_database_config['host']
-                        esdl_profile.port = int(settings.profile_database_config['port'])
+@command_registry.command('get_port_profile_info')
+def cmd_get_port_profile_info(message, esh, active_es_id):
+    port_id = message['port_id']
 
-                    esdl_profile.database = p['database']
-                    esdl_profile.filters = settings.profile_database_config['filters']
+    asset = get_asset_from_port_id(esh, active_es_id, port_id)
+    if asset:
+        ports = asset.port
+        for p in ports:
+            if p.id == port_id:
+                profile = p.profile
+                if profile:
+                    profile_info_list = generate_profile_info(profile)
+                    emit('port_profile_info', {'port_id': port_id, 'profile_info': profile_info_list})
+                else:
+                    emit('port_profile_info', {'port_id': port_id, 'profile_info': []})
 
-                    if 'start_datetime' in p:
-                        dt = parse_date(p['start_datetime'])
-                        if dt:
-                            esdl_profile.startDate = EDate.from_string(str(dt))
-                        else:
-                            send_alert('Invalid datetime format')
-                    if 'end_datetime' in p:
-                        dt = parse_date(p['end_datetime'])
-                        if dt:
-                            esdl_profile.endDate = EDate.from_string(str(dt))
-                        else:
-                            send_alert('Invalid datetime format')
-
-        if quap_type == 'predefined_qau':
-            # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
-            #    profile_class: profile_class, quap_type: qaup_type, predefined_qau: predefined_qau});
-            predefined_qau = message["predefined_qau"]
-            for pqau in esdl_config.esdl_config['predefined_quantity_and_units']:
-                if pqau['id'] == predefined_qau:
-                    try:
-                        # check if predefined qau is already present in the ESDL
-                        qau = esh.get_by_id(active_es_id, predefined_qau)
-                    except KeyError:
-                        qau = ESDLQuantityAndUnits.build_qau_from_dict(pqau)
-                        esi_qau = ESDLQuantityAndUnits.get_or_create_esi_qau(esh, active_es_id)
-                        esi_qau.quantityAndUnit.append(qau)
-                        esh.add_object_to_dict(active_es_id, qau)
-                        #qau.id = str(uuid.uuid4()) # generate new id for predifined qua otherwise double ids appear
-                    break
-            # make a reference instead of a direct link
-            qau_ref = esdl.QuantityAndUnitReference(reference=qau)
-            esdl_profile.profileQuantityAndUnit = qau_ref
-        elif quap_type == 'custom_qau':
-            # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
-            #    profile_class: profile_class, quap_type: qaup_type, custom_qau: custom_qau});
-            custom_qau = message["custom_qau"]
-            qau = ESDLQuantityAndUnits.build_qau_from_dict(custom_qau)
-            esdl_profile.profileQuantityAndUnit = qau
-        elif quap_type == 'profiletype':
-            # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
-            #    profile_class: profile_class, quap_type: qaup_type, profile_type: profile_type});
-            profile_type = message['profile_type']
-            esdl_profile.profileType = esdl.ProfileTypeEnum.from_string(profile_type)
-
-        esdl_profile.id = str(uuid.uuid4())
-        esh.add_object_to_dict(es_edit.id, esdl_profile)
-
-        asset = get_asset_from_port_id(esh, active_es_id, port_id)
-        if asset:
-            ports = asset.port
-            for p in ports:
-                if p.id == port_id:
-                    # p.profile = esdl_profile
-                    ESDLAsset.add_profile_to_port(p, esdl_profile)
 
-    if message['cmd'] == 'remove_profile_from_port':
-        port_id = message['port_id']
-        profile_id = message['profile_id']
+@command_registry.command('add_profile_to_port')
+def cmd_add_profile_to_port(message, esh, es_edit, active_es_id):
+    port_id = message['port_id']
+    profile_class = message['profile_class']
+    quap_type = message["qaup_type"]
 
-        asset = get_asset_from_port_id(esh, active_es_id, port_id)
-        if asset:
-            ports = asset.port
-            for p in ports:
-                if p.id == port_id:
-                    # p.profile = esdl_profile
-                    ESDLAsset.remove_profile_from_port(p, profile_id)
-
-    if message['cmd'] == 'add_port' or message['cmd'] == 'add_port_with_id':
-        # merge add_port and add_port_with_id. Why on earth were there two messages for the same thing!
-        # frontend should be adapted to only send one of these: todo
-        # ptype and direction do the same thing!
-        asset_id = message['asset_id']
-        pname = message['pname']
-        pid = str(uuid.uuid4())
-        if 'pid' in message:
-            pid = message['pid']
-        if 'ptype' in message:
-            ptype = message['ptype']
-        if 'direction' in message:
-            direction = message['direction']
-            ptype = 'InPort' if direction == 'in' else 'OutPort'
-
-        asset = esh.get_by_id(es_edit.id, asset_id)
-        if ptype == 'InPort':
-            port = esdl.InPort(id=pid, name=pname)
-        else:
-            port = esdl.OutPort(id=pid, name=pname)
-
-        geom = asset.geometry
-        if len(asset.port) >= 6:
-            send_alert('ERROR: MapEditor cannot visualize assets with more than 6 ports.')
-        if isinstance(geom, esdl.Line) and len(asset.port) >= 2:
-            send_alert('ERROR: Line geometries cannot have more than two ports.')
-        elif isinstance(geom, esdl.Line) and len(asset.port) == 1 and asset.port[0].eClass.name == ptype:
-            send_alert('ERROR: Line cannot have ports of the same type.')
-        else:
-            if isinstance(geom, esdl.Line) and isinstance(port, esdl.InPort):
-                asset.port.insert(0, port)  # insert InPort always at beginning as this is the convention
-            else:
-                asset.port.append(port)
-            esh.add_object_to_dict(active_es_id, port)
-            port_list = []
-            for p in asset.port:
-                port_list.append(
-                    {'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': [p.id for p in p.connectedTo]})
-            emit('update_asset', {'asset_id': asset.id, 'ports': port_list})
-
-    if message['cmd'] == 'remove_port':
-        pid = message['port_id']
-        asset = get_asset_from_port_id(esh, active_es_id, pid)
+    if profile_class == 'SingleValue':
+        value = message['value']
+        esdl_profile = esdl.SingleValue()
+        esdl_profile.value = str2float(value)
+    elif profile_class == 'DateTimeProfile':
+        esdl_profile = esdl.DateTimeProfile()
+        # TODO: Determine how to deal with DateTimeProfiles in the UI
+    else:
+        # Assume all other options are InfluxDBProfiles
+        multiplier = message['multiplier']
+
+        profiles = Profiles.get_instance().get_profiles()['profiles']
+        for pkey in profiles:
+            p = profiles[pkey]
+
+            if p['profile_uiname'] == profile_class:
+                esdl_profile = esdl.InfluxDBProfile()
+                esdl_profile.multiplier = str2float(multiplier)
+
+                esdl_profile.measurement = p['measurement']
+                esdl_profile.field = p['field']
+                if 'host' in p and p['host']:
+                    esdl_profile.host = p['host']
+                    if 'port' in p and p['port']:
+                       esdl_profile.port = int(p['port'])
+                else:
+                    esdl_profile.host = settings.profile_database_config['protocol'] + "://" + \
+                        settings.profile_database_config['host']
+                    esdl_profile.port = int(settings.profile_database_config['port'])
+
+                esdl_profile.database = p['database']
+                esdl_profile.filters = settings.profile_database_config['filters']
+
+                if 'start_datetime' in p:
+                    dt = parse_date(p['start_datetime'])
+                    if dt:
+                        esdl_profile.startDate = EDate.from_string(str(dt))
+                    else:
+                        send_alert('Invalid datetime format')
+                if 'end_datetime' in p:
+                    dt = parse_date(p['end_datetime'])
+                    if dt:
+                        esdl_profile.endDate = EDate.from_string(str(dt))
+                    else:
+                        send_alert('Invalid datetime format')
+
+    if quap_type == 'predefined_qau':
+        # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
+        #    profile_class: profile_class, quap_type: qaup_type, predefined_qau: predefined_qau});
+        predefined_qau = message["predefined_qau"]
+        for pqau in esdl_config.esdl_config['predefined_quantity_and_units']:
+            if pqau['id'] == predefined_qau:
+                try:
+                    # check if predefined qau is already present in the ESDL
+                    qau = esh.get_by_id(active_es_id, predefined_qau)
+                except KeyError:
+                    qau = ESDLQuantityAndUnits.build_qau_from_dict(pqau)
+                    esi_qau = ESDLQuantityAndUnits.get_or_create_esi_qau(esh, active_es_id)
+                    esi_qau.quantityAndUnit.append(qau)
+                    esh.add_object_to_dict(active_es_id, qau)
+                    #qau.id = str(uuid.uuid4()) # generate new id for predifined qua otherwise double ids appear
+                break
+        # make a reference instead of a direct link
+        qau_ref = esdl.QuantityAndUnitReference(reference=qau)
+        esdl_profile.profileQuantityAndUnit = qau_ref
+    elif quap_type == 'custom_qau':
+        # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
+        #    profile_class: profile_class, quap_type: qaup_type, custom_qau: custom_qau});
+        custom_qau = message["custom_qau"]
+        qau = ESDLQuantityAndUnits.build_qau_from_dict(custom_qau)
+        esdl_profile.profileQuantityAndUnit = qau
+    elif quap_type == 'profiletype':
+        # socket.emit('command', {cmd: 'add_profile_to_port', port_id: port_id, value: profile_mult_value,
+        #    profile_class: profile_class, quap_type: qaup_type, profile_type: profile_type});
+        profile_type = message['profile_type']
+        esdl_profile.profileType = esdl.ProfileTypeEnum.from_string(profile_type)
+
+    esdl_profile.id = str(uuid.uuid4())
+    esh.add_object_to_dict(es_edit.id, esdl_profile)
+
+    asset = get_asset_from_port_id(esh, active_es_id, port_id)
+    if asset:
         ports = asset.port
+        for p in ports:
+            if p.id == port_id:
+                # p.profile = esdl_profile
+                ESDLAsset.add_profile_to_port(p, esdl_profile)
 
+
+@command_registry.command('remove_profile_from_port')
+def cmd_remove_profile_from_port(message, esh, active_es_id):
+    port_id = message['port_id']
+    profile_id = message['profile_id']
+
+    asset = get_asset_from_port_id(esh, active_es_id, port_id)
+    if asset:
+        ports = asset.port
+        for p in ports:
+            if p.id == port_id:
+                # p.profile = esdl_profile
+                ESDLAsset.remove_profile_from_port(p, profile_id)
+
+
+@command_registry.command('add_port', 'add_port_with_id')
+def cmd_add_port(message, esh, es_edit, active_es_id):
+    # merge add_port and add_port_with_id. Why on earth were there two messages for the same thing!
+    # frontend should be adapted to only send one of these: todo
+    # ptype and direction do the same thing!
+    asset_id = message['asset_id']
+    pname = message['pname']
+    pid = str(uuid.uuid4())
+    if 'pid' in message:
+        pid = message['pid']
+    if 'ptype' in message:
+        ptype = message['ptype']
+    if 'direction' in message:
+        direction = message['direction']
+        ptype = 'InPort' if direction == 'in' else 'OutPort'
+
+    asset = esh.get_by_id(es_edit.id, asset_id)
+    if ptype == 'InPort':
+        port = esdl.InPort(id=pid, name=pname)
+    else:
+        port = esdl.OutPort(id=pid, name=pname)
+
+    geom = asset.geometry
+    if len(asset.port) >= 6:
+        send_alert('ERROR: MapEditor cannot visualize assets with more than 6 ports.')
+    if isinstance(geom, esdl.Line) and len(asset.port) >= 2:
+        send_alert('ERROR: Line geometries cannot have more than two ports.')
+    elif isinstance(geom, esdl.Line) and len(asset.port) == 1 and asset.port[0].eClass.name == ptype:
+        send_alert('ERROR: Line cannot have ports of the same type.')
+    else:
+        if isinstance(geom, esdl.Line) and isinstance(port, esdl.InPort):
+            asset.port.insert(0, port)  # insert InPort always at beginning as this is the convention
+        else:
+            asset.port.append(port)
+        esh.add_object_to_dict(active_es_id, port)
         port_list = []
-        for p in set(ports):
-            if p.id == pid:
-                esh.remove_object_from_dict(active_es_id, p, recursive=True)
-                ports.remove(p) # remove from list
-                p.delete()  # delete from esdl (e.g. if other ports refer to this port, they will be updated)
-                            # question is why is this necessary in pyecore and isn't this done automatically
-                            # as p is not contained anymore and you get dangling references.
-            else:
-                carrier_id = p.carrier.id if p.carrier else None
-                port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': [pt.id for pt in p.connectedTo], 'carrier': carrier_id})
+        for p in asset.port:
+            port_list.append(
+                {'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': [p.id for p in p.connectedTo]})
         emit('update_asset', {'asset_id': asset.id, 'ports': port_list})
 
-    if message['cmd'] == 'remove_connection_portids': # user clicked remove connection by right-clicking on connection
-        building_id = message['building_id'] if 'building_id' in message else None
-        from_port_id = message['from_port_id']
-        from_port: esdl.Port = esh.get_by_id(es_edit.id, from_port_id)
-        to_port_id = message['to_port_id']
-        to_port: esdl.Port = esh.get_by_id(es_edit.id, to_port_id)
-        from_port.connectedTo.remove(to_port)
-
-        from_asset_id = from_port.eContainer().id
-        to_asset_id = to_port.eContainer().id
-
-        # refresh connections in gui
-        #active_es_id = get_session('active_es_id')
-        conn_list = get_session_for_esid(es_edit.id, 'conn_list')
-        new_list = []
-        #print(conn_list)
-        for conn in conn_list:
-            if (conn['from-port-id'] != from_port_id or conn['from-asset-id'] != from_asset_id or
-                    conn['to-port-id'] != to_port_id or conn['to-asset-id'] != to_asset_id) and \
-                    (conn['from-port-id'] != to_port_id or conn['from-asset-id'] != to_asset_id or
-                    conn['to-port-id'] != from_port_id or conn['to-asset-id'] != from_asset_id):
-                # Remove both directions from -> to and to -> from as we don't know how they are stored in the list
-                # does not matter, as a connection is unique
-                new_list.append(conn)  # add connections that we are not interested in
-            else:
-                print(' - removed {}'.format(conn))
-        set_session_for_esid(es_edit.id, 'conn_list', new_list)  # set new connection list
-        if building_id:
-            # building editor is open, so only update building connections.
-            building = esh.get_by_id(es_edit.id, building_id)
-            bld_info = get_building_information(building)
-            bld_conn_list = bld_info["conn_list"]
-            emit('clear_connections', {'id': building_id})   # clear current active layer connections
-            emit('add_connections', {'es_id': es_edit.id, 'conn_list': bld_conn_list, 'add_to_building': True})
-        if from_port.energyasset.containingBuilding is None or to_port.energyasset.containingBuilding is None:
-            # only clear main map connections if not both assets are in a building
-            emit('clear_connections', {'id': active_es_id})   # clear current active layer connections
-            emit('add_connections', {'es_id': active_es_id, 'conn_list': new_list})
-
-    if message['cmd'] == 'remove_connection':
-        # socket.emit('command', {cmd: 'remove_connection', from_asset_id: from_asset_id, from_port_id: from_port_id,
-        #                         to_asset_id: to_asset_id, to_port_id: to_port_id, 'building_id': building_id});
-        from_asset_id = message['from_asset_id']
-        from_port_id = message['from_port_id']
-        from_port = esh.get_by_id(es_edit.id, from_port_id)
-        to_asset_id = message['to_asset_id']
-        to_port_id = message['to_port_id']
-        building_id = message['building_id'] if 'building_id' in message else None
-        to_port = esh.get_by_id(es_edit.id, to_port_id)
-        from_port.connectedTo.remove(to_port)
-
-        # refresh connections in gui
-        #active_es_id = get_session('active_es_id')
-        conn_list = get_session_for_esid(es_edit.id, 'conn_list')
-        new_list = []
-        for conn in conn_list:
-            if (conn['from-port-id'] != from_port_id or conn['from-asset-id'] != from_asset_id or \
-                    conn['to-port-id'] != to_port_id or conn['to-asset-id'] != to_asset_id) and \
-                    (conn['from-port-id'] != to_port_id or conn['from-asset-id'] != to_asset_id or \
-                    conn['to-port-id'] != from_port_id or conn['to-asset-id'] != from_asset_id):
-                # Remove both directions from -> to and to -> from as we don't know how they are stored in the list
-                # does not matter, as a connection is unique
-                new_list.append(conn)  # add connections that we are not interested in
-            else:
-                print(' - removed {}'.format(conn))
-        set_session_for_esid(active_es_id, 'conn_list', new_list)  # set new connection list
-        # TODO: send es.id with this message?
-        if building_id:
-            # building editor is open, so only update building connections.
-            building = esh.get_by_id(es_edit.id, building_id)
-            bld_info = get_building_information(building)
-            conn_list = bld_info["conn_list"]
-            emit('clear_connections', {'id': building_id})   # clear connection of building editor
-            emit('add_connections', {'es_id': es_edit.id, 'conn_list': conn_list, 'add_to_building': True})
-
-        # always clear the main layer, as the connection edited can be at two maps at the same time
-        # only clear main map if the assets are not part of a containingBuilding
-        if from_port.energyasset.containingBuilding is None or to_port.energyasset.containingBuilding is None:
-            emit('clear_connections', {'id': es_edit.id})   # clear main layer layer connections
-            emit('add_connections', {'es_id': es_edit.id, 'conn_list': new_list, 'add_to_building': False})
-
-    if message['cmd'] == 'set_carrier':
-        asset_id = message['asset_id']
-        carrier_id = message['carrier_id']
-        area = es_edit.instance[0].area
-
-        if asset_id:
-            asset = ESDLAsset.find_asset(area, asset_id)
-            num_ports = len(asset.port)
-            if isinstance(asset, esdl.Transport) or num_ports == 1:
-                set_carrier_for_connected_transport_assets(asset_id, carrier_id)
-            else:
-                send_alert("Error: Can only start setting carriers from transport assets or assets with only one port")
-
-        update_carrier_conn_list()
-
-    if message['cmd'] == 'add_carrier':
-        # en_carr: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, emission: carr_emission, encont: carr_encont, encunit: carr_encunit});
-        # el_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, voltage: carr_voltage});
-        # g_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, pressure: carr_pressure});
-        # h_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, suptemp: carr_suptemp, rettemp: carr_rettemp});
-        # en_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name});
-        carr_type = message['type']
-        carr_name = message['name']
-        carr_id = str(uuid.uuid4())
-
-        if carr_type == 'en_carr':
-            carr_emission = message['emission']
-            carr_encont = message['encont']
-            carr_encunit = message['encunit']   # MJpkg MJpNm3 MJpMJ
-            carr_sofm = message['sofm']
-            carr_rentype = message['rentype']
-
-            carrier = esdl.EnergyCarrier(id = carr_id, name = carr_name, emission = str2float(carr_emission),
-                        energyContent = str2float(carr_encont), energyCarrierType = carr_rentype, stateOfMatter = carr_sofm)
-
-            if carr_encunit == 'MJpkg':
-                encont_qandu=esdl.QuantityAndUnitType(
-                    physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
-                    multiplier=esdl.MultiplierEnum.MEGA,
-                    unit=esdl.UnitEnum.JOULE,
-                    perMultiplier=esdl.MultiplierEnum.KILO,
-                    perUnit=esdl.UnitEnum.GRAM)
-            elif carr_encunit == 'MJpNm3':
-                encont_qandu=esdl.QuantityAndUnitType(
-                    physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
-                    multiplier=esdl.MultiplierEnum.MEGA,
-                    unit=esdl.UnitEnum.JOULE,
-                    perUnit=esdl.UnitEnum.CUBIC_METRE)
-            elif carr_encunit == 'MJpMJ':
-                encont_qandu=esdl.QuantityAndUnitType(
-                    physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
-                    multiplier=esdl.MultiplierEnum.MEGA,
-                    unit=esdl.UnitEnum.JOULE,
-                    perMultiplier=esdl.MultiplierEnum.MEGA,
-                    perUnit=esdl.UnitEnum.JOULE)
-
-            emission_qandu=esdl.QuantityAndUnitType(
-                physicalQuantity=esdl.PhysicalQuantityEnum.EMISSION,
-                multiplier=esdl.MultiplierEnum.KILO,
-                unit=esdl.UnitEnum.GRAM,
-                perMultiplier=esdl.MultiplierEnum.GIGA,
-                perUnit=esdl.UnitEnum.JOULE)
 
-            carrier.energyContentUnit = encont_qandu
-            carrier.emissionUnit = emission_qandu
-
-        if carr_type == 'el_comm':
-            carr_voltage = message['voltage']
-            carrier = esdl.ElectricityCommodity(id=carr_id, name=carr_name, voltage=str2float(carr_voltage))
-        if carr_type == 'g_comm':
-            carr_pressure = message['pressure']
-            carrier = esdl.GasCommodity(id=carr_id, name=carr_name, pressure=str2float(carr_pressure))
-        if carr_type == 'h_comm':
-            carr_suptemp = message['suptemp']
-            carr_rettemp = message['rettemp']
-            carrier = esdl.HeatCommodity(id=carr_id, name=carr_name, supplyTemperature=str2float(carr_suptemp), returnTemperature=str2float(carr_rettemp))
-        if carr_type == 'en_comm':
-            carrier = esdl.EnergyCarrier(id=carr_id, name=carr_name)
-
-        esh.add_object_to_dict(es_edit.id, carrier) # add carrier to ID list for easy retrieval
-
-        esi = es_edit.energySystemInformation
-        if not esi:
-            esi_id = str(uuid.uuid4())
-            esi = esdl.EnergySystemInformation()
-            esi.id = esi_id
-            es_edit.energySystemInformation = esi
-        esh.add_object_to_dict(es_edit.id, esi)
+@command_registry.command('remove_port')
+def cmd_remove_port(message, esh, active_es_id):
+    pid = message['port_id']
+    asset = get_asset_from_port_id(esh, active_es_id, pid)
+    ports = asset.port
 
-        ecs = esi.carriers
-        if not ecs:
-            ecs_id = str(uuid.uuid4())
-            ecs = esdl.Carriers(id=ecs_id)
-            esi.carriers = ecs
-        esh.add_object_to_dict(es_edit.id, ecs)
-        ecs.carrier.append(carrier)
+    port_list = []
+    for p in set(ports):
+        if p.id == pid:
+            esh.remove_object_from_dict(active_es_id, p, recursive=True)
+            ports.remove(p) # remove from list
+            p.delete()  # delete from esdl (e.g. if other ports refer to this port, they will be updated)
+                        # question is why is this necessary in pyecore and isn't this done automatically
+                        # as p is not contained anymore and you get dangling references.
+        else:
+            carrier_id = p.carrier.id if p.carrier else None
+            port_list.append({'name': p.name, 'id': p.id, 'type': type(p).__name__, 'conn_to': [pt.id for pt in p.connectedTo], 'carrier': carrier_id})
+    emit('update_asset', {'asset_id': asset.id, 'ports': port_list})
 
-        carrier_list = ESDLEnergySystem.get_carrier_list(es_edit)
-        emit('carrier_list', {'es_id': es_edit.id, 'carrier_list': carrier_list})
-        return True
 
-    if message['cmd'] == 'remove_carrier':
-        carrier_id = message['carrier_id']
+# user clicked remove connection by right-clicking on connection
+@command_registry.command('remove_connection_portids')
+def cmd_remove_connection_portids(message, esh, es_edit, active_es_id):
+    building_id = message['building_id'] if 'building_id' in message else None
+    from_port_id = message['from_port_id']
+    from_port: esdl.Port = esh.get_by_id(es_edit.id, from_port_id)
+    to_port_id = message['to_port_id']
+    to_port: esdl.Port = esh.get_by_id(es_edit.id, to_port_id)
+    from_port.connectedTo.remove(to_port)
+
+    from_asset_id = from_port.eContainer().id
+    to_asset_id = to_port.eContainer().id
+
+    # refresh connections in gui
+    #active_es_id = get_session('active_es_id')
+    conn_list = get_session_for_esid(es_edit.id, 'conn_list')
+    new_list = []
+    #print(conn_list)
+    for conn in conn_list:
+        if (conn['from-port-id'] != from_port_id or conn['from-asset-id'] != from_asset_id or
+                conn['to-port-id'] != to_port_id or conn['to-asset-id'] != to_asset_id) and \
+                (conn['from-port-id'] != to_port_id or conn['from-asset-id'] != to_asset_id or
+                conn['to-port-id'] != from_port_id or conn['to-asset-id'] != from_asset_id):
+            # Remove both directions from -> to and to -> from as we don't know how they are stored in the list
+            # does not matter, as a connection is unique
+            new_list.append(conn)  # add connections that we are not interested in
+        else:
+            print(' - removed {}'.format(conn))
+    set_session_for_esid(es_edit.id, 'conn_list', new_list)  # set new connection list
+    if building_id:
+        # building editor is open, so only update building connections.
+        building = esh.get_by_id(es_edit.id, building_id)
+        bld_info = get_building_information(building)
+        bld_conn_list = bld_info["conn_list"]
+        emit('clear_connections', {'id': building_id})   # clear current active layer connections
+        emit('add_connections', {'es_id': es_edit.id, 'conn_list': bld_conn_list, 'add_to_building': True})
+    if from_port.energyasset.containingBuilding is None or to_port.energyasset.containingBuilding is None:
+        # only clear main map connections if not both assets are in a building
+        emit('clear_connections', {'id': active_es_id})   # clear current active layer connections
+        emit('add_connections', {'es_id': active_es_id, 'conn_list': new_list})
+        ui_delta_sent(active_es_id, CONNECTIONS_LAYER, new_list, replace=True)
+
+
+@command_registry.command('remove_connection')
+def cmd_remove_connection(message, esh, es_edit, active_es_id):
+    # socket.emit('command', {cmd: 'remove_connection', from_asset_id: from_asset_id, from_port_id: from_port_id,
+    #                         to_asset_id: to_asset_id, to_port_id: to_port_id, 'building_id': building_id});
+    from_asset_id = message['from_asset_id']
+    from_port_id = message['from_port_id']
+    from_port = esh.get_by_id(es_edit.id, from_port_id)
+    to_asset_id = message['to_asset_id']
+    to_port_id = message['to_port_id']
+    building_id = message['building_id'] if 'building_id' in message else None
+    to_port = esh.get_by_id(es_edit.id, to_port_id)
+    from_port.connectedTo.remove(to_port)
+
+    # refresh connections in gui
+    #active_es_id = get_session('active_es_id')
+    conn_list = get_session_for_esid(es_edit.id, 'conn_list')
+    new_list = []
+    for conn in conn_list:
+        if (conn['from-port-id'] != from_port_id or conn['from-asset-id'] != from_asset_id or \
+                conn['to-port-id'] != to_port_id or conn['to-asset-id'] != to_asset_id) and \
+                (conn['from-port-id'] != to_port_id or conn['from-asset-id'] != to_asset_id or \
+                conn['to-port-id'] != from_port_id or conn['to-asset-id'] != from_asset_id):
+            # Remove both directions from -> to and to -> from as we don't know how they are stored in the list
+            # does not matter, as a connection is unique
+            new_list.append(conn)  # add connections that we are not interested in
+        else:
+            print(' - removed {}'.format(conn))
+    set_session_for_esid(active_es_id, 'conn_list', new_list)  # set new connection list
+    # TODO: send es.id with this message?
+    if building_id:
+        # building editor is open, so only update building connections.
+        building = esh.get_by_id(es_edit.id, building_id)
+        bld_info = get_building_information(building)
+        conn_list = bld_info["conn_list"]
+        emit('clear_connections', {'id': building_id})   # clear connection of building editor
+        emit('add_connections', {'es_id': es_edit.id, 'conn_list': conn_list, 'add_to_building': True})
 
-        carrier = esh.get_by_id(es_edit.id, carrier_id)
-        carrier.delete()
+    # always clear the main layer, as the connection edited can be at two maps at the same time
+    # only clear main map if the assets are not part of a containingBuilding
+    if from_port.energyasset.containingBuilding is None or to_port.energyasset.containingBuilding is None:
+        emit('clear_connections', {'id': es_edit.id})   # clear main layer layer connections
+        emit('add_connections', {'es_id': es_edit.id, 'conn_list': new_list, 'add_to_building': False})
+        ui_delta_sent(es_edit.id, CONNECTIONS_LAYER, new_list, replace=True)
 
-        conn_list = get_session_for_esid(es_edit.id, 'conn_list')
-        for c in conn_list:
-            if c['from-port-carrier'] == carrier_id:
-                c['from-port-carrier'] = None
-            if c['to-port-carrier'] == carrier_id:
-                c['to-port-carrier'] = None
-
-        emit('clear_connections')  # clear current active layer connections
-        emit('add_connections', {'es_id': es_edit.id, 'conn_list': conn_list})
-
-    if message['cmd'] == 'get_storage_strategy_info':
-        asset_id = message['asset_id']
-
-        mcc, mdc = get_storage_marginal_costs(asset_id)
-        emit('storage_strategy_window', {'asset_id': asset_id, 'mcc': mcc, 'mdc': mdc})
-
-    if message['cmd'] == 'get_curtailment_strategy_info':
-        asset_id = message['asset_id']
-
-        max_power = get_curtailment_max_power(asset_id)
-        emit('curtailment_strategy_window', {'asset_id': asset_id, 'max_power': max_power})
-
-    if message['cmd'] == 'set_control_strategy':
-        # socket.emit('command', {'cmd': 'set_control_strategy', 'strategy': control_strategy, 'asset_id': asset_id, 'port_id': port_id});
-        strategy = message['strategy']
-        asset_id = message['asset_id']
-
-        if strategy == 'StorageStrategy':
-            mcc = message['marg_ch_costs']
-            mdc = message['marg_disch_costs']
-            add_storage_control_strategy_for_asset(asset_id, mcc, mdc)
-        elif strategy == 'CurtailmentStrategy':
-            max_power = message['max_power']
-            add_curtailment_control_strategy_for_asset(asset_id, max_power)
+
+@command_registry.command('set_carrier')
+def cmd_set_carrier(message, es_edit):
+    asset_id = message['asset_id']
+    carrier_id = message['carrier_id']
+    area = es_edit.instance[0].area
+
+    if asset_id:
+        asset = ESDLAsset.find_asset(area, asset_id)
+        num_ports = len(asset.port)
+        if isinstance(asset, esdl.Transport) or num_ports == 1:
+            set_carrier_for_connected_transport_assets(asset_id, carrier_id)
         else:
-            port_id = message['port_id']
-            add_drivenby_control_strategy_for_asset(asset_id, strategy, port_id)
-
-    if message['cmd'] == 'remove_control_strategy':
-        asset_id = message['asset_id']
-        remove_control_strategy_for_asset(asset_id)
-
-    # if message['cmd'] == 'set_marginal_costs_get_info':
-    #     asset_id = message['asset_id']
-    #     mc = get_marginal_costs_for_asset(asset_id)
-    #     emit('marginal_costs', {'asset_id': asset_id, 'mc': mc})
-
-    if message['cmd'] == 'set_marg_costs':
-        asset_id = message['asset_id']
-        mc = str2float(message['marg_costs'])
-        set_marginal_costs_for_asset(asset_id, mc)
-
-    if message['cmd'] == 'remove_marg_costs':
-        asset_id = message['asset_id']
-        remove_marginal_costs_for_asset(asset_id)
-
-    if message['cmd'] == 'layer':
-        pass
-
-    if message['cmd'] == 'run_ESSIM_simulation':
-        logger.debug('ESSIM simulation command received')
-        sim_descr = message['sim_description']
-        sim_start_datetime = message['sim_start_datetime']
-        sim_end_datetime = message['sim_end_datetime']
-        essim_kpis = message['essim_kpis']
-        essim_loadflow = message['essim_loadflow']
-        # Create the HTTP POST to start the simulation
-        if not essim.run_simulation(sim_descr, sim_start_datetime, sim_end_datetime, essim_kpis, essim_loadflow):
-            emit('simulation_not_started')
-
-    if message['cmd'] == 'validate_for_ESSIM':
-        logger.debug('validation for ESSIM command received')
-        res = validate_ESSIM(es_edit)
-        emit('results_validation_for_ESSIM', res)
-
-    # if message['cmd'] == 'calculate_ESSIM_KPIs':
-        # session['simulationRun'] = '5d10f273783bac5eff4575e8'
-        # ESSIM_config = settings.essim_config
-        #
-        # simulation_run = get_session('simulationRun')
-        # if simulation_run:
-        #
-        #     active_simulation = get_session('active_simulation')
-        #     if active_simulation:
-        #         sdt = datetime.strptime(active_simulation['startDate'], '%Y-%m-%dT%H:%M:%S%z')
-        #         edt = datetime.strptime(active_simulation['endDate'], '%Y-%m-%dT%H:%M:%S%z')
-        #     else:
-        #         send_alert('No active_simulation! This should not happen, please report. However, you can continue')
-        #         sdt = datetime.strptime(ESSIM_config['start_datetime'], '%Y-%m-%dT%H:%M:%S%z')
-        #         edt = datetime.strptime(ESSIM_config['end_datetime'], '%Y-%m-%dT%H:%M:%S%z')
-        #
-        #     influxdb_startdate = sdt.strftime('%Y-%m-%dT%H:%M:%SZ')
-        #     influxdb_enddate = edt.strftime('%Y-%m-%dT%H:%M:%SZ')
-        #
-        #     calc_ESSIM_KPIs.submit(es_edit, simulation_run, influxdb_startdate, influxdb_enddate)
-        # else:
-        #     send_alert('No simulation id defined - run an ESSIM simulation first')
-
-    if message['cmd'] == 'get_es_info':
-        attributes = [
-            {"id": 1, "name": "Energysystem name", "value": es_edit.name},
-            {"id": 2, "name": "Energysystem description", "value": es_edit.description}
-        ]
-        emit('show_es_info', attributes)
-
-    if message['cmd'] == 'set_es_info_param':
-        id = message['id']
-        value = message['value']
+            send_alert("Error: Can only start setting carriers from transport assets or assets with only one port")
+
+    update_carrier_conn_list()
+
+
+@command_registry.command('add_carrier')
+def cmd_add_carrier(message, esh, es_edit):
+    # en_carr: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, emission: carr_emission, encont: carr_encont, encunit: carr_encunit});
+    # el_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, voltage: carr_voltage});
+    # g_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, pressure: carr_pressure});
+    # h_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name, suptemp: carr_suptemp, rettemp: carr_rettemp});
+    # en_comm: socket.emit('command', {cmd: 'add_carrier', type: carr_type, name: carr_name});
+    carr_type = message['type']
+    carr_name = message['name']
+    carr_id = str(uuid.uuid4())
+
+    if carr_type == 'en_carr':
+        carr_emission = message['emission']
+        carr_encont = message['encont']
+        carr_encunit = message['encunit']   # MJpkg MJpNm3 MJpMJ
+        carr_sofm = message['sofm']
+        carr_rentype = message['rentype']
+
+        carrier = esdl.EnergyCarrier(id = carr_id, name = carr_name, emission = str2float(carr_emission),
+                    energyContent = str2float(carr_encont), energyCarrierType = carr_rentype, stateOfMatter = carr_sofm)
+
+        if carr_encunit == 'MJpkg':
+            encont_qandu=esdl.QuantityAndUnitType(
+                physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
+                multiplier=esdl.MultiplierEnum.MEGA,
+                unit=esdl.UnitEnum.JOULE,
+                perMultiplier=esdl.MultiplierEnum.KILO,
+                perUnit=esdl.UnitEnum.GRAM)
+        elif carr_encunit == 'MJpNm3':
+            encont_qandu=esdl.QuantityAndUnitType(
+                physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
+                multiplier=esdl.MultiplierEnum.MEGA,
+                unit=esdl.UnitEnum.JOULE,
+                perUnit=esdl.UnitEnum.CUBIC_METRE)
+        elif carr_encunit == 'MJpMJ':
+            encont_qandu=esdl.QuantityAndUnitType(
+                physicalQuantity=esdl.PhysicalQuantityEnum.ENERGY,
+                multiplier=esdl.MultiplierEnum.MEGA,
+                unit=esdl.UnitEnum.JOULE,
+                perMultiplier=esdl.MultiplierEnum.MEGA,
+                perUnit=esdl.UnitEnum.JOULE)
 
-        if id == "1":
-            es_edit.name = value
-        if id == "2":
-            es_edit.description = value
-            es_edit.description = value
+        emission_qandu=esdl.QuantityAndUnitType(
+            physicalQuantity=esdl.PhysicalQuantityEnum.EMISSION,
+            multiplier=esdl.MultiplierEnum.KILO,
+            unit=esdl.UnitEnum.GRAM,
+            perMultiplier=esdl.MultiplierEnum.GIGA,
+            perUnit=esdl.UnitEnum.JOULE)
+
+        carrier.energyContentUnit = encont_qandu
+        carrier.emissionUnit = emission_qandu
+
+    if carr_type == 'el_comm':
+        carr_voltage = message['voltage']
+        carrier = esdl.ElectricityCommodity(id=carr_id, name=carr_name, voltage=str2float(carr_voltage))
+    if carr_type == 'g_comm':
+        carr_pressure = message['pressure']
+        carrier = esdl.GasCommodity(id=carr_id, name=carr_name, pressure=str2float(carr_pressure))
+    if carr_type == 'h_comm':
+        carr_suptemp = message['suptemp']
+        carr_rettemp = message['rettemp']
+        carrier = esdl.HeatCommodity(id=carr_id, name=carr_name, supplyTemperature=str2float(carr_suptemp), returnTemperature=str2float(carr_rettemp))
+    if carr_type == 'en_comm':
+        carrier = esdl.EnergyCarrier(id=carr_id, name=carr_name)
+
+    esh.add_object_to_dict(es_edit.id, carrier) # add carrier to ID list for easy retrieval
+
+    esi = es_edit.energySystemInformation
+    if not esi:
+        esi_id = str(uuid.uuid4())
+        esi = esdl.EnergySystemInformation()
+        esi.id = esi_id
+        es_edit.energySystemInformation = esi
+    esh.add_object_to_dict(es_edit.id, esi)
+
+    ecs = esi.carriers
+    if not ecs:
+        ecs_id = str(uuid.uuid4())
+        ecs = esdl.Carriers(id=ecs_id)
+        esi.carriers = ecs
+    esh.add_object_to_dict(es_edit.id, ecs)
+    ecs.carrier.append(carrier)
+
+    carrier_list = ESDLEnergySystem.get_carrier_list(es_edit)
+    emit('carrier_list', {'es_id': es_edit.id, 'carrier_list': carrier_list})
+    return True
+
+
+@command_registry.command('remove_carrier')
+def cmd_remove_carrier(message, esh, es_edit):
+    carrier_id = message['carrier_id']
+
+    carrier = esh.get_by_id(es_edit.id, carrier_id)
+    carrier.delete()
+
+    conn_list = get_session_for_esid(es_edit.id, 'conn_list')
+    for c in conn_list:
+        if c['from-port-carrier'] == carrier_id:
+            c['from-port-carrier'] = None
+        if c['to-port-carrier'] == carrier_id:
+            c['to-port-carrier'] = None
 
-    if message['cmd'] == 'add_sector':
-        name = message['name']
-        descr = message['descr']
-        code = message['code']
-        ESDLEnergySystem.add_sector(es_edit, name, code, descr)
-        sector_list = ESDLEnergySystem.get_sector_list(es_edit)
-        emit('sector_list', {'es_id': es_edit.id, 'sector_list': sector_list})
-
-    if message['cmd'] == 'remove_sector':
-        id = message['id']
-        esh = get_handler()
-        ESDLEnergySystem.remove_sector(es_edit, id)
-        sector_list = ESDLEnergySystem.get_sector_list(es_edit)
-        emit('sector_list', {'es_id': es_edit.id, 'sector_list': sector_list})
+    emit('clear_connections')  # clear current active layer connections
+    emit('add_connections', {'es_id': es_edit.id, 'conn_list': conn_list})
+    ui_delta_sent(es_edit.id, CONNECTIONS_LAYER, conn_list, replace=True)
 
-    if message['cmd'] == 'set_sector':
-        asset_id = message['asset_id']
-        sector_id = message['sector_id']
 
-        instance = es_edit.instance
-        area = instance[0].area
-        asset = ESDLAsset.find_asset(area, asset_id)
+@command_registry.command('get_storage_strategy_info')
+def cmd_get_storage_strategy_info(message):
+    asset_id = message['asset_id']
 
-        esi = es_edit.energySystemInformation
-        sectors = esi.sectors
-        sector = sectors.sector
-        for s in sector:
-            if s.id == sector_id:
-                asset.sector = s
+    mcc, mdc = get_storage_marginal_costs(asset_id)
+    emit('storage_strategy_window', {'asset_id': asset_id, 'mcc': mcc, 'mdc': mdc})
 
-    if message['cmd'] == 'get_edr_asset':
-        edr_asset_id = message['edr_asset_id']
-        edr_asset_str = edr_client.get_object_from_EDR(edr_asset_id)
-        if edr_asset_str:
-            edr_asset = ESDLAsset.load_asset_from_string(edr_asset_str)
-            edr_asset_name = edr_asset.name
-            edr_asset_type = type(edr_asset).__name__
-            edr_asset_cap = get_asset_capability_type(edr_asset)
-            emit('place_edr_asset', edr_asset_type)
-            set_session('adding_edr_assets', edr_asset_str)
-
-            recently_used_edr_assets = get_session('recently_used_edr_assets')
-            if recently_used_edr_assets:
-                current_edr_asset_in_list = False
-                for edra in recently_used_edr_assets:
-                    if edra['edr_asset_id'] == edr_asset_id:
-                        current_edr_asset_in_list = True
-
-                if not current_edr_asset_in_list and len(recently_used_edr_assets) == 5:
-                    recently_used_edr_assets.pop()     # Remove last element
-
-                if not current_edr_asset_in_list:
-                    recently_used_edr_assets.insert(0, {
-                        'edr_asset_id': edr_asset_id,
-                        'edr_asset_name': edr_asset_name,
-                        'edr_asset_type': edr_asset_type,
-                        'edr_asset_cap': edr_asset_cap,
-                        'edr_asset_str': edr_asset_str
-                    })
-            else:
-                recently_used_edr_assets = list()
-                recently_used_edr_assets.append({
+
+@command_registry.command('get_curtailment_strategy_info')
+def cmd_get_curtailment_strategy_info(message):
+    asset_id = message['asset_id']
+
+    max_power = get_curtailment_max_power(asset_id)
+    emit('curtailment_strategy_window', {'asset_id': asset_id, 'max_power': max_power})
+
+
+@command_registry.command('set_control_strategy')
+def cmd_set_control_strategy(message):
+    # socket.emit('command', {'cmd': 'set_control_strategy', 'strategy': control_strategy, 'asset_id': asset_id, 'port_id': port_id});
+    strategy = message['strategy']
+    asset_id = message['asset_id']
+
+    if strategy == 'StorageStrategy':
+        mcc = message['marg_ch_costs']
+        mdc = message['marg_disch_costs']
+        add_storage_control_strategy_for_asset(asset_id, mcc, mdc)
+    elif strategy == 'CurtailmentStrategy':
+        max_power = message['max_power']
+        add_curtailment_control_strategy_for_asset(asset_id, max_power)
+    else:
+        port_id = message['port_id']
+        add_drivenby_control_strategy_for_asset(asset_id, strategy, port_id)
+
+
+@command_registry.command('remove_control_strategy')
+def cmd_remove_control_strategy(message):
+    asset_id = message['asset_id']
+    remove_control_strategy_for_asset(asset_id)
+
+
+# if message['cmd'] == 'set_marginal_costs_get_info':
+#     asset_id = message['asset_id']
+#     mc = get_marginal_costs_for_asset(asset_id)
+#     emit('marginal_costs', {'asset_id': asset_id, 'mc': mc})
+
+
+@command_registry.command('set_marg_costs')
+def cmd_set_marg_costs(message):
+    asset_id = message['asset_id']
+    mc = str2float(message['marg_costs'])
+    set_marginal_costs_for_asset(asset_id, mc)
+
+
+@command_registry.command('remove_marg_costs')
+def cmd_remove_marg_costs(message):
+    asset_id = message['asset_id']
+    remove_marginal_costs_for_asset(asset_id)
+
+
+@command_registry.command('layer')
+def cmd_layer(message):
+    pass
+
+
+@command_registry.command('run_ESSIM_simulation')
+def cmd_run_ESSIM_simulation(message):
+    logger.debug('ESSIM simulation command received')
+    sim_descr = message['sim_description']
+    sim_start_datetime = message['sim_start_datetime']
+    sim_end_datetime = message['sim_end_datetime']
+    essim_kpis = message['essim_kpis']
+    essim_loadflow = message['essim_loadflow']
+    # Create the HTTP POST to start the simulation
+    if not essim.run_simulation(sim_descr, sim_start_datetime, sim_end_datetime, essim_kpis, essim_loadflow):
+        emit('simulation_not_started')
+
+
+@command_registry.command('validate_for_ESSIM')
+def cmd_validate_for_ESSIM(message, es_edit):
+    logger.debug('validation for ESSIM command received')
+    res = validate_ESSIM(es_edit)
+    emit('results_validation_for_ESSIM', res)
+
+
+# if message['cmd'] == 'calculate_ESSIM_KPIs':
+    # session['simulationRun'] = '5d10f273783bac5eff4575e8'
+    # ESSIM_config = settings.essim_config
+    #
+    # simulation_run = get_session('simulationRun')
+    # if simulation_run:
+    #
+    #     active_simulation = get_session('active_simulation')
+    #     if active_simulation:
+    #         sdt = datetime.strptime(active_simulation['startDate'], '%Y-%m-%dT%H:%M:%S%z')
+    #         edt = datetime.strptime(active_simulation['endDate'], '%Y-%m-%dT%H:%M:%S%z')
+    #     else:
+    #         send_alert('No active_simulation! This should not happen, please report. However, you can continue')
+    #         sdt = datetime.strptime(ESSIM_config['start_datetime'], '%Y-%m-%dT%H:%M:%S%z')
+    #         edt = datetime.strptime(ESSIM_config['end_datetime'], '%Y-%m-%dT%H:%M:%S%z')
+    #
+    #     influxdb_startdate = sdt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    #     influxdb_enddate = edt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    #
+    #     calc_ESSIM_KPIs.submit(es_edit, simulation_run, influxdb_startdate, influxdb_enddate)
+    # else:
+    #     send_alert('No simulation id defined - run an ESSIM simulation first')
+
+
+@command_registry.command('get_es_info')
+def cmd_get_es_info(message, es_edit):
+    attributes = [
+        {"id": 1, "name": "Energysystem name", "value": es_edit.name},
+        {"id": 2, "name": "Energysystem description", "value": es_edit.description}
+    ]
+    emit('show_es_info', attributes)
+
+
+@command_registry.command('set_es_info_param')
+def cmd_set_es_info_param(message, es_edit):
+    id = message['id']
+    value = message['value']
+
+    if id == "1":
+        es_edit.name = value
+    if id == "2":
+        es_edit.description = value
+        es_edit.description = value
+
+
+@command_registry.command('add_sector')
+def cmd_add_sector(message, es_edit):
+    name = message['name']
+    descr = message['descr']
+    code = message['code']
+    ESDLEnergySystem.add_sector(es_edit, name, code, descr)
+    sector_list = ESDLEnergySystem.get_sector_list(es_edit)
+    emit('sector_list', {'es_id': es_edit.id, 'sector_list': sector_list})
+
+
+@command_registry.command('remove_sector')
+def cmd_remove_sector(message, es_edit):
+    id = message['id']
+    ESDLEnergySystem.remove_sector(es_edit, id)
+    sector_list = ESDLEnergySystem.get_sector_list(es_edit)
+    emit('sector_list', {'es_id': es_edit.id, 'sector_list': sector_list})
+
+
+@command_registry.command('set_sector')
+def cmd_set_sector(message, es_edit):
+    asset_id = message['asset_id']
+    sector_id = message['sector_id']
+
+    instance = es_edit.instance
+    area = instance[0].area
+    asset = ESDLAsset.find_asset(area, asset_id)
+
+    esi = es_edit.energySystemInformation
+    sectors = esi.sectors
+    sector = sectors.sector
+    for s in sector:
+        if s.id == sector_id:
+            asset.sector = s
+
+
+@command_registry.command('get_edr_asset')
+def cmd_get_edr_asset(message):
+    edr_asset_id = message['edr_asset_id']
+    edr_asset_str = edr_client.get_object_from_EDR(edr_asset_id)
+    if edr_asset_str:
+        edr_asset = ESDLAsset.load_asset_from_string(edr_asset_str)
+        edr_asset_name = edr_asset.name
+        edr_asset_type = type(edr_asset).__name__
+        edr_asset_cap = get_asset_capability_type(edr_asset)
+        emit('place_edr_asset', edr_asset_type)
+        set_session('adding_edr_assets', edr_asset_str)
+
+        recently_used_edr_assets = get_session('recently_used_edr_assets')
+        if recently_used_edr_assets:
+            current_edr_asset_in_list = False
+            for edra in recently_used_edr_assets:
+                if edra['edr_asset_id'] == edr_asset_id:
+                    current_edr_asset_in_list = True
+
+            if not current_edr_asset_in_list and len(recently_used_edr_assets) == 5:
+                recently_used_edr_assets.pop()     # Remove last element
+
+            if not current_edr_asset_in_list:
+                recently_used_edr_assets.insert(0, {
                     'edr_asset_id': edr_asset_id,
                     'edr_asset_name': edr_asset_name,
                     'edr_asset_type': edr_asset_type,
                     'edr_asset_cap': edr_asset_cap,
                     'edr_asset_str': edr_asset_str
                 })
-                set_session('recently_used_edr_assets', recently_used_edr_assets)
-
-            emit('recently_used_edr_assets', recently_used_edr_assets)
         else:
-            send_alert('Error getting ESDL model from EDR')
-
-    if message['cmd'] == 'set_asset_drawing_mode':
-        mode = message['mode']
-        set_session('asset_drawing_mode', mode)
-        if mode == 'empty_assets':
-            set_session('adding_edr_assets', None)
-            set_session('asset_from_measure_id', None)
-        if mode == 'edr_asset':
-            edr_asset_info = message['edr_asset_info']
-            # If you select an asset from the EDR directly, ESDL string is cached.
-            # AssetDrawToolbar EDR assets that are stored in mongo, do not have the ESDL string stored.
-            if 'edr_asset_str' not in edr_asset_info:
-                edr_asset_id = edr_asset_info['edr_asset_id']
-                edr_asset_info['edr_asset_str'] = edr_client.get_object_from_EDR(edr_asset_id)
-            set_session('adding_edr_assets', edr_asset_info['edr_asset_str'])
-        if mode == 'asset_from_measures':
-            asset_from_measure_id = message['asset_from_measure_id']
-            set_session('asset_from_measure_id', asset_from_measure_id)
-
-    if message['cmd'] == 'query_esdl_service':
-        params = message['params']
-        logger.debug("received query_esdl_service command with params: {}".format(params))
-        query_esdl_services.submit(params)
-
-    if message['cmd'] == 'redraw_connections': # set_carrier_color
-        # this is called when a carrier color is changed and the gui needs to be refreshed
-        # best would be to do this fully in the front end (no changes in the ESDL model)
-        # but that does not contain enough information yet to do this.
-        conn_list = get_session_for_esid(active_es_id, 'conn_list')
-        emit('clear_connections')  # clear current active layer connections
-        emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list})
+            recently_used_edr_assets = list()
+            recently_used_edr_assets.append({
+                'edr_asset_id': edr_asset_id,
+                'edr_asset_name': edr_asset_name,
+                'edr_asset_type': edr_asset_type,
+                'edr_asset_cap': edr_asset_cap,
+                'edr_asset_str': edr_asset_str
+            })
+            set_session('recently_used_edr_assets', recently_used_edr_assets)
+
+        emit('recently_used_edr_assets', recently_used_edr_assets)
+    else:
+        send_alert('Error getting ESDL model from EDR')
+
+
+@command_registry.command('set_asset_drawing_mode')
+def cmd_set_asset_drawing_mode(message):
+    mode = message['mode']
+    set_session('asset_drawing_mode', mode)
+    if mode == 'empty_assets':
+        set_session('adding_edr_assets', None)
+        set_session('asset_from_measure_id', None)
+    if mode == 'edr_asset':
+        edr_asset_info = message['edr_asset_info']
+        # If you select an asset from the EDR directly, ESDL string is cached.
+        # AssetDrawToolbar EDR assets that are stored in mongo, do not have the ESDL string stored.
+        if 'edr_asset_str' not in edr_asset_info:
+            edr_asset_id = edr_asset_info['edr_asset_id']
+            edr_asset_info['edr_asset_str'] = edr_client.get_object_from_EDR(edr_asset_id)
+        set_session('adding_edr_assets', edr_asset_info['edr_asset_str'])
+    if mode == 'asset_from_measures':
+        asset_from_measure_id = message['asset_from_measure_id']
+        set_session('asset_from_measure_id', asset_from_measure_id)
+
+
+@command_registry.command('query_esdl_service')
+def cmd_query_esdl_service(message):
+    params = message['params']
+    logger.debug("received query_esdl_service command with params: {}".format(params))
+    query_esdl_services.submit(params)
+
+
+# set_carrier_color
+@command_registry.command('redraw_connections')
+def cmd_redraw_connections(message, esh, active_es_id):
+    # this is called when a carrier color is changed and the gui needs to be refreshed
+    # best would be to do this fully in the front end (no changes in the ESDL model)
+    # but that does not contain enough information yet to do this.
+    # Only the assets and connections that use the carrier are sent again.
+    carrier_id = message.get('carrier_id')
+    if carrier_id:
+        emit_ui_delta(esh, active_es_id, changed_ids={carrier_id})
+    else:
+        emit_ui_full(active_es_id, CONNECTIONS_LAYER)
+        emit_ui_full(active_es_id, ASSETS_LAYER)
 
-        asset_list = get_session_for_esid(active_es_id, 'asset_list')
-        emit('clear_ui', {'layer': 'assets'})  # clear current active layer assets
-        emit('add_esdl_objects', {'es_id': active_es_id, 'asset_pot_list': asset_list, 'zoom': False})
 
-    if message['cmd'] == 'building_editor':
-        bld_id = message['id']
-        building = esh.get_by_id(active_es_id, bld_id)
-        bld_info = get_building_information(building)
-        emit('building_information', bld_info)
-        emit('add_esdl_objects',
-             {'es_id': active_es_id, 'add_to_building': True, 'asset_pot_list': bld_info["asset_list"],
-              'zoom': False})
-        emit('add_connections', {'es_id': active_es_id, 'add_to_building': True, 'conn_list': bld_info["conn_list"]})
-
-    if message['cmd'] == 'get_building_connections':
-        bld_id = message['id']
-        building = esh.get_by_id(active_es_id, bld_id)
-        return get_building_connections(building)
-
-    if message['cmd'] == 'accept_received_esdl':
-        user_email = get_session('user-email')
-        received_esdls = esdl_api.get_esdl_for_user(user_email)
-        if received_esdls:
-            for received_esdl in received_esdls:
-                filename = 'ESDL from '+received_esdl['sender']
-                esh = get_handler()
+@command_registry.command('ui_resync')
+def cmd_ui_resync(message):
+    # the client missed a ui_delta message
+    if message['layer'] in (ASSETS_LAYER, CONNECTIONS_LAYER):
+        emit_ui_full(message['es_id'], message['layer'])
 
-                try:
-                    result, parse_info = esh.add_from_string(name=filename, esdl_string=urllib.parse.unquote(received_esdl['esdl']))
-                    if len(parse_info) > 0:
-                        info = ''
-                        for line in parse_info:
-                            info += line + "\n"
-                        send_alert("Warnings while opening {}:\n\n{}".format(filename, info))
-
-                    call_process_energy_system.submit(esh, filename)  # run in seperate thread
-                    esdl_api.remove_esdls_for_user(user_email)
-                except Exception as e:
-                    logger.error("Error loading {}: {}".format(filename, e))
-                    send_alert('Error interpreting ESDL from file - Exception: ' + str(e))
-
-    if message['cmd'] == 'rename_energysystem':
-        name = message['name']
-        rename_es_id = message['remame_es_id']
 
-        es_rename = esh.get_energy_system(es_id=rename_es_id)
-        es_rename.name = name
+@command_registry.command('building_editor')
+def cmd_building_editor(message, esh, active_es_id):
+    bld_id = message['id']
+    building = esh.get_by_id(active_es_id, bld_id)
+    bld_info = get_building_information(building)
+    emit('building_information', bld_info)
+    emit('add_esdl_objects',
+         {'es_id': active_es_id, 'add_to_building': True, 'asset_pot_list': bld_info["asset_list"],
+          'zoom': False})
+    emit('add_connections', {'es_id': active_es_id, 'add_to_building': True, 'conn_list': bld_info["conn_list"]})
 
-    if message['cmd'] == 'remove_energysystem':
-        remove_es_id = message['remove_es_id']
-        es_info_list = get_session("es_info_list")
-        del es_info_list[remove_es_id]  # update es info list too
-        esh.remove_energy_system(es_id=remove_es_id)
 
-    if message['cmd'] == 'refresh_esdl':
-        print('refresh_esdl')
-        esh = get_handler()
-        call_process_energy_system.submit(esh, force_update_es_id=es_edit.id, zoom=False)  # run in separate thread
+@command_registry.command('get_building_connections')
+def cmd_get_building_connections(message, esh, active_es_id):
+    bld_id = message['id']
+    building = esh.get_by_id(active_es_id, bld_id)
+    return get_building_connections(building)
 
-    set_handler(esh)
-    session.modified = True
+
+@command_registry.command('accept_received_esdl')
+def cmd_accept_received_esdl(message, esh, user_email):
+    user_email = get_session('user-email')
+    received_esdls = esdl_api.get_esdl_for_user(user_email)
+    if received_esdls:
+        for received_esdl in received_esdls:
+            filename = 'ESDL from '+received_esdl['sender']
+            esh = get_handler()
+
+            try:
+                result, parse_info = esh.add_from_string(name=filename, esdl_string=urllib.parse.unquote(received_esdl['esdl']))
+                if len(parse_info) > 0:
+                    info = ''
+                    for line in parse_info:
+                        info += line + "\n"
+                    send_alert("Warnings while opening {}:\n\n{}".format(filename, info))
+
+                call_process_energy_system.submit(esh, filename)  # run in seperate thread
+                esdl_api.remove_esdls_for_user(user_email)
+            except Exception as e:
+                logger.error("Error loading {}: {}".format(filename, e))
+                send_alert('Error interpreting ESDL from file - Exception: ' + str(e))
+
+
+@command_registry.command('rename_energysystem')
+def cmd_rename_energysystem(message, esh):
+    name = message['name']
+    rename_es_id = message['remame_es_id']
+
+    es_rename = esh.get_energy_system(es_id=rename_es_id)
+    es_rename.name = name
+
+
+@command_registry.command('remove_energysystem')
+def cmd_remove_energysystem(message, esh):
+    remove_es_id = message['remove_es_id']
+    es_info_list = get_session("es_info_list")
+    del es_info_list[remove_es_id]  # update es info list too
+    esh.remove_energy_system(es_id=remove_es_id)
+
+
+@command_registry.command('refresh_esdl')
+def cmd_refresh_esdl(message, esh, es_edit):
+    print('refresh_esdl')
+    esh = get_handler()
+    call_process_energy_system.submit(esh, force_update_es_id=es_edit.id, zoom=False)  # run in separate thread
 
 
 @executor.job
@@ -3098,10 +3231,22 @@ def set_active_es_id(id):
     logger.debug("========== Setting active es_id to {} =============".format(id))
 
 
+@socketio.on('set_map_zoom', namespace='/esdl')
+@session_writer
+def set_map_zoom(message):
+    # send the areas of the active energy system again when another level of detail is required
+    active_es_id = get_session('active_es_id')
+    if active_es_id:
+        emit_area_lod_update(get_handler(), active_es_id, message['zoom'])
+    else:
+        set_session('map_zoom', message['zoom'])
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 #  React on commands from the browser (add, remove, ...)
 # ---------------------------------------------------------------------------------------------------------------------
 @socketio.on('file_command', namespace='/esdl')
+@session_writer
 def process_file_command(message):
     logger.info('received: ' + message['cmd'])
     es_info_list = get_session("es_info_list")
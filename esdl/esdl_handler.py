@@ -17,16 +17,20 @@ from pyecore.ecore import EEnum, EAttribute, EObject, EReference, EClass, EStruc
 from pyecore.valuecontainer import ECollection
 from pyecore.utils import alias
 from pyecore.resources.resource import HttpURI
-from esdl.resources.xmlresource import XMLResource
+from esdl.resources.xmlresource import XMLResource, XMLOptions
 from esdl import esdl
 from uuid import uuid4
 from io import BytesIO
 import src.log as log
 from esdl import support_functions
+from esdl import snapshot
 
 #logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = log.get_logger(__name__)
 
+# ESDL strings larger than this (in characters) are parsed incrementally to reduce peak memory usage
+STREAMING_LOAD_THRESHOLD = 10 * 1024 * 1024
+
 
 class EnergySystemHandler:
 
@@ -117,6 +121,7 @@ class EnergySystemHandler:
             self.esid_uri_dict[self.energy_system.id] = uri
         else:
             self.esid_uri_dict[self.energy_system.id] = uri.normalize()
+        self._observe_resource(self.resource)
         self.add_object_to_dict(self.energy_system.id, self.energy_system, False)
         return self.energy_system, parse_info
 
@@ -136,29 +141,35 @@ class EnergySystemHandler:
             self.esid_uri_dict[tmp_resource.contents[0].id] = uri
         else:
             self.esid_uri_dict[tmp_resource.contents[0].id] = uri.normalize()
+        self._observe_resource(tmp_resource)
         # Edwin: recursive moet hier toch False zijn?? immers elke resource heeft zijn eigen uuid_dict
         # Ewoud: precies, dus in False veranderd
         self.add_object_to_dict(tmp_resource.contents[0].id, tmp_resource.contents[0], False)
         return tmp_resource.contents[0], parse_info
 
-    def load_from_string(self, esdl_string, name='from_string'):
+    def load_from_string(self, esdl_string, name='from_string', streaming=None):
         """
         Loads an energy system from a string and adds it to a *new* resourceSet
+        :param streaming: parse the XML incrementally (True), as a complete tree (False) or decide based on the
+        size of the string (None, uses STREAMING_LOAD_THRESHOLD)
         :returns: EnergySystem and the parse warnings as a tuple (es, parse_info)
          """
         if name == '':
             name = str(uuid4())
+        if streaming is None:
+            streaming = len(esdl_string) > STREAMING_LOAD_THRESHOLD
         uri = StringURI(name+'.esdl', esdl_string)
         self._new_resource_set()
         self.resource = self.rset.create_resource(uri)
         try:
-            self.resource.load()
+            self.resource.load(options={XMLOptions.STREAMING_LOAD: streaming})
             self.energy_system = self.resource.contents[0]
             parse_info = []
             if isinstance(self.resource, XMLResource):
                 parse_info = self.resource.get_parse_information()
             self.validate()
             self.esid_uri_dict[self.energy_system.id] = uri.normalize()
+            self._observe_resource(self.resource)
             # set to False, otherwise all the ids are added again after loading, is not smart and is slow
             # is only here to make sure the id of the energy system is also in the uuid_dict
             self.add_object_to_dict(self.energy_system.id, self.energy_system, False)
@@ -201,7 +212,8 @@ class EnergySystemHandler:
             #    tmp_es.name = tmp_es.name + '_' + uu
             self.validate(es=tmp_es)
             self.esid_uri_dict[tmp_es.id] = uri.normalize()
-            self.add_object_to_dict(tmp_es.id, tmp_es, True)
+            self._observe_resource(tmp_resource)
+            self.add_object_to_dict(tmp_es.id, tmp_es, False)
             return tmp_resource.contents[0], parse_info
         except Exception as e:
             logger.error("Exception when loading resource: {}: {}".format(name, e))
@@ -328,8 +340,8 @@ class EnergySystemHandler:
 
     # Using this function you can query for objects by ID
     # After loading an ESDL-file, all objects that have an ID defines are stored in resource.uuid_dict automatically
-    # Note: If you add things later to the resource, it won't be added automatically to this dictionary though.
-    # Use get_by_id_slow() for that or add them manually using add_object_to_dict()
+    # Objects that are added, removed or get a different id later are kept up to date in this dictionary by the
+    # UUIDDictObserver of the resource (see _observe_resource()).
     def get_by_id(self, es_id, object_id):
         if object_id in self.get_resource(es_id).uuid_dict:
             return self.get_resource(es_id).uuid_dict[object_id]
@@ -340,37 +352,101 @@ class EnergySystemHandler:
             return None
 
     def add_object_to_dict(self, es_id: str, esdl_object: EObject, recursive=False):
-        if recursive:
+        """
+        Adds an object to the uuid_dict. Only required for resources that are not observed by a UUIDDictObserver,
+        for observed resources the contents of an object are registered automatically when it is added to the
+        resource and recursive is ignored.
+        """
+        resource = self.get_resource(es_id)
+        if recursive and not self._is_observed(resource):
             for obj in esdl_object.eAllContents():
                 self.add_object_to_dict(es_id, obj)
         if hasattr(esdl_object, 'id'):
             if esdl_object.id is not None:
-                self.get_resource(es_id).uuid_dict[esdl_object.id] = esdl_object
+                resource.uuid_dict[esdl_object.id] = esdl_object
             else:
                 logger.warning('Id has not been set for object {}({})'.format(esdl_object.eClass.name, esdl_object))
 
     def remove_object_from_dict(self, es_id, esdl_object: EObject, recursive=False):
-        if recursive:
+        """
+        Removes an object from the uuid_dict. For observed resources the contents of an object are removed
+        automatically when it is removed from the resource and recursive is ignored.
+        """
+        resource = self.get_resource(es_id)
+        if resource is None:
+            return
+        if recursive and not self._is_observed(resource):
             for obj in esdl_object.eAllContents():
                 self.remove_object_from_dict(es_id, obj)
         if hasattr(esdl_object, 'id'):
-            if esdl_object.id is not None and self.get_resource(es_id):
-                del self.get_resource(es_id).uuid_dict[esdl_object.id]
+            if esdl_object.id is not None:
+                # the UUIDDictObserver may have removed it already
+                resource.uuid_dict.pop(esdl_object.id, None)
 
     def remove_object_from_dict_by_id(self, es_id, object_id):
-        del self.get_resource(es_id).uuid_dict[object_id]
+        self.get_resource(es_id).uuid_dict.pop(object_id, None)
+
+    def get_model_version(self, es_id=None):
+        """
+        Returns a value that changes whenever the energy system is changed, to check if information that was
+        derived from the energy system is still up to date, also in another process
+        """
+        return support_functions.UUIDDictObserver.observe_resource(self.get_resource(es_id)).version
+
+    def object_count(self):
+        """Returns the number of objects with an id in all energy systems in the resource set"""
+        return sum(len(getattr(resource, 'uuid_dict', ())) for resource in self.rset.resources.values())
+
+    def state_version(self):
+        """
+        Returns a value that changes whenever any of the energy systems in the resource set is changed, added or
+        removed, e.g. to check if a stored snapshot of the handler is still up to date
+        """
+        return tuple(support_functions.UUIDDictObserver.observe_resource(resource).version
+                     for resource in self.rset.resources.values())
+
+    @staticmethod
+    def _observe_resource(resource):
+        """Keeps the uuid_dict of the resource up to date when objects are added, removed or change their id"""
+        support_functions.UUIDDictObserver.observe_resource(resource)
+
+    @staticmethod
+    def _is_observed(resource):
+        return any(isinstance(listener, support_functions.UUIDDictObserver) for listener in resource.listeners)
 
-    # returns a generator of all assets of a specific type. Not only the ones defined in  the main Instance's Area
+    def check_uuid_dicts(self):
+        """
+        Debug consistency check of the uuid_dict of every energy system against the actual model contents
+        :returns: dict of es_id with a list of inconsistencies, only for energy systems that have any
+        """
+        result = dict()
+        for es_id in self.esid_uri_dict:
+            resource = self.get_resource(es_id)
+            if resource is not None:
+                problems = support_functions.find_uuid_dict_inconsistencies(resource)
+                if problems:
+                    logger.warning('uuid_dict of energy system {} is inconsistent: {}'.format(es_id, problems))
+                    result[es_id] = problems
+        return result
+
+    # returns a list of all assets of a specific type. Not only the ones defined in  the main Instance's Area
     # e.g. QuantityAndUnits can be defined in the KPI of an Area or in the EnergySystemInformation object
     # this function returns all of them at once
     # @staticmethod
     def get_all_instances_of_type(self, esdl_type, es_id):
-        all_instances = list()
-        for esdl_element in self.get_energy_system(es_id=es_id).eAllContents():
-            if isinstance(esdl_element, esdl_type):
-                all_instances.append(esdl_element)
-        return all_instances
-        #return esdl_type.allInstances()
+        es = self.get_energy_system(es_id=es_id)
+        return [esdl_element for esdl_element in self.instances_of(es_id, esdl_type) if esdl_element is not es]
+
+    def instances_of(self, es_id, esdl_type):
+        """
+        Returns all objects of an energy system that are an instance of esdl_type, including subtypes,
+        e.g. instances_of(es_id, esdl.EnergyAsset). Uses an index by type that is kept up to date by the
+        UUIDDictObserver of the resource, so this takes time proportional to the number of results.
+        :param esdl_type: an ESDL class (e.g. esdl.Pipe) or its EClass
+        """
+        resource = self.get_resource(es_id)
+        eclass = esdl_type if isinstance(esdl_type, EClass) else esdl_type.eClass
+        return support_functions.UUIDDictObserver.observe_resource(resource).instances_of(eclass)
 
     # Creates a dict of all the attributes of an ESDL object, useful for printing/debugging
     @staticmethod
@@ -394,6 +470,7 @@ class EnergySystemHandler:
 
         uri = StringURI('empty_energysystem.esdl')
         self.resource = self.rset.create_resource(uri)
+        self._observe_resource(self.resource)
         # add the current energy system
         self.resource.append(self.energy_system)
         self.esid_uri_dict[self.energy_system.id] = uri.normalize()
@@ -405,31 +482,46 @@ class EnergySystemHandler:
         area = esdl.Area(id=str(uuid4()), name=area_title, scope=esdl.AreaScopeEnum.from_string('UNDEFINED'))
         instance.area = area
 
-        # add generated id's to uuid dict
+        # add the id of the energy system to the uuid dict, instance and area are added by the UUIDDictObserver
         self.add_object_to_dict(es_id, self.energy_system)
-        self.add_object_to_dict(es_id, instance)
-        self.add_object_to_dict(es_id, area)
 
         return self.energy_system
 
+    def save_snapshot(self) -> bytes:
+        """
+        Returns a compact binary snapshot of all energy systems in the resource set, including the uuid_dicts.
+        Much faster than to_string() and load_from_string() for storing and restoring a session.
+        """
+        return snapshot.dump(self)
+
+    def load_snapshot(self, snapshot_bytes: bytes) -> esdl.EnergySystem:
+        """
+        Replaces the resource set by the energy systems in a snapshot created by save_snapshot()
+        :returns: the main EnergySystem
+        """
+        energy_system = snapshot.load(self, snapshot_bytes)
+        for resource in self.rset.resources.values():
+            self._observe_resource(resource)
+        return energy_system
+
     # Support for Pickling when serializing the energy system in a session
     # The pyEcore classes by default do not allow for simple serialization for Session management in Flask.
     # Internally Flask Sessions use Pickle to serialize a data structure by means of its __dict__. This does not work.
-    # Furthermore, ESDL can contain cyclic relations. Therefore we serialize to XMI and back if necessary.
+    # Furthermore, ESDL can contain cyclic relations. Therefore we serialize to a binary snapshot and back.
     def __getstate__(self):
         state = dict()
-        #print('Serialize rset {}'.format(self.rset.resources))
-        print('Serializing EnergySystem...', end ="")
-        state['energySystem'] = self.to_string()
-        print('done')
+        logger.debug('Serializing EnergySystem snapshot')
+        state['snapshot'] = self.save_snapshot()
         return state
 
     def __setstate__(self, state):
         self.__init__()
-        #print('Deserialize rset {}'.format(self.rset.resources))
-        print('Deserializing EnergySystem...', end="")
-        self.load_from_string(state['energySystem'])
-        print('done')
+        logger.debug('Deserializing EnergySystem snapshot')
+        if 'snapshot' in state:
+            self.load_snapshot(state['snapshot'])
+        else:
+            # state pickled by older versions, containing the XML of the main energy system
+            self.load_from_string(state['energySystem'])
 
 
     def update_version(self, es_id) -> str:
@@ -0,0 +1,126 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Connectivity index of an energy system, used for drawing the connections between assets.
+
+For every port it caches the asset it belongs to and the coordinate a connection to that port is drawn at, and for
+every asset (or building) the coordinate(s) of its geometry, so a polygon center is calculated only once. The
+adjacency itself is available as port.connectedTo, which pyecore keeps consistent on both sides.
+The index observes the resource and drops the cached entries of an asset when its geometry or ports change.
+"""
+from pyecore.ecore import EObject
+from pyecore.notification import EObserver, Notification
+from esdl import esdl
+from esdl.processing import ESDLGeometry
+
+
+class ConnectivityIndex(EObserver):
+    def __init__(self, resource):
+        super().__init__()
+        self.resource = resource
+        self._asset_coords = dict()    # asset -> coordinate(s) of the geometry of the asset
+        self._port_entries = dict()    # port -> (asset, coordinate of the port)
+
+    @staticmethod
+    def get_index(resource):
+        """Returns the ConnectivityIndex of a resource, creates it if it does not exist yet"""
+        for listener in resource.listeners:
+            if isinstance(listener, ConnectivityIndex):
+                return listener
+        index = ConnectivityIndex(resource)
+        index.observe(resource)
+        return index
+
+    def asset_coord(self, asset):
+        """
+        Coordinate(s) of the geometry of an asset: (lat, lon) for a Point, the center for a Polygon and
+        [first, last] for a Line, or () if the asset has no geometry
+        """
+        try:
+            return self._asset_coords[asset]
+        except KeyError:
+            pass
+        geom = asset.geometry
+        coord = ()
+        if isinstance(geom, esdl.Point):
+            coord = (geom.lat, geom.lon)
+        elif isinstance(geom, esdl.Line):
+            points = geom.point
+            coord = [(points[0].lat, points[0].lon), (points[len(points) - 1].lat, points[len(points) - 1].lon)]
+        elif isinstance(geom, esdl.Polygon):
+            coord = ESDLGeometry.calculate_polygon_center(geom)
+        self._asset_coords[asset] = coord
+        return coord
+
+    def building_coord(self, building):
+        """Coordinate of a (containing) building with a Point or Polygon geometry, None otherwise"""
+        if isinstance(building.geometry, (esdl.Point, esdl.Polygon)):
+            return self.asset_coord(building)
+        return None
+
+    def port_asset_and_coord(self, port):
+        """
+        Returns the asset of a port and the coordinate a connection to this port is drawn at: the first point of a
+        line for the first port, the last point for the second port, and the asset's coordinate otherwise
+        """
+        try:
+            return self._port_entries[port]
+        except KeyError:
+            pass
+        asset = port.eContainer()
+        coord = ()
+        if asset.geometry:
+            coord = self.asset_coord(asset)
+            if isinstance(asset.geometry, esdl.Line):
+                ports = asset.port
+                if ports[0] is port:
+                    coord = coord[0]
+                elif len(ports) > 1 and ports[1] is port:
+                    coord = coord[1]
+                else:
+                    coord = ()
+        entry = (asset, coord)
+        self._port_entries[port] = entry
+        return entry
+
+    def notifyChanged(self, notification: Notification):
+        # find the asset the changed object belongs to, e.g. the asset of a point of a line geometry
+        obj = notification.notifier
+        while obj is not None and not isinstance(obj, esdl.Asset):
+            obj = obj.eContainer()
+        if obj is not None:
+            self._invalidate(obj)
+        feature = notification.feature
+        if feature is not None and getattr(feature, 'containment', False):
+            # added or removed objects may have been changed while they were not observed
+            for value in (notification.old, notification.new):
+                if isinstance(value, EObject):
+                    self._invalidate_tree(value)
+                elif isinstance(value, (list, tuple)):
+                    for v in value:
+                        self._invalidate_tree(v)
+
+    def _invalidate(self, asset):
+        self._asset_coords.pop(asset, None)
+        if isinstance(asset, esdl.EnergyAsset):
+            for port in asset.port:
+                self._port_entries.pop(port, None)
+
+    def _invalidate_tree(self, eobject):
+        if not isinstance(eobject, EObject):
+            return
+        for obj in [eobject, *eobject.eAllContents()]:
+            self._asset_coords.pop(obj, None)
+            self._port_entries.pop(obj, None)
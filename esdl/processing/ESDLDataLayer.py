@@ -164,11 +164,20 @@ class ESDLDataLayer:
         es = esh.get_energy_system(active_es_id)
         area = es.instance[0].area
         object_list = list()
-        for area_asset in area.eAllContents():
-            if isinstance(area_asset, type):
+        for area_asset in esh.instances_of(active_es_id, type):
+            if area_asset is not area and ESDLDataLayer._is_contained_in(area_asset, area):
                 object_list.append({'id': area_asset.id, 'name': area_asset.name})
         return object_list
 
+    @staticmethod
+    def _is_contained_in(esdl_object, container):
+        parent = esdl_object.eContainer()
+        while parent is not None:
+            if parent is container:
+                return True
+            parent = parent.eContainer()
+        return False
+
     @staticmethod
     def remove_control_strategy(asset):
         active_es_id = get_session('active_es_id')
@@ -315,12 +324,14 @@ class ESDLDataLayer:
         active_es_id = get_session('active_es_id')
         esh = get_handler()
         es = esh.get_energy_system(active_es_id)
+        area = es.instance[0].area
 
         # module = importlib.import_module('esdl.esdl')
         # esdl_asset_class = getattr(module, asset_type)
 
-        for asset in es.instance[0].area.asset:
-            if isinstance(asset, esdl.getEClassifier(asset_type)):
+        # only the assets of the main area
+        for asset in esh.instances_of(active_es_id, esdl.getEClassifier(asset_type)):
+            if asset.eContainer() is area:
                 asset_list.append(asset)
 
         return asset_list
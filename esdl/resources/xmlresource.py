@@ -12,13 +12,26 @@
 #  Manager:
 #      TNO
 
-from pyecore.resources.xmi import XMIResource, XMIOptions, XMI_URL, XSI_URL, XSI
-from lxml.etree import QName, Element, ElementTree
+from enum import Enum, unique
+from pyecore.ecore import EDataType, EProxy
+from pyecore.resources.xmi import XMIResource, XMIOptions, XMI_URL, XSI_URL, XSI, XMI
+from lxml.etree import QName, Element, ElementTree, iterparse
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+
+@unique
+class XMLOptions(Enum):
+    STREAMING_LOAD = 0
+
+
+# markers used on the element stack of the streaming loader
+_XMI_ROOT = object()    # the <xmi:XMI> wrapper element containing multiple roots
+_DEFERRED = object()    # element with a text value, decoded when the element closes
+_SKIP = object()        # element (and children) that is not decoded into an EObject
+
 """
 Extension of pyecore's XMIResource to support the XMLResource in EMF.
 It basically removes the xmi:version stuff from the serialization.
@@ -35,6 +48,94 @@ class XMLResource(XMIResource):
     def get_parse_information(self):
         return self.parse_information
 
+    def load(self, options=None):
+        """
+        Loads the resource. By default the complete XML tree is parsed first (pyecore's XMIResource behaviour).
+        When options contains XMLOptions.STREAMING_LOAD: True, the XML is parsed incrementally and each XML
+        element is released as soon as it has been converted, which keeps peak memory low for large ESDLs.
+        """
+        options = options or {}
+        if not options.get(XMLOptions.STREAMING_LOAD, False):
+            return super().load(options)
+
+        self.options = options
+        self.cache_enabled = True
+        stack = []
+        for event, node in iterparse(self.uri.create_instream(), events=('start', 'end')):
+            if event == 'start':
+                if not stack:
+                    stack.append(self._init_streaming_root(node))
+                    continue
+                parent = stack[-1]
+                if parent is _XMI_ROOT:
+                    stack.append(self._init_modelroot(node))
+                elif parent is _SKIP or parent is _DEFERRED:
+                    stack.append(_SKIP)
+                elif self._is_text_node(parent, node):
+                    # the text of an element is only complete when the element is closed
+                    stack.append(_DEFERRED)
+                else:
+                    stack.append(self._decode_streaming_node(node, parent))
+            else:
+                current = stack.pop()
+                if current is _DEFERRED:
+                    self._decode_streaming_node(node, stack[-1])
+                # release the parsed element and its already processed siblings
+                node.clear()
+                parent_node = node.getparent()
+                if parent_node is not None:
+                    while node.getprevious() is not None:
+                        del parent_node[0]
+
+        if self.contents:
+            self._decode_ereferences()
+
+        self._clean_registers()
+        self.uri.close_stream()
+
+    def _init_streaming_root(self, xmlroot):
+        self.prefixes.update(xmlroot.nsmap)
+        self.reverse_nsmap = {v: k for k, v in self.prefixes.items()}
+
+        self.xsitype = '{{{}}}type'.format(self.prefixes.get(XSI))
+        self.xmiid = '{{{}}}id'.format(self.prefixes.get(XMI))
+        self.schema_tag = '{{{}}}schemaLocation'.format(self.prefixes.get(XSI))
+
+        self.schema_locations = {}
+        schema_tag_list = xmlroot.attrib.get(self.schema_tag, '').split()
+        for prefix, path in zip(schema_tag_list[::2], schema_tag_list[1::2]):
+            if '#' not in path:
+                path = path + '#'
+            self.schema_locations[prefix] = EProxy(path, self)
+
+        if '{{{}}}XMI'.format(self.prefixes.get(XMI)) == xmlroot.tag:
+            return _XMI_ROOT
+        return self._init_modelroot(xmlroot)
+
+    def _is_text_node(self, parent_eobj, node):
+        _, node_tag = self.extract_namespace(node.tag)
+        feature = self._find_feature(parent_eobj.eClass, node_tag)
+        return feature is not None and self._type_attribute(node) is None and isinstance(feature._eType, EDataType)
+
+    def _decode_streaming_node(self, node, parent_eobj):
+        """Same as XMIResource._decode_eobject(), but without recursing into the children of the node"""
+        feat_container, eobject, eatts, erefs, from_tag = self._decode_node(parent_eobj, node)
+
+        for eattribute, value in eatts:
+            self._decode_eattribute_value(eobject, eattribute, value, from_tag)
+
+        if erefs:
+            self._later.append((eobject, erefs))
+
+        if not feat_container:
+            return _SKIP
+
+        if feat_container.many:
+            parent_eobj.__getattribute__(feat_container.name).append(eobject)
+        else:
+            parent_eobj.__setattr__(feat_container.name, eobject)
+        return eobject
+
     def save(self, output=None, options=None):
         self.options = options or {}
         output = self.open_out_stream(output)
@@ -0,0 +1,283 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Compact binary snapshots of all resources in an EnergySystemHandler.
+
+Serializing to XML and parsing it again is as slow as a full save and load. A snapshot stores the containment tree
+as a flat table of objects, where every object is identified by its position in that table. Containment and
+cross references are stored as integer indices into that table, attribute values are stored as plain Python values
+and the uuid_dict of every resource (the id table) is stored as (id, index) pairs. The result is pickled.
+
+Layout: MAGIC | version (unsigned short, big endian) | pickled payload
+"""
+import gc
+import pickle
+import struct
+
+from pyecore.ecore import EEnum, EProxy
+from pyecore.valuecontainer import EValue
+from pyecore.resources import global_registry
+
+MAGIC = b'ESDLSNAP'
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('>H')
+
+
+class _ClassInfo:
+    """Features of an EClass that are stored in a snapshot, cached per EClass"""
+    def __init__(self, eclass):
+        self.attributes = []
+        self.containments = []
+        self.references = []
+        for feature in eclass.eAllStructuralFeatures():
+            if feature.derived or feature.transient:
+                continue
+            if feature.is_attribute:
+                self.attributes.append((feature, feature.name, feature.many, isinstance(feature._eType, EEnum)))
+            elif feature.containment:
+                self.containments.append((feature, feature.name, feature.many))
+            elif not (feature.eOpposite and feature.eOpposite.containment):
+                # container references are restored through the containment
+                self.references.append((feature, feature.name, feature.many))
+
+
+def dump(esh) -> bytes:
+    """Creates a snapshot of all resources in the resource set of the EnergySystemHandler"""
+    classes = []            # (nsURI, EClass name)
+    class_index = {}
+    class_info = {}
+    features = []           # feature names
+    feature_index = {}
+    objects = []            # (class idx, container idx, containment feature idx, ((feature idx, value), ...))
+    eobjects = []           # the EObject of each entry in objects
+    object_index = {}       # id(EObject) -> index in objects
+    references = []         # (object idx, feature idx, target or list of targets)
+    resources = []          # (uri, first object idx, ((id, object idx), ...))
+
+    def get_class_index(eclass):
+        try:
+            return class_index[eclass]
+        except KeyError:
+            class_index[eclass] = len(classes)
+            classes.append((eclass.ePackage.nsURI, eclass.name))
+            class_info[eclass] = _ClassInfo(eclass)
+            return class_index[eclass]
+
+    def get_feature_index(name):
+        try:
+            return feature_index[name]
+        except KeyError:
+            feature_index[name] = len(features)
+            features.append(name)
+            return feature_index[name]
+
+    def add_object(eobject, container_idx, containment_feature_idx):
+        eclass = eobject.eClass
+        eclass_idx = get_class_index(eclass)
+        isset = eobject._isset
+        attributes = []
+        for feature, name, many, is_enum in class_info[eclass].attributes:
+            if feature not in isset:
+                continue
+            value = eobject.__getattribute__(name)
+            if is_enum:
+                value = [v.name for v in value] if many else (value.name if value is not None else None)
+            elif many:
+                value = list(value)
+            attributes.append((get_feature_index(name), value))
+        idx = len(objects)
+        object_index[id(eobject)] = idx
+        objects.append((eclass_idx, container_idx, containment_feature_idx, tuple(attributes)))
+        eobjects.append(eobject)
+
+        for feature, name, many in class_info[eclass].containments:
+            if feature not in isset:
+                continue
+            value = eobject.__getattribute__(name)
+            if many:
+                for child in value:
+                    add_object(child, idx, get_feature_index(name))
+            elif value is not None:
+                add_object(value, idx, get_feature_index(name))
+
+    for uri, resource in esh.rset.resources.items():
+        first = len(objects)
+        for root in resource.contents:
+            add_object(root, -1, -1)
+        resources.append([uri, first, None])
+
+    def encode_target(target, resource):
+        if target is None:
+            return None
+        if type(target) is EProxy:
+            return object.__getattribute__(target, '_proxy_path')
+        try:
+            return object_index[id(target)]
+        except KeyError:
+            # object outside of the resource set, store it as an external reference (proxy)
+            path, _ = resource._build_path_from(target)
+            return path
+
+    # second pass, all objects are known now so cross references can be encoded as indices
+    resource_bounds = [r[1] for r in resources[1:]] + [len(objects)]
+    for resource_item, last in zip(resources, resource_bounds):
+        resource = esh.rset.resources[resource_item[0]]
+        for idx in range(resource_item[1], last):
+            eobject = eobjects[idx]
+            isset = eobject._isset
+            for feature, name, many in class_info[eobject.eClass].references:
+                if feature not in isset:
+                    continue
+                value = eobject.__getattribute__(name)
+                if many:
+                    value = [encode_target(v, resource) for v in value]
+                else:
+                    value = encode_target(value, resource)
+                references.append((idx, get_feature_index(name), value))
+        resource_item[2] = tuple((key, object_index[id(eobject)]) for key, eobject in resource.uuid_dict.items()
+                                 if id(eobject) in object_index)
+
+    main_uri = None
+    for uri, resource in esh.rset.resources.items():
+        if resource is esh.resource:
+            main_uri = uri
+
+    payload = {
+        'classes': classes,
+        'features': features,
+        'objects': objects,
+        'references': references,
+        'resources': resources,
+        'main_resource': main_uri,
+        'esid_uri_dict': dict(esh.esid_uri_dict),
+    }
+    return MAGIC + _HEADER.pack(SNAPSHOT_VERSION) + pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load(esh, snapshot: bytes):
+    """
+    Restores a snapshot created by dump() into a *new* resource set of the EnergySystemHandler
+    :raises ValueError: when the data is not a snapshot or has an unsupported version
+    """
+    if snapshot[:len(MAGIC)] != MAGIC:
+        raise ValueError('Data is not an ESDL snapshot')
+    version, = _HEADER.unpack_from(snapshot, len(MAGIC))
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported ESDL snapshot version {} (expected {})'.format(version, SNAPSHOT_VERSION))
+    payload = pickle.loads(snapshot[len(MAGIC) + _HEADER.size:])
+
+    # creating many cyclic objects triggers lots of (useless) garbage collection runs
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load_payload(esh, payload)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _load_payload(esh, payload):
+    # imported here, as esdl_handler imports this module
+    from esdl.esdl_handler import StringURI
+
+    classes = [global_registry[ns_uri].getEClassifier(name) for ns_uri, name in payload['classes']]
+    features = payload['features']
+    feature_cache = {}
+
+    def find_feature(eobject, idx):
+        key = (type(eobject), idx)
+        try:
+            return feature_cache[key]
+        except KeyError:
+            feature = eobject.eClass.findEStructuralFeature(features[idx])
+            enum_type = feature._eType if isinstance(feature._eType, EEnum) else None
+            feature_cache[key] = feature, feature.name, feature.many, enum_type
+            return feature_cache[key]
+
+    esh._new_resource_set()
+    objects = []
+    resource_bounds = [r[1] for r in payload['resources'][1:]] + [len(payload['objects'])]
+    resources = []
+    for (uri, first, _), last in zip(payload['resources'], resource_bounds):
+        resource = esh.rset.create_resource(StringURI(uri))
+        if uri not in esh.rset.resources:
+            esh.rset.resources[uri] = esh.rset.resources.pop(resource.uri.normalize())
+        resources.append(resource)
+        roots = []
+        for class_idx, container_idx, containment_idx, attributes in payload['objects'][first:last]:
+            eobject = classes[class_idx]()
+            eobject_dict = eobject.__dict__
+            for feature_idx, value in attributes:
+                feature, name, many, enum_type = find_feature(eobject, feature_idx)
+                if enum_type is not None:
+                    if many:
+                        value = [enum_type.getEEnumLiteral(v) for v in value]
+                    elif value is not None:
+                        value = enum_type.getEEnumLiteral(value)
+                if many:
+                    eobject.__getattribute__(name).extend(value)
+                else:
+                    # values come from a valid model and nobody listens to a new object yet,
+                    # so the type check and notification of a normal set can be skipped
+                    evalue = EValue(eobject, feature)
+                    evalue._value = value
+                    eobject_dict[name] = evalue
+                    eobject._isset.add(feature)
+            if container_idx < 0:
+                roots.append(eobject)
+            else:
+                container = objects[container_idx]
+                feature, name, many, _ = find_feature(container, containment_idx)
+                if many:
+                    container.__getattribute__(name).append(eobject)
+                else:
+                    container.__setattr__(name, eobject)
+            objects.append(eobject)
+        # add the roots after their content is complete, so building the tree does not notify resource listeners
+        for root in roots:
+            resource.append(root)
+
+    references = payload['references']
+    ref_idx = 0
+    for resource, last in zip(resources, resource_bounds):
+        while ref_idx < len(references) and references[ref_idx][0] < last:
+            object_idx, feature_idx, value = references[ref_idx]
+            ref_idx += 1
+            eobject = objects[object_idx]
+            feature, name, many, _ = find_feature(eobject, feature_idx)
+            if many:
+                collection = eobject.__getattribute__(name)
+                for target in value:
+                    collection.append(objects[target] if isinstance(target, int) else _decode_proxy(target, resource))
+            elif value is None or isinstance(value, int):
+                eobject.__setattr__(name, objects[value] if value is not None else None)
+            else:
+                eobject.__setattr__(name, _decode_proxy(value, resource))
+
+    for resource, (_, _, id_table) in zip(resources, payload['resources']):
+        resource.uuid_dict.update((key, objects[idx]) for key, idx in id_table)
+
+    esh.esid_uri_dict = dict(payload['esid_uri_dict'])
+    if payload['main_resource'] is not None:
+        esh.resource = esh.rset.resources[payload['main_resource']]
+    elif resources:
+        esh.resource = resources[0]
+    if esh.resource is not None and esh.resource.contents:
+        esh.energy_system = esh.resource.contents[0]
+    return esh.energy_system
+
+
+def _decode_proxy(path, resource):
+    return EProxy(path=path, resource=resource)
@@ -26,8 +26,12 @@
 Support functions for managing EObjects
 """
 from pyecore.ecore import EAttribute, EObject, EClass, EReference, EStructuralFeature
+from pyecore.notification import EObserver, Kind, Notification
 from pyecore.valuecontainer import ECollection
+import itertools
 import logging
+import os
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -131,70 +135,178 @@ def deepcopy(self, memo=None):
     copy._isset = set(self._isset)  # copy over the eIsSet configuration, otherwise all attributes are set due to this deepcopy
     return copy
 
-    # show deleted object from memory
-    # setattr(EObject, '__del__', lambda x: print('Deleted {}'.format(x.eClass.name)))
-
-    # def update_id(n: Notification):
-    #     if isinstance(n.feature, EAttribute):
-    #         #print(n)
-    #         if n.feature.name == 'id':
-    #             resource = n.notifier.eResource
-    #             if resource is not None and (n.kind != Kind.UNSET and n.kind != Kind.REMOVE):
-    #                 print('ADDING to UUID dict {}#{}, notification type {}'.format(n.notifier.eClass.name, n.feature.name, n.kind.name))
-    #                 resource.uuid_dict[n.new] = n.notifier
-    #                 if n.old is not None and n.old is not '':
-    #                     del resource.uuid_dict[n.old]
-    # observer = EObserver()
-    # observer.notifyChanged = update_id
-    #
-    # old_init = EObject.__init__
-    # def new_init(self, **kwargs):
-    #     observer.observe(self)
-    #     old_init(self, **kwargs)
-    #
-    # setattr(EObject, '__init__', new_init)
-
-    # Methods to automatically update the uuid_dict.
-    # Currently disabled, because it does not work in all circumstances
-    # This only works when the object which id is to be added to the dict is already part
-    # of the energysystem xml tree, otherwise there is no way of knowing to which uuid_dict it should be added.
-    # E.g.
-    # > asset = esdl.Asset(id='uuid)
-    # > asset.port.append(esdl.InPort(id='uuid)) # this does not work because asset is not part of the energy system yet
-    # > area.asset.append(asset) #works for asset, but not for port. In order to have port working too, this statement
-    # should be executed bofore adding the port...
-
-    # old_set = EObject.__setattr__
-    # def updated_set(self, feature, value):
-    #     old_set(self, feature, value)
-    #     #if feature == 'id':
-    #     #print('Feature :{}#{}, value={}, resource={}'.format(self.eClass.name, feature, value, '?'))
-    #     #if isinstance(feature, EReference):
-    #     if hasattr(value, 'id') and feature[0] != '_':
-    #         print('*****Update uuid_dict {}#{} for {}#id'.format(self.eClass.name, feature, value.eClass.name))
-    #         self.eResource.uuid_dict[value.id] = value
-    # setattr(EObject, '__setattr__', updated_set)
-    #
-    #
-    #
-    # old_append = EAbstractSet.append
-    # def updated_append(self, value, update_opposite=True):
-    #     old_append(self, value, update_opposite)
-    #     #print('EAbstractSet :{}, value={}, resource={}, featureEr={}'.format(self, value, value.eResource, self.feature.eResource))
-    #     if hasattr(value, 'id'):
-    #         if self.feature.eResource:
-    #             print('****Update uuid_dict AbstractSet-{}#id'.format(value.eClass.name))
-    #             self.feature.eResource.uuid_dict[value.id] = value
-    #         elif value.eResource:
-    #             print('****Update uuid_dict AbstractSet-{}#id'.format(value.eClass.name))
-    #             value.eResource.uuid_dict[value.id] = value
-    #
-    # setattr(EAbstractSet, 'append', updated_append)
-
-
-
-
-    # def toJSON(self):
-    #     return json.dumps(self, default=lambda o: list(o),
-    #                       sort_keys=True, indent=4)
-    # setattr(EOrderedSet, 'toJSON', toJSON)
\ No newline at end of file
+
+class UUIDDictObserver(EObserver):
+    """
+    Keeps the uuid_dict of a resource up to date while the model is edited, based on the notifications pyecore
+    sends for every change of an object in the resource:
+    - objects added to a containment reference are registered, including all their (already existing) contents
+    - objects removed from a containment reference are unregistered, including all their contents
+    - a changed id is re-registered under the new id
+
+    This also works for objects that are built outside of a resource (e.g. an asset with ports that is created first
+    and added to an area later), as their contents are registered at the moment they are added to the resource.
+    Use observe_resource() to start observing a resource, after it has been loaded.
+
+    The observer also maintains an index of all objects in the resource by EClass (including all supertypes), that
+    is used by instances_of(). It is built on first use, so resources that are never queried by type don't pay for it.
+
+    version changes on every change of the resource and is unique over all resources and processes (a random id of
+    the process and a counter), so it can be used to check if something that was calculated from the resource is
+    still up to date, also when that is stored in a session that is shared between workers.
+    """
+    def __init__(self, resource):
+        super().__init__()
+        self.resource = resource
+        self.type_index = None
+        self.version = _next_version()
+
+    @staticmethod
+    def observe_resource(resource):
+        for listener in resource.listeners:
+            if isinstance(listener, UUIDDictObserver):
+                return listener
+        observer = UUIDDictObserver(resource)
+        observer.observe(resource)
+        return observer
+
+    def notifyChanged(self, notification: Notification):
+        self.version = _next_version()
+        feature = notification.feature
+        if feature is None:
+            return
+        kind = notification.kind
+        if isinstance(feature, EAttribute):
+            if feature.iD and kind in (Kind.SET, Kind.UNSET):
+                self._unregister_id(notification.old, notification.notifier)
+                self._register_id(notification.new, notification.notifier)
+        elif feature.containment:
+            if kind in (Kind.SET, Kind.UNSET):
+                if notification.old is not notification.new:
+                    self.unregister(notification.old)
+                    self.register(notification.new)
+            elif kind == Kind.ADD:
+                self.register(notification.new)
+            elif kind == Kind.ADD_MANY:
+                for value in notification.new:
+                    self.register(value)
+            elif kind == Kind.REMOVE:
+                self.unregister(notification.old)
+            elif kind == Kind.REMOVE_MANY:
+                for value in notification.old:
+                    self.unregister(value)
+
+    def register(self, eobject):
+        """Adds an object and all its contents to the uuid_dict and the type index"""
+        if not isinstance(eobject, EObject):
+            return
+        type_index = self.type_index
+        for obj in [eobject, *eobject.eAllContents()]:
+            self._register_id(_get_id(obj), obj)
+            if type_index is not None:
+                for eclass in _get_types(obj.eClass):
+                    type_index.setdefault(eclass, dict())[obj] = None
+
+    def unregister(self, eobject):
+        """Removes an object and all its contents from the uuid_dict and the type index"""
+        if not isinstance(eobject, EObject):
+            return
+        type_index = self.type_index
+        for obj in [eobject, *eobject.eAllContents()]:
+            self._unregister_id(_get_id(obj), obj)
+            if type_index is not None:
+                for eclass in _get_types(obj.eClass):
+                    type_index.get(eclass, dict()).pop(obj, None)
+
+    def instances_of(self, eclass):
+        """
+        Returns all objects in the resource that are an instance of eclass (or of one of its subtypes), in
+        document order for the objects that were part of the resource when the index was built.
+        """
+        if self.type_index is None:
+            type_index = dict()
+            for root in self.resource.contents:
+                for obj in [root, *root.eAllContents()]:
+                    for obj_eclass in _get_types(obj.eClass):
+                        type_index.setdefault(obj_eclass, dict())[obj] = None
+            self.type_index = type_index
+        return list(self.type_index.get(eclass, ()))
+
+    def _register_id(self, object_id, eobject):
+        if object_id:
+            self.resource.uuid_dict[object_id] = eobject
+
+    def _unregister_id(self, object_id, eobject):
+        # only remove the entry if it still refers to this object (another object may use the same id now)
+        if object_id and self.resource.uuid_dict.get(object_id) is eobject:
+            del self.resource.uuid_dict[object_id]
+
+
+_versions = itertools.count()
+_process_id = uuid.uuid4().hex
+_id_attributes = dict()
+_types = dict()
+
+
+def _next_version():
+    return _process_id, next(_versions)
+
+
+def _renew_process_id():
+    # a forked worker must not continue with the versions of its parent
+    global _process_id
+    _process_id = uuid.uuid4().hex
+
+
+os.register_at_fork(after_in_child=_renew_process_id)
+
+
+def _get_types(eclass):
+    """An EClass and all its supertypes, cached per EClass"""
+    try:
+        return _types[eclass]
+    except KeyError:
+        _types[eclass] = (eclass, *eclass.eAllSuperTypes())
+        return _types[eclass]
+
+
+def _get_id(eobject):
+    eclass = eobject.eClass
+    try:
+        id_attribute = _id_attributes[eclass]
+    except KeyError:
+        id_attribute = eclass.findEStructuralFeature('id')
+        if not (isinstance(id_attribute, EAttribute) and id_attribute.iD):
+            id_attribute = None
+        _id_attributes[eclass] = id_attribute
+    if id_attribute is None:
+        return None
+    return eobject.__getattribute__(id_attribute.name)
+
+
+def find_uuid_dict_inconsistencies(resource):
+    """
+    Debug helper that compares the uuid_dict of a resource with the objects that are actually in the resource.
+    :return: list of messages describing the inconsistencies, empty if the uuid_dict is consistent
+    """
+    problems = []
+    contained = set()
+    for root in resource.contents:
+        for obj in [root, *root.eAllContents()]:
+            contained.add(id(obj))
+            object_id = _get_id(obj)
+            if object_id is None:
+                continue
+            registered = resource.uuid_dict.get(object_id)
+            if registered is None:
+                problems.append('{} with id {} is missing in uuid_dict'.format(obj.eClass.name, object_id))
+            elif registered is not obj:
+                problems.append('id {} of {} refers to another {} in uuid_dict'.format(
+                    object_id, obj.eClass.name, registered.eClass.name))
+    for key, obj in resource.uuid_dict.items():
+        if id(obj) not in contained:
+            problems.append('uuid_dict entry {} refers to {} that is not part of the resource'.format(
+                key, obj.eClass.name if isinstance(obj, EObject) else type(obj).__name__))
+        elif _get_id(obj) != key:
+            problems.append('uuid_dict entry {} refers to {} with id {}'.format(key, obj.eClass.name, _get_id(obj)))
+    return problems
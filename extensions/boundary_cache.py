@@ -0,0 +1,245 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Tiered cache for the replies of the boundary service, keyed by (year, scope, id).
+
+The first tier is an in-process LRU cache that is limited in (JSON) bytes, the second tier is a SQLite file that
+survives restarts and is shared by all workers of a deployment. Entries expire after a TTL and the least recently
+used entries are removed from the file when it grows beyond its size budget.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import src.log as log
+from src.metrics import metrics
+
+logger = log.get_logger(__name__)
+
+# number of puts after which the size of the file is checked
+_CHECK_FILE_SIZE_INTERVAL = 100
+
+_requests = metrics.counter('mapeditor_boundary_cache_requests_total', 'Lookups of boundaries in the boundary cache',
+                            ['tier', 'result'])
+_memory_bytes = metrics.gauge('mapeditor_boundary_cache_memory_bytes', 'Size of the boundaries in the in-process '
+                              'boundary cache')
+
+
+class BoundaryCache:
+    def __init__(self, memory_size, file=None, file_size=None, ttl=None):
+        """
+        :param memory_size: maximum size in bytes of the in-process cache
+        :param file: path of the SQLite file, None or '' to use only the in-process cache
+        :param file_size: maximum size in bytes of the boundaries in the SQLite file
+        :param ttl: time in seconds after which a boundary must be retrieved again, None for no expiration
+        """
+        self.memory_size = memory_size
+        self.file = file or None
+        self.file_size = file_size
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()    # key -> (value, size, expires)
+        self._memory_bytes = 0
+        self._local = threading.local()
+        self._puts = 0
+        self._file_failed = False
+
+    @staticmethod
+    def key(year, scope, id):
+        return '{}/{}/{}'.format(year, scope, id)
+
+    def get(self, year, scope, id):
+        """Returns the cached boundary, or None if it is not cached or has expired"""
+        key = self.key(year, scope, id)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] is None or entry[2] > time.time():
+                    self._memory.move_to_end(key)
+                    _requests.inc(tier='memory', result='hit')
+                    return entry[0]
+                self._remove_from_memory(key)
+        _requests.inc(tier='memory', result='miss')
+        found = self._read_file([key])
+        if key in found:
+            text, expires = found[key]
+            value = json.loads(text)
+            self._add_to_memory(key, value, len(text), expires)
+            return value
+        return None
+
+    def put(self, year, scope, id, value):
+        self.put_many(year, scope, {id: value})
+
+    def put_many(self, year, scope, values):
+        """Adds a dict with id -> boundary to the cache"""
+        expires = time.time() + self.ttl if self.ttl else None
+        rows = []
+        for id, value in values.items():
+            if value is None:
+                continue
+            key = self.key(year, scope, id)
+            text = json.dumps(value)
+            self._add_to_memory(key, value, len(text), expires)
+            rows.append((key, text, len(text), expires, time.time()))
+        self._write_file(rows)
+
+    def prefetch(self, year, scope, ids):
+        """
+        Loads the boundaries with the given ids from the file into memory, using a single query
+        :return: the ids that are not cached
+        """
+        missing = []
+        with self._lock:
+            for id in ids:
+                entry = self._memory.get(self.key(year, scope, id))
+                if entry is None or (entry[2] is not None and entry[2] <= time.time()):
+                    missing.append(id)
+        _requests.inc(len(ids) - len(missing), tier='memory', result='hit')
+        _requests.inc(len(missing), tier='memory', result='miss')
+        if not missing:
+            return []
+        found = self._read_file([self.key(year, scope, id) for id in missing])
+        not_cached = []
+        for id in missing:
+            key = self.key(year, scope, id)
+            if key in found:
+                text, expires = found[key]
+                self._add_to_memory(key, json.loads(text), len(text), expires)
+            else:
+                not_cached.append(id)
+        return not_cached
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            _memory_bytes.set(0)
+        connection = self._connection()
+        if connection is not None:
+            with connection:
+                connection.execute('DELETE FROM boundaries')
+
+    # -----------------------------------------------------------------------------------------------------------------
+    #  In-process LRU cache
+    # -----------------------------------------------------------------------------------------------------------------
+    def _add_to_memory(self, key, value, size, expires):
+        if size > self.memory_size:
+            return
+        with self._lock:
+            self._remove_from_memory(key)
+            self._memory[key] = (value, size, expires)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_size:
+                _, (_, removed_size, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= removed_size
+            _memory_bytes.set(self._memory_bytes)
+
+    def _remove_from_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+            _memory_bytes.set(self._memory_bytes)
+
+    # -----------------------------------------------------------------------------------------------------------------
+    #  SQLite file
+    # -----------------------------------------------------------------------------------------------------------------
+    def _connection(self):
+        if self.file is None or self._file_failed:
+            return None
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            try:
+                directory = os.path.dirname(self.file)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(self.file, timeout=30)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('CREATE TABLE IF NOT EXISTS boundaries (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                                   'size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL)')
+                connection.commit()
+            except sqlite3.Error as e:
+                logger.error('Cannot use boundary cache file {}: {}'.format(self.file, e))
+                self._file_failed = True
+                return None
+            self._local.connection = connection
+        return connection
+
+    def _read_file(self, keys):
+        """Returns a dict with key -> (json text, expires) of the keys that are in the file and have not expired"""
+        connection = self._connection()
+        if connection is None or not keys:
+            return {}
+        found = {}
+        now = time.time()
+        try:
+            # stay below the maximum number of variables of a SQLite statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = connection.execute(
+                    'SELECT key, value, expires FROM boundaries WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                    .format(','.join('?' * len(chunk))), (*chunk, now)).fetchall()
+                for key, value, expires in rows:
+                    found[key] = (value, expires)
+            if found:
+                with connection:
+                    connection.executemany('UPDATE boundaries SET accessed = ? WHERE key = ?',
+                                           [(now, key) for key in found])
+        except sqlite3.Error as e:
+            logger.warning('Error reading boundary cache file: {}'.format(e))
+        _requests.inc(len(found), tier='file', result='hit')
+        _requests.inc(len(keys) - len(found), tier='file', result='miss')
+        return found
+
+    def _write_file(self, rows):
+        connection = self._connection()
+        if connection is None or not rows:
+            return
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO boundaries (key, value, size, expires, accessed) '
+                                       'VALUES (?, ?, ?, ?, ?)', rows)
+            with self._lock:
+                self._puts += len(rows)
+                check_size = self._puts >= _CHECK_FILE_SIZE_INTERVAL
+                if check_size:
+                    self._puts = 0
+            if check_size:
+                self._limit_file_size(connection)
+        except sqlite3.Error as e:
+            logger.warning('Error writing boundary cache file: {}'.format(e))
+
+    def _limit_file_size(self, connection):
+        with connection:
+            connection.execute('DELETE FROM boundaries WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+            if self.file_size is None:
+                return
+            total, = connection.execute('SELECT COALESCE(SUM(size), 0) FROM boundaries').fetchone()
+            if total <= self.file_size:
+                return
+            # remove the least recently used boundaries until the budget is met, leaving some room
+            to_remove = total - int(self.file_size * 0.9)
+            removed = 0
+            keys = []
+            for key, size in connection.execute('SELECT key, size FROM boundaries ORDER BY accessed'):
+                keys.append((key,))
+                removed += size
+                if removed >= to_remove:
+                    break
+            connection.executemany('DELETE FROM boundaries WHERE key = ?', keys)
+            logger.info('Removed {} boundaries ({} bytes) from the boundary cache file'.format(len(keys), removed))
@@ -17,6 +17,8 @@ from flask_socketio import SocketIO, emit
 
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import json
 import uuid
 import re
@@ -24,12 +26,14 @@ import os
 
 from esdl import esdl
 from esdl.processing import ESDLGeometry
+from extensions.boundary_cache import BoundaryCache
 from extensions.session_manager import get_handler, get_session, set_session
 from extensions.settings_storage import SettingsStorage
 
-from src.shape import Shape
+from src.shape import Shape, ShapeDictionary
 import src.settings as settings
 import src.log as log
+from src.metrics import track_executor
 
 logger = log.get_logger(__name__)
 
@@ -60,8 +64,9 @@ boundary_service_mapping = {
     'COUNTRY': 'countries'
 }
 
-#create a cache for the boundary service
-boundary_cache = dict()
+# cache for the boundary service, in memory and in a file that is shared by all workers
+boundary_cache = BoundaryCache(settings.boundary_cache_config["memory_size"], settings.boundary_cache_config["file"],
+                               settings.boundary_cache_config["file_size"], settings.boundary_cache_config["ttl"])
 DEFAULT_BOUNDARIES_YEAR = 2019
 
 
@@ -78,6 +83,13 @@ class BoundaryService:
         self.socketio = socket
         self.settings_storage = settings_storage
         self.plugin_settings = self.get_settings()
+
+        # reuse connections to the boundary service, also when retrieving boundaries in parallel
+        max_workers = settings.boundaries_config["max_workers"]
+        self.http = requests.Session()
+        self.http.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='boundary_service')
+        track_executor('boundary_service', self.executor)
         self.register()
 
         if settings.boundaries_config["host"] is None or settings.boundaries_config["host"] == "":
@@ -122,7 +134,7 @@ class BoundaryService:
                     url = 'http://' + settings.boundaries_config["host"] + ':' + settings.boundaries_config["port"] + \
                           settings.boundaries_config["path_names"] + '/YEAR/' + boundaries_year + '/' + scope_type
                     print(url)
-                    r = requests.get(url)
+                    r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                     if len(r.text) > 0:
                         reply = json.loads(r.text)
                         return {"boundaries_names": reply}
@@ -145,7 +157,7 @@ class BoundaryService:
                           settings.boundaries_config["path_names"] + '/YEAR/' + boundaries_year + '/' \
                           + select_scope_type + '/' + select_scope_id + '/' + scope_type
                     print(url)
-                    r = requests.get(url)
+                    r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                     if len(r.text) > 0:
                         reply = json.loads(r.text)
                         return {"boundaries_names": reply}
@@ -176,7 +188,7 @@ class BoundaryService:
 
             shape_dictionary = get_session('shape_dictionary')
             if not shape_dictionary:
-                shape_dictionary = {}
+                shape_dictionary = ShapeDictionary()
 
             identifier = info["identifier"]
             toparea_name = info["toparea_name"]
@@ -459,24 +471,23 @@ class BoundaryService:
         if is_valid_boundary_id(id):
             time.sleep(0.01) # yield a little concurrency when running this in a thread
 
-            if str(year)+id in boundary_cache:
+            cached_boundary = boundary_cache.get(year, scope.name, id)
+            if cached_boundary is not None:
                 # print('Retrieve boundary from cache', str(year)+id)
-                # res_boundary = copy.deepcopy(boundary_cache[id])   # this doesn't solve messing up cache
-                # return res_boundary
-                return boundary_cache[str(year)+id]
+                return cached_boundary
 
             try:
                 url = 'http://' + settings.boundaries_config["host"] + ':' + settings.boundaries_config["port"] + \
                       settings.boundaries_config["path_boundaries"] + '/YEAR/' + str(year) + '/' + boundary_service_mapping[scope.name] + '/' + id
                 # print('Retrieve from boundary service', id)
-                r = requests.get(url)
+                r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                 if len(r.text) > 0:
                     reply = json.loads(r.text)
                     # geom = reply['geom']
                     # {'type': 'MultiPolygon', 'coordinates': [[[[253641.50000000006, 594417.8126220703], [253617, .... ,
                     # 594477.125], [253641.50000000006, 594417.8126220703]]]]}, 'code': 'BU00030000', 'name': 'Appingedam-Centrum',
                     # 'tCode': 'GM0003', 'tName': 'Appingedam'}
-                    boundary_cache[str(year)+id] = reply
+                    boundary_cache.put(year, scope.name, id, reply)
                     return reply
                 else:
                     print("WARNING: Empty response for Boundary service for {} with id {}".format(scope.name, id))
@@ -497,21 +508,19 @@ class BoundaryService:
         if is_valid_boundary_id(scope_id):
             time.sleep(0.01)  # yield a little concurrency when running this in a thread
 
-            if "SA_" + scope_id in boundary_cache:
-                # print('Retrieve boundary from cache', str(year)+id)
-                # res_boundary = copy.deepcopy(boundary_cache[id])   # this doesn't solve messing up cache
-                # return res_boundary
-                return boundary_cache["SA_" + scope_id]
+            cached_service_area = boundary_cache.get(None, scope.name, "SA_" + scope_id)
+            if cached_service_area is not None:
+                return cached_service_area
 
             try:
                 url = 'http://' + settings.boundaries_config["host"] + ':' + settings.boundaries_config["port"] + \
                       settings.boundaries_config["path_service_areas"] + '/service_area/' + \
                       boundary_service_mapping[scope.name] + '/' + scope_id
                 # print('Retrieve from boundary service', id)
-                r = requests.get(url)
+                r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                 if len(r.text) > 0:
                     reply = json.loads(r.text)
-                    boundary_cache["SA_" + scope_id] = reply
+                    boundary_cache.put(None, scope.name, "SA_" + scope_id, reply)
                     return reply
                 else:
                     print("WARNING: Empty response for Boundary service supply area info for {} with id {}".format(scope.name, id))
@@ -536,7 +545,7 @@ class BoundaryService:
                 url = 'http://' + settings.boundaries_config["host"] + ':' + settings.boundaries_config["port"] + \
                       settings.boundaries_config["path_service_areas"] + '/station/' + \
                       boundary_service_mapping[scope.name] + '/' + scope_id
-                r = requests.get(url)
+                r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                 if len(r.text) > 0:
                     reply = json.loads(r.text)
                     return reply
@@ -564,7 +573,7 @@ class BoundaryService:
                       + settings.boundaries_config["path_boundaries"] + '/YEAR/' + str(year) + '/' \
                       + boundary_service_mapping[subscope.name] + '/' \
                       + boundary_service_mapping[scope.name] + '/' + id
-                r = requests.get(url)
+                r = self.http.get(url, timeout=settings.boundaries_config["timeout"])
                 reply = json.loads(r.text)
                 # print(reply)
 
@@ -582,11 +591,49 @@ class BoundaryService:
     def __preload_subboundaries_in_cache(self, year, top_area_scope, sub_area_scope, top_area_id):
         sub_boundaries = self.__get_subboundaries_from_service(year, top_area_scope, sub_area_scope, top_area_id)
 
-        for sub_boundary in sub_boundaries:
-            code = sub_boundary['code']
-            geom = sub_boundary['geom']
-            if code and geom:
-                boundary_cache[str(year)+code] = sub_boundary
+        boundary_cache.put_many(year, sub_area_scope.name, {sub_boundary['code']: sub_boundary
+                                                            for sub_boundary in sub_boundaries
+                                                            if sub_boundary['code'] and sub_boundary['geom']})
+
+    def prefetch(self, year, scope, ids):
+        """
+        Makes sure the boundaries of the given ids are in the cache: boundaries that are stored in the cache file are
+        loaded in one query, the others are retrieved from the boundary service
+        :return: the ids of which no boundary is available
+        """
+        boundaries = self.get_boundaries_from_service(year, [(scope, id) for id in ids])
+        return [id for (_, id), boundary in boundaries.items() if boundary is None]
+
+    def get_boundaries_from_service(self, year, keys):
+        """
+        Retrieves many boundaries at once: the boundaries that are stored in the cache file are loaded in one query,
+        the others are retrieved from the boundary service in parallel
+        :param keys: list of (scope, id)
+        :return: dict with (scope, id) -> boundary, or None if the boundary is not available
+        """
+        keys = list(dict.fromkeys((scope, str.upper(id)) for scope, id in keys if id and is_valid_boundary_id(id)))
+        ids_per_scope = dict()
+        for scope, id in keys:
+            ids_per_scope.setdefault(scope, []).append(id)
+        missing = [(scope, id) for scope, ids in ids_per_scope.items()
+                   for id in boundary_cache.prefetch(year, scope.name, ids)]
+        if missing:
+            logger.info('Retrieving {} boundaries from the boundary service'.format(len(missing)))
+            list(self.executor.map(lambda key: self.get_boundary_from_service(year, key[0], key[1]), missing))
+        return {(scope, id): boundary_cache.get(year, scope.name, id) for scope, id in keys}
+
+    @staticmethod
+    def collect_area_tree_boundary_keys(area):
+        """Returns the (scope, id) of all areas in the area tree that have no geometry and can be retrieved"""
+        keys = []
+        areas = [area]
+        while areas:
+            ar = areas.pop()
+            if not ar.geometry and ar.id and ar.scope and ar.scope.name != 'UNDEFINED' and \
+                    is_valid_boundary_id(ar.id):
+                keys.append((ar.scope, str.upper(ar.id)))
+            areas.extend(ar.area)
+        return keys
 
     def preload_area_subboundaries_in_cache(self, top_area):
         user = get_session('user-email')
@@ -607,4 +654,11 @@ class BoundaryService:
             if top_area_scope and top_area_scope is not esdl.AreaScopeEnum.UNDEFINED and \
                 sub_area_scope and sub_area_scope is not esdl.AreaScopeEnum.UNDEFINED and \
                 is_valid_boundary_id(top_area_id):
-                self.__preload_subboundaries_in_cache(boundaries_year, top_area_scope, sub_area_scope, top_area_id)
\ No newline at end of file
+                # only ask the boundary service for all sub boundaries if some of them are not cached yet
+                sub_area_ids = [str.upper(ar.id) for ar in sub_areas if ar.id and is_valid_boundary_id(ar.id)]
+                if not sub_area_ids or boundary_cache.prefetch(boundaries_year, sub_area_scope.name, sub_area_ids):
+                    self.__preload_subboundaries_in_cache(boundaries_year, top_area_scope, sub_area_scope,
+                                                          top_area_id)
+
+        # retrieve the boundaries of all other areas in the tree (e.g. of deeper levels) at once
+        self.get_boundaries_from_service(boundaries_year, self.collect_area_tree_boundary_keys(top_area))
\ No newline at end of file
@@ -21,7 +21,6 @@ from datetime import datetime
 from flask import Flask, jsonify, request
 from flask_executor import Executor
 from flask_socketio import SocketIO
-from influxdb import InfluxDBClient
 import io
 import os
 import requests
@@ -39,6 +38,7 @@ from extensions.essim import (
 from extensions.session_manager import get_handler, get_session
 from extensions.settings_storage import SettingsStorage
 from src.esdl_config import ESDL_UPLOAD_PROFILES_HOST
+from src.influxdb_gateway import gateway as influxdb_gateway
 from src.log import get_logger
 from src.settings import essim_config
 
@@ -338,7 +338,7 @@ def _export_energy_system_simulation_task(
         influx_url_parts = (
             essim_config["influx_mapeditor_url"].replace("http://", "").rpartition(":")
         )
-        influx_client = InfluxDBClient(influx_url_parts[0], influx_url_parts[2])
+        influx_client = influxdb_gateway.database(influx_url_parts[0], influx_url_parts[2])
 
         db = influx_client.get_list_database()[-1]["name"]
         influx_client.switch_database(db)
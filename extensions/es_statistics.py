@@ -15,7 +15,7 @@ import base64
 
 from flask import Flask
 from flask_socketio import SocketIO
-from extensions.session_manager import get_handler, get_session
+from extensions.session_manager import get_handler_snapshot, get_session
 import src.settings as settings
 import requests
 import urllib
@@ -39,7 +39,7 @@ class ESStatisticsService:
         @self.socketio.on('get_es_statistics', namespace='/esdl')
         def get_es_statistics():
             with self.flask_app.app_context():
-                esh = get_handler()
+                esh = get_handler_snapshot()
                 active_es_id = get_session('active_es_id')
                 esdl_str = esh.to_string(active_es_id)
                 return self.call_es_statistics_service(esdl_str)
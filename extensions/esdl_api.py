@@ -14,7 +14,7 @@
 
 from flask import Flask, request
 from flask_socketio import SocketIO
-from extensions.session_manager import managed_sessions
+from extensions.session_manager import get_all_sessions, managed_sessions
 import src.log as log
 
 logger = log.get_logger(__name__)
@@ -30,8 +30,9 @@ class ESDL_API:
 
     def get_sessions_from_managed_sessions(self):
         socketio_sid_list = dict()
-        for client_id in managed_sessions:
-            session_info = managed_sessions[client_id]
+        sessions = get_all_sessions(['user-email', 'socketio_sid'])
+        for client_id in sessions:
+            session_info = sessions[client_id]
             if 'user-email' in session_info and 'socketio_sid' in session_info:
                 user_email = session_info['user-email']
                 socketio_sid = session_info['socketio_sid']
@@ -14,7 +14,7 @@
 
 from flask import Flask
 from flask_socketio import SocketIO, emit
-from extensions.session_manager import get_handler
+from extensions.session_manager import get_handler_snapshot
 from xmldiff import main
 import src.log as log
 
@@ -33,7 +33,8 @@ class ESDLCompare:
         @self.socketio.on('esdl_compare', namespace='/esdl')
         def compare(esdls):
             with self.flask_app.app_context():
-                esh = get_handler()
+                # compare a copy, so the user can continue editing
+                esh = get_handler_snapshot()
 
                 es_id1 = esdls['esdl1']
                 es_id2 = esdls['esdl2']
@@ -28,6 +28,7 @@ from flask_socketio import SocketIO, emit
 from extensions.session_manager import get_handler, get_session, get_session_for_esid
 import src.log as log
 from src.esdl_helper import asset_state_to_ui, get_tooltip_asset_attrs, add_spatial_attributes
+from src.ui_delta import ui_delta_sent, CONNECTIONS_LAYER
 from esdl.processing import ESDLGeometry
 
 logger = log.get_logger(__name__)
@@ -139,6 +140,7 @@ class HeatNetwork:
             print(add_esdl_object_message)
             emit('add_esdl_objects', add_esdl_object_message, namespace='/esdl')
             emit("add_connections", {"es_id": active_es_id, "conn_list": connections})
+            ui_delta_sent(active_es_id, CONNECTIONS_LAYER, connections)
 
 
     @staticmethod
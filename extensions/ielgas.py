@@ -16,8 +16,9 @@ from flask import Flask
 from flask_socketio import SocketIO, emit
 from extensions.session_manager import get_handler, get_session, set_session
 from extensions.settings_storage import SettingsStorage
-from influxdb import InfluxDBClient
 import src.settings as settings
+from src.influxdb_gateway import gateway as influxdb_gateway
+from src.load_duration_curve import ldc_data, ldc_engine
 import src.log as log
 
 logger = log.get_logger(__name__)
@@ -111,48 +112,24 @@ class IELGAS:
                 power = asset.power
             elif hasattr(asset, 'capacity'):
                 power = asset.capacity
-            power_pos = None
-            power_neg = None
 
-            self.database_client = InfluxDBClient(host=self.plugin_settings['database_host'],
-                                                      port=self.plugin_settings['database_port'],
-                                                      database=self.plugin_settings['database_name'])
+            self.database_client = influxdb_gateway.database(host=self.plugin_settings['database_host'],
+                                                             port=self.plugin_settings['database_port'],
+                                                             database=self.plugin_settings['database_name'])
 
             user = get_session('user-email')
             user_config = self.get_user_settings(user)
 
-            results = dict()
-            measurements = user_config['measurements']
-            for m in measurements:
-                try:
-                    query = 'SELECT "'+FIELD_NAME+'" FROM "' + m + '" WHERE assetId=\'' + asset_id + '\''
-                    logger.debug(query)
-                    res = self.database_client.query(query)
-                    if res:
-                        results = res
-                        break
-                except Exception as e:
-                    logger.error('error with query: ', str(e))
-
-            first_key = list(results.keys())[0]
-            series = results[first_key]
-
-            ldc_series = []
-            for item in series:
-                ldc_series.append(item['allocationEnergy'])
-            ldc_series.sort(reverse=True)
-
-            ldc_series_decimate = []
-            for idx, item in enumerate(ldc_series):
-                if idx % 40 == 0:
-                    ldc_series_decimate.append(item * 1e6)
-                    if item > 0:
-                        power_pos = power
-                    if item < 0:
-                        power_neg = -power
-
-            emit('ldc-data', {'asset_name': asset_name, 'ldc_series': ldc_series_decimate, 'power_pos': power_pos,
-                              'power_neg': power_neg})
+            measurements = ','.join('"' + m + '"' for m in user_config['measurements'])
+            try:
+                # results are not filtered on a simulation run, so the curve is not cached
+                curves = ldc_engine.get_curves(self.database_client, measurements, [asset_id], field=FIELD_NAME)
+            except Exception as e:
+                logger.error('error with query: {}'.format(e))
+                return
+
+            if asset_id in curves:
+                emit('ldc-data', ldc_data(asset_name, curves[asset_id], power, 1e6))
 
     def get_user_settings(self, user):
         if self.settings_storage.has_user(user, IELGAS_USER_CONFIG):
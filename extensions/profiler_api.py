@@ -0,0 +1,114 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Admin API to profile the next socket commands and background jobs of the session of a user:
+
+    POST /admin/profiling                   {"user_email": ..., or "client_id": ..., "count": 5, "mode": "sampled"}
+    GET  /admin/profiling                   the stored profiles and the sessions that will be profiled
+    GET  /admin/profiling/<id>              the profile file (.prof or .txt)
+    GET  /admin/profiling/<id>/info         the duration, model statistics and summary of the profile
+
+A count of 0 cancels the profiling of a session. See src/session_profiler.py.
+"""
+import os
+
+from flask import Flask, Response, request
+from flask_socketio import SocketIO
+
+from extensions.session_manager import get_all_sessions, get_session, request_profiling
+from src.essim_export import send_file_blocks
+from src.session_profiler import DETERMINISTIC, MODES, PROFILING_KEY, session_profiler
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+# maximum number of commands that can be profiled with one request
+MAX_COUNT = 100
+
+
+def is_admin():
+    mapeditor_role = get_session('user-mapeditor-role')
+    return bool(mapeditor_role) and 'mapeditor-admin' in mapeditor_role
+
+
+class ProfilerAPI:
+    def __init__(self, flask_app: Flask, socket: SocketIO):
+        self.flask_app = flask_app
+        self.socketio = socket
+        self.register()
+
+    def register(self):
+        logger.info('Registering ProfilerAPI extension')
+
+        @self.flask_app.route('/admin/profiling', methods=['POST'])
+        def request_session_profiling():
+            if not is_admin():
+                return 'Only available for the MapEditor admin role', 403
+            content = request.get_json(silent=True) or {}
+            mode = content.get('mode', DETERMINISTIC)
+            try:
+                count = int(content.get('count', 1))
+            except (TypeError, ValueError):
+                return 'count must be a number', 400
+            if mode not in MODES or not 0 <= count <= MAX_COUNT:
+                return 'mode must be one of {} and count between 0 and {}'.format(', '.join(MODES), MAX_COUNT), 400
+
+            if 'client_id' in content:
+                client_ids = [content['client_id']]
+            elif 'user_email' in content:
+                sessions = get_all_sessions(['user-email'])
+                client_ids = [client_id for client_id, values in sessions.items()
+                              if values.get('user-email') == content['user_email']]
+            else:
+                return 'Either client_id or user_email is required', 400
+
+            client_ids = [client_id for client_id in client_ids if request_profiling(client_id, count, mode)]
+            if not client_ids:
+                return 'No session found', 404
+            logger.info('Profiling the next {} commands of sessions {} ({})'.format(count, client_ids, mode))
+            return {'client_ids': client_ids, 'count': count, 'mode': mode}
+
+        @self.flask_app.route('/admin/profiling', methods=['GET'])
+        def list_session_profiles():
+            if not is_admin():
+                return 'Only available for the MapEditor admin role', 403
+            sessions = get_all_sessions(['user-email', PROFILING_KEY])
+            requested = [{'client_id': client_id, 'user_email': values.get('user-email'), **values[PROFILING_KEY]}
+                         for client_id, values in sessions.items() if values.get(PROFILING_KEY)]
+            return {'requested': requested, 'profiles': session_profiler.list()}
+
+        @self.flask_app.route('/admin/profiling/<profile_id>', methods=['GET'])
+        def download_session_profile(profile_id):
+            if not is_admin():
+                return 'Only available for the MapEditor admin role', 403
+            metadata = session_profiler.get(profile_id)
+            if metadata is None:
+                return 'Profile not found', 404
+            path = os.path.join(session_profiler.directory, metadata['file'])
+            headers = {
+                'Content-Disposition': 'attachment; filename="{}"'.format(metadata['file']),
+                'Content-Length': os.path.getsize(path)
+            }
+            return Response(send_file_blocks(open(path, 'rb')), headers=headers, direct_passthrough=True,
+                            mimetype='application/octet-stream')
+
+        @self.flask_app.route('/admin/profiling/<profile_id>/info', methods=['GET'])
+        def get_session_profile_info(profile_id):
+            if not is_admin():
+                return 'Only available for the MapEditor admin role', 403
+            metadata = session_profiler.get(profile_id)
+            if metadata is None:
+                return 'Profile not found', 404
+            return metadata
@@ -12,9 +12,9 @@
 #  Manager:
 #      TNO
 import base64
-import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-import pytz
 from flask import Flask
 from flask_socketio import SocketIO, emit
 from flask_executor import Executor
@@ -25,15 +25,13 @@ from esdl.esdl_handler import EnergySystemHandler
 from extensions.settings_storage import SettingType, SettingsStorage
 from extensions.session_manager import get_session
 from extensions.panel_service import create_panel, get_panel_service_datasource
-from influxdb import InfluxDBClient
 import copy
 import src.log as log
-import csv
-import locale
-from io import StringIO
 from uuid import uuid4
 import src.settings as settings
 from src.edr_client import EDRClient
+from src.influxdb_gateway import gateway as influxdb_gateway
+from src.profile_ingestion import ProfileCSVIngestion
 from utils.datetime_utils import parse_date
 from utils.utils import str2float
 
@@ -44,6 +42,9 @@ PROFILES_LIST = 'PROFILES'                  # To store profiles
 PROFILES_SETTINGS = 'PROFILES_SETTINGS'     # To store information about profiles servers, ...
 profiles = None
 
+# uploads larger than this are stored in a temporary file
+CSV_UPLOAD_MEMORY_SIZE = 8 * 1024 * 1024
+
 
 def send_alert(message):
     print(message)
@@ -173,7 +174,8 @@ class Profiles:
 
                     self.csv_files[uuid] = message
                     self.csv_files[uuid]['pos'] = 0
-                    self.csv_files[uuid]['content'] = []
+                    # large uploads are kept on disk instead of in memory
+                    self.csv_files[uuid]['content'] = tempfile.SpooledTemporaryFile(max_size=CSV_UPLOAD_MEMORY_SIZE)
                     self.csv_files[uuid]['group'] = group
                     logger.debug('Uploading CSV file {}, size={}'.format(name, size))
                     emit('csv_next_chunk', {'name': name, 'uuid': uuid, 'pos': self.csv_files[uuid]['pos']})
@@ -185,16 +187,15 @@ class Profiles:
                     content = message['content']
                     pos = message['pos']
                     #print(content)
-                    self.csv_files[uuid]['content'][pos:len(content)] = content
+                    csv_file = self.csv_files[uuid]['content']
+                    csv_file.seek(pos)
+                    csv_file.write(bytes(content))
                     self.csv_files[uuid]['pos'] = pos + len(content)
                     if self.csv_files[uuid]['pos'] >= size:
-                        #print("Upload complete:", str(bytearray(self.csv_files[uuid]['content'])))
-
-                        ba = bytearray(self.csv_files[uuid]['content'])
-                        csv = ba.decode(encoding='utf-8-sig')
                         emit('csv_upload_done', {'name': name, 'uuid': uuid, 'pos': self.csv_files[uuid]['pos'],
                                                  'success': True})
-                        self.executor.submit(self.process_csv_file, name, uuid, csv)
+                        csv_file.seek(0)
+                        self.executor.submit(self.process_csv_file, name, uuid, csv_file)
                     else:
                         #print("Requesting next chunk", str(bytearray(self.csv_files[uuid]['content'])))
                         emit('csv_next_chunk', {'name': name, 'uuid': uuid, 'pos': self.csv_files[uuid]['pos']})
@@ -214,73 +215,19 @@ class Profiles:
         ntime = time + ":00+0000"
         return ndate + "T" + ntime
 
-    def process_csv_file(self, name, uuid, content):
+    def process_csv_file(self, name, uuid, csv_file):
         logger.debug("Processing csv file(s) (threaded): ".format(name))
 
-        tz_string = datetime.datetime.now().astimezone().tzname()
-
         try:
             logger.info("process CSV")
             measurement = name.split('.')[0]
 
-            try:
-                csv_file = StringIO(content)
-                dialect = csv.Sniffer().sniff(csv_file.read(4096))
-                csv_file = StringIO(content)
-                reader = csv.reader(csv_file, dialect)
-            except:
-                # If format cannot be determined automatically, try ; as a default
-                csv_file = StringIO(content)
-                reader = csv.reader(csv_file, delimiter=';')
-
-            column_names = next(reader)
-            num_fields = len(column_names)
-            json_body = []
-
-            locale.setlocale(locale.LC_ALL, '')
-            start_datetime = None
-            end_datetime = ""
-            previous_datetime = None
-
-            for row in reader:
-                fields = {}
-                for i in range(1, num_fields):
-                    if row[i]:
-                        fields[column_names[i]] = locale.atof(row[i])
-
-                dt = parse_date(row[0])
-                try:
-                    aware_dt = pytz.utc.localize(dt)  # Assume timezone is UTC if no TZ was given (as asked in the UI)
-                except ValueError:  # ValueError: Not naive datetime (tzinfo is already set)
-                    aware_dt = dt
-
-                dt_string = aware_dt.strftime('%Y-%m-%dT%H:%M:%S%z')
-
-                if previous_datetime:
-                    if previous_datetime == aware_dt:
-                        raise(Exception("CSV contains duplicate datetimes ({}). Check timezone and daylight saving".
-                                        format(dt_string)))
-                previous_datetime = aware_dt
-
-                if not start_datetime:
-                    start_datetime = dt_string
-                else:
-                    end_datetime = dt_string
-
-                json_body.append({
-                    "measurement": measurement,
-                    "time": dt_string,
-                    "fields": fields
-                })
-
-            logger.info("CSV processing finished, now writing to database...")
-
             with self.flask_app.app_context():
                 profiles_settings = self.get_profiles_settings()
                 profiles_server_index = int(self.csv_files[uuid]['profiles_server_index'])
 
                 database = profiles_settings['profiles_servers'][profiles_server_index]['database']
-                client = InfluxDBClient(
+                client = influxdb_gateway.database(
                     host=profiles_settings['profiles_servers'][profiles_server_index]['host'],
                     port=profiles_settings['profiles_servers'][profiles_server_index]['port'],
                     username=profiles_settings['profiles_servers'][profiles_server_index]['username'],
@@ -294,7 +241,20 @@ class Profiles:
             if not(any(db['name'] == database for db in available_databases)):
                 logger.debug('Database does not exist, creating a new one')
                 client.create_database(database)
-            client.write_points(points=json_body, database=database, batch_size=100)
+
+            def progress(rows, fraction):
+                emit('csv_processing_progress', {'name': name, 'uuid': uuid, 'rows': rows,
+                                                 'percentage': fraction * 100 if fraction is not None else None})
+
+            # Parse the file in chunks and write the points while parsing
+            ingestion = ProfileCSVIngestion(client, database, measurement,
+                                            chunk_size=settings.profile_upload_config['chunk_size'],
+                                            batch_size=settings.profile_upload_config['batch_size'],
+                                            progress=progress)
+            field_names = ingestion.ingest(csv_file, self.csv_files[uuid]['size'])
+            start_datetime = ingestion.start_datetime
+            end_datetime = ingestion.end_datetime
+            logger.info("CSV processing finished, {} rows written to the database".format(ingestion.rows))
 
             if profiles_settings['profiles_servers'][profiles_server_index]['ssl_enabled']:
                 protocol = "https://"
@@ -316,12 +276,8 @@ class Profiles:
             # Store profile information in settings
             group = self.csv_files[uuid]['group']
             prof_aggr_type = self.csv_files[uuid]['prof_aggr_type']
-            for i in range(1, num_fields):
-                field = column_names[i]
-
-                # Stop if empty column was found
-                if field.strip() == '':
-                    break
+            new_profiles = []
+            for field in field_names:
                 # Create a dictionary with all relevant information about the new profile
                 profile = self.create_new_profile(
                     group=group,
@@ -337,24 +293,30 @@ class Profiles:
                 if profiles_server_index != 0:  # Only non standard profiles server
                     profile['host'] = profiles_settings['profiles_servers'][profiles_server_index]['host']
                     profile['port'] = profiles_settings['profiles_servers'][profiles_server_index]['port']
+                new_profiles.append(profile)
 
-                # Create a grafana panel for visualization and add the embedURL to the dictionary
-                profile["embedUrl"] = create_panel(
-                    graph_title=group + " - " + field,
+            # Create a grafana panel for visualization of every profile, concurrently
+            def create_profile_panel(profile):
+                return create_panel(
+                    graph_title=group + " - " + profile['field'],
                     axis_title="",
                     datasource=datasource,
                     host=profiles_server_host,
                     database=database,
                     measurement=measurement,
-                    field=field,
+                    field=profile['field'],
                     filters=[],
                     qau=None,
                     prof_aggr_type=prof_aggr_type,
                     start_datetime=start_datetime,
                     end_datetime=end_datetime
                 )
-                # Store the new profile in the profiles settings
-                self.add_profile(str(uuid4()), profile)
+            with ThreadPoolExecutor(max_workers=settings.profile_upload_config['panel_workers']) as panel_executor:
+                for profile, embed_url in zip(new_profiles, panel_executor.map(create_profile_panel, new_profiles)):
+                    profile["embedUrl"] = embed_url
+
+            # Store the new profiles in the profiles settings
+            self.add_profiles({str(uuid4()): profile for profile in new_profiles})
 
             emit('csv_processing_done', {'name': name, 'uuid': uuid, 'pos': self.csv_files[uuid]['pos'],
                                      'success': True})
@@ -364,8 +326,25 @@ class Profiles:
                                      'success': False, 'error': str(e)})
 
         # clean up
+        csv_file.close()
         del (self.csv_files[uuid])
 
+    def add_profiles(self, new_profiles):
+        """Adds a dict with profile id -> profile, storing the profiles list of every group once"""
+        profiles_per_group = dict()
+        for profile_id, profile in new_profiles.items():
+            setting_type = SettingType(profile['setting_type'])
+            identifier = self._get_identifier(setting_type, profile['project_name'])
+            profiles_per_group.setdefault((setting_type, identifier), dict())[profile_id] = profile
+        for (setting_type, identifier), group_profiles in profiles_per_group.items():
+            if identifier is not None and self.settings_storage.has(setting_type, identifier, PROFILES_LIST):
+                profiles = self.settings_storage.get(setting_type, identifier, PROFILES_LIST)
+            else:
+                profiles = dict()
+            profiles.update(group_profiles)
+            self.settings_storage.set(setting_type, identifier, PROFILES_LIST, profiles)
+        self.update_profiles_list()
+
     def add_profile(self, profile_id, profile):
         setting_type = SettingType(profile['setting_type'])
         project_name = profile['project_name']
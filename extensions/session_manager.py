@@ -12,29 +12,97 @@
 #  Manager:
 #      TNO
 
-from flask import session
+from flask import g, has_app_context, has_request_context, session
 from esdl.esdl_handler import EnergySystemHandler
 from datetime import datetime
 import esdl.processing.EcoreDocumentation as esdl_doc
+import functools
 import threading
 import time
 import src.log as log
+import src.settings as settings
+from src.metrics import metrics
+from src.session_lock import ReadWriteLock
+from src.session_profiler import PROFILING_KEY, model_stats, session_profiler
+from src.session_store import LAST_ACCESSED_KEY, SessionStoreMessageQueue, create_session_store
 import os, glob
 
 logger = log.get_logger(__name__)
-managed_sessions = dict()
+session_store = create_session_store(settings.session_store_config)
+# the sessions of this worker (with a shared session store: the local copies of the sessions this worker serves)
+managed_sessions = session_store.sessions
 ESH_KEY = 'esh'
-LAST_ACCESSED_KEY = 'last-accessed'
+# reader-writer lock per client_id, to coordinate the handlers and jobs that use the energy systems of a session
+session_locks = dict()
+_session_locks_lock = threading.Lock()
+_profiling_lock = threading.Lock()
 SESSION_TIMEOUT = 60*60*24  # 1 day
 CLEANUP_INTERVAL = 60*60  # every hour
+EVICTION_INTERVAL = 60  # every minute
+
+
+def _load_session(client_id, create=False):
+    """
+    Returns the session dict of a client from the session store. With a shared session store, the session is loaded
+    once per request (or socket event) and the keys that are used are remembered, so save_session() can send the
+    changed values back to the store at the end of the request.
+    """
+    if not session_store.shared or not has_app_context():
+        client_session = session_store.load(client_id)
+        if client_session is None and create:
+            client_session = session_store.create(client_id)
+        return client_session
+    if g.get('session_client_id') != client_id:
+        g.session_client_id = client_id
+        g.session_keys = set()
+        g.session_removed_keys = set()
+        g.session_data = session_store.load(client_id)
+    if g.session_data is None and create:
+        g.session_data = session_store.create(client_id)
+    return g.session_data
+
+
+def _use_keys(*keys):
+    if session_store.shared and has_app_context() and 'session_keys' in g:
+        g.session_keys.update(keys)
+
+
+def save_session(exception=None):
+    """Saves the session values that were used in this request to the shared session store"""
+    if session_store.shared and g.get('session_client_id') is not None:
+        client_id = g.pop('session_client_id')
+        try:
+            session_store.save(client_id, g.session_keys, g.session_removed_keys)
+        except Exception:
+            logger.exception('Cannot save session of client_id={} to the session store'.format(client_id))
+
+
+def init_session_store(flask_app):
+    """Saves the sessions after every request and socket event, and adds the routing hint to every response"""
+    flask_app.teardown_request(save_session)
+
+    if session_store.shared:
+        @flask_app.after_request
+        def add_routing_hint(response):
+            # requests of a client are best sent to the worker that has a local copy of its session
+            response.headers['X-Session-Worker'] = session_store.worker_id
+            return response
+
+
+def get_socketio_client_manager():
+    """Socket.IO client manager that relays messages to clients of other workers, None when there is one worker"""
+    if session_store.shared:
+        return SessionStoreMessageQueue(session_store)
+    return None
 
 
 def get_handler() -> EnergySystemHandler:
-    global managed_sessions
     client_id = session['client_id']
-    if client_id in managed_sessions:
-        if ESH_KEY in managed_sessions[client_id]:
-            esh = managed_sessions[client_id][ESH_KEY]
+    client_session = _load_session(client_id)
+    if client_session is not None:
+        _use_keys(ESH_KEY)
+        if ESH_KEY in client_session:
+            esh = client_session[ESH_KEY]
             logger.debug('Retrieve ESH client_id={}'.format(client_id))
         else:
             logger.warning('No EnergySystemHandler in session. Returning empty energy system')
@@ -50,8 +118,103 @@ def get_handler() -> EnergySystemHandler:
         return esh
 
 
+def get_session_lock(client_id=None) -> ReadWriteLock:
+    """Returns the reader-writer lock of the session of a client (default: the client of the current request)"""
+    if client_id is None:
+        client_id = session['client_id']
+    with _session_locks_lock:
+        lock = session_locks.get(client_id)
+        if lock is None:
+            lock = session_locks[client_id] = ReadWriteLock()
+        return lock
+
+
+def _with_session_lock(f, write):
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if not has_request_context() or session.get('client_id') is None:
+            return f(*args, **kwargs)
+        lock = get_session_lock()
+        with (lock.write() if write else lock.read()):
+            mode = _take_profiling_request()
+            if mode is None:
+                return f(*args, **kwargs)
+            return session_profiler.run(mode, _command_name(f, args), f, args, kwargs, _profile_info(),
+                                        lambda: model_stats(get_session(ESH_KEY)))
+    return wrapper
+
+
+def _take_profiling_request():
+    """Returns the profiling mode when an admin asked to profile the next command of this session, see profiler_api"""
+    if session_profiler.active():
+        return None
+    with _profiling_lock:
+        request = get_session(PROFILING_KEY)
+        if not request:
+            return None
+        remaining = request['count'] - 1
+        if remaining > 0:
+            set_session(PROFILING_KEY, dict(request, count=remaining))
+        else:
+            del_session(PROFILING_KEY)
+        return request['mode']
+
+
+def _command_name(f, args):
+    if args and isinstance(args[0], dict) and 'cmd' in args[0]:
+        return '{}:{}'.format(f.__name__, args[0]['cmd'])
+    return f.__name__
+
+
+def _profile_info():
+    return {'client_id': session['client_id'], 'user_email': get_session('user-email')}
+
+
+def request_profiling(client_id, count, mode):
+    """Asks to profile the next count commands or jobs of the session of a client, returns False if it does not exist"""
+    client_session = session_store.load(client_id)
+    if client_session is None:
+        return False
+    if count > 0:
+        client_session[PROFILING_KEY] = {'count': count, 'mode': mode}
+        session_store.save(client_id, [PROFILING_KEY])
+    elif PROFILING_KEY in client_session:
+        del client_session[PROFILING_KEY]
+        session_store.save(client_id, [], [PROFILING_KEY])
+    return True
+
+
+def session_writer(f):
+    """
+    Decorator for socket handlers and jobs that change the energy systems or lists in the session of the client:
+    they run one at a time per session and not at the same time as readers
+    """
+    return _with_session_lock(f, write=True)
+
+
+def session_reader(f):
+    """
+    Decorator for handlers and jobs that only read the energy systems and the session of the client: they can run at
+    the same time, but not at the same time as a writer. Handlers that set values in the session (e.g. the lists of
+    the UI) are writers.
+    """
+    return _with_session_lock(f, write=False)
+
+
+def get_handler_snapshot() -> EnergySystemHandler:
+    """
+    Returns a private copy of the EnergySystemHandler of the session for long read-only jobs, such as exports and
+    compares. The session is only locked while the snapshot is taken, so the user can continue editing while the
+    copy is used. Changes to the copy are not stored in the session.
+    """
+    with get_session_lock().read():
+        snapshot = get_handler().save_snapshot()
+    esh = EnergySystemHandler()
+    esh.load_snapshot(snapshot)
+    return esh
+
+
 def set_handler(esh):
-    global managed_sessions
     client_id = session['client_id']
     logger.debug('Set ESH client_id={}'.format(client_id))
     set_session(ESH_KEY, esh)
@@ -64,16 +227,15 @@ def valid_session():
 
 
 def set_session(key, value):
-    global managed_sessions
     #logger.debug('Current Thread %s' % threading.currentThread().getName())
     if 'client_id' not in session:
         logger.warning('No client_id for the session is available, cannot set value for key {}'.format(key))
         return
     client_id = session['client_id']
-    if client_id not in managed_sessions:
-        managed_sessions[client_id] = dict()
-    managed_sessions[client_id][LAST_ACCESSED_KEY] = datetime.now()
-    managed_sessions[client_id][key] = value
+    client_session = _load_session(client_id, create=True)
+    client_session[LAST_ACCESSED_KEY] = datetime.now()
+    client_session[key] = value
+    _use_keys(key)
     #logger.debug(managed_sessions)
 
 
@@ -83,59 +245,98 @@ def get_session(key=None):
     :param key: key to retrieve a value for. If key is None, it will return the whole session for this client
     :return:
     """
-    global managed_sessions
     if 'client_id' not in session:
         logger.warning('No client id for the session is available, cannot return value for key {}'.format(key))
         return None
     client_id = session['client_id']
-    if client_id not in managed_sessions:
+    client_session = _load_session(client_id)
+    if client_session is None:
         logger.warning('No client id in the managed_sessions is available, cannot return value for key {}'.format(key))
         return None
     else:
         if key is None:
-            return managed_sessions[client_id]
+            _use_keys(*client_session.keys())
+            return client_session
         else:
+            _use_keys(key)
             try:
-                return managed_sessions[client_id][key]
+                return client_session[key]
             except:
                 return None
 
 
 def del_session(key):
-    global managed_sessions
     client_id = session['client_id']
-    if client_id not in managed_sessions:
+    client_session = _load_session(client_id)
+    if client_session is None:
         logger.warning('No client id for the session is available, cannot return value for key {}'.format(key))
         return None
     else:
-        if key in managed_sessions[client_id]:
-            del managed_sessions[client_id][key]
+        if key in client_session:
+            del client_session[key]
+            if session_store.shared and has_app_context():
+                g.session_removed_keys.add(key)
+
+
+def get_all_sessions(keys):
+    """Returns {client_id: {key: value}} with the given keys of the sessions of all clients (of all workers)"""
+    return session_store.values(keys)
 
 
 def clean_up_sessions():
-    global managed_sessions
     logger.debug('Current Thread %s' % threading.currentThread().getName())
     logger.info('Clean up sessions: current number of sessions: {}'.format(len(managed_sessions)))
-    for key in list(managed_sessions.keys()):  # make a copy of the keys in the list
-        last_accessed = managed_sessions[key][LAST_ACCESSED_KEY]
-        now = datetime.now()
-        difference = (now - last_accessed).total_seconds()
-        if difference > SESSION_TIMEOUT:
-            logger.info('Cleaning up session with client_id={}'.format(key))
-            del managed_sessions[key]
+    for client_id in session_store.clean_up(SESSION_TIMEOUT):
+        logger.info('Cleaning up session with client_id={}'.format(client_id))
+        with _session_locks_lock:
+            lock = session_locks.get(client_id)
+            if lock is not None and not lock.in_use():
+                del session_locks[client_id]
+
+
+def evict_sessions():
+    """Evicts idle sessions when the sessions use more memory than the budget, see MemorySessionStore.evict()"""
+    budget = settings.session_store_config['memory_budget']
+    if budget:
+        busy = [client_id for client_id, lock in list(session_locks.items()) if lock.in_use()]
+        evicted = session_store.evict(budget, settings.session_store_config['evict_after'], busy)
+        if evicted:
+            logger.info('Evicted {} sessions: {}'.format(len(evicted), get_session_stats()))
+
+
+def get_session_stats():
+    """Returns the number of sessions and their estimated bytes, in memory and evicted to disk"""
+    return session_store.stats()
+
+
+def _session_metrics(kind):
+    stats = get_session_stats()
+    return {('resident',): stats['resident_' + kind], ('evicted',): stats['evicted_' + kind]}
+
+
+metrics.gauge('mapeditor_sessions', 'Number of sessions of this worker, in memory and evicted to disk',
+              ['state']).set_function(lambda: _session_metrics('sessions'))
+metrics.gauge('mapeditor_session_bytes', 'Estimated size of the sessions of this worker, in memory and evicted to disk',
+              ['state']).set_function(lambda: _session_metrics('bytes'))
 
 
 def schedule_session_clean_up():
     logger.info("Scheduling session clean-up thread every {} seconds".format(CLEANUP_INTERVAL))
-    global managed_sessions
-    clean_thread = threading.Thread(target=_clean_up_sessions_every_hour, name='Session-Cleanup-Thread')
+    clean_thread = threading.Thread(target=_clean_up_sessions_periodically, name='Session-Cleanup-Thread')
     clean_thread.start()
 
 
-def _clean_up_sessions_every_hour():
+def _clean_up_sessions_periodically():
+    last_clean_up = time.time()
     while True:
-        time.sleep(CLEANUP_INTERVAL)
-        clean_up_sessions()
+        time.sleep(EVICTION_INTERVAL)
+        try:
+            evict_sessions()
+            if time.time() - last_clean_up >= CLEANUP_INTERVAL:
+                last_clean_up = time.time()
+                clean_up_sessions()
+        except Exception:
+            logger.exception('Error cleaning up sessions')
 
 
 def get_session_for_esid(es_id, key):
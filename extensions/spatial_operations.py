@@ -21,13 +21,17 @@ from shapely.geometry import Polygon, MultiPoint, Point
 from shapely.ops import triangulate
 from pprint import pprint
 
-from extensions.session_manager import get_handler, get_session, set_session
+from extensions.session_manager import get_handler, get_session, set_session, get_session_for_esid, session_reader, \
+    session_writer
 from extensions.boundary_service import BoundaryService, is_valid_boundary_id
 import esdl.esdl as esdl
 from src.shape import Shape
 from src.esdl_helper import energy_asset_to_ui, get_asset_and_coord_from_port_id
+from src.nearest_match import geometries_of, to_meters, match_nearest
+from src.ui_delta import emit_ui_delta, CONNECTIONS_LAYER
 import src.log as log
 import requests
+import numpy as np
 
 logger = log.get_logger(__name__)
 
@@ -43,6 +47,7 @@ class SpatialOperations:
         logger.info('Registering Spatial Operations extension')
 
         @self.socketio.on('spatop_collect_info', namespace='/esdl')
+        @session_writer
         def spatop_collect_info():
             with self.flask_app.app_context():
                 esh = get_handler()
@@ -53,6 +58,7 @@ class SpatialOperations:
                 self.collect_info(area, True)
 
         @self.socketio.on('spatop_preprocess_areas', namespace='/esdl')
+        @session_writer
         def spatop_preprocess_subarea():
             with self.flask_app.app_context():
                 esh = get_handler()
@@ -62,6 +68,7 @@ class SpatialOperations:
                 return self.preprocess_area(area)
 
         @self.socketio.on('spatop_joint_middle_subarea', namespace='/esdl')
+        @session_writer
         def spatop_joint_middle_subarea():
             with self.flask_app.app_context():
                 esh = get_handler()
@@ -104,6 +111,7 @@ class SpatialOperations:
                  })
 
         @self.socketio.on('spatop_joint_delaunay', namespace='/esdl')
+        @session_writer
         def spatop_joint_delaunay():
             with self.flask_app.app_context():
                 esh = get_handler()
@@ -128,6 +136,7 @@ class SpatialOperations:
                     self.create_pipes(edges, None, mapping_centroid_wkt_to_joint)
 
         @self.socketio.on('spatop_joint_delaunay_subarea', namespace='/esdl')
+        @session_writer
         def spatop_joint_delaunay():
             with self.flask_app.app_context():
                 esh = get_handler()
@@ -149,21 +158,21 @@ class SpatialOperations:
                 self.create_pipes(edges, top_area_shape, mapping_centroid_wkt_to_joint)
 
         @self.socketio.on('spatop_get_asset_types', namespace='/esdl')
+        @session_reader
         def spatop_get_asset_types():
             with self.flask_app.app_context():
                 esh = get_handler()
                 active_es_id = get_session('active_es_id')
-                es = esh.get_energy_system(active_es_id)
 
                 asset_types_set = set()
-                for c in es.eAllContents():
-                    if isinstance(c, esdl.EnergyAsset):
-                        asset_types_set.add(type(c).__name__)
+                for c in esh.instances_of(active_es_id, esdl.EnergyAsset):
+                    asset_types_set.add(type(c).__name__)
 
                 print(list(asset_types_set))
                 return list(asset_types_set)
 
         @self.socketio.on('spatop_connect_unconnected_assets', namespace='/esdl')
+        @session_writer
         def spatop_connect_unconnected_assets(params):
             with self.flask_app.app_context():
                 print(params)
@@ -172,57 +181,81 @@ class SpatialOperations:
 
                 esh = get_handler()
                 active_es_id = get_session('active_es_id')
-                es = esh.get_energy_system(active_es_id)
 
-                # Collect all assets of the required types
+                # Collect all assets of the required types (exact type, not subtypes)
                 connect_asset_list = list()
                 connect_to_asset_list = list()
-                for c in es.eAllContents():
-                    if type(c).__name__ == connect_asset_type:
-                        connect_asset_list.append(c)
-                    if type(c).__name__ == connect_to_asset_type:
-                        connect_to_asset_list.append(c)
-
-                connections_list = list()
-                # Iterate over connect_asset_list
-                for c in connect_asset_list:
-                    # TODO: fix assume one port
-                    port_c = c.port[0]
-
-                    if not port_c.connectedTo:
-                        shape_c = Shape.create(c.geometry)
-                        min_distance = 1e99
-                        closest_ct = None
-
-                        # Find closest asset to connect to
-                        for ct in connect_to_asset_list:
-                            shape_ct = Shape.create(ct.geometry)
-                            if shape_ct.shape.distance(shape_c.shape) < min_distance:
-                                min_distance = shape_ct.shape.distance(shape_c.shape)
-                                closest_ct = ct
-
-                        # Determine the type of port to connect to
-                        if type(port_c) == esdl.InPort:
-                            find_port_type = esdl.OutPort
-                        else:
-                            find_port_type = esdl.InPort
-
-                        # Find first port that matches criteria
-                        for p in closest_ct.port:
-                            if isinstance(p, find_port_type):
-                                p.connectedTo.append(port_c)
-
-                                pct_coord = get_asset_and_coord_from_port_id(esh, active_es_id, p.id)['coord']
-                                pc_coord = get_asset_and_coord_from_port_id(esh, active_es_id, port_c.id)['coord']
-
-                                connections_list.append \
-                                    ({'from-port-id': port_c.id, 'from-asset-id': c.id,
-                                      'from-asset-coord': pc_coord,
-                                      'to-port-id': p.id, 'to-asset-id': closest_ct.id,
-                                      'to-asset-coord': pct_coord})
-                                break
-
-                emit('add_connections', {'es_id': active_es_id, 'conn_list': connections_list})
+                connect_asset_class = esdl.getEClassifier(connect_asset_type)
+                connect_to_asset_class = esdl.getEClassifier(connect_to_asset_type)
+                if connect_asset_class is not None:
+                    connect_asset_list = [c for c in esh.instances_of(active_es_id, connect_asset_class)
+                                          if type(c) is connect_asset_class]
+                if connect_to_asset_class is not None:
+                    connect_to_asset_list = [c for c in esh.instances_of(active_es_id, connect_to_asset_class)
+                                             if type(c) is connect_to_asset_class]
+
+                max_distance = params.get("max_distance")
+                max_distance = float(max_distance) if max_distance not in (None, '') else None
+                max_connections = params.get("max_connections")
+                max_connections = int(max_connections) if max_connections not in (None, '') else None
+
+                connections_list = self.connect_to_nearest(esh, active_es_id, connect_asset_list,
+                                                           connect_to_asset_list, max_distance, max_connections)
+                logger.info('Connected {} unconnected {} assets to the nearest {}'.format(
+                    len(connections_list), connect_asset_type, connect_to_asset_type))
+
+                conn_list = get_session_for_esid(active_es_id, 'conn_list')
+                if conn_list is not None:
+                    conn_list.extend(connections_list)
+                    emit_ui_delta(esh, active_es_id, layers=(CONNECTIONS_LAYER,))
+                else:
+                    emit('add_connections', {'es_id': active_es_id, 'conn_list': connections_list})
+                return len(connections_list)
+
+    @staticmethod
+    def connect_to_nearest(esh, es_id, connect_asset_list, connect_to_asset_list, max_distance=None,
+                           max_connections=None):
+        """
+        Connects the first port of every unconnected asset in connect_asset_list to the first port of opposite type
+        of the nearest asset in connect_to_asset_list
+        :param max_distance: maximum distance in meters, assets further away are not connected
+        :param max_connections: maximum number of assets that are connected to the same asset
+        :return: list with the new connections, in the format of the conn_list of the session
+        """
+        targets = [ct for ct in connect_to_asset_list if ct.geometry is not None]
+        target_geometries = geometries_of(targets)
+        remaining = np.full(len(targets), max_connections if max_connections is not None else len(connect_asset_list))
+
+        connections_list = list()
+        for port_type, find_port_type in ((esdl.InPort, esdl.OutPort), (esdl.OutPort, esdl.InPort)):
+            # TODO: fix assume one port
+            sources = [c for c in connect_asset_list if c.port and isinstance(c.port[0], port_type)
+                       and not c.port[0].connectedTo and c.geometry is not None]
+            target_ports = [next((p for p in ct.port if isinstance(p, find_port_type)), None) for ct in targets]
+            available = np.array([p is not None for p in target_ports], dtype=bool)
+            if not sources or not available.any():
+                continue
+
+            source_geometries, available_geometries = to_meters(geometries_of(sources), target_geometries[available])
+            available_idx = np.flatnonzero(available)
+            source_idx, target_idx, _ = match_nearest(source_geometries, available_geometries, max_distance,
+                                                      remaining[available])
+            target_idx = available_idx[target_idx]
+            np.subtract.at(remaining, target_idx, 1)
+
+            for si, ti in zip(source_idx, target_idx):
+                c, ct = sources[si], targets[ti]
+                port_c, p = c.port[0], target_ports[ti]
+                p.connectedTo.append(port_c)
+
+                pct_coord = get_asset_and_coord_from_port_id(esh, es_id, p.id)['coord']
+                pc_coord = get_asset_and_coord_from_port_id(esh, es_id, port_c.id)['coord']
+                connections_list.append({
+                    'from-port-id': port_c.id, 'from-port-carrier': port_c.carrier.id if port_c.carrier else None,
+                    'from-asset-id': c.id, 'from-asset-coord': pc_coord,
+                    'to-port-id': p.id, 'to-port-carrier': p.carrier.id if p.carrier else None,
+                    'to-asset-id': ct.id, 'to-asset-coord': pct_coord})
+        return connections_list
 
     @staticmethod
     def add_boundary_to_shape_list(shape_list, area_id, boundary):
@@ -248,13 +281,17 @@ class SpatialOperations:
         top_area_shape = list()
         if year and area.id and area.scope.name != 'UNDEFINED':
             if is_valid_boundary_id(area.id):
-                boundary = self.boundary_service_instance.get_boundary_from_service(year, area.scope, str.upper(area.id))
+                # retrieve the boundaries of the area and all sub areas in parallel
+                boundaries = self.boundary_service_instance.get_boundaries_from_service(
+                    year, [(area.scope, area.id)] + [(ar.scope, ar.id) for ar in area.area
+                                                     if ar.id and ar.scope.name != 'UNDEFINED'])
+                boundary = boundaries[(area.scope, str.upper(area.id))]
                 top_area_shape = Shape.parse_geojson_geometry(boundary['geom'])
 
                 for ar in area.area:
                     if ar.id and ar.scope.name != 'UNDEFINED':
                         if is_valid_boundary_id(ar.id):
-                            boundary = self.boundary_service_instance.get_boundary_from_service(year, ar.scope, str.upper(ar.id))
+                            boundary = boundaries[(ar.scope, str.upper(ar.id))]
                             self.add_boundary_to_shape_list(sub_area_shape_list, ar.id, boundary)
 
         set_session('sub_area_shape_list', sub_area_shape_list)
@@ -16,11 +16,8 @@ from flask import Flask
 from flask_socketio import SocketIO, emit
 from flask_executor import Executor
 from datetime import datetime
-from datetime import timedelta
 from dateutil import rrule
-from influxdb import InfluxDBClient
 from geojson import Feature, MultiLineString, FeatureCollection, dumps
-from math import fabs
 import pytz
 
 from extensions.session_manager import get_handler, get_session, set_session
@@ -28,6 +25,8 @@ from extensions.settings_storage import SettingsStorage
 from extensions.mapeditor_settings import MapEditorSettings, MAPEDITOR_UI_SETTINGS
 
 import src.settings as settings
+from src.influxdb_gateway import gateway as influxdb_gateway
+from src.simulation_frames import SimulationFrames, allocation_boundaries
 import src.log as log
 
 logger = log.get_logger(__name__)
@@ -124,15 +123,34 @@ class TimeDimension:
                 set_session('ielgas_monitor_ids', [])
 
                 self.preprocess_data(networks)
-                time_list = self.get_all_times_from_simulation()
 
                 timedimension_colors = self.get_colors()
                 set_session('timedimension-colors', timedimension_colors)
 
-                # self.preload_simulation_data()
+                # Load the run once, the player retrieves its frames from memory
+                frames = self.load_simulation_frames()
+                set_session('timedimension-frames', frames)
                 # Return list of times.
-                #return True
-                return time_list
+                return frames.times if frames else None
+
+        @self.socketio.on('timedimension_get_assets', namespace='/esdl')
+        def timedimension_get_assets():
+            with self.flask_app.app_context():
+                frames = get_session('timedimension-frames')
+                return frames.assets if frames else []
+
+        @self.socketio.on('timedimension_get_frames', namespace='/esdl')
+        def timedimension_get_frames(start, end):
+            """
+            Returns the frames with index start up to and including end, with the values and stroke widths by the
+            index of the asset in the list returned by timedimension_get_assets
+            """
+            with self.flask_app.app_context():
+                frames = get_session('timedimension-frames')
+                if not frames:
+                    return None
+                self.emit_monitor_data(frames, start, end)
+                return frames.get_frames(start, end)
 
         @self.socketio.on('timedimension_get_asset_ids', namespace='/esdl')
         def timedimension_get_asset_ids():
@@ -165,8 +183,8 @@ class TimeDimension:
 
     def connect_to_database(self):
         database = get_session('timedimension-database')
-        return InfluxDBClient(host=self.config['ESSIM_database_server'],
-                                              port=self.config['ESSIM_database_port'], database=database)
+        return influxdb_gateway.database(host=self.config['ESSIM_database_server'],
+                                         port=self.config['ESSIM_database_port'], database=database)
 
     def preprocess_data(self, networks):
         influxdb_client = self.connect_to_database()
@@ -198,19 +216,16 @@ class TimeDimension:
         set_session('timedimension-asset-ids', asset_ids)
 
         logger.debug("calculating min/max per carrier")
-        allocation_boundaries = dict()
+        boundaries = dict()
         simulation_parameter = get_session('timedimension-parameter')
         query = "SELECT MIN({}), MAX({}) FROM {}".format(simulation_parameter, simulation_parameter, ",".join(networks_list))
-        result = allocation_energy = influxdb_client.query(query)
+        result = influxdb_client.query(query)
         if result:
-            for key in list(allocation_energy.keys()):
-                series = allocation_energy[key]
-                for item in series:
-                    allocation_boundaries[key] = (item['min'], item['max'])
-
-            logger.debug(allocation_boundaries)
+            # keyed by network name, as used by SimulationFrames
+            boundaries = allocation_boundaries(result)
+            logger.debug(boundaries)
 
-        set_session('timedimension-allocation-boundaries', allocation_boundaries)
+        set_session('timedimension-allocation-boundaries', boundaries)
 
     def get_colors(self):
         active_es_id = get_session('active_es_id')
@@ -236,145 +251,83 @@ class TimeDimension:
 
         return colors
 
-    def generate_timed_geojson_for_line(self, coordinates, time, load, allocationEnergy, id, color, min_en, max_en):
-        my_feature = Feature(geometry=MultiLineString(coordinates))
-        my_feature['properties']['id'] = id
-        my_feature['properties']['time'] = time
-        my_feature['properties']['load'] = allocationEnergy
-        my_feature['properties']['stroke'] = color
-        if allocationEnergy < 0:
-            val = 10*fabs(allocationEnergy/min_en) + 3
-            my_feature['properties']['pos'] = False
-        else:
-            val = 10*allocationEnergy/max_en + 3
-            my_feature['properties']['pos'] = True
-
-        # val = 10*((fabs(allocationEnergy)  - min_en)/(max_en - min_en)) + 3
-        my_feature['properties']['strokeWidth'] = val
-        return my_feature
-
-    # This function retrieves all timestamps for a measurement.
-    def get_all_times_from_simulation(self):
+    def load_simulation_frames(self):
+        """Retrieves all results of the simulation run and creates the animation frames"""
         networks_list = get_session('timedimension-networks-list')
         simulation_id = get_session('timedimension-simulation-id')
-        try:
-            influxdb_client = self.connect_to_database()
-            query = 'SELECT * FROM ' + ",".join(networks_list) + ' WHERE "simulationRun" = \'' + simulation_id + '\''
-            sim_results = influxdb_client.query(query)
-
-            time_list = list()
-
-            if sim_results:
-                feature_list = []
-                for key in list(sim_results.keys()):
-                    series = sim_results[key]
-                    fid = 1
-                    for item in series:
-                        time_list.append(item['time'])
+        simulation_parameter = get_session('timedimension-parameter')
+        allocation_boundaries = get_session('timedimension-allocation-boundaries')
+        colors = get_session('timedimension-colors')
+        active_es_id = get_session('active_es_id')
+        esh = get_handler()
 
-            # Keep only unique time values.
-            time_list = list(dict.fromkeys(time_list))
-            return time_list
+        def get_asset(asset_id):
+            try:
+                return esh.get_by_id(active_es_id, asset_id)
+            except KeyError:
+                logger.warning('Asset id {} not found'.format(asset_id))
+                return None
 
+        carrier_colors = {c['carrier_id']: c['color'] for c in colors.values()}
+        try:
+            influxdb_client = self.connect_to_database()
+            query = 'SELECT "{}", "assetId", "carrierId" FROM {} WHERE "simulationRun" = \'{}\''.format(
+                simulation_parameter, ",".join(networks_list), simulation_id)
+            sim_results = influxdb_client.query(query, cache=True)
         except Exception as e:
-            logger.error('error with query: ', str(e))
-
-    def get_windowed_simulation_data(self, start, end):
-        simulation_id = get_session('timedimension-simulation-id')
+            logger.error('error with query: {}'.format(e))
+            return None
 
-        # Functie get_windowed_simulation_data doet niets met self.time_list, dus denk niet dat aanroep hier nodig is?
-        # self.get_all_times_from_simulation()
+        frames = SimulationFrames.from_results(sim_results, simulation_parameter, get_asset, carrier_colors,
+                                               allocation_boundaries)
+        logger.debug('Loaded {} frames of {} assets'.format(len(frames.times), len(frames.assets)))
+        return frames
 
-        logger.debug("--- Retrieving Simulation Data ---")
-        influxdb_client = self.connect_to_database()
-        # active_simulation = get_session('active_simulation')
+    def emit_monitor_data(self, frames, start, end):
+        """Sends the values of the monitored assets in the frames to the IELGAS monitor"""
+        monitor_asset_ids = get_session('ielgas_monitor_ids')
+        if not monitor_asset_ids or start >= len(frames.times):
+            return
         active_es_id = get_session('active_es_id')
-        # active_es_id = "ea50089c-0404-4048-97b8-94f0b0aa866b"
-
-        sdt = datetime.strptime(start, '%Y-%m-%dT%H:%M:%S.%f%z')
-        edt = datetime.strptime(end, '%Y-%m-%dT%H:%M:%S.%f%z')
-        influxdb_startdate = sdt.strftime('%Y-%m-%dT%H:%M:%SZ')
-        influxdb_enddate = edt.strftime('%Y-%m-%dT%H:%M:%SZ')
-
         esh = get_handler()
-        monitor_asset_ids = get_session('ielgas_monitor_ids')
-        networks_list = get_session('timedimension-networks-list')
 
-        monitor_data = dict()
-        logger.debug(monitor_asset_ids)
-        if monitor_asset_ids:
-            start_cet = sdt.astimezone(pytz.timezone("Europe/Amsterdam"))
-            date_cet = start_cet.strftime('%Y-%m-%d')
-            monitor_asset_data = dict()
-            for aid in monitor_asset_ids:
-                asset = esh.get_by_id(active_es_id, aid)
-                asset_name = asset.name + ' - ' + date_cet
-
-                monitor_asset_data[aid] = {
-                    'name': asset_name,
-                    'data_x': list(),
-                    'data_y': list()
-                }
-            monitor_data = {
-                'time': date_cet,
-                'data': monitor_asset_data
+        sdt = datetime.strptime(frames.times[max(0, start)], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=pytz.utc)
+        date_cet = sdt.astimezone(pytz.timezone("Europe/Amsterdam")).strftime('%Y-%m-%d')
+        monitor_asset_data = dict()
+        for aid in monitor_asset_ids:
+            asset = esh.get_by_id(active_es_id, aid)
+            times, values = frames.get_asset_series(aid, start, end)
+            monitor_asset_data[aid] = {
+                'name': asset.name + ' - ' + date_cet,
+                'data_x': [t.split('T')[1].strip('Z') for t in times],
+                'data_y': values
             }
+        emit('ielgas_monitor_asset_data', {'time': date_cet, 'data': monitor_asset_data})
 
-        sim_results = None
-        try:
-            # if start and end date are the same, it means that we have reached the end of the time series.
-            # But this also eans that we miss exactly the final entry, so handle this here.
-            if influxdb_startdate == influxdb_enddate:
-                influxdb_enddate = datetime.strptime(influxdb_enddate, '%Y-%m-%dT%H:%M:%SZ')
-                influxdb_enddate = influxdb_enddate + timedelta(days=1)
-                influxdb_enddate = influxdb_enddate.strftime('%Y-%m-%dT%H:%M:%SZ')
-            query = 'SELECT * FROM '+ ",".join(networks_list) +\
-                    ' WHERE (time >= \'' + influxdb_startdate + '\' AND time <= \'' + influxdb_enddate + '\'' +\
-                    ' AND "simulationRun" = \'' + simulation_id + '\')'
-            sim_results = influxdb_client.query(query)
-        except Exception as e:
-            logger.error('error with query: ', str(e))
-
-        simulation_parameter = get_session('timedimension-parameter')
-        allocation_boundaries = get_session('timedimension-allocation-boundaries')
-        colors = get_session('timedimension-colors')
+    def get_windowed_simulation_data(self, start, end):
+        """Returns the frames between start and end as a GeoJSON feature collection"""
+        frames = get_session('timedimension-frames')
+        if not frames:
+            logger.warn('No simulation data loaded')
+            return "{}"
 
-        feature_collection_json_string = "{}"
-        if sim_results:
-            feature_list = []
-            for key in list(sim_results.keys()):
-                series = sim_results[key]
-                fid = 1
-                for item in series:
-                    try:
-                        current_asset = esh.get_by_id(active_es_id, item['assetId'])
-                    except:
-                        print("Asset id not found.")
-                        continue
-                    coordinates = [[(current_asset.geometry.point.items[0].lon, current_asset.geometry.point.items[0].lat),
-                                    (current_asset.geometry.point.items[1].lon, current_asset.geometry.point.items[1].lat)]]
-
-                    color = colors[active_es_id+item['carrierId']]['color']  # 32a852"
-                    if abs(item[simulation_parameter]) > 1e-2:
-                        feature_list.append(
-                            self.generate_timed_geojson_for_line(coordinates, item['time'], 0.5,
-                                                                 item[simulation_parameter], item['assetId'], color,
-                                                                 allocation_boundaries[key][0], allocation_boundaries[key][1]))
-                        fid += 1
-                    if 'data' in monitor_data and item['assetId'] in monitor_data['data']:
-                        monitor_data['data'][item['assetId']]['data_x'].append(item['time'].split('T')[1].strip('Z'))
-                        monitor_data['data'][item['assetId']]['data_y'].append(item[simulation_parameter])
-
-            logger.debug('Number of features result from get_windowed_simulation_data: ' + str(len(feature_list)))
-
-            feature_collection = FeatureCollection(feature_list)
-            feature_collection_json_string = dumps(feature_collection)
-        else:
+        sdt = datetime.strptime(start, '%Y-%m-%dT%H:%M:%S.%f%z')
+        edt = datetime.strptime(end, '%Y-%m-%dT%H:%M:%S.%f%z')
+        start_index, end_index = frames.time_range(sdt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                                   edt.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        self.emit_monitor_data(frames, start_index, end_index)
+        if start_index > end_index:
             logger.warn('query yielded no results')
-
-        if monitor_asset_ids:
-            # logger.debug(monitor_data)
-            emit('ielgas_monitor_asset_data', monitor_data)
-
-        return feature_collection_json_string
-
+            return "{}"
+
+        window = frames.get_frames(start_index, end_index)
+        feature_list = []
+        for time, frame in zip(window['times'], window['frames']):
+            for i, value, width in zip(frame['a'], frame['v'], frame['w']):
+                asset = frames.assets[i]
+                my_feature = Feature(geometry=MultiLineString([asset['coordinates']]))
+                my_feature['properties'] = {'id': asset['id'], 'time': time, 'load': value, 'stroke': asset['color'],
+                                            'pos': value >= 0, 'strokeWidth': width}
+                feature_list.append(my_feature)
+        logger.debug('Number of features result from get_windowed_simulation_data: ' + str(len(feature_list)))
+        return dumps(FeatureCollection(feature_list))
@@ -0,0 +1,333 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Mapbox Vector Tiles of the assets, buildings, connections, areas and potentials of an energy system.
+
+GET /tiles/<es_id>/<layer>/<z>/<x>/<y>.mvt returns a tile with one layer, built from the energy system that is
+loaded in the session. Per energy system (resource), a VectorTileSource keeps the features of every layer in web
+mercator coordinates with an STR-tree index, and an LRU cache of encoded tiles. The source observes the resource:
+the features of changed objects are updated on the next request, and only the cached tiles that contain the old or
+new location of a changed feature are dropped.
+"""
+import itertools
+import math
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from flask import Flask, make_response, request
+from flask_socketio import SocketIO
+from pyecore.ecore import EObject
+from pyecore.notification import EObserver, Notification
+from shapely import STRtree
+from shapely.geometry import LineString, box
+
+from esdl import esdl
+from esdl.processing.ESDLConnectivity import ConnectivityIndex
+from extensions.session_manager import get_handler, get_session
+from src.mvt import encode_tile, EXTENT
+from src.shape import Shape
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+ASSETS_LAYER = 'assets'
+BUILDINGS_LAYER = 'buildings'
+CONNECTIONS_LAYER = 'connections'
+AREAS_LAYER = 'areas'
+POTENTIALS_LAYER = 'potentials'
+LAYERS = (ASSETS_LAYER, BUILDINGS_LAYER, CONNECTIONS_LAYER, AREAS_LAYER, POTENTIALS_LAYER)
+
+MAX_ZOOM = 24
+TILE_BUFFER = 64            # in tile coordinates, so lines and symbols at the border of a tile are drawn completely
+TILE_CACHE_SIZE = 2048      # tiles per energy system
+MAX_INCREMENTAL_UPDATE = 1000   # with more changed objects, all features are recalculated
+
+MAX_LATITUDE = 85.0511287798
+
+# ETags of tiles are unique per process, so tiles of an earlier run are never considered up to date
+_ETAG_PREFIX = uuid.uuid4().hex[:8]
+
+
+def _lonlat_to_world(coords):
+    """Web mercator coordinates in the range 0..1 (y pointing down) of an array with (lon, lat) coordinates"""
+    lon = coords[:, 0]
+    lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0
+    return np.column_stack((x, y))
+
+
+def to_world(geometry):
+    return shapely.transform(geometry, _lonlat_to_world)
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """Bounds of a tile in web mercator coordinates (0..1), with a buffer in tile coordinates"""
+    n = 2 ** z
+    b = buffer / EXTENT
+    return (x - b) / n, (y - b) / n, (x + 1 + b) / n, (y + 1 + b) / n
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class VectorTileSource(EObserver):
+    def __init__(self, resource):
+        super().__init__()
+        self.resource = resource
+        self._lock = threading.RLock()
+        self._features = None           # layer -> {key: (world geometry, properties, WGS84 geometry)}
+        self._asset_connections = {}    # asset id -> keys of the connections of the asset
+        self._trees = {}                # layer -> (STRtree, keys)
+        self._dirty = set()             # objects of which the features must be updated
+        self._tiles = OrderedDict()     # (layer, z, x, y) -> (etag, data)
+        self._shapes = None             # (token, generation) of the shape dictionary that was used for the areas
+        self._etags = itertools.count()
+
+    @staticmethod
+    def get_source(resource):
+        """Returns the VectorTileSource of a resource, creates it if it does not exist yet"""
+        for listener in resource.listeners:
+            if isinstance(listener, VectorTileSource):
+                return listener
+        source = VectorTileSource(resource)
+        source.observe(resource)
+        return source
+
+    def notifyChanged(self, notification: Notification):
+        # the asset, area or potential the changed object belongs to, e.g. the asset of a port
+        obj = notification.notifier
+        while obj is not None and not isinstance(obj, (esdl.Asset, esdl.Area, esdl.Potential)):
+            obj = obj.eContainer()
+        with self._lock:
+            if obj is not None:
+                self._dirty.add(obj)
+            feature = notification.feature
+            if feature is not None and getattr(feature, 'containment', False):
+                for value in (notification.old, notification.new):
+                    values = value if isinstance(value, (list, tuple)) else [value]
+                    for v in values:
+                        if isinstance(v, EObject):
+                            self._dirty.update(o for o in [v, *v.eAllContents()]
+                                               if isinstance(o, (esdl.Asset, esdl.Area, esdl.Potential)))
+
+    def get_tile(self, layer, z, x, y, shape_dictionary=None):
+        """
+        Returns (etag, data) of the tile of a layer
+        :param shape_dictionary: the shapes of the areas of the session (e.g. from the boundary service)
+        """
+        with self._lock:
+            self._refresh(shape_dictionary)
+            key = (layer, z, x, y)
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                return cached
+            data = encode_tile({layer: self._query(layer, z, x, y)})
+            cached = ('{}-{}-{}'.format(_ETAG_PREFIX, id(self), next(self._etags)), data)
+            self._tiles[key] = cached
+            while len(self._tiles) > TILE_CACHE_SIZE:
+                self._tiles.popitem(last=False)
+            return cached
+
+    # -----------------------------------------------------------------------------------------------------------------
+    #  Updating features
+    # -----------------------------------------------------------------------------------------------------------------
+    def _energy_system_objects(self):
+        for es in self.resource.contents:
+            for obj in es.eAllContents():
+                if isinstance(obj, (esdl.Asset, esdl.Area, esdl.Potential)):
+                    yield obj
+
+    def _refresh(self, shape_dictionary):
+        # the token survives pickling, the shape dictionary is a new object on every request with a shared store
+        shapes = None
+        if shape_dictionary is not None:
+            shapes = (getattr(shape_dictionary, 'token', id(shape_dictionary)),
+                      getattr(shape_dictionary, 'generation', None))
+        if shapes != self._shapes and self._features is not None:
+            self._dirty.update(obj for obj in self._energy_system_objects() if isinstance(obj, esdl.Area))
+        self._shapes = shapes
+
+        if self._features is None or len(self._dirty) > MAX_INCREMENTAL_UPDATE:
+            self._features = {layer: dict() for layer in LAYERS}
+            self._asset_connections = {}
+            self._trees = {}
+            self._tiles.clear()
+            self._dirty = set()
+            for obj in self._energy_system_objects():
+                self._update_object(obj, shape_dictionary, None)
+            return
+
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        changed_bounds = {layer: [] for layer in LAYERS}
+        for obj in dirty:
+            self._update_object(obj, shape_dictionary, changed_bounds)
+        self._invalidate_tiles(changed_bounds)
+
+    def _update_object(self, obj, shape_dictionary, changed_bounds):
+        in_resource = obj.eResource is self.resource
+        if isinstance(obj, esdl.Area):
+            geometry = None
+            if in_resource:
+                shp = shape_dictionary.get(obj.id) if shape_dictionary is not None and obj.id else None
+                if shp is not None and shp.shape is not None:
+                    geometry = shp.shape
+                elif obj.geometry:
+                    geometry = Shape.create(obj.geometry).shape
+            self._set_feature(AREAS_LAYER, obj.id, geometry, {
+                'id': obj.id, 'name': obj.name, 'scope': obj.scope.name if obj.scope else None}, changed_bounds)
+        elif isinstance(obj, esdl.Potential):
+            geometry = Shape.create(obj.geometry).shape if in_resource and obj.geometry else None
+            self._set_feature(POTENTIALS_LAYER, obj.id, geometry, {
+                'id': obj.id, 'name': obj.name, 'type': type(obj).__name__}, changed_bounds)
+        else:
+            is_building = isinstance(obj, esdl.AbstractBuilding)
+            geometry = None
+            # assets in a building are shown in the building editor, not on the map
+            if in_resource and obj.geometry and (is_building or obj.containingBuilding is None):
+                geometry = Shape.create(obj.geometry).shape
+            self._set_feature(BUILDINGS_LAYER if is_building else ASSETS_LAYER, obj.id, geometry, {
+                'id': obj.id, 'name': obj.name, 'type': type(obj).__name__}, changed_bounds)
+            self._update_connections(obj, in_resource, changed_bounds)
+            if is_building and in_resource:
+                # connections to assets in a building are drawn to the building
+                for asset in obj.eAllContents():
+                    if isinstance(asset, esdl.EnergyAsset):
+                        self._update_connections(asset, True, changed_bounds)
+
+    def _update_connections(self, asset, in_resource, changed_bounds):
+        for key in self._asset_connections.pop(asset.id, set()):
+            feature = self._features[CONNECTIONS_LAYER].get(key)
+            if feature is not None:
+                for asset_id in (feature[1]['from-asset-id'], feature[1]['to-asset-id']):
+                    if asset_id != asset.id and asset_id in self._asset_connections:
+                        self._asset_connections[asset_id].discard(key)
+            self._set_feature(CONNECTIONS_LAYER, key, None, None, changed_bounds)
+        if not in_resource or not isinstance(asset, esdl.EnergyAsset):
+            return
+
+        connectivity = ConnectivityIndex.get_index(self.resource)
+        for port in asset.port:
+            for connected_port in port.connectedTo:
+                if connected_port.eResource is not self.resource:
+                    continue
+                from_port, to_port = (port, connected_port) if port.id < connected_port.id else (connected_port, port)
+                key = from_port.id + to_port.id
+                from_asset, from_coord = self._connection_point(connectivity, from_port)
+                to_asset, to_coord = self._connection_point(connectivity, to_port)
+                if not from_coord or not to_coord:
+                    continue
+                carrier = from_port.carrier or to_port.carrier
+                self._set_feature(CONNECTIONS_LAYER, key,
+                                  LineString([(from_coord[1], from_coord[0]), (to_coord[1], to_coord[0])]), {
+                                      'id': key, 'from-port-id': from_port.id, 'to-port-id': to_port.id,
+                                      'from-asset-id': from_asset.id, 'to-asset-id': to_asset.id,
+                                      'carrier': carrier.id if carrier else None}, changed_bounds)
+                self._asset_connections.setdefault(from_asset.id, set()).add(key)
+                self._asset_connections.setdefault(to_asset.id, set()).add(key)
+
+    @staticmethod
+    def _connection_point(connectivity, port):
+        asset, coord = connectivity.port_asset_and_coord(port)
+        building = asset.containingBuilding
+        if building is not None:
+            coord = connectivity.building_coord(building)
+        return asset, coord
+
+    def _set_feature(self, layer, key, geometry, properties, changed_bounds):
+        features = self._features[layer]
+        old = features.get(key)
+        if geometry is not None and geometry.is_empty:
+            geometry = None
+        if old is None and geometry is None:
+            return
+        if old is not None and geometry is not None and old[1] == properties and \
+                (old[2] is geometry or shapely.equals_exact(old[2], geometry, 0)):
+            return
+        if old is not None:
+            del features[key]
+            if changed_bounds is not None:
+                changed_bounds[layer].append(old[0].bounds)
+        if geometry is not None:
+            world_geometry = to_world(geometry)
+            features[key] = (world_geometry, properties, geometry)
+            if changed_bounds is not None:
+                changed_bounds[layer].append(world_geometry.bounds)
+        self._trees.pop(layer, None)
+
+    def _invalidate_tiles(self, changed_bounds):
+        if not any(changed_bounds.values()):
+            return
+        removed = [key for key in self._tiles
+                   if any(_intersects(tile_bounds(*key[1:], TILE_BUFFER), bounds) for bounds in changed_bounds[key[0]])]
+        for key in removed:
+            del self._tiles[key]
+        logger.debug('Removed {} vector tiles from the cache'.format(len(removed)))
+
+    # -----------------------------------------------------------------------------------------------------------------
+    #  Creating tiles
+    # -----------------------------------------------------------------------------------------------------------------
+    def _query(self, layer, z, x, y):
+        """Returns the features of a layer in the tile, in tile coordinates"""
+        tree = self._trees.get(layer)
+        if tree is None:
+            keys = list(self._features[layer].keys())
+            tree = (STRtree([self._features[layer][k][0] for k in keys]), keys)
+            self._trees[layer] = tree
+        bounds = tile_bounds(z, x, y, TILE_BUFFER)
+        indices = tree[0].query(box(*bounds))
+        if len(indices) == 0:
+            return []
+        features = [self._features[layer][tree[1][i]] for i in sorted(indices.tolist())]
+        geometries = np.array([f[0] for f in features], dtype=object)
+        is_point = shapely.get_type_id(geometries) == 0
+        geometries[~is_point] = shapely.clip_by_rect(geometries[~is_point], *bounds)
+        n = 2 ** z
+        offset = np.array([x, y], dtype=float)
+        geometries = shapely.transform(geometries, lambda c: (c * n - offset) * EXTENT)
+        return [(geometry, feature[1]) for geometry, feature in zip(geometries, features) if not geometry.is_empty]
+
+
+class VectorTiles:
+    def __init__(self, flask_app: Flask, socket: SocketIO):
+        self.flask_app = flask_app
+        self.socketio = socket
+        self.register()
+
+    def register(self):
+        logger.info('Registering VectorTiles extension')
+
+        @self.flask_app.route('/tiles/<es_id>/<layer>/<int:z>/<int:x>/<int:y>.mvt')
+        def get_vector_tile(es_id, layer, z, x, y):
+            if layer not in LAYERS or not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+                return 'Invalid tile', 404
+            esh = get_handler()
+            resource = esh.get_resource(es_id) if esh else None
+            if resource is None:
+                return 'Unknown energy system', 404
+
+            etag, data = VectorTileSource.get_source(resource).get_tile(layer, z, x, y, get_session('shape_dictionary'))
+            response = make_response(data)
+            response.headers['Content-Type'] = 'application/vnd.mapbox-vector-tile'
+            response.headers['Cache-Control'] = 'no-cache'
+            response.set_etag(etag)
+            return response.make_conditional(request)
@@ -0,0 +1,133 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Registry of the handlers of the commands that the browser sends with the 'command' socket event.
+
+Handlers are registered by the name of the command, by the core application and by extensions:
+
+    @command_registry.command('add_object')
+    def add_object(message, esh, es_edit, active_es_id):
+        ...
+
+A handler is called with the message and the values of the context of process_command() that it has parameters
+for: esh, es_edit, active_es_id, area_bld_list and user_email. The return value is sent back to the browser.
+
+Every dispatch is timed and recorded in a latency histogram per command and size of the model (number of objects
+with an id) in the metrics of the map editor, so it shows which commands are slow on large models. Commands that take
+longer than the slow threshold are logged with their arguments.
+"""
+import inspect
+import json
+import time
+from collections import deque
+from datetime import datetime
+
+import src.log as log
+import src.settings as settings
+from src.metrics import metrics
+
+logger = log.get_logger(__name__)
+
+# upper bounds of the classes of model sizes, in number of objects
+MODEL_SIZE_CLASSES = (1000, 10000, 100000, float('inf'))
+# maximum length of the arguments of a command in the slow command log
+MAX_ARGS_LENGTH = 2000
+
+
+def model_size_class(model_size):
+    """Returns the label of the class of a model size, e.g. '10000' for a model with 2500 objects"""
+    if model_size is None:
+        return 'unknown'
+    for upper_bound in MODEL_SIZE_CLASSES:
+        if model_size <= upper_bound:
+            return '+Inf' if upper_bound == float('inf') else str(upper_bound)
+
+
+class CommandRegistry:
+    def __init__(self, slow_threshold=1.0, slow_log_size=100, metrics_prefix='mapeditor_command'):
+        """
+        :param slow_threshold: commands that take longer (in seconds) are logged with their arguments
+        :param slow_log_size: number of slow commands that are kept
+        :param metrics_prefix: prefix of the names of the metrics of the commands
+        """
+        self.slow_threshold = slow_threshold
+        self.handlers = dict()          # name -> (handler, names of the context parameters of the handler)
+        self.durations = metrics.histogram(metrics_prefix + '_duration_seconds',
+                                           'Duration of the commands from the browser per size of the model',
+                                           ['command', 'model_size'])
+        self.slow = metrics.counter(metrics_prefix + '_slow_total', 'Number of commands that took longer than the '
+                                    'slow command threshold', ['command'])
+        self.slow_commands = deque(maxlen=slow_log_size)
+
+    def register(self, name, handler):
+        if name in self.handlers:
+            raise ValueError('Command {} is already registered'.format(name))
+        parameters = list(inspect.signature(handler).parameters)[1:]     # the first one is the message
+        self.handlers[name] = (handler, frozenset(parameters))
+
+    def command(self, *names):
+        """Decorator that registers a function as the handler of one or more commands"""
+        def decorator(handler):
+            for name in names:
+                self.register(name, handler)
+            return handler
+        return decorator
+
+    def get(self, name):
+        entry = self.handlers.get(name)
+        return entry[0] if entry else None
+
+    def dispatch(self, name, message, **context):
+        """Calls the handler of a command with the message and the context values it has parameters for"""
+        entry = self.handlers.get(name)
+        if entry is None:
+            logger.warning('No handler registered for command {}'.format(name))
+            return None
+        handler, parameters = entry
+        kwargs = {key: value for key, value in context.items() if key in parameters}
+        start = time.perf_counter()
+        try:
+            return handler(message, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            esh = context.get('esh')
+            self.record(name, duration, esh.object_count() if esh is not None else None, message)
+
+    def record(self, name, duration, model_size=None, message=None):
+        self.durations.observe(duration, command=name, model_size=model_size_class(model_size))
+        if duration >= self.slow_threshold:
+            self.slow.inc(command=name)
+            try:
+                args = json.dumps(message, default=str)
+            except (TypeError, ValueError):
+                args = repr(message)
+            if len(args) > MAX_ARGS_LENGTH:
+                args = args[:MAX_ARGS_LENGTH] + '...'
+            self.slow_commands.append({'command': name, 'duration': duration, 'model_size': model_size,
+                                       'time': datetime.now().isoformat(), 'args': args})
+            logger.warning('Slow command {} took {:.2f}s on a model with {} objects, args: {}'.format(
+                name, duration, model_size, args))
+
+    def get_stats(self):
+        """Returns a list with the latency statistics per command and model size class"""
+        stats = []
+        for (name, size_class), (cumulative, total, count) in sorted(self.durations.values().items()):
+            stats.append({'command': name, 'model_size': size_class, 'count': count, 'total': total,
+                          'mean': total / count if count else 0.0,
+                          'buckets': dict(zip(self.durations.buckets, cumulative))})
+        return stats
+
+
+command_registry = CommandRegistry(settings.SLOW_COMMAND_THRESHOLD)
@@ -24,7 +24,7 @@ import zipfile
 import time
 
 from esdl import esdl
-from extensions.session_manager import set_session, get_session, get_handler
+from extensions.session_manager import set_session, get_session, get_handler_snapshot
 from pyecore.ecore import EAttribute
 import src.log as log
 
@@ -83,28 +83,27 @@ class ESDL2Shapefile:
         @self.flask_app.route('/esdl2shapefile')
         def export_to_shapefile():
             active_es_id = get_session('active_es_id')
-            esh = get_handler()
+            esh = get_handler_snapshot()     # export a copy, so the user can continue editing
             es = esh.get_energy_system(active_es_id)
             es_name = get_session('es_filename')
             if not es_name:
                 es_name = es.name if es.name else "Untitled EnergySystem"
 
-            file_obj = ESDL2Shapefile.convert_esdl_to_shapefiles_zipfile(es)
+            file_obj = ESDL2Shapefile.convert_esdl_to_shapefiles_zipfile(esh, active_es_id)
             response = make_response(file_obj.read())
             response.headers.set('Content-Type', 'zip')
             response.headers.set('Content-Disposition', 'attachment', filename='%s.zip' % es_name)
             return response
 
     @staticmethod
-    def convert_esdl_to_shapefiles_zipfile(es: esdl.EnergySystem):
+    def convert_esdl_to_shapefiles_zipfile(esh, es_id):
         assets_with_geometry = dict()
-        for obj in es.eAllContents():
-            if isinstance(obj, esdl.Asset):
-                if obj.geometry and not obj.geometry.CRS == 'Simple':
-                    if obj.eClass.name in assets_with_geometry:
-                        assets_with_geometry[obj.eClass.name]['objects'].append(obj)
-                    else:
-                        assets_with_geometry[obj.eClass.name] = {'objects': [obj], 'attr_types': []}
+        for obj in esh.instances_of(es_id, esdl.Asset):
+            if obj.geometry and not obj.geometry.CRS == 'Simple':
+                if obj.eClass.name in assets_with_geometry:
+                    assets_with_geometry[obj.eClass.name]['objects'].append(obj)
+                else:
+                    assets_with_geometry[obj.eClass.name] = {'objects': [obj], 'attr_types': []}
 
         # collect attribute types
         for asset_type, assets in assets_with_geometry.items():
@@ -19,8 +19,10 @@ from pyecore.ecore import EEnum
 
 from esdl import esdl
 from esdl.processing import ESDLGeometry, ESDLAsset, ESDLQuantityAndUnits
+from esdl.processing.ESDLConnectivity import ConnectivityIndex
 from extensions.session_manager import get_handler, get_session, get_session_for_esid
 from extensions.profiles import Profiles
+from src.ui_delta import emit_ui_delta, CONNECTIONS_LAYER
 
 
 def generate_profile_info(profile_list):
@@ -123,21 +125,15 @@ def get_asset_from_port_id(esh, es_id, pid):
     return port.eContainer()
 
 
+def get_connectivity_index(esh, es_id) -> ConnectivityIndex:
+    return ConnectivityIndex.get_index(esh.get_resource(es_id))
+
+
 def get_asset_and_coord_from_port_id(esh, es_id, pid):
     port = esh.get_by_id(es_id, pid)
-    asset = port.eContainer()
-    if asset.geometry:
-        coord = get_asset_geom_info(asset)
-        if isinstance(asset.geometry, esdl.Line):
-            # Take care of returning first coordinate for first port and last coordinate for second port
-            if asset.port[0].id == pid:
-                return {'asset': asset, 'coord': coord[0]}
-            if asset.port[1].id == pid:
-                return {'asset': asset, 'coord': coord[1]}
-        else:
-            return {'asset': asset, 'coord': coord}
-
-    return {'asset': asset, 'coord': ()}
+    # Takes care of returning first coordinate for first port and last coordinate for second port of a line
+    asset, coord = get_connectivity_index(esh, es_id).port_asset_and_coord(port)
+    return {'asset': asset, 'coord': coord}
 
 
 def asset_state_to_ui(asset):
@@ -198,12 +194,12 @@ def add_spatial_attributes(asset, attrs):
 def energy_asset_to_ui(esh, es_id, asset): # , port_asset_mapping):
     port_list = []
     conn_list = []
+    connectivity = get_connectivity_index(esh, es_id)
 
     ports = asset.port
     for p in ports:
         # p_asset = port_asset_mapping[p.id]
-        p_asset = get_asset_and_coord_from_port_id(esh, es_id, p.id)
-        p_asset_coord = p_asset['coord']        # get proper coordinate if asset is line
+        _, p_asset_coord = connectivity.port_asset_and_coord(p)     # get proper coordinate if asset is line
         conn_to = [cp.id for cp in p.connectedTo]
         profile = p.profile
         profile_info_list = []
@@ -214,19 +210,18 @@ def energy_asset_to_ui(esh, es_id, asset): # , port_asset_mapping):
                           'profile': profile_info_list, 'carrier': carrier_id})
         if conn_to:
             # conn_to_list = conn_to.split(' ')   # connectedTo attribute is list of port ID's separated by a space
-            for id in conn_to:
+            for pc in p.connectedTo:
                 # pc_asset = port_asset_mapping[id]
-                pc_asset = get_asset_and_coord_from_port_id(esh, es_id, id)
-                pc_asset_coord = pc_asset['coord']
+                pc_asset, pc_asset_coord = connectivity.port_asset_and_coord(pc)
 
                 conn_list.append(
                     {'from-port-id': p.id,
-                     'from-asset-id': p_asset['asset'].id,
+                     'from-asset-id': asset.id,
                      'from-port-carrier': p.carrier.id if p.carrier else None,
                      'from-asset-coord': p_asset_coord,
-                     'to-port-id': id,
-                     'to-port-carrier': pc_asset['asset'].carrier.id if pc_asset['asset'].carrier else None,
-                     'to-asset-id': pc_asset['asset'].id,
+                     'to-port-id': pc.id,
+                     'to-port-carrier': pc_asset.carrier.id if pc_asset.carrier else None,
+                     'to-asset-id': pc_asset.id,
                      'to-asset-coord': pc_asset_coord
                      })
 
@@ -275,9 +270,9 @@ def update_carrier_conn_list():
         from_port = esh.get_by_id(active_es_id, c['from-port-id'])
         if from_port.carrier:
             c['from-port-carrier'] = from_port.carrier.id
-        to_port = esh.get_by_id(active_es_id, c['from-port-id'])
+        to_port = esh.get_by_id(active_es_id, c['to-port-id'])
         if to_port.carrier:
             c['to-port-carrier'] = to_port.carrier.id
 
-    emit('clear_connections')  # clear current active layer connections
-    emit('add_connections', {'es_id': active_es_id, 'conn_list': conn_list})
+    # only the connections of which the carrier of a port changed are sent
+    emit_ui_delta(esh, active_es_id, layers=(CONNECTIONS_LAYER,))
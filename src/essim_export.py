@@ -0,0 +1,163 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Export of the results of an ESSIM simulation run to an Excel file.
+
+The results are queried in ranges of time and every range is pivoted per network into a block with a row per time
+and a column per asset, which is appended to the sheets of a write-only workbook. Only one range of results is in
+memory at a time, the rows of the sheets are kept in temporary files until the workbook is saved.
+"""
+import os
+from datetime import timedelta
+
+import pandas as pd
+
+import src.log as log
+from src.tno.shared import excel
+
+logger = log.get_logger(__name__)
+
+# allocation/imbalance attribute -> postfix of the sheet name
+ATTRIBUTES = (("Power", "PinW"), ("Energy", "EinJ"))
+# size of the blocks in which the file is sent
+SEND_BLOCK_SIZE = 64 * 1024
+
+
+def pivot_results(columns, values, attribute):
+    """
+    Pivots the rows of the results of a network into a DataFrame with a row per time and a column per (non transport)
+    asset with the allocation, and a column with the imbalance of the network
+    :return: (DataFrame indexed by time, list with the columns in order of appearance)
+    """
+    df = pd.DataFrame(values, columns=columns)
+    allocation = 'allocation' + attribute
+    imbalance = 'imbalance' + attribute
+    if allocation in df and 'assetName' in df:
+        is_asset = df[allocation].notna() & df['assetName'].notna()
+    else:
+        is_asset = pd.Series(False, index=df.index)
+    if 'capability' in df:
+        # Ignore all transport assets
+        assets = df[is_asset & (df['capability'] != 'Transport')]
+    else:
+        assets = df[is_asset]
+
+    blocks = []
+    labels = pd.Series(None, index=df.index, dtype=object)
+    if len(assets):
+        assets = assets.drop_duplicates(['time', 'assetName'], keep='last')
+        blocks.append(assets.pivot(index='time', columns='assetName', values=allocation))
+        labels[assets.index] = assets['assetName']
+    if imbalance in df:
+        imbalances = df[~is_asset]
+        if len(imbalances):
+            blocks.append(imbalances.groupby('time')[imbalance].last().to_frame())
+            labels[imbalances.index] = imbalance
+
+    if not blocks:
+        return pd.DataFrame(), []
+    frame = blocks[0].join(blocks[1:], how='outer') if len(blocks) > 1 else blocks[0]
+    return frame.sort_index(), list(pd.unique(labels.dropna()))
+
+
+class SimulationResultsExport:
+    def __init__(self, client, source, simulation_run, start, end, chunk=timedelta(days=7)):
+        """
+        :param client: InfluxDatabase with the results of the simulation
+        :param source: FROM clause with the measurements of the networks, e.g. a regular expression
+        :param start: start of the simulation (datetime)
+        :param end: end of the simulation (datetime)
+        :param chunk: time range of the results that are retrieved with one query
+        """
+        self.client = client
+        self.source = source
+        self.simulation_run = simulation_run
+        self.start = start
+        self.end = end
+        self.chunk = chunk
+
+    def _where(self, start, end):
+        return '(time >= \'' + start.strftime('%Y-%m-%dT%H:%M:%SZ') + '\' AND time < \'' + \
+               end.strftime('%Y-%m-%dT%H:%M:%SZ') + '\' AND "simulationRun" = \'' + self.simulation_run + '\')'
+
+    def measurements(self):
+        """The measurements (networks) with results of the simulation run"""
+        query = 'SELECT COUNT(*) FROM ' + self.source + ' WHERE ' + self._where(self.start, self.end)
+        result = self.client.query(query, cache=True)
+        return [series['name'] for series in result.raw.get('series', [])]
+
+    def write(self, file):
+        """
+        Writes the results to an Excel file (path or file object)
+        :return: False if there are no results
+        """
+        measurements = self.measurements()
+        if not measurements:
+            return False
+
+        # Excel only allows tabs of max 31 characters, so the part of the names that is common for all networks
+        # (the name of the energy system) is removed
+        common_name = os.path.commonprefix(measurements)
+        workbook = excel.create_write_only_workbook()
+        sheets = dict()
+        for measurement in measurements:
+            for attribute, postfix in ATTRIBUTES:
+                sheets[(measurement, attribute)] = workbook.create_sheet(
+                    measurement.replace(common_name, "") + "_" + postfix)
+        headers = dict()
+
+        chunk_start = self.start
+        while chunk_start < self.end:
+            chunk_end = min(chunk_start + self.chunk, self.end)
+            query = 'SELECT * FROM ' + self.source + ' WHERE ' + self._where(chunk_start, chunk_end)
+            logger.debug(query)
+            # results are written to the file, so they are not cached
+            result = self.client.query(query, cache=False)
+            for series in result.raw.get('series', []):
+                if series['name'] not in measurements:
+                    continue
+                for attribute, _ in ATTRIBUTES:
+                    self._append(sheets[(series['name'], attribute)], headers, (series['name'], attribute),
+                                 pivot_results(series['columns'], series['values'], attribute))
+            chunk_start = chunk_end
+
+        workbook.save(file)
+        return True
+
+    @staticmethod
+    def _append(sheet, headers, key, pivoted):
+        frame, columns = pivoted
+        if key not in headers:
+            if not columns:
+                return
+            # the columns of a sheet are the columns of the first block with results
+            headers[key] = columns
+            excel.write_only_sheet_header(sheet, ['time'] + columns)
+        frame = frame.reindex(columns=headers[key])
+        for time, row in zip(frame.index, frame.itertuples(index=False, name=None)):
+            sheet.append([time] + [None if pd.isna(v) else v for v in row])
+
+
+def send_file_blocks(file):
+    """Generator with the contents of a file object in blocks, closing the file at the end"""
+    try:
+        file.seek(0)
+        while True:
+            block = file.read(SEND_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+    finally:
+        file.close()
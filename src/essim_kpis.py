@@ -16,7 +16,8 @@ from flask import Flask
 from flask_socketio import SocketIO, emit
 from extensions.session_manager import get_handler, get_session
 import src.settings as settings
-from influxdb import InfluxDBClient
+from src.influxdb_gateway import gateway as influxdb_gateway
+from src.load_duration_curve import ldc_data, ldc_engine
 from datetime import datetime
 import src.log as log
 
@@ -41,6 +42,12 @@ class ESSIM_KPIs:
 
                 self.calculate_load_duration_curve(asset_id, asset.name)
 
+        @self.socketio.on('calculate_load_duration_curves', namespace='/esdl')
+        def calculate_ldcs(asset_ids):
+            """Returns the load duration curves of a list of assets, to compare them"""
+            with self.flask_app.app_context():
+                return self.calculate_load_duration_curves(asset_ids)
+
     def send_alert(self, msg):
         logger.warn(msg)
         emit('alert', msg, namespace='/esdl')
@@ -69,8 +76,10 @@ class ESSIM_KPIs:
         self.simulationRun = simulationRun
 
     def connect_to_database(self):
-        self.database_client = InfluxDBClient(host=self.config['ESSIM_database_server'],
-                                              port=self.config['ESSIM_database_port'], database=self.scenario_id)
+        # results of simulation runs do not change, so they are cached
+        self.database_client = influxdb_gateway.database(host=self.config['ESSIM_database_server'],
+                                                         port=self.config['ESSIM_database_port'],
+                                                         database=self.scenario_id, cache=True)
 
     def calculate_load_duration_curve(self, asset_id, asset_name):
         logger.debug("--- calculate_load_duration_curve ---")
@@ -79,53 +88,44 @@ class ESSIM_KPIs:
         if active_simulation:
             active_es_id = get_session('active_es_id')
             esh = get_handler()
-            es = esh.get_energy_system(active_es_id)
-            sdt = datetime.strptime(active_simulation['startDate'], '%Y-%m-%dT%H:%M:%S%z')
-            edt = datetime.strptime(active_simulation['endDate'], '%Y-%m-%dT%H:%M:%S%z')
-            influxdb_startdate = sdt.strftime('%Y-%m-%dT%H:%M:%SZ')
-            influxdb_enddate = edt.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-            sim_id = active_simulation['sim_id']
             asset = esh.get_by_id(active_es_id, asset_id)
             power = None
             if hasattr(asset, 'power'):
                 power = asset.power
             elif hasattr(asset, 'capacity'):
                 power = asset.capacity
-            power_pos = None
-            power_neg = None
-
-            allocation_energy = None
-            try:
-                query = 'SELECT "allocationEnergy" FROM /' + es.name + '.*/ WHERE (time >= \'' + influxdb_startdate + '\' AND time < \'' + influxdb_enddate + '\' AND "simulationRun" = \'' + sim_id + '\' AND "assetId" = \''+asset_id+'\')'
-                logger.debug(query)
-                allocation_energy = self.database_client.query(query)
-            except Exception as e:
-                logger.error('error with query: ', str(e))
-
-            if allocation_energy:
-                # logger.debug(allocation_energy)
-                first_key = list(allocation_energy.keys())[0]
-                series = allocation_energy[first_key]
-
-                ldc_series = []
-                for item in series:
-                    ldc_series.append(item['allocationEnergy'])
-                ldc_series.sort(reverse=True)
-
-                ldc_series_decimate = []
-                for idx, item in enumerate(ldc_series):
-                    if idx % 40 == 0:
-                        ldc_series_decimate.append(item / 3600)
-                        if item > 0:
-                            power_pos = power
-                        if item < 0:
-                            power_neg = -power
-
-                # logger.debug(ldc_series_decimate)
-                emit('ldc-data', {'asset_name': asset_name, 'ldc_series': ldc_series_decimate, 'power_pos': power_pos, 'power_neg': power_neg})
 
+            curves = self.get_load_duration_curves(active_simulation, [asset_id])
+            if asset_id in curves:
+                emit('ldc-data', ldc_data(asset_name, curves[asset_id], power, 1 / 3600))
             else:
                 logger.warn('query returned no results')
         else:
-            self.send_alert('No active simulation')
\ No newline at end of file
+            self.send_alert('No active simulation')
+
+    def calculate_load_duration_curves(self, asset_ids):
+        """Returns a dict with asset id -> load duration curve (in Wh) of the assets in the active simulation"""
+        active_simulation = get_session('active_simulation')
+        if not active_simulation:
+            self.send_alert('No active simulation')
+            return None
+        curves = self.get_load_duration_curves(active_simulation, asset_ids)
+        return {asset_id: (curve / 3600).tolist() for asset_id, curve in curves.items()}
+
+    def get_load_duration_curves(self, active_simulation, asset_ids):
+        active_es_id = get_session('active_es_id')
+        esh = get_handler()
+        es = esh.get_energy_system(active_es_id)
+        sdt = datetime.strptime(active_simulation['startDate'], '%Y-%m-%dT%H:%M:%S%z')
+        edt = datetime.strptime(active_simulation['endDate'], '%Y-%m-%dT%H:%M:%S%z')
+        influxdb_startdate = sdt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        influxdb_enddate = edt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        try:
+            return ldc_engine.get_curves(self.database_client, '/' + es.name + '.*/', asset_ids,
+                                         where='time >= \'' + influxdb_startdate + '\' AND time < \'' +
+                                               influxdb_enddate + '\'',
+                                         simulation_run=active_simulation['sim_id'])
+        except Exception as e:
+            logger.error('error with query: {}'.format(e))
+            return dict()
@@ -0,0 +1,147 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Zoom dependent level of detail (LOD) of the area and potential geometries that are sent to the map.
+
+Boundaries of municipalities or provinces can have tens of thousands of vertices, while at the zoom level of the map
+most of them fall within the same pixel. For every geometry, simplified versions are calculated (once) for a few
+zoom levels, with a tolerance of half a pixel at that zoom level. The client gets the version for its zoom level, and
+the full geometry when zoomed in beyond the last level.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import shapely
+from shapely.geometry import shape, mapping
+
+# zoom levels for which simplified geometries are calculated, at higher zoom levels the full geometry is used
+LOD_ZOOM_LEVELS = (6, 9, 12, 15)
+# geometries with fewer vertices are not simplified
+MIN_VERTICES = 64
+# maximum number of geometries of which the simplified versions are cached
+CACHE_SIZE = 20000
+
+
+def tolerance_for_zoom(zoom):
+    """Half the size of a pixel in degrees at the given zoom level of a web mercator map (256 pixel tiles)"""
+    return 0.5 * 360.0 / (256 * 2 ** zoom)
+
+
+def lod_zoom(zoom):
+    """The zoom level of the LOD to use for a map zoom level, or None for the full geometry"""
+    if zoom is None:
+        return None
+    for level in LOD_ZOOM_LEVELS:
+        if zoom <= level:
+            return level
+    return None
+
+
+def zoom_for_bounds(bounds, width=1200, height=800):
+    """Estimates the zoom level at which bounds (min_lon, min_lat, max_lon, max_lat) fit in a map of width x height"""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    lon_span = max(max_lon - min_lon, 1e-9)
+    lat_span = max(max_lat - min_lat, 1e-9) / max(math.cos(math.radians((min_lat + max_lat) / 2)), 0.01)
+    zoom = min(math.log2(width * 360.0 / (256 * lon_span)), math.log2(height * 360.0 / (256 * lat_span)))
+    return max(0, int(math.floor(zoom)))
+
+
+class GeometryLOD:
+    """LRU cache with the simplified versions of GeoJSON geometries, by identity of the geometry dict"""
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # id(geometry) -> (geometry, {level: simplified geometry}); the geometry is kept so its id is not reused
+        self._cache = OrderedDict()
+
+    def get(self, geometry, zoom):
+        """Returns the version of a GeoJSON geometry dict for the map zoom level"""
+        level = lod_zoom(zoom)
+        if level is None or not geometry:
+            return geometry
+        key = id(geometry)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry[1][level]
+        levels = self._simplify(geometry)
+        with self._lock:
+            self._cache[key] = (geometry, levels)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return levels[level]
+
+    @staticmethod
+    def _simplify(geometry):
+        try:
+            shp = shape(geometry)
+        except Exception:
+            shp = None
+        if shp is None or shapely.get_num_coordinates(shp) < MIN_VERTICES:
+            return {level: geometry for level in LOD_ZOOM_LEVELS}
+        levels = dict()
+        finer = geometry
+        for level in reversed(LOD_ZOOM_LEVELS):
+            simplified = shp.simplify(tolerance_for_zoom(level), preserve_topology=True)
+            if simplified.is_empty:
+                levels[level] = finer
+            else:
+                levels[level] = finer = mapping(simplified)
+        return levels
+
+
+geometry_lod = GeometryLOD()
+
+
+def lod_feature_list(feature_list, zoom):
+    """
+    Returns a copy of a list with GeoJSON features (and groups of features, as created by create_area_info_geojson)
+    with the geometries for the map zoom level
+    """
+    if lod_zoom(zoom) is None:
+        return feature_list
+    result = []
+    for item in feature_list:
+        if item.get('type') == 'group':
+            item = dict(item, area_list=lod_feature_list(item['area_list'], zoom))
+        elif 'geometry' in item:
+            item = dict(item, geometry=geometry_lod.get(item['geometry'], zoom))
+        result.append(item)
+    return result
+
+
+def feature_list_bounds(feature_list):
+    """Returns (min_lon, min_lat, max_lon, max_lat) of all features, or None if there are no geometries"""
+    bounds = None
+    for item in feature_list:
+        if item.get('type') == 'group':
+            item_bounds = feature_list_bounds(item['area_list'])
+        elif item.get('geometry'):
+            try:
+                item_bounds = shape(item['geometry']).bounds
+            except Exception:
+                continue
+        else:
+            continue
+        if item_bounds is None or any(math.isnan(b) for b in item_bounds):
+            continue
+        if bounds is None:
+            bounds = item_bounds
+        else:
+            bounds = (min(bounds[0], item_bounds[0]), min(bounds[1], item_bounds[1]),
+                      max(bounds[2], item_bounds[2]), max(bounds[3], item_bounds[3]))
+    return bounds
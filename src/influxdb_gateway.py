@@ -0,0 +1,212 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Process wide access to the InfluxDB servers with the ESSIM simulation results and the profiles.
+
+There is one InfluxDBClient (with its own pool of HTTP connections) per server and user, instead of a new client for
+every request. Results of queries can be cached in an LRU cache that is limited in (estimated) memory size, keyed by
+server, database and the normalized query. Only use the cache for data that does not change, such as the results of a
+finished simulation run. Writing points through the gateway removes the cached results of that database.
+
+A cached ResultSet is returned to every caller that runs the same query, so callers must not change it (or the lists
+in its raw data); use get_points() or copy the values before changing them.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from influxdb import InfluxDBClient
+
+import src.log as log
+import src.settings as settings
+from src.metrics import metrics
+
+logger = log.get_logger(__name__)
+
+_query_durations = metrics.histogram('mapeditor_influxdb_query_duration_seconds', 'Duration of the queries to InfluxDB',
+                                     ['host', 'status'])
+_cache_requests = metrics.counter('mapeditor_influxdb_cache_requests_total', 'Lookups of query results in the cache '
+                                  'of the InfluxDB gateway', ['result'])
+
+
+def estimate_size(result):
+    """
+    Estimates the memory size in bytes of the rows of a ResultSet from the number of rows and the size of the values
+    of the first row of every series, as serializing large results only to size them takes too long
+    """
+    size = sys.getsizeof(result.raw)
+    for series in result.raw.get('series', []):
+        values = series.get('values') or []
+        size += sys.getsizeof(series) + sys.getsizeof(values) + sys.getsizeof(series.get('columns') or [])
+        if values:
+            first_row = values[0]
+            size += len(values) * (sys.getsizeof(first_row) + sum(sys.getsizeof(v) for v in first_row))
+    return size
+
+
+def normalize_query(query):
+    """Collapses whitespace outside of quoted strings and identifiers, so equivalent queries share a cache entry"""
+    result = []
+    quote = None
+    pending_space = False
+    for c in query.strip():
+        if quote:
+            result.append(c)
+            if c == quote:
+                quote = None
+        elif c.isspace():
+            pending_space = True
+        else:
+            if pending_space and result:
+                result.append(' ')
+            pending_space = False
+            result.append(c)
+            if c in ('\'', '"'):
+                quote = c
+    return ''.join(result)
+
+
+class InfluxDBGateway:
+    def __init__(self, timeout=None, pool_size=10, cache_size=0, client_factory=InfluxDBClient):
+        """
+        :param timeout: timeout in seconds of the requests to InfluxDB
+        :param pool_size: maximum number of connections per server
+        :param cache_size: maximum (estimated) memory size in bytes of the query result cache, 0 to disable caching
+        :param client_factory: creates the client of a server, InfluxDBClient by default
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self.client_factory = client_factory
+        self._lock = threading.RLock()
+        self._clients = dict()
+        self._cache = OrderedDict()     # (server, database, query, epoch) -> (result, size)
+        self._cache_bytes = 0
+
+    def database(self, host, port, database=None, username='root', password='root', ssl=False, cache=False):
+        """
+        Returns an InfluxDatabase for a database on a server, which can be used instead of an InfluxDBClient
+        :param cache: default for caching the results of queries, only use True for data that does not change
+        """
+        server = (host, str(port), username, password, bool(ssl))
+        return InfluxDatabase(self, server, database, cache)
+
+    def client(self, server):
+        with self._lock:
+            client = self._clients.get(server)
+            if client is None:
+                host, port, username, password, ssl = server
+                logger.debug('Creating InfluxDB client for {}:{}'.format(host, port))
+                client = self.client_factory(host=host, port=int(port), username=username, password=password,
+                                             ssl=ssl, timeout=self.timeout, pool_size=self.pool_size)
+                self._clients[server] = client
+            return client
+
+    def query(self, server, query, database, cache=False, epoch=None):
+        """Returns the ResultSet of a query. A cached ResultSet is shared with other callers and must not be changed"""
+        if not cache or not self.cache_size:
+            return self._query(server, query, database, epoch)
+
+        key = (server, database, normalize_query(query), epoch)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                _cache_requests.inc(result='hit')
+                return entry[0]
+        _cache_requests.inc(result='miss')
+        result = self._query(server, query, database, epoch)
+        size = estimate_size(result)
+        if size <= self.cache_size:
+            with self._lock:
+                self._remove(key)
+                self._cache[key] = (result, size)
+                self._cache_bytes += size
+                while self._cache_bytes > self.cache_size:
+                    _, (_, removed_size) = self._cache.popitem(last=False)
+                    self._cache_bytes -= removed_size
+        return result
+
+    def _query(self, server, query, database, epoch):
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            result = self.client(server).query(query, database=database, epoch=epoch)
+            status = 'ok'
+            return result
+        finally:
+            _query_durations.observe(time.perf_counter() - start, host=server[0], status=status)
+
+    def invalidate(self, server, database=None):
+        """Removes the cached results of a database (or all databases) of a server"""
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == server and (database is None or k[1] == database)]:
+                self._remove(key)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def _remove(self, key):
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._cache_bytes -= entry[1]
+
+
+class InfluxDatabase:
+    """
+    A database on a server of the gateway, with the methods of InfluxDBClient that are used by the map editor.
+    The underlying client is shared, so the selected database is only kept in this object.
+    """
+    def __init__(self, gateway, server, database=None, cache=False):
+        self.gateway = gateway
+        self.server = server
+        self.database = database
+        self.cache = cache
+
+    def query(self, query, database=None, cache=None, epoch=None):
+        if cache is None:
+            cache = self.cache
+        return self.gateway.query(self.server, query, database or self.database, cache=cache, epoch=epoch)
+
+    def write_points(self, points, database=None, **kwargs):
+        database = database or self.database
+        try:
+            return self.gateway.client(self.server).write_points(points, database=database, **kwargs)
+        finally:
+            self.gateway.invalidate(self.server, database)
+
+    def get_list_database(self):
+        return self.gateway.client(self.server).get_list_database()
+
+    def create_database(self, database):
+        self.gateway.client(self.server).create_database(database)
+
+    def get_list_measurements(self):
+        return list(self.query('SHOW MEASUREMENTS', cache=False).get_points())
+
+    def switch_database(self, database):
+        self.database = database
+
+    def close(self):
+        # the connections of the client are shared with other users of the gateway
+        pass
+
+
+gateway = InfluxDBGateway(timeout=settings.influxdb_gateway_config['timeout'],
+                          pool_size=settings.influxdb_gateway_config['pool_size'],
+                          cache_size=settings.influxdb_gateway_config['cache_size'])
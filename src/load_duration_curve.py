@@ -0,0 +1,148 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Load duration curves (LDC) of the results of simulation runs.
+
+The values of many assets are retrieved with one query (grouped by asset id) and read from the raw InfluxDB reply
+into NumPy arrays. A curve is a fixed number of points, equally spaced between the maximum and the minimum value (the
+percentiles from 100 down to 0), so the size of the curve does not depend on the length of the simulation.
+Curves are cached by (database, simulation run, asset), as the results of a simulation run do not change.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+# number of points of a load duration curve
+DEFAULT_POINTS = 220
+# maximum number of cached curves
+CACHE_SIZE = 10000
+# maximum number of assets in one query
+_ASSETS_PER_QUERY = 100
+
+
+def load_duration_curves(series, points=DEFAULT_POINTS):
+    """
+    Calculates the load duration curves of a list of value arrays in one vectorized operation
+    :return: array (series x points) with the values sorted from high to low, sampled at equally spaced percentiles
+    """
+    lengths = np.array([len(s) for s in series], dtype=np.intp)
+    if not len(series) or lengths.min() == 0:
+        raise ValueError('Cannot calculate the load duration curve of an empty series')
+    data = np.full((len(series), lengths.max()), np.nan)
+    for i, s in enumerate(series):
+        data[i, :len(s)] = s
+    data.sort(axis=1)   # NaN padding is sorted to the end
+
+    # linear interpolation between the closest ranks, like numpy.percentile
+    positions = (lengths[:, None] - 1) * np.linspace(1, 0, points)[None, :]
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, lengths[:, None] - 1)
+    fraction = positions - lower
+    return (np.take_along_axis(data, lower, axis=1) * (1 - fraction) +
+            np.take_along_axis(data, upper, axis=1) * fraction)
+
+
+def ldc_data(asset_name, curve, power=None, factor=1.0):
+    """The message for the LDC chart of the map editor, with the power of the asset as positive and negative limit"""
+    return {
+        'asset_name': asset_name,
+        'ldc_series': (curve * factor).tolist(),
+        'power_pos': power if curve[0] > 0 else None,
+        'power_neg': -power if power is not None and curve[-1] < 0 else None
+    }
+
+
+def quote(value):
+    return '\'' + str(value).replace('\\', '\\\\').replace('\'', '\\\'') + '\''
+
+
+class LDCEngine:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def get_curves(self, client, source, asset_ids, where='', simulation_run=None, field='allocationEnergy',
+                   points=DEFAULT_POINTS):
+        """
+        Returns a dict with asset id -> load duration curve (array) for the assets that have results
+        :param client: InfluxDatabase of the influxdb_gateway with the results
+        :param source: FROM clause of the query, e.g. a measurement or a regular expression
+        :param where: additional conditions of the query, such as the time range
+        :param simulation_run: id of the simulation run. When given, the results are filtered on the run and the
+                               curves are cached, as the results of a run do not change.
+        """
+        conditions = [where] if where else []
+        if simulation_run is not None:
+            conditions.append('"simulationRun" = ' + quote(simulation_run))
+
+        curves = dict()
+        missing = []
+        with self._lock:
+            for asset_id in dict.fromkeys(asset_ids):
+                key = (client.server, client.database, simulation_run, source, where, field, points, asset_id)
+                if simulation_run is not None and key in self._cache:
+                    self._cache.move_to_end(key)
+                    curves[asset_id] = self._cache[key]
+                else:
+                    missing.append(asset_id)
+
+        for i in range(0, len(missing), _ASSETS_PER_QUERY):
+            chunk = missing[i:i + _ASSETS_PER_QUERY]
+            values = self._query_values(client, source, chunk, conditions, field)
+            found = [asset_id for asset_id in chunk if asset_id in values]
+            if not found:
+                continue
+            chunk_curves = load_duration_curves([values[asset_id] for asset_id in found], points)
+            with self._lock:
+                for asset_id, curve in zip(found, chunk_curves):
+                    curves[asset_id] = curve
+                    if simulation_run is not None:
+                        key = (client.server, client.database, simulation_run, source, where, field, points, asset_id)
+                        self._cache[key] = curve
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        return curves
+
+    @staticmethod
+    def _query_values(client, source, asset_ids, conditions, field):
+        """Retrieves the values of the assets as a dict with asset id -> array, using one query"""
+        asset_condition = '(' + ' OR '.join('"assetId" = ' + quote(a) for a in asset_ids) + ')'
+        query = 'SELECT "{}" FROM {} WHERE {} GROUP BY "assetId"'.format(
+            field, source, ' AND '.join(['(' + c + ')' for c in conditions] + [asset_condition]))
+        logger.debug(query)
+        result = client.query(query, cache=False)
+
+        values = dict()
+        # the raw reply is used, creating a dict per point (ResultSet.get_points) is much slower
+        for series in result.raw.get('series', []):
+            asset_id = series.get('tags', {}).get('assetId')
+            column = series['columns'].index(field)
+            series_values = np.array([row[column] for row in series['values']], dtype=float)
+            series_values = series_values[~np.isnan(series_values)]
+            if asset_id in values:
+                # the same asset in multiple measurements
+                series_values = np.concatenate((values[asset_id], series_values))
+            if len(series_values):
+                values[asset_id] = series_values
+        return values
+
+
+ldc_engine = LDCEngine()
@@ -0,0 +1,285 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+In-process metrics (counters, gauges and histograms) of the map editor, in the text format of Prometheus.
+
+Metrics are created once, usually at module level, and updated with the values of their labels as keyword arguments:
+
+    boundary_requests = metrics.counter('mapeditor_boundary_requests_total', 'Requests for boundaries', ['scope'])
+    boundary_requests.inc(scope='municipality')
+
+A gauge can also get its values from a function when the metrics are rendered, for values that are already kept
+somewhere else, such as the number of sessions. The metrics are per process, every worker exposes its own values.
+"""
+import json
+import math
+import threading
+
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# default buckets of histograms of durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# buckets of histograms of sizes, in bytes
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = dict()       # tuple with the values of the labels -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels) or not all(name in labels for name in self.labels):
+            raise ValueError('Metric {} has labels {}, got {}'.format(self.name, self.labels, tuple(labels)))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """Returns a list of (suffix, label names, label values, value) of the samples of the metric"""
+        with self._lock:
+            return [('', self.labels, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation.replace('\\', '\\\\').replace('\n', '\\n')),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+        for suffix, names, values, value in self.samples():
+            lines.append('{}{}{} {}'.format(self.name, suffix, _format_labels(names, values), _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """
+        Gets the values from a function when the metrics are rendered. The function returns the value, or a dict with
+        the values of the labels (a tuple) -> value when the gauge has labels.
+        """
+        self._function = function
+
+    def value(self, **labels):
+        return dict(self._current()).get(self._key(labels), 0)
+
+    def _current(self):
+        if self._function is None:
+            with self._lock:
+                return list(self._values.items())
+        try:
+            result = self._function()
+        except Exception as e:
+            logger.warning('Error getting the value of metric {}: {}'.format(self.name, e))
+            return []
+        if not self.labels:
+            return [((), result)]
+        return [(tuple(str(v) for v in key), value) for key, value in result.items()]
+
+    def samples(self):
+        return [('', self.labels, key, value) for key, value in self._current()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != math.inf:
+            self.buckets += (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]     # counts per bucket, sum, count
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def values(self):
+        """Returns a dict with the values of the labels -> (cumulative counts per bucket, sum, count)"""
+        result = dict()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = []
+                running = 0
+                for bucket_count in counts:
+                    running += bucket_count
+                    cumulative.append(running)
+                result[key] = (cumulative, total, count)
+        return result
+
+    def samples(self):
+        samples = []
+        for key, (cumulative, total, count) in self.values().items():
+            for upper_bound, bucket_count in zip(self.buckets, cumulative):
+                samples.append(('_bucket', self.labels + ('le',), key + (_format_value(upper_bound),), bucket_count))
+            samples.append(('_sum', self.labels, key, total))
+            samples.append(('_count', self.labels, key, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif type(metric) is not cls or metric.labels != tuple(labels):
+                raise ValueError('Metric {} is already registered as a different {}'.format(name, metric.type))
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Returns all metrics in the text format of Prometheus"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return ''.join(metric.render() + '\n' for metric in metrics)
+
+
+metrics = MetricsRegistry()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#  Queue depth of thread pools
+# ---------------------------------------------------------------------------------------------------------------------
+_executors = dict()
+
+
+def track_executor(name, executor):
+    """
+    Exposes the number of jobs that wait for a thread of a concurrent.futures.ThreadPoolExecutor. Other executors
+    (or None) are skipped, as they have no work queue to measure. Returns True when the executor is tracked.
+    """
+    if getattr(executor, '_work_queue', None) is None:
+        logger.warning('Cannot measure the queue of executor {}, no queue depth metric'.format(name))
+        return False
+    _executors[name] = executor
+    return True
+
+
+def _executor_queue_depths():
+    # the work queue of a ThreadPoolExecutor only holds the jobs that are not picked up by a thread yet
+    return {(name,): executor._work_queue.qsize() for name, executor in list(_executors.items())}
+
+
+metrics.gauge('mapeditor_executor_queue_depth', 'Number of jobs waiting for a thread of the executor',
+              ['executor']).set_function(_executor_queue_depths)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#  Size of Socket.IO messages
+# ---------------------------------------------------------------------------------------------------------------------
+class MeasuredJSON:
+    """
+    JSON module for Socket.IO that records the size of the encoded messages of some events, so the size is known
+    without encoding large messages twice. Pass it with SocketIO(app, json=socketio_json).
+    """
+    def __init__(self):
+        self.events = set()
+        self.sizes = metrics.histogram('mapeditor_socketio_emit_bytes', 'Size of the messages sent to the browser',
+                                       ['event'], buckets=SIZE_BUCKETS)
+
+    def measure(self, *events):
+        """Records the size of the messages of these events"""
+        self.events.update(events)
+
+    def dumps(self, obj, *args, **kwargs):
+        text = json.dumps(obj, *args, **kwargs)
+        # an event is encoded as a list with the name of the event and its arguments
+        if type(obj) is list and obj and type(obj[0]) is str and obj[0] in self.events:
+            self.sizes.observe(len(text), event=obj[0])
+        return text
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return json.loads(s, *args, **kwargs)
+
+
+socketio_json = MeasuredJSON()
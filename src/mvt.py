@@ -0,0 +1,333 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Encoder for Mapbox Vector Tiles (version 2.1 of the specification, https://github.com/mapbox/vector-tile-spec).
+
+Geometries must already be in tile coordinates (0..extent, y pointing down) and clipped to the tile (plus buffer).
+A tile is a protobuf message, which is written directly using the protobuf wire format, so no protobuf library or
+generated code is required.
+"""
+import math
+import struct
+
+import shapely
+
+EXTENT = 4096
+
+_MOVE_TO = 1
+_LINE_TO = 2
+_CLOSE_PATH = 7
+
+_POINT = 1
+_LINESTRING = 2
+_POLYGON = 3
+
+
+def _varint(value):
+    result = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field, data):
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed(field, values):
+    return _length_delimited(field, b''.join(_varint(v) for v in values))
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, 0) + _varint(value)
+        return _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _length_delimited(1, str(value).encode('utf-8'))
+
+
+class _GeometryEncoder:
+    def __init__(self):
+        self.commands = []
+        self.x = 0
+        self.y = 0
+
+    def _add_points(self, points):
+        for px, py in points:
+            self.commands.append(_zigzag(px - self.x))
+            self.commands.append(_zigzag(py - self.y))
+            self.x, self.y = px, py
+
+    def add_points(self, points):
+        self.commands.append(_command(_MOVE_TO, len(points)))
+        self._add_points(points)
+
+    def add_line(self, points):
+        self.commands.append(_command(_MOVE_TO, 1))
+        self._add_points(points[:1])
+        self.commands.append(_command(_LINE_TO, len(points) - 1))
+        self._add_points(points[1:])
+
+    def add_ring(self, points):
+        # points without the closing point
+        self.add_line(points)
+        self.commands.append(_command(_CLOSE_PATH, 1))
+
+
+def _integer_points(coords):
+    """Rounds coordinates to integers and removes consecutive duplicates"""
+    points = []
+    for x, y in coords:
+        point = (int(round(x)), int(round(y)))
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+def _signed_area(points):
+    area = 0
+    for i in range(len(points)):
+        x1, y1 = points[i]
+        x2, y2 = points[(i + 1) % len(points)]
+        area += x1 * y2 - x2 * y1
+    return area
+
+
+def _ring_points(ring, exterior):
+    points = _integer_points(ring.coords)
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+    if len(points) < 3:
+        return None
+    area = _signed_area(points)
+    if area == 0:
+        return None
+    # exterior rings have a positive area (clockwise with y pointing down), interior rings a negative area
+    if (area > 0) != exterior:
+        points.reverse()
+    return points
+
+
+def _flatten(geometry):
+    """The points, lines and polygons of a (nested) multi-geometry or collection"""
+    if hasattr(geometry, 'geoms'):
+        for part in geometry.geoms:
+            yield from _flatten(part)
+    else:
+        yield geometry
+
+
+def encode_geometry(geometry):
+    """Returns (geometry type, list of commands) of a shapely geometry in tile coordinates, or None if it is empty"""
+    encoder = _GeometryEncoder()
+    geometry_type = None
+    points = []
+    for part in _flatten(geometry):
+        if part.is_empty:
+            continue
+        part_type = shapely.get_type_id(part)
+        if part_type == 0:      # Point, all points are encoded in a single MoveTo command
+            if geometry_type not in (None, _POINT):
+                continue
+            geometry_type = _POINT
+            points.extend(_integer_points(part.coords))
+        elif part_type in (1, 2):   # LineString, LinearRing
+            if geometry_type not in (None, _LINESTRING):
+                continue
+            line_points = _integer_points(part.coords)
+            if len(line_points) >= 2:
+                geometry_type = _LINESTRING
+                encoder.add_line(line_points)
+        elif part_type == 3:    # Polygon
+            if geometry_type not in (None, _POLYGON):
+                continue
+            exterior = _ring_points(part.exterior, True)
+            if exterior is None:
+                continue
+            geometry_type = _POLYGON
+            encoder.add_ring(exterior)
+            for interior in part.interiors:
+                interior_points = _ring_points(interior, False)
+                if interior_points is not None:
+                    encoder.add_ring(interior_points)
+    if points:
+        encoder.add_points(points)
+    if geometry_type is None or not encoder.commands:
+        return None
+    return geometry_type, encoder.commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    Encodes a layer of a vector tile
+    :param features: list of (shapely geometry in tile coordinates, dict with properties)
+    """
+    keys = []
+    key_index = {}
+    values = []
+    value_index = {}
+    encoded_features = []
+    for geometry, properties in features:
+        encoded = encode_geometry(geometry)
+        if encoded is None:
+            continue
+        geometry_type, commands = encoded
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value), value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags.append(key_index[key])
+            tags.append(value_index[value_key])
+        feature = _packed(2, tags) + _key(3, 0) + _varint(geometry_type) + _packed(4, commands)
+        encoded_features.append(_length_delimited(2, feature))
+    if not encoded_features:
+        return b''
+
+    layer = bytearray(_key(15, 0) + _varint(2))
+    layer += _length_delimited(1, name.encode('utf-8'))
+    for feature in encoded_features:
+        layer += feature
+    for key in keys:
+        layer += _length_delimited(3, key.encode('utf-8'))
+    for value in values:
+        layer += _length_delimited(4, _encode_value(value))
+    layer += _key(5, 0) + _varint(extent)
+    return bytes(layer)
+
+
+def encode_tile(layers, extent=EXTENT):
+    """Encodes a vector tile with a dict of layer name -> list of (geometry in tile coordinates, properties)"""
+    tile = bytearray()
+    for name, features in layers.items():
+        layer = encode_layer(name, features, extent)
+        if layer:
+            tile += _length_delimited(3, layer)
+    return bytes(tile)
+
+
+def decode_tile(data):
+    """Decodes a vector tile into a dict of layer name -> list of (geometry type, commands, properties), for testing"""
+    layers = {}
+    for field, value in _fields(data):
+        if field != 3:
+            continue
+        name, keys, values, raw_features = None, [], [], []
+        for layer_field, layer_value in _fields(value):
+            if layer_field == 1:
+                name = layer_value.decode('utf-8')
+            elif layer_field == 2:
+                raw_features.append(layer_value)
+            elif layer_field == 3:
+                keys.append(layer_value.decode('utf-8'))
+            elif layer_field == 4:
+                values.append(_decode_value(layer_value))
+        features = []
+        for raw_feature in raw_features:
+            tags, geometry_type, commands = [], None, []
+            for feature_field, feature_value in _fields(raw_feature):
+                if feature_field == 2:
+                    tags = _unpack(feature_value)
+                elif feature_field == 3:
+                    geometry_type = feature_value
+                elif feature_field == 4:
+                    commands = _unpack(feature_value)
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            features.append((geometry_type, commands, properties))
+        layers[name] = features
+    return layers
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _fields(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError('Unsupported wire type {}'.format(wire_type))
+        yield field, value
+
+
+def _unpack(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _decode_value(data):
+    for field, value in _fields(data):
+        if field == 1:
+            return value.decode('utf-8')
+        if field == 3:
+            return struct.unpack('<d', value)[0]
+        if field == 2:
+            return struct.unpack('<f', value)[0]
+        if field in (4, 5):
+            return value
+        if field == 6:
+            return (value >> 1) ^ -(value & 1)
+        if field == 7:
+            return bool(value)
+    return None
@@ -0,0 +1,119 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Bulk nearest neighbour matching of ESDL objects, e.g. to connect thousands of houses to the nearest joint.
+
+The geometries of all objects are created once (WGS84 points in a single vectorized call), projected to approximate
+meters and matched using one nearest neighbour query of an STRtree per round, instead of comparing every pair.
+"""
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from esdl import esdl
+from src.shape import Shape
+
+METERS_PER_DEGREE = 111320.0
+
+
+def geometries_of(objects):
+    """Array with the shapely geometry (WGS84) of every object, or None if the object has no geometry"""
+    geometries = np.empty(len(objects), dtype=object)
+    point_indices = []
+    coords = []
+    for i, obj in enumerate(objects):
+        geometry = obj.geometry
+        if isinstance(geometry, esdl.Point) and geometry.CRS in (None, '', 'WGS84', 'EPSG:4326'):
+            point_indices.append(i)
+            coords.append((geometry.lon, geometry.lat))
+        elif geometry is not None:
+            geometries[i] = Shape.create(geometry).shape
+    if point_indices:
+        geometries[point_indices] = shapely.points(np.array(coords, dtype=float))
+    return geometries
+
+
+def to_meters(*geometry_arrays):
+    """
+    Projects arrays of WGS84 geometries to approximate meters (equirectangular around the mean latitude of all
+    geometries), which is accurate enough to compare distances within a region
+    """
+    present = [g[~shapely.is_missing(g)] for g in geometry_arrays]
+    all_geometries = np.concatenate(present) if present else np.empty(0, dtype=object)
+    if len(all_geometries) == 0:
+        return geometry_arrays
+    mean_lat = float(np.mean(shapely.get_coordinates(all_geometries)[:, 1]))
+    scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(mean_lat)), METERS_PER_DEGREE])
+    return tuple(shapely.transform(g, lambda c: c * scale) for g in geometry_arrays)
+
+
+def match_nearest(sources, targets, max_distance=None, capacity=None):
+    """
+    Matches every source geometry to the nearest target geometry.
+    :param sources: array of source geometries (None entries are not matched)
+    :param targets: array of target geometries (None entries are not matched)
+    :param max_distance: sources further away than this from every (available) target are not matched
+    :param capacity: maximum number of sources per target, an int or an array with a value per target. When a target
+                     is full, the sources closest to it are matched and the others go to their next nearest target.
+    :return: (source indices, target indices, distances) of the matches, as numpy arrays
+    """
+    sources = np.asarray(sources, dtype=object)
+    targets = np.asarray(targets, dtype=object)
+    source_idx = np.flatnonzero(~shapely.is_missing(sources))
+    target_idx = np.flatnonzero(~shapely.is_missing(targets))
+    if capacity is None:
+        remaining = None
+    else:
+        remaining = np.broadcast_to(np.asarray(capacity, dtype=np.int64), (len(targets),)).copy()
+        target_idx = target_idx[remaining[target_idx] > 0]
+
+    matched_sources, matched_targets, matched_distances = [], [], []
+    while len(source_idx) and len(target_idx):
+        tree = STRtree(targets[target_idx])
+        (s, t), d = tree.query_nearest(sources[source_idx], max_distance=max_distance, return_distance=True)
+        # with ties, keep one target per source
+        s, first = np.unique(s, return_index=True)
+        s, t, d = source_idx[s], target_idx[t[first]], d[first]
+        if remaining is None:
+            matched_sources.append(s)
+            matched_targets.append(t)
+            matched_distances.append(d)
+            break
+
+        # the closest sources of every target are accepted, up to its remaining capacity. A rejected source may
+        # still claim another target at a larger distance than its current nearest one, so matches that are further
+        # away than the closest rejected source are postponed to the next round (this gives the same result as
+        # matching the closest pairs first)
+        order = np.lexsort((d, t))
+        s, t, d = s[order], t[order], d[order]
+        group_start = np.r_[0, np.flatnonzero(t[1:] != t[:-1]) + 1]
+        rank = np.arange(len(t)) - np.repeat(group_start, np.diff(np.r_[group_start, len(t)]))
+        accepted = rank < remaining[t]
+        if not accepted.all():
+            accepted &= d <= d[~accepted].min()
+        matched_sources.append(s[accepted])
+        matched_targets.append(t[accepted])
+        matched_distances.append(d[accepted])
+        np.subtract.at(remaining, t[accepted], 1)
+
+        # sources without any target within max_distance are done, the others try again
+        source_idx = np.sort(s[~accepted])
+        target_idx = target_idx[remaining[target_idx] > 0]
+
+    if not matched_sources:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+    return np.concatenate(matched_sources), np.concatenate(matched_targets), np.concatenate(matched_distances)
@@ -14,9 +14,11 @@
 
 import uuid
 import random
+import json
 
+from concurrent.futures import ThreadPoolExecutor
 from sys import getsizeof
-from flask import session
+from flask import session, copy_current_request_context, has_request_context
 from flask_socketio import emit
 
 from esdl import esdl
@@ -25,16 +27,30 @@ from esdl.processing.ESDLEnergySystem import get_notes_list
 from extensions.boundary_service import BoundaryService, is_valid_boundary_id
 from extensions.mapeditor_settings import MapEditorSettings
 from extensions.session_manager import set_handler, get_handler, get_session, set_session_for_esid, set_session, \
-    get_session_for_esid
-from src.esdl_helper import generate_profile_info, get_asset_and_coord_from_port_id, asset_state_to_ui, \
+    get_session_for_esid, session_writer
+from src.esdl_helper import generate_profile_info, get_connectivity_index, asset_state_to_ui, \
     get_tooltip_asset_attrs, add_spatial_attributes
-from src.shape import Shape, ShapePoint
+from src.shape import Shape, ShapePoint, ShapeDictionary
 from src.assets_to_be_added import AssetsToBeAdded
+from src.ui_delta import reset_ui_delta
+from src.geometry_lod import lod_feature_list, lod_zoom, feature_list_bounds, zoom_for_bounds
+from src.metrics import socketio_json, track_executor
 from utils.RDWGSConverter import RDWGSConverter
+import src.settings as settings
 import shapely
 import math
 import re
 
+# Worker threads that prepare the UI information of multiple energy systems at the same time. Most of the time is
+# spent waiting for the boundary service and creating shapes, other work is limited by the GIL.
+process_es_executor = ThreadPoolExecutor(max_workers=settings.PROCESS_ES_MAX_WORKERS,
+                                         thread_name_prefix='ProcessES')
+track_executor('process_es', process_es_executor)
+
+# the size of the messages that process_energy_system() sends to draw an energy system is recorded in the metrics
+socketio_json.measure('geojson', 'carrier_list', 'sector_list', 'kpis', 'ATBA_assets_to_be_added',
+                      'add_building_objects', 'add_esdl_objects', 'area_bld_list', 'add_connections', 'add_notes')
+
 
 # ---------------------------------------------------------------------------------------------------------------------
 #  Generic functions
@@ -434,13 +450,17 @@ def find_area_info_geojson(area_list, pot_list, this_area, shape_dictionary, sho
             area_list.append(grouped_area_info)
 
 
-def create_area_info_geojson(area):
+def create_area_info_geojson(area, shape_dictionary=None):
+    """
+    :param shape_dictionary: dictionary to add the shapes of the areas to. If None, the shape_dictionary of the session
+                             is used and updated
+    """
     area_list = []
     pot_list = []
 
-    shape_dictionary = get_session('shape_dictionary')
-    if not shape_dictionary:
-        shape_dictionary = {}
+    update_session = shape_dictionary is None
+    if update_session:
+        shape_dictionary = get_shape_dictionary()
 
     user = get_session('user-email')
     user_settings = MapEditorSettings.get_instance().get_user_settings(user)
@@ -454,22 +474,56 @@ def create_area_info_geojson(area):
     find_area_info_geojson(area_list, pot_list, area, shape_dictionary, show_assets_without_location)
     print("- Done")
 
-    set_session('shape_dictionary', shape_dictionary)
+    if update_session:
+        set_session('shape_dictionary', shape_dictionary)
     return area_list, pot_list
 
 
 def find_boundaries_in_ESDL(top_area):
     print("Finding area and potential boundaries in ESDL")
     area_list, pot_list = create_area_info_geojson(top_area)
+    zoom = get_map_zoom_for_areas(area_list, pot_list)
 
     # Sending an empty list triggers removing the legend at client side
     print('- Sending area information to client, size={}'.format(getsizeof(area_list)))
-    emit('geojson', {"layer": "area_layer", "geojson": area_list})
+    emit('geojson', {"layer": "area_layer", "geojson": lod_feature_list(area_list, zoom)})
     # Buildings are now taken care of in process_building
     # print('- Sending building information to client, size={}'.format(getsizeof(building_list)))
     # emit('geojson', {"layer": "bld_layer", "geojson": building_list})
     print('- Sending potential information to client, size={}'.format(getsizeof(pot_list)))
-    emit('geojson', {"layer": "pot_layer", "geojson": pot_list})
+    emit('geojson', {"layer": "pot_layer", "geojson": lod_feature_list(pot_list, zoom)})
+
+
+def get_map_zoom_for_areas(area_list, pot_list, fit_bounds=False):
+    """
+    Returns the zoom level of the map that determines the level of detail of the area and potential geometries:
+    the zoom level of the client, or the estimated zoom level when the client will zoom to the energy system. When
+    the client zooms to another level of detail, the geometries are sent again (see emit_area_lod_update)
+    """
+    zoom = get_session('map_zoom')
+    if fit_bounds or zoom is None:
+        bounds = feature_list_bounds(area_list + pot_list)
+        if bounds:
+            # prefer too much detail over too little, as the client may not zoom out to the bounds
+            zoom = zoom_for_bounds(bounds) if zoom is None else max(zoom, zoom_for_bounds(bounds))
+    set_session('map_lod_zoom', lod_zoom(zoom))
+    return zoom
+
+
+def emit_area_lod_update(esh, es_id, zoom):
+    """Sends the areas and potentials of an energy system again when the level of detail for the zoom level changed"""
+    set_session('map_zoom', zoom)
+    if get_session('map_lod_zoom') == lod_zoom(zoom):
+        return
+    set_session('map_lod_zoom', lod_zoom(zoom))
+
+    es_ui_info = get_session_for_esid(es_id, 'es_ui_info')
+    if es_ui_info and es_ui_info['version'] == esh.get_model_version(es_id):
+        area_list, pot_list = es_ui_info['area_list'], es_ui_info['pot_list']
+    else:
+        area_list, pot_list = create_area_info_geojson(esh.get_energy_system(es_id).instance[0].area)
+    emit('area_lod', {'es_id': es_id, 'area_list': lod_feature_list(area_list, zoom),
+                      'pot_list': lod_feature_list(pot_list, zoom)})
 
 
 def add_missing_coordinates(area):
@@ -563,6 +617,7 @@ def add_asset_to_asset_list(asset_list, asset):
 def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_list, building, bld_editor, level):
     # Add building to list that is shown in a dropdown at the top
     area_bld_list.append(['Building', building.id, building.name, level])
+    connectivity = get_connectivity_index(esh, es_id)
 
     # Determine if building has assets
     building_has_assets = False
@@ -595,14 +650,9 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                 building_list.append(['polygon', building.name, building.id, type(building).__name__,
                                       boundary['coordinates'], building_has_assets, bld_KPIs, extra_attributes])
                 # bld_coord = coords
-                bld_coord = ESDLGeometry.calculate_polygon_center(geometry)
+                bld_coord = connectivity.building_coord(building)
     elif building.containingBuilding:       # BuildingUnit
-        bld_geom = building.containingBuilding.geometry
-        if bld_geom:
-            if isinstance(bld_geom, esdl.Point):
-                bld_coord = (bld_geom.lat, bld_geom.lon)
-            elif isinstance(bld_geom, esdl.Polygon):
-                bld_coord = ESDLGeometry.calculate_polygon_center(bld_geom)
+        bld_coord = connectivity.building_coord(building.containingBuilding)
 
     # Iterate over all assets in building to gather all required information
     for basset in building.asset:
@@ -651,11 +701,11 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                 if conn_to:
                     for pc in conn_to:
                         in_different_buildings = False
-                        pc_asset = get_asset_and_coord_from_port_id(esh, es_id, pc.id)
+                        pc_asset, pc_coord = connectivity.port_asset_and_coord(pc)
 
                         # If the asset the current asset connects to, is in a building...
-                        if pc_asset['asset'].containingBuilding:
-                            bld_pc_asset = pc_asset['asset'].containingBuilding
+                        if pc_asset.containingBuilding:
+                            bld_pc_asset = pc_asset.containingBuilding
                             bld_basset = basset.containingBuilding
                             # If the asset is in a different building ...
                             if not bld_pc_asset == bld_basset:
@@ -666,10 +716,9 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                                         pc_asset_coord = (coord[0], 0)
                                     else:
                                         # ... use the building coordinate instead of the asset coordinate
-                                        if isinstance(bld_pc_asset.geometry, esdl.Point):
-                                            pc_asset_coord = (bld_pc_asset.geometry.lat, bld_pc_asset.geometry.lon)
-                                        elif isinstance(bld_pc_asset.geometry, esdl.Polygon):
-                                            pc_asset_coord = ESDLGeometry.calculate_polygon_center(bld_pc_asset.geometry)
+                                        bld_pc_coord = connectivity.building_coord(bld_pc_asset)
+                                        if bld_pc_coord is not None:
+                                            pc_asset_coord = bld_pc_coord
 
                                     # If connecting to a building outside of the current, replace current asset
                                     # coordinates with building coordinates too
@@ -677,7 +726,7 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                                         coord = bld_coord
                             else:
                                 # asset is in the same building, use asset's own coordinates
-                                pc_asset_coord = pc_asset['coord']
+                                pc_asset_coord = pc_coord
                         else:
                             # other asset is not in a building
                             if bld_editor:
@@ -685,7 +734,7 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                                 pc_asset_coord = (coord[0], 0)
                             else:
                                 # ... just use asset's location
-                                pc_asset_coord = pc_asset['coord']
+                                pc_asset_coord = pc_coord
 
                         pc_carr_id = None
                         if pc.carrier:
@@ -697,7 +746,7 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
                             conn_list.append({'from-port-id': p.id, 'from-port-carrier': p_carr_id,
                                               'from-asset-id': basset.id, 'from-asset-coord': coord,
                                               'to-port-id': pc.id, 'to-port-carrier': pc_carr_id,
-                                              'to-asset-id': pc_asset['asset'].id, 'to-asset-coord': pc_asset_coord})
+                                              'to-asset-id': pc_asset.id, 'to-asset-coord': pc_asset_coord})
 
     if bld_editor:
         for potential in building.potential:
@@ -713,6 +762,7 @@ def process_building(esh, es_id, asset_list, building_list, area_bld_list, conn_
 
 def process_area(esh, es_id, asset_list, building_list, area_bld_list, conn_list, area, level):
     area_bld_list.append(['Area', area.id, area.name, level])
+    connectivity = get_connectivity_index(esh, es_id)
 
     # process subareas
     for ar in area.area:
@@ -730,33 +780,23 @@ def process_area(esh, es_id, asset_list, building_list, area_bld_list, conn_list
                 break
 
             for p in asset.port:
-                p_asset = get_asset_and_coord_from_port_id(esh, es_id, p.id)
-                p_asset_coord = p_asset['coord']        # get proper coordinate if asset is line
-                conn_to_ids = [cp.id for cp in p.connectedTo]
+                _, p_asset_coord = connectivity.port_asset_and_coord(p)     # get proper coordinate if asset is line
                 p_carr_id = None
                 if p.carrier:
                     p_carr_id = p.carrier.id
-                if conn_to_ids:
+                if p.connectedTo:
                     for pc in p.connectedTo:
-                        pc_asset = get_asset_and_coord_from_port_id(esh, es_id, pc.id)
-                        pc_asset_coord = None
-                        if pc_asset['asset'].containingBuilding:
-                            bld_pc_asset = pc_asset['asset'].containingBuilding
-                            if bld_pc_asset.geometry:
-                                if isinstance(bld_pc_asset.geometry, esdl.Point):
-                                    pc_asset_coord = (bld_pc_asset.geometry.lat, bld_pc_asset.geometry.lon)
-                                elif isinstance(bld_pc_asset.geometry, esdl.Polygon):
-                                    pc_asset_coord = ESDLGeometry.calculate_polygon_center(bld_pc_asset.geometry)
-                        else:
-                            pc_asset_coord = pc_asset['coord']
+                        pc_asset, pc_asset_coord = connectivity.port_asset_and_coord(pc)
+                        if pc_asset.containingBuilding:
+                            pc_asset_coord = connectivity.building_coord(pc_asset.containingBuilding)
 
                         pc_carr_id = None
                         if pc.carrier:
                             pc_carr_id = pc.carrier.id
                         conn_list.append({'from-port-id': p.id, 'from-port-carrier': p_carr_id,
-                                          'from-asset-id': p_asset['asset'].id, 'from-asset-coord': p_asset_coord,
+                                          'from-asset-id': asset.id, 'from-asset-coord': p_asset_coord,
                                           'to-port-id': pc.id, 'to-port-carrier': pc_carr_id,
-                                          'to-asset-id': pc_asset['asset'].id, 'to-asset-coord': pc_asset_coord})
+                                          'to-asset-id': pc_asset.id, 'to-asset-coord': pc_asset_coord})
 
     for potential in area.potential:
         geom = potential.geometry
@@ -794,37 +834,78 @@ def recalculate_area_bld_list_area(area, area_bld_list, level):
         recalculate_area_bld_list_area(subarea, area_bld_list, level+1)
 
 
-def find_area_location_based(esh, active_es_id, geometry):
+def get_shape_dictionary() -> ShapeDictionary:
+    """Returns the shape_dictionary of the session, with a spatial index of the shapes"""
     shape_dictionary = get_session('shape_dictionary')
+    if not isinstance(shape_dictionary, ShapeDictionary):
+        shape_dictionary = ShapeDictionary(shape_dictionary or {})
+        set_session('shape_dictionary', shape_dictionary)
+    return shape_dictionary
+
 
-    obj_geometry_shape = Shape.create(geometry)
-    areas_that_contain_obj = list()
+def get_area_levels(esh, es_id):
+    """
+    Returns the level in the area hierarchy of all areas of an energy system (the top level area has level 1).
+    The result is cached until the energy system changes.
+    """
+    version = esh.get_model_version(es_id)
+    cached = get_session_for_esid(es_id, 'area_levels')
+    if cached is not None and cached[0] == version:
+        return cached[1]
 
-    for key in shape_dictionary.keys():
-        area_shp = shape_dictionary[key]
-        if area_shp.shape.contains(obj_geometry_shape.shape):
-            areas_that_contain_obj.append(key)
+    area_levels = dict()
 
-    if len(areas_that_contain_obj) == 0:
-        es = esh.get_energy_system(es_id=active_es_id)
-        return es.instance[0].area.id   # If no area is found, return the id of the top level area
-    elif len(areas_that_contain_obj) == 1:
-        return areas_that_contain_obj[0]
-    else:
-        # Find area that is 'lowest' in the area hierarchy
-        lowest_level = 0
-        lowest_area_id = None
-        for ar_id in areas_that_contain_obj:
-            area = esh.get_by_id(active_es_id, ar_id)
-            area_level = 1
-            while isinstance(area.eContainer(), esdl.Area):
-                area_level += 1
-                area = area.eContainer()
-            if area_level > lowest_level:
-                lowest_level = area_level
-                lowest_area_id = ar_id
-
-        return lowest_area_id
+    def add_area_levels(area, level):
+        area_levels[area.id] = level
+        for sub_area in area.area:
+            add_area_levels(sub_area, level + 1)
+
+    for instance in esh.get_energy_system(es_id).instance:
+        if instance.area:
+            add_area_levels(instance.area, 1)
+    set_session_for_esid(es_id, 'area_levels', (version, area_levels))
+    return area_levels
+
+
+def find_area_location_based(esh, active_es_id, geometry):
+    return find_areas_location_based(esh, active_es_id, [geometry])[0]
+
+
+def find_areas_location_based(esh, active_es_id, geometries):
+    """
+    Finds the area that is 'lowest' in the area hierarchy that contains a geometry, for every ESDL geometry
+    :return: list with the area ids
+    """
+    shape_dictionary = get_shape_dictionary()
+    obj_shapes = [Shape.create(geometry).shape for geometry in geometries]
+    result = []
+    area_levels = None
+    for areas_that_contain_obj in shape_dictionary.find_containing_bulk(obj_shapes):
+        if len(areas_that_contain_obj) == 0:
+            es = esh.get_energy_system(es_id=active_es_id)
+            result.append(es.instance[0].area.id)   # If no area is found, return the id of the top level area
+        elif len(areas_that_contain_obj) == 1:
+            result.append(areas_that_contain_obj[0])
+        else:
+            # Find area that is 'lowest' in the area hierarchy
+            if area_levels is None:
+                area_levels = get_area_levels(esh, active_es_id)
+            lowest_level = 0
+            lowest_area_id = None
+            for ar_id in areas_that_contain_obj:
+                area_level = area_levels.get(ar_id)
+                if area_level is None:
+                    # not an area of the energy system, e.g. a potential
+                    area = esh.get_by_id(active_es_id, ar_id)
+                    area_level = 1
+                    while area is not None and isinstance(area.eContainer(), esdl.Area):
+                        area_level += 1
+                        area = area.eContainer()
+                if area_level > lowest_level:
+                    lowest_level = area_level
+                    lowest_area_id = ar_id
+            result.append(lowest_area_id)
+    return result
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -857,6 +938,7 @@ def get_building_connections(building):
     esh = get_handler()
 
     conn_list = []
+    connectivity = get_connectivity_index(esh, active_es_id)
 
     for basset in building.asset:
         if isinstance(basset, esdl.EnergyAsset):
@@ -864,11 +946,11 @@ def get_building_connections(building):
                 conn_to = p.connectedTo
                 if conn_to:
                     for pc in conn_to:
-                        pc_asset = get_asset_and_coord_from_port_id(esh, active_es_id, pc.id)
+                        pc_asset, _ = connectivity.port_asset_and_coord(pc)
 
                         # If the asset the current asset connects to, is in a building...
-                        if pc_asset['asset'].containingBuilding:
-                            bld_pc_asset = pc_asset['asset'].containingBuilding
+                        if pc_asset.containingBuilding:
+                            bld_pc_asset = pc_asset.containingBuilding
                             bld_basset = basset.containingBuilding
                             # If the asset is in a different building ...
                             if not bld_pc_asset == bld_basset:
@@ -880,11 +962,63 @@ def get_building_connections(building):
     return conn_list
 
 
+# ---------------------------------------------------------------------------------------------------------------------
+#  Create all information the UI needs to draw an energy system, without sending it. This does not depend on other
+#  energy systems, so process_energy_system runs it for multiple energy systems in parallel.
+# ---------------------------------------------------------------------------------------------------------------------
+def create_es_ui_info(esh, es):
+    area = es.instance[0].area
+    shapes = dict()
+    area_list, pot_list = create_area_info_geojson(area, shapes)   # also adds coordinates to assets if possible
+    carrier_list = ESDLEnergySystem.get_carrier_list(es)
+    sector_list = ESDLEnergySystem.get_sector_list(es)
+    print('- Processing KPIs')
+    area_kpis = ESDLEnergySystem.process_area_KPIs(area)
+    assets_to_be_added = AssetsToBeAdded.get_assets_from_measures(es)
+
+    # Probably the following call is not required anymore, everything is handled by create_area_info_geojson
+    # add_missing_coordinates(area)
+    print('- Processing area')
+    asset_list = []
+    building_list = []
+    area_bld_list = []
+    conn_list = []
+    process_area(esh, es.id, asset_list, building_list, area_bld_list, conn_list, area, 0)
+    notes_list = get_notes_list(es)
+
+    return {
+        # determined afterwards, as processing can add missing coordinates to assets
+        'version': esh.get_model_version(es.id),
+        'shapes': shapes,
+        'area_list': area_list,
+        'pot_list': pot_list,
+        'carrier_list': carrier_list,
+        'sector_list': sector_list,
+        'area_kpis': area_kpis,
+        'assets_to_be_added': assets_to_be_added,
+        'asset_list': asset_list,
+        'building_list': building_list,
+        'area_bld_list': area_bld_list,
+        'conn_list': conn_list,
+        'notes_list': notes_list,
+    }
+
+
+def get_ui_settings_key():
+    """The UI settings that influence the information of create_es_ui_info (e.g. tooltips)"""
+    user_settings = get_session('user_settings')
+    ui_settings = user_settings.get('ui_settings') if user_settings else None
+    return json.dumps(ui_settings, sort_keys=True, default=str)
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 #  Initialization after new or load energy system
 #  If this function is run through process_energy_system.submit(filename, es_title) it is executed
 #  in a separate thread.
+#  It takes the write lock of the session: it sets ids and geometries in the model, and the lists of the UI, the shape
+#  dictionary and the ui_delta feed in the session, so two runs for one session must not overlap.
 # ---------------------------------------------------------------------------------------------------------------------
+@session_writer
 def process_energy_system(esh, filename=None, es_title=None, app_context=None, force_update_es_id=None, zoom=True):
     # NOTE: filename, es_title and app_context are currently not used.
     # emit('clear_ui')
@@ -899,12 +1033,8 @@ def process_energy_system(esh, filename=None, es_title=None, app_context=None, f
     if force_update_es_id == "all":
         emit('clear_esdl_layer_list')
 
+    es_to_process = []
     for es in es_list:
-        asset_list = []
-        building_list = []
-        area_bld_list = []
-        conn_list = []
-
         if not isinstance(es, esdl.EnergySystem):
             print("- Detected ESDL without an EnergySystem, is of type {}. Ignoring.".format(es.eClass.name))
             continue
@@ -913,70 +1043,105 @@ def process_energy_system(esh, filename=None, es_title=None, app_context=None, f
             es.id = str(uuid.uuid4())
 
         if es.id not in es_info_list or es.id == force_update_es_id or force_update_es_id == "all":
-            print("- Processing energysystem with id {}".format(es.id))
-            name = es.name
-            if not name:
-                title = 'Untitled Energysystem'
-            else:
-                title = name
-
-            emit('create_new_esdl_layer', {'es_id': es.id, 'title': title}) # removes old layer if exists
-            emit('set_active_layer_id', es.id)
-
-            area = es.instance[0].area
-            find_boundaries_in_ESDL(area)       # also adds coordinates to assets if possible
-            carrier_list = ESDLEnergySystem.get_carrier_list(es)
-            emit('carrier_list', {'es_id': es.id, 'carrier_list': carrier_list})
-            sector_list = ESDLEnergySystem.get_sector_list(es)
-            if sector_list:
-                emit('sector_list', {'es_id': es.id, 'sector_list': sector_list})
-
-            # KPIs that are connected to top-level area are visualized in a KPI dialog
-            print('- Processing KPIs')
-            area_kpis = ESDLEnergySystem.process_area_KPIs(area)
-            area_name = area.name
-            if not area_name:
-                area_name = title
-            if area_kpis['kpi_list']:   # Only emit KPI info when there are KPIs available
-                emit('kpis', {'es_id': es.id, 'scope': area_name, 'kpi_info': area_kpis})
-                emit('kpis_present', True)
-
-            # measures can contain assets that still need to be added to the energysystem
-            assets_to_be_added = AssetsToBeAdded.get_assets_from_measures(es)
-            if assets_to_be_added:
-                emit('ATBA_assets_to_be_added', {'ed_id': es.id, 'assets_to_be_added': assets_to_be_added})
-
-            # Probably the following call is not required anymore, everything is handled by find_boundaries_in_ESDL
-            # add_missing_coordinates(area)
-            print('- Processing area')
-            process_area(esh, es.id, asset_list, building_list, area_bld_list, conn_list, area, 0)
-            print(f'#assets: {len(asset_list)}, #buildings: {len(building_list)}, #area_bld: {len(area_bld_list)}, #conn: {len(conn_list)}')
-            notes_list = get_notes_list(es)
-
-            emit('add_building_objects', {'es_id': es.id, 'building_list': building_list, 'zoom': zoom})
-            emit('add_esdl_objects', {'es_id': es.id, 'asset_pot_list': asset_list, 'zoom': zoom})
-            emit('area_bld_list', {'es_id': es.id,  'area_bld_list': area_bld_list})
-            emit('add_connections', {'es_id': es.id, 'add_to_building': False, 'conn_list': conn_list})
-            emit('add_notes', {'es_id': es.id,  'notes_list': notes_list})
-
-            set_session_for_esid(es.id, 'conn_list', conn_list)
-            set_session_for_esid(es.id, 'asset_list', asset_list)
-            set_session_for_esid(es.id, 'area_bld_list', area_bld_list)
-
-            # TODO: update asset_list???
-            es_info_list[es.id] = {
-                "processed": True
-            }
-
-            # If one energysystem is added (by calling an external service or via the API) the active_es_id (backend) and
-            # active_layer_id (frontend) are not synchronized. As a temporary fix the following lines are added.
-            # Be aware: process_energy_system is called in a seperate thread, active_es_id is also changed in the functions
-            # calling process_energy_system!
-            if get_session('active_es_id') != es.id:
-                set_session('active_es_id', es.id)
+            es_to_process.append(es)
         else:
             print("- Energysystem with id {} already processed".format(es.id))
 
+    # Prepare the information of all energy systems that changed in parallel, reuse it for the others
+    ui_settings = get_ui_settings_key()
+    es_ui_info_cached = dict()
+    es_ui_info_futures = dict()
+    for es in es_to_process:
+        es_ui_info = get_session_for_esid(es.id, 'es_ui_info')
+        if es_ui_info and es_ui_info['version'] == esh.get_model_version(es.id) and \
+                es_ui_info['ui_settings'] == ui_settings:
+            print("- Energysystem with id {} did not change".format(es.id))
+            es_ui_info_cached[es.id] = es_ui_info
+        else:
+            print("- Processing energysystem with id {}".format(es.id))
+            create_info = create_es_ui_info
+            if has_request_context():
+                create_info = copy_current_request_context(create_es_ui_info)
+            es_ui_info_futures[es.id] = process_es_executor.submit(create_info, esh, es)
+
+    shape_dictionary = get_shape_dictionary()
+    for es in es_to_process:
+        if es.id in es_ui_info_cached:
+            es_ui_info = es_ui_info_cached[es.id]
+        else:
+            es_ui_info = es_ui_info_futures[es.id].result()
+        es_ui_info['ui_settings'] = ui_settings
+        set_session_for_esid(es.id, 'es_ui_info', es_ui_info)
+        shape_dictionary.update(es_ui_info['shapes'])
+        set_session('shape_dictionary', shape_dictionary)
+
+        name = es.name
+        if not name:
+            title = 'Untitled Energysystem'
+        else:
+            title = name
+
+        emit('create_new_esdl_layer', {'es_id': es.id, 'title': title}) # removes old layer if exists
+        emit('set_active_layer_id', es.id)
+
+        # Sending an empty list triggers removing the legend at client side
+        area_zoom = get_map_zoom_for_areas(es_ui_info['area_list'], es_ui_info['pot_list'], fit_bounds=zoom)
+        emit('geojson', {"layer": "area_layer", "geojson": lod_feature_list(es_ui_info['area_list'], area_zoom)})
+        emit('geojson', {"layer": "pot_layer", "geojson": lod_feature_list(es_ui_info['pot_list'], area_zoom)})
+        emit('carrier_list', {'es_id': es.id, 'carrier_list': es_ui_info['carrier_list']})
+        if es_ui_info['sector_list']:
+            emit('sector_list', {'es_id': es.id, 'sector_list': es_ui_info['sector_list']})
+
+        # KPIs that are connected to top-level area are visualized in a KPI dialog
+        area_kpis = es_ui_info['area_kpis']
+        area_name = es.instance[0].area.name
+        if not area_name:
+            area_name = title
+        if area_kpis['kpi_list']:   # Only emit KPI info when there are KPIs available
+            emit('kpis', {'es_id': es.id, 'scope': area_name, 'kpi_info': area_kpis})
+            emit('kpis_present', True)
+
+        # measures can contain assets that still need to be added to the energysystem
+        if es_ui_info['assets_to_be_added']:
+            emit('ATBA_assets_to_be_added', {'ed_id': es.id, 'assets_to_be_added': es_ui_info['assets_to_be_added']})
+
+        asset_list = es_ui_info['asset_list']
+        building_list = es_ui_info['building_list']
+        area_bld_list = es_ui_info['area_bld_list']
+        conn_list = es_ui_info['conn_list']
+        print(f'#assets: {len(asset_list)}, #buildings: {len(building_list)}, #area_bld: {len(area_bld_list)}, #conn: {len(conn_list)}')
+
+        # later changes are sent as ui_delta messages, starting from these sequence numbers
+        ui_delta_seq = reset_ui_delta(esh, es.id, asset_list, conn_list)
+
+        emit('add_building_objects', {'es_id': es.id, 'building_list': building_list, 'zoom': zoom})
+        emit('add_esdl_objects', {'es_id': es.id, 'asset_pot_list': asset_list, 'zoom': zoom,
+                                  'seq': ui_delta_seq['assets']})
+        emit('area_bld_list', {'es_id': es.id,  'area_bld_list': area_bld_list})
+        emit('add_connections', {'es_id': es.id, 'add_to_building': False, 'conn_list': conn_list,
+                                 'seq': ui_delta_seq['connections']})
+        emit('add_notes', {'es_id': es.id,  'notes_list': es_ui_info['notes_list']})
+
+        set_session_for_esid(es.id, 'conn_list', conn_list)
+        set_session_for_esid(es.id, 'asset_list', asset_list)
+        set_session_for_esid(es.id, 'area_bld_list', area_bld_list)
+
+        # TODO: update asset_list???
+        es_info_list[es.id] = {
+            "processed": True
+        }
+
+        # If one energysystem is added (by calling an external service or via the API) the active_es_id (backend) and
+        # active_layer_id (frontend) are not synchronized. As a temporary fix the following lines are added.
+        # Be aware: process_energy_system is called in a seperate thread, active_es_id is also changed in the functions
+        # calling process_energy_system!
+        if get_session('active_es_id') != es.id:
+            set_session('active_es_id', es.id)
+
+    # build the spatial index of the areas, so the first asset that is dropped on the map does not have to wait
+    if es_to_process:
+        shape_dictionary.build_index()
+
     set_handler(esh)
     # emit('set_active_layer_id', main_es.id)
 
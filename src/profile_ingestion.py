@@ -0,0 +1,205 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Streaming ingestion of CSV files with profiles into InfluxDB.
+
+The first column of the CSV file contains the date and time, the other columns the values of the profiles. The file
+is parsed in chunks of rows: the format of the dates is detected once and then used for all dates of a chunk at
+once, values are converted per column (using the decimal point and thousands separator of the locale). The file is
+read twice: first all rows are validated without writing anything, so an invalid file does not leave part of its
+points in the database. Then every chunk is converted to InfluxDB line protocol and written by a background thread
+while the next chunk is parsed, so the memory use does not depend on the size of the file.
+"""
+import csv
+import io
+import locale
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import src.log as log
+from utils.datetime_utils import detect_date_format, parse_date
+
+logger = log.get_logger(__name__)
+
+
+def sniff_delimiter(sample):
+    try:
+        # spaces and colons of the dates are not delimiters
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        # If format cannot be determined automatically, try ; as a default
+        return ';'
+
+
+def escape_measurement(name):
+    return name.replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ')
+
+
+def escape_key(name):
+    return escape_measurement(name).replace('=', '\\=')
+
+
+def parse_timestamps(values, date_format):
+    """Parses an array of dates with the same format into UTC timestamps (datetime64[ns, UTC] series)"""
+    try:
+        return pd.to_datetime(pd.Series(values), format=date_format, utc=True)
+    except (ValueError, TypeError):
+        # e.g. formats with a timezone name, parse every date on its own
+        return pd.to_datetime(pd.Series([parse_date(v) for v in values]), utc=True)
+
+
+def to_line_protocol(measurement, field_names, timestamps, columns):
+    """
+    Converts a chunk of rows to InfluxDB line protocol
+    :param timestamps: array with the timestamps in nanoseconds
+    :param columns: list with a float array of every field, NaN for missing values
+    """
+    parts = []
+    for name, values in zip(field_names, columns):
+        present = ~np.isnan(values)
+        text = np.where(present, escape_key(name) + '=' + values.astype(str).astype(object), '')
+        parts.append(text)
+    prefix = escape_measurement(measurement) + ' '
+    lines = []
+    for timestamp, fields in zip(timestamps.tolist(), zip(*parts) if parts else []):
+        fields = ','.join(f for f in fields if f)
+        if fields:
+            lines.append(prefix + fields + ' ' + str(timestamp))
+    return lines
+
+
+class ProfileCSVIngestion:
+    def __init__(self, client, database, measurement, chunk_size=50000, batch_size=5000, progress=None):
+        """
+        :param client: InfluxDatabase (or InfluxDBClient) to write the points to
+        :param chunk_size: number of rows that are parsed at once
+        :param batch_size: number of points per write request
+        :param progress: function that is called with (number of rows, fraction of the file) after every chunk
+        """
+        self.client = client
+        self.database = database
+        self.measurement = measurement
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.progress = progress
+        self.field_names = []
+        self.start_datetime = None
+        self.end_datetime = None
+        self.rows = 0
+
+    def ingest(self, file, size=None):
+        """
+        Parses a CSV file (binary, seekable file object) and writes its values to InfluxDB, after all rows are valid
+        :return: the names of the fields (columns) that were written
+        """
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        delimiter = sniff_delimiter(sample)
+        column_names = next(csv.reader([text.readline()], delimiter=delimiter))
+
+        # Stop at the first empty column name
+        self.field_names = []
+        for name in column_names[1:]:
+            if name.strip() == '':
+                break
+            self.field_names.append(name)
+        if not self.field_names:
+            raise Exception('CSV file does not contain any profile columns')
+
+        locale.setlocale(locale.LC_ALL, '')
+        conventions = locale.localeconv()
+        data_start = text.tell()
+
+        def read_chunks(write):
+            text.seek(data_start)
+            reader = pd.read_csv(text, sep=delimiter, header=None, usecols=range(len(self.field_names) + 1),
+                                 dtype={0: str}, decimal=conventions['decimal_point'],
+                                 thousands=conventions['thousands_sep'] or None, chunksize=self.chunk_size,
+                                 skip_blank_lines=True)
+            return self._parse_chunks(reader, file, size, write)
+
+        # validate the whole file before the first point is written
+        rows = 0
+        for chunk_rows, _, _ in read_chunks(write=False):
+            rows += chunk_rows
+        if rows == 0:
+            text.detach()
+            raise Exception('CSV file does not contain any rows')
+
+        first_timestamp = last_timestamp = None
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+            for chunk_rows, timestamps, lines in read_chunks(write=True):
+                if first_timestamp is None:
+                    first_timestamp = timestamps.iloc[0]
+                last_timestamp = timestamps.iloc[-1]
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(self._write, lines)
+                self.rows += chunk_rows
+            if pending is not None:
+                pending.result()
+
+        # do not close the file when the wrapper is garbage collected
+        text.detach()
+        self.start_datetime = first_timestamp.strftime('%Y-%m-%dT%H:%M:%S%z')
+        self.end_datetime = last_timestamp.strftime('%Y-%m-%dT%H:%M:%S%z') if self.rows > 1 else ""
+        return self.field_names
+
+    def _parse_chunks(self, reader, file, size, write):
+        """
+        Yields (number of rows, timestamps, line protocol) of every chunk, raises an exception for invalid rows
+        :param write: False to only validate the rows (the line protocol is None), the first half of the progress
+        """
+        date_format = None
+        previous_timestamp = None
+        rows = 0
+        for chunk in reader:
+            chunk = chunk.dropna(subset=[0])
+            if chunk.empty:
+                continue
+            dates = chunk[0].str.strip().to_numpy()
+            if date_format is None:
+                date_format = detect_date_format(dates[0])
+                logger.debug('Date format of profile CSV: {}'.format(date_format))
+            timestamps = parse_timestamps(dates, date_format)
+            timestamps_ns = timestamps.astype('int64').to_numpy()
+            self._check_duplicates(timestamps_ns, timestamps, previous_timestamp)
+            previous_timestamp = timestamps_ns[-1]
+
+            columns = [pd.to_numeric(chunk[i]).to_numpy(dtype=float) for i in range(1, len(self.field_names) + 1)]
+            lines = to_line_protocol(self.measurement, self.field_names, timestamps_ns, columns) if write else None
+            rows += len(chunk)
+            if self.progress:
+                fraction = (0.5 if write else 0.0) + min(1.0, file.tell() / size) / 2 if size else None
+                self.progress(rows, fraction)
+            yield len(chunk), timestamps, lines
+
+    @staticmethod
+    def _check_duplicates(timestamps_ns, timestamps, previous_timestamp):
+        duplicates = np.flatnonzero(timestamps_ns[1:] == timestamps_ns[:-1]) + 1
+        if previous_timestamp is not None and timestamps_ns[0] == previous_timestamp:
+            duplicates = np.r_[0, duplicates]
+        if len(duplicates):
+            dt_string = timestamps.iloc[duplicates[0]].strftime('%Y-%m-%dT%H:%M:%S%z')
+            raise Exception("CSV contains duplicate datetimes ({}). Check timezone and daylight saving".
+                            format(dt_string))
+
+    def _write(self, lines):
+        if lines:
+            self.client.write_points(lines, database=self.database, protocol='line', batch_size=self.batch_size)
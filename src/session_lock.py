@@ -0,0 +1,104 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Reader-writer lock to coordinate the socket handlers and background jobs that use the energy systems of a session.
+Uses the threading module, so it also works with gevent (greenlets) when the threading module is monkey patched.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock that is held by any number of readers or by one writer. Waiting writers go before new readers, so a stream
+    of readers cannot stall a writer. The writer can take the lock again and can also read, a reader can read again
+    but cannot start writing.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = dict()          # thread id -> number of times the read lock is taken
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self, timeout=None):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return True
+            if not self._condition.wait_for(lambda: self._writer is None and not self._waiting_writers, timeout):
+                return False
+            self._readers[me] = 1
+            return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                self._condition.notify_all()
+
+    def acquire_write(self, timeout=None):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writes += 1
+                return True
+            if me in self._readers:
+                raise RuntimeError('Cannot take the write lock while holding the read lock')
+            self._waiting_writers += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self._writer is None and not self._readers, timeout)
+            finally:
+                self._waiting_writers -= 1
+            if not acquired:
+                self._condition.notify_all()    # readers that waited for this writer can continue
+                return False
+            self._writer = me
+            self._writes = 1
+            return True
+
+    def release_write(self):
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('Write lock is not held by this thread')
+            self._writes -= 1
+            if not self._writes:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+    def in_use(self):
+        """True when the lock is held or a writer is waiting for it"""
+        return self._writer is not None or bool(self._readers) or bool(self._waiting_writers)
@@ -0,0 +1,250 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Profiles of the socket commands and background jobs of a session, captured on request of an admin.
+
+An admin asks for the next N commands or jobs of a session to be profiled (see extensions/profiler_api.py). The
+request is stored in the session, so it is picked up by the worker that serves the session. The handlers and jobs
+that lock the session (session_writer and session_reader) are then run with a profiler:
+
+- deterministic: cProfile, stored in the pstats format (.prof), for e.g. snakeviz or python -m pstats
+- sampled: the stack of the thread is sampled at an interval, stored as collapsed stacks (.txt) for flame graphs
+  (e.g. speedscope or flamegraph.pl). This has less overhead for long jobs on large models.
+
+Every profile has a JSON file with the name of the command, the duration and the statistics of the model at the
+end of the command, and for deterministic profiles the functions with the highest cumulative time.
+"""
+import _thread
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from esdl import esdl
+import src.log as log
+import src.settings as settings
+
+logger = log.get_logger(__name__)
+
+PROFILING_KEY = 'profiling'
+DETERMINISTIC = 'deterministic'
+SAMPLED = 'sampled'
+MODES = (DETERMINISTIC, SAMPLED)
+# number of functions in the summary of a deterministic profile
+SUMMARY_FUNCTIONS = 30
+
+
+def _real_thread_functions():
+    """Returns start_new_thread, sleep and get_ident of OS threads, also when they are monkey patched by gevent"""
+    if settings.USE_GEVENT:
+        from gevent import monkey
+        return monkey.get_original('_thread', 'start_new_thread'), monkey.get_original('time', 'sleep'), \
+            monkey.get_original('_thread', 'get_ident')
+    return _thread.start_new_thread, time.sleep, _thread.get_ident
+
+
+class StackSampler:
+    """
+    Samples the stack of a thread from another OS thread. With gevent, a sample shows the greenlet that runs on the
+    thread at that moment, which is another greenlet when the profiled one waits for I/O.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = False
+        self._finished = False
+
+    def start(self):
+        start_new_thread, self._sleep, get_ident = _real_thread_functions()
+        self._target = get_ident()
+        start_new_thread(self._run, ())
+
+    def stop(self):
+        # the sampler is an OS thread, also with gevent, so wait for it by polling instead of with an Event
+        self._stop = True
+        deadline = time.perf_counter() + 1
+        while not self._finished and time.perf_counter() < deadline:
+            self._sleep(self.interval)
+
+    def _run(self):
+        try:
+            while not self._stop:
+                frame = sys._current_frames().get(self._target)
+                if frame is not None:
+                    self.stacks[self._collapse(frame)] += 1
+                    self.samples += 1
+                self._sleep(self.interval)
+        finally:
+            self._finished = True
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def to_text(self):
+        """The samples as collapsed stacks, one line per stack with the number of samples"""
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+
+def model_stats(esh):
+    """Returns statistics of the energy systems of a handler, to judge a profile by the size of the model"""
+    if esh is None:
+        return {}
+    stats = {'objects': esh.object_count(), 'energy_systems': []}
+    for es in esh.get_energy_systems():
+        counts = Counter()
+        if isinstance(es, esdl.EnergySystem):
+            for o in es.eAllContents():
+                if isinstance(o, esdl.Asset):
+                    counts['assets'] += 1
+                    counts['ports'] += len(o.port)
+                elif isinstance(o, esdl.Area):
+                    counts['areas'] += 1
+                elif isinstance(o, esdl.GenericProfile):
+                    counts['profiles'] += 1
+        stats['energy_systems'].append(dict(id=getattr(es, 'id', None), name=getattr(es, 'name', None), **counts))
+    return stats
+
+
+class SessionProfiler:
+    def __init__(self, directory, max_profiles=100, sample_interval=0.005):
+        """
+        :param directory: directory with the profiles, shared by the workers so any worker can send them
+        :param max_profiles: the oldest profiles are removed when there are more
+        :param sample_interval: time in seconds between two samples of a sampled profile
+        """
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self._local = threading.local()
+
+    def active(self):
+        """True when a command is profiled in this thread, commands that it calls are part of that profile"""
+        return getattr(self._local, 'active', False)
+
+    def run(self, mode, name, f, args=(), kwargs=None, info=None, get_model_stats=None):
+        """
+        Calls f with a profiler and stores the profile
+        :param info: dict with information about the session that is stored with the profile
+        :param get_model_stats: function that returns the statistics of the model after the call
+        """
+        kwargs = kwargs or {}
+        self._local.active = True
+        profile = sampler = None
+        start = time.perf_counter()
+        try:
+            if mode == SAMPLED:
+                sampler = StackSampler(self.sample_interval)
+                sampler.start()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    sampler.stop()
+            else:
+                profile = cProfile.Profile()
+                return profile.runcall(f, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            self._local.active = False
+            try:
+                self._save(mode, name, duration, profile, sampler, info, get_model_stats)
+            except Exception:
+                logger.exception('Cannot save the profile of {}'.format(name))
+
+    def _save(self, mode, name, duration, profile, sampler, info, get_model_stats):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = '{}-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8])
+        metadata = dict(info or {}, id=profile_id, command=name, mode=mode, duration=duration,
+                        time=datetime.now().isoformat(), pid=os.getpid())
+        if profile is not None:
+            metadata['file'] = profile_id + '.prof'
+            profile.dump_stats(os.path.join(self.directory, metadata['file']))
+            metadata['summary'] = self._summary(profile)
+        else:
+            metadata['file'] = profile_id + '.txt'
+            metadata['samples'] = sampler.samples
+            metadata['sample_interval'] = sampler.interval
+            with open(os.path.join(self.directory, metadata['file']), 'w') as f:
+                f.write(sampler.to_text())
+        if get_model_stats is not None:
+            try:
+                metadata['model'] = get_model_stats()
+            except Exception as e:
+                metadata['model'] = {'error': str(e)}
+        with open(os.path.join(self.directory, profile_id + '.json'), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+        logger.info('Stored {} profile {} of {} ({:.2f}s)'.format(mode, profile_id, name, duration))
+        self._remove_old_profiles()
+
+    @staticmethod
+    def _summary(profile):
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_FUNCTIONS)
+        return stream.getvalue()
+
+    def list(self):
+        """Returns the metadata of the stored profiles, the newest first"""
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for filename in sorted(os.listdir(self.directory), reverse=True):
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        metadata = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                metadata.pop('summary', None)
+                profiles.append(metadata)
+        return profiles
+
+    def get(self, profile_id):
+        """Returns the metadata of a profile, or None when it does not exist"""
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith('.'):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_old_profiles(self):
+        profiles = sorted(f for f in os.listdir(self.directory) if f.endswith('.json'))
+        for filename in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            profile_id = filename[:-len('.json')]
+            for extension in ('.json', '.prof', '.txt'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+
+session_profiler = SessionProfiler(settings.profiler_config['directory'],
+                                   settings.profiler_config['max_profiles'],
+                                   settings.profiler_config['sample_interval'])
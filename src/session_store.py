@@ -0,0 +1,661 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Backends for the per client session state of the session manager.
+
+The MemorySessionStore keeps the sessions in a dict of the process, which only works with a single worker process.
+The SharedSessionStore keeps the sessions in a session store daemon (run with python -m src.session_store) that all
+worker processes connect to over a local socket. Every worker has a local copy of the sessions it serves: at the
+start of a request the values that were changed by other workers are loaded, at the end of a request the values that
+were used are pickled and sent back if they changed. Objects with a state_version() method (the
+EnergySystemHandler) are only pickled when that version changed. Values that cannot be pickled stay local to the
+worker. The daemon also relays the Socket.IO messages between the workers (see SessionStoreMessageQueue).
+
+Both stores keep the memory of the sessions in this worker within a budget: when the estimated size of the sessions
+is over the budget, the least recently used sessions that are idle are evicted. The MemorySessionStore writes the
+large values of an evicted session to a snapshot file on disk and reloads them when the session is used again, the
+SharedSessionStore drops its local copy of the session.
+"""
+import glob
+import hashlib
+import itertools
+import os
+import pickle
+import queue
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+
+import socketio
+
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+# stored in the session by the session manager, but only relevant for the local copy of a worker
+LAST_ACCESSED_KEY = 'last-accessed'
+# messages for a worker that are not received within this time are dropped
+SUBSCRIBER_TIMEOUT = 60
+# estimated memory in bytes of an object of an energy system (with its attributes, references and geometry)
+ESDL_OBJECT_SIZE = 3000
+# values of an evicted session that are smaller than this (in bytes) stay in memory, e.g. the user info
+EVICT_VALUE_SIZE = 4096
+
+
+def parse_address(address):
+    """'host:port' is a TCP address (localhost when the host is left out), anything else the path of a unix socket"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host or 'localhost', int(port)
+    return address
+
+
+def get_authkey(config):
+    """
+    Returns the key of the shared session store as bytes. There is no default key: the workers and the daemon exchange
+    pickles, so anyone who can connect with the key can run code in them.
+    """
+    authkey = config.get('authkey')
+    if not authkey:
+        raise ValueError('SESSION_STORE_AUTHKEY must be set to a secret key to use the shared session store')
+    return authkey.encode()
+
+
+def estimate_size(value):
+    """
+    Estimate of the memory in bytes used by a session value: for an EnergySystemHandler the number of objects times
+    ESDL_OBJECT_SIZE, for other values the size of the pickled value
+    """
+    object_count = getattr(value, 'object_count', None)
+    if callable(object_count):
+        return object_count() * ESDL_OBJECT_SIZE
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class LocalSessions:
+    """Sessions in the memory of this worker, with the time they were used last and an estimate of their size"""
+    def __init__(self):
+        self.sessions = dict()
+        self._accessed = dict()     # client_id -> time.monotonic() of the last use
+        self._sizes = dict()        # client_id -> (time of last use when measured, {key: estimated bytes})
+
+    def _touch(self, client_id):
+        self._accessed[client_id] = time.monotonic()
+
+    def value_sizes(self, client_id):
+        """Returns {key: estimated bytes} of a session, only measured again when the session was used since"""
+        accessed = self._accessed.get(client_id)
+        measured = self._sizes.get(client_id)
+        if measured is None or measured[0] != accessed:
+            session = self.sessions.get(client_id, {})
+            measured = self._sizes[client_id] = (accessed, {key: estimate_size(value)
+                                                            for key, value in list(session.items())})
+        return measured[1]
+
+    def resident_size(self):
+        return sum(sum(self.value_sizes(client_id).values()) for client_id in list(self.sessions))
+
+    def least_recently_used(self, budget, idle_time, busy=()):
+        """
+        Returns the client ids of the least recently used sessions that were idle for at least idle_time seconds,
+        that have to be evicted to get the estimated size of the sessions within budget (bytes)
+        :param busy: client ids of sessions that are in use by a job and cannot be evicted
+        """
+        now = time.monotonic()
+        sizes = {client_id: sum(self.value_sizes(client_id).values()) for client_id in list(self.sessions)}
+        total = sum(sizes.values())
+        result = []
+        for client_id in sorted(sizes, key=lambda c: self._accessed.get(c, 0)):
+            if total <= budget or now - self._accessed.get(client_id, 0) < idle_time:
+                break
+            if client_id in busy:
+                continue
+            result.append(client_id)
+            total -= sizes[client_id]
+        return result
+
+
+class SessionSnapshots:
+    """Values of sessions that were evicted from memory, stored in a pickle file per session"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.sizes = dict()     # client_id -> size of the file
+        os.makedirs(directory, exist_ok=True)
+        # snapshots of a previous run cannot be used, as the ESDLs are not stored in the flask session
+        for file in glob.glob(os.path.join(directory, '*.session')):
+            os.remove(file)
+
+    def _path(self, client_id):
+        return os.path.join(self.directory, hashlib.sha1(str(client_id).encode()).hexdigest() + '.session')
+
+    def __contains__(self, client_id):
+        return client_id in self.sizes
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def total_size(self):
+        return sum(self.sizes.values())
+
+    def save(self, client_id, values):
+        """Writes a dict with pickled values of a session"""
+        data = pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(client_id)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        self.sizes[client_id] = len(data)
+
+    def load(self, client_id):
+        """Reads and removes the snapshot of a session, returns the dict with pickled values"""
+        with open(self._path(client_id), 'rb') as f:
+            values = pickle.load(f)
+        self.delete(client_id)
+        return values
+
+    def delete(self, client_id):
+        if self.sizes.pop(client_id, None) is not None:
+            try:
+                os.remove(self._path(client_id))
+            except FileNotFoundError:
+                pass
+
+
+class MemorySessionStore(LocalSessions):
+    shared = False
+
+    def __init__(self, snapshot_dir=None):
+        super().__init__()
+        self.worker_id = None
+        self.snapshots = SessionSnapshots(snapshot_dir) if snapshot_dir else None
+        self._lock = threading.Lock()
+
+    def load(self, client_id):
+        session = self.sessions.get(client_id)
+        if session is not None:
+            # an eviction either sees this access and stops, or has finished and the session is reloaded
+            with self._lock:
+                self._touch(client_id)
+                if self.snapshots is not None and client_id in self.snapshots:
+                    self._reload(client_id, session)
+        return session
+
+    def create(self, client_id):
+        with self._lock:
+            self._touch(client_id)
+        return self.sessions.setdefault(client_id, dict())
+
+    def save(self, client_id, keys, removed_keys=()):
+        pass
+
+    def values(self, keys):
+        """Returns {client_id: {key: value}} with the given keys of all sessions"""
+        return {client_id: {key: s[key] for key in keys if key in s} for client_id, s in list(self.sessions.items())}
+
+    def clean_up(self, timeout):
+        """Removes the sessions that were not accessed in the last timeout seconds, returns their client ids"""
+        removed = []
+        for client_id in list(self.sessions.keys()):  # make a copy of the keys in the list
+            last_accessed = self.sessions[client_id].get(LAST_ACCESSED_KEY)
+            if last_accessed is not None and (datetime.now() - last_accessed).total_seconds() > timeout:
+                del self.sessions[client_id]
+                self._accessed.pop(client_id, None)
+                self._sizes.pop(client_id, None)
+                if self.snapshots is not None:
+                    self.snapshots.delete(client_id)
+                removed.append(client_id)
+        return removed
+
+    def evict(self, budget, idle_time, busy=()):
+        """
+        Writes the large values of the least recently used idle sessions to disk until the estimated size of the
+        sessions in memory is within budget (bytes), returns the client ids of the evicted sessions
+        """
+        if self.snapshots is None:
+            return []
+        return [client_id for client_id in self.least_recently_used(budget, idle_time, busy)
+                if self._evict(client_id)]
+
+    def _evict(self, client_id):
+        session = self.sessions.get(client_id)
+        accessed = self._accessed.get(client_id)
+        if session is None:
+            return False
+        values = dict()
+        evicted = dict()
+        for key, size in self.value_sizes(client_id).items():
+            value = session.get(key)
+            if size < EVICT_VALUE_SIZE or key == LAST_ACCESSED_KEY or value is None:
+                continue
+            try:
+                values[key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                evicted[key] = value
+            except Exception as e:
+                logger.debug('Session value {} cannot be evicted: {}'.format(key, e))
+        if not values:
+            return False
+        with self._lock:
+            # load() touches the session under the lock, so it is not used while the values are removed
+            if self._accessed.get(client_id) != accessed or client_id in self.snapshots:
+                return False    # used while it was being pickled
+            self.snapshots.save(client_id, values)
+            for key, value in evicted.items():
+                if session.get(key) is value:
+                    del session[key]
+            self._sizes.pop(client_id, None)
+        logger.info('Evicted session of client_id={} to disk ({} bytes)'.format(client_id,
+                                                                                self.snapshots.sizes[client_id]))
+        return True
+
+    def _reload(self, client_id, session):
+        """Loads the evicted values of a session, the caller holds the lock"""
+        start = time.perf_counter()
+        for key, blob in self.snapshots.load(client_id).items():
+            # values that were set after the session was evicted are newer
+            if key not in session:
+                session[key] = pickle.loads(blob)
+        self._sizes.pop(client_id, None)
+        logger.info('Reloaded session of client_id={} from disk in {:.2f}s'.format(client_id,
+                                                                                    time.perf_counter() - start))
+
+    def stats(self):
+        return {
+            'resident_sessions': len(self.sessions) - (len(self.snapshots) if self.snapshots is not None else 0),
+            'resident_bytes': self.resident_size(),
+            'evicted_sessions': len(self.snapshots) if self.snapshots is not None else 0,
+            'evicted_bytes': self.snapshots.total_size() if self.snapshots is not None else 0,
+        }
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#  Session store daemon
+# ---------------------------------------------------------------------------------------------------------------------
+class SessionTable:
+    """Pickled values of the sessions of all workers, every value has a version number that changes when it is set"""
+    def __init__(self):
+        self._sessions = dict()     # client_id -> {key: (version, pickled value)}
+        self._accessed = dict()     # client_id -> time
+        self._owners = dict()       # client_id -> worker that used the session last
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def changes(self, client_id, known, worker_id):
+        """
+        :param known: {key: version} of the values that the worker has
+        :return: (exists, {key: (version, pickled value)} of changed values, list of removed keys)
+        """
+        with self._lock:
+            values = self._sessions.get(client_id)
+            if values is None:
+                return False, {}, []
+            self._accessed[client_id] = time.time()
+            self._owners[client_id] = worker_id
+            changed = {key: value for key, value in values.items() if known.get(key) != value[0]}
+            removed = [key for key in known if key not in values]
+            return True, changed, removed
+
+    def create(self, client_id, worker_id):
+        with self._lock:
+            self._sessions.setdefault(client_id, dict())
+            self._accessed[client_id] = time.time()
+            self._owners[client_id] = worker_id
+
+    def update(self, client_id, worker_id, values, removed_keys, known):
+        """Sets pickled values of a session, returns {key: version} of the new values"""
+        with self._lock:
+            session = self._sessions.setdefault(client_id, dict())
+            versions = dict()
+            for key, blob in values.items():
+                if key in session and session[key][0] != known.get(key):
+                    logger.warning('Session value {} of client_id={} was changed by another worker, overwriting it'
+                                   .format(key, client_id))
+                versions[key] = next(self._versions)
+                session[key] = (versions[key], blob)
+            for key in removed_keys:
+                session.pop(key, None)
+            self._accessed[client_id] = time.time()
+            self._owners[client_id] = worker_id
+            return versions
+
+    def values(self, keys):
+        with self._lock:
+            return {client_id: {key: session[key][1] for key in keys if key in session}
+                    for client_id, session in self._sessions.items()}
+
+    def owner(self, client_id):
+        return self._owners.get(client_id)
+
+    def clean_up(self, timeout):
+        with self._lock:
+            now = time.time()
+            removed = [client_id for client_id, accessed in self._accessed.items() if now - accessed > timeout]
+            for client_id in removed:
+                self._sessions.pop(client_id, None)
+                self._accessed.pop(client_id, None)
+                self._owners.pop(client_id, None)
+            if removed:
+                logger.info('Removed {} sessions, {} sessions left'.format(len(removed), len(self._sessions)))
+            return removed
+
+
+class MessageBus:
+    """Publish/subscribe channels with a queue of messages per subscriber"""
+    def __init__(self, max_messages=10000):
+        self.max_messages = max_messages
+        self._subscribers = dict()      # id -> (channel, queue, time of last receive)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        with self._lock:
+            subscriber = next(self._ids)
+            self._subscribers[subscriber] = [channel, queue.Queue(self.max_messages), time.time()]
+            return subscriber
+
+    def publish(self, channel, message):
+        now = time.time()
+        with self._lock:
+            for subscriber, (ch, messages, received) in list(self._subscribers.items()):
+                if now - received > SUBSCRIBER_TIMEOUT:
+                    logger.warning('Subscriber {} does not receive messages, removing it'.format(subscriber))
+                    del self._subscribers[subscriber]
+                elif ch == channel:
+                    try:
+                        messages.put_nowait(message)
+                    except queue.Full:
+                        logger.warning('Message queue of subscriber {} is full, dropping message'.format(subscriber))
+
+    def receive(self, subscriber, timeout):
+        """Waits at most timeout seconds for messages, returns a list with all waiting messages"""
+        entry = self._subscribers.get(subscriber)
+        if entry is None:
+            raise KeyError('Unknown subscriber {}'.format(subscriber))
+        entry[2] = time.time() + timeout
+        result = []
+        try:
+            result.append(entry[1].get(timeout=timeout))
+            while True:
+                result.append(entry[1].get_nowait())
+        except queue.Empty:
+            pass
+        entry[2] = time.time()
+        return result
+
+
+class SessionStoreServer:
+    """Serves the SessionTable and MessageBus over a socket, with a thread per connection"""
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.table = SessionTable()
+        self.bus = MessageBus()
+        self.methods = {
+            'changes': self.table.changes,
+            'create': self.table.create,
+            'update': self.table.update,
+            'values': self.table.values,
+            'owner': self.table.owner,
+            'clean_up': self.table.clean_up,
+            'subscribe': self.bus.subscribe,
+            'publish': self.bus.publish,
+            'receive': self.bus.receive,
+        }
+        self.listener = None
+
+    def serve_forever(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        logger.info('Session store listening on {}'.format(self.listener.address))
+        if isinstance(self.address, tuple) and self.address[0] not in ('localhost', '127.0.0.1', '::1'):
+            logger.warning('The session store can be reached from other hosts, only allow the workers to connect')
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                if self.listener is None:
+                    break       # closed
+                logger.exception('Error accepting connection to the session store')
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+
+    def _serve(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = (True, self.methods[method](*args))
+                except Exception as e:
+                    result = (False, e)
+                connection.send(result)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+#  Worker side
+# ---------------------------------------------------------------------------------------------------------------------
+class SessionStoreClient:
+    """Calls the methods of a SessionStoreServer, using a pool of connections"""
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._connections = queue.LifoQueue()
+
+    def call(self, method, *args):
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+        try:
+            connection.send((method, args))
+            ok, result = connection.recv()
+        except BaseException:
+            connection.close()
+            raise
+        self._connections.put(connection)
+        if not ok:
+            raise result
+        return result
+
+
+class SharedSessionStore(LocalSessions):
+    shared = True
+
+    def __init__(self, address, authkey, worker_id=None):
+        super().__init__()              # sessions: the local copies, client_id -> session dict
+        self.client = SessionStoreClient(address, authkey)
+        self.worker_id = worker_id or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self._versions = dict()         # client_id -> {key: version in the store}
+        self._fingerprints = dict()     # client_id -> {key: state version or hash of the pickled value}
+        self._local_keys = set()        # keys with values that cannot be pickled
+        self._lock = threading.Lock()
+
+    def load(self, client_id):
+        """Returns the local copy of a session, updated with the values that other workers changed"""
+        exists, changed, removed = self.client.call('changes', client_id, dict(self._versions.get(client_id, {})),
+                                                    self.worker_id)
+        with self._lock:
+            if not exists:
+                self._forget(client_id)
+                return None
+            session = self.sessions.setdefault(client_id, dict())
+            self._touch(client_id)
+            versions = self._versions.setdefault(client_id, dict())
+            fingerprints = self._fingerprints.setdefault(client_id, dict())
+            for key, (version, blob) in changed.items():
+                value = pickle.loads(blob)
+                session[key] = value
+                versions[key] = version
+                fingerprints[key] = self._fingerprint(value, blob)
+            for key in removed:
+                session.pop(key, None)
+                versions.pop(key, None)
+                fingerprints.pop(key, None)
+            return session
+
+    def create(self, client_id):
+        self.client.call('create', client_id, self.worker_id)
+        with self._lock:
+            self._touch(client_id)
+            self._versions.setdefault(client_id, dict())
+            self._fingerprints.setdefault(client_id, dict())
+            return self.sessions.setdefault(client_id, dict())
+
+    def save(self, client_id, keys, removed_keys=()):
+        """Sends the values of the given keys that changed since they were loaded or saved to the store"""
+        session = self.sessions.get(client_id)
+        if session is None:
+            return
+        fingerprints = self._fingerprints.setdefault(client_id, dict())
+        values = dict()
+        new_fingerprints = dict()
+        for key in list(keys):
+            if key == LAST_ACCESSED_KEY or key not in session:
+                continue
+            value = session[key]
+            fingerprint = self._fingerprint(value)
+            if fingerprint is not None and fingerprint == fingerprints.get(key):
+                continue
+            try:
+                blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                if key not in self._local_keys:
+                    logger.warning('Session value {} cannot be shared with other workers: {}'.format(key, e))
+                    self._local_keys.add(key)
+                continue
+            if fingerprint is None:
+                fingerprint = self._fingerprint(value, blob)
+                if fingerprint == fingerprints.get(key):
+                    continue
+            values[key] = blob
+            new_fingerprints[key] = fingerprint
+        removed_keys = [key for key in removed_keys if key not in session]
+        if not values and not removed_keys:
+            return
+        known = {key: version for key, version in self._versions.get(client_id, {}).items() if key in values}
+        versions = self.client.call('update', client_id, self.worker_id, values, removed_keys, known)
+        with self._lock:
+            self._versions.setdefault(client_id, dict()).update(versions)
+            fingerprints.update(new_fingerprints)
+            for key in removed_keys:
+                self._versions[client_id].pop(key, None)
+                fingerprints.pop(key, None)
+
+    def values(self, keys):
+        return {client_id: {key: pickle.loads(blob) for key, blob in values.items()}
+                for client_id, values in self.client.call('values', list(keys)).items()}
+
+    def routing_hint(self, client_id):
+        """The worker that used the session last, requests of that client are best routed to that worker"""
+        return self.client.call('owner', client_id)
+
+    def clean_up(self, timeout):
+        removed = self.client.call('clean_up', timeout)
+        with self._lock:
+            for client_id in removed:
+                self._forget(client_id)
+            # local copies of sessions that are used by other workers are loaded again when needed
+            for client_id, session in list(self.sessions.items()):
+                last_accessed = session.get(LAST_ACCESSED_KEY)
+                if last_accessed is None or (datetime.now() - last_accessed).total_seconds() > timeout:
+                    self._forget(client_id)
+        return removed
+
+    def evict(self, budget, idle_time, busy=()):
+        """
+        Drops the local copies of the least recently used idle sessions until the estimated size of the local copies
+        is within budget (bytes), they are loaded from the session store when they are used again
+        """
+        evicted = []
+        for client_id in self.least_recently_used(budget, idle_time, busy):
+            with self._lock:
+                session = self.sessions.get(client_id, {})
+                if not any(key in self._local_keys for key in session):
+                    self._forget(client_id)
+                    evicted.append(client_id)
+        return evicted
+
+    def stats(self):
+        return {'resident_sessions': len(self.sessions), 'resident_bytes': self.resident_size(),
+                'evicted_sessions': 0, 'evicted_bytes': 0}
+
+    def _forget(self, client_id):
+        self.sessions.pop(client_id, None)
+        self._accessed.pop(client_id, None)
+        self._sizes.pop(client_id, None)
+        self._versions.pop(client_id, None)
+        self._fingerprints.pop(client_id, None)
+
+    @staticmethod
+    def _fingerprint(value, blob=None):
+        state_version = getattr(value, 'state_version', None)
+        if callable(state_version):
+            return 'version', id(value), state_version()
+        if blob is not None:
+            return 'hash', hashlib.blake2b(blob, digest_size=16).digest()
+        return None
+
+
+class SessionStoreMessageQueue(socketio.PubSubManager):
+    """Socket.IO client manager that sends the messages for clients of other workers through the session store"""
+    name = 'session-store'
+
+    def __init__(self, store: SharedSessionStore, channel='socketio', write_only=False, logger=None):
+        self.store = store
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        self.store.client.call('publish', self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        subscriber = None
+        while True:
+            try:
+                if subscriber is None:
+                    subscriber = self.store.client.call('subscribe', self.channel)
+                for message in self.store.client.call('receive', subscriber, 5):
+                    yield message
+            except Exception:
+                logger.exception('Cannot receive Socket.IO messages from the session store, retrying')
+                subscriber = None
+                time.sleep(1)
+
+
+def create_session_store(config):
+    if config['type'] == 'shared':
+        logger.info('Using shared session store at {}'.format(config['address']))
+        return SharedSessionStore(config['address'], get_authkey(config), config['worker_id'])
+    return MemorySessionStore(config['snapshot_dir'] if config['memory_budget'] else None)
+
+
+if __name__ == '__main__':
+    import src.settings as settings
+    try:
+        authkey = get_authkey(settings.session_store_config)
+    except ValueError as e:
+        sys.exit(str(e))
+    server = SessionStoreServer(settings.session_store_config['address'], authkey)
+    server.serve_forever()
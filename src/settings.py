@@ -32,6 +32,12 @@ OIDC_CLIENT_SECRETS = os.environ.get('OIDC_CLIENT_SECRETS', None) # 'credentials
 _use_gevent = os.environ.get('MAPEDITOR_USE_GEVENT', '')
 USE_GEVENT = (_use_gevent.upper() == 'TRUE' or _use_gevent == '1')
 
+# Number of energy systems that are prepared for drawing in the UI at the same time
+PROCESS_ES_MAX_WORKERS = int(os.environ.get('PROCESS_ES_MAX_WORKERS', '4'))
+
+# Commands from the browser that take longer than this (in seconds) are logged with their arguments
+SLOW_COMMAND_THRESHOLD = float(os.environ.get('SLOW_COMMAND_THRESHOLD', '1.0'))
+
 settings_storage_config = {
     "host": os.environ.get('SETTINGS_STORAGE_HOST', None),  # "mongo",
     "port": os.environ.get('SETTINGS_STORAGE_PORT', "27017"),
@@ -49,7 +55,17 @@ boundaries_config = {
     "port": os.environ.get('BOUNDARY_SERVICE_PORT', None),  # "4002",
     "path_names": "/names",
     "path_boundaries": "/boundaries",
-    "path_service_areas": "/service_areas"
+    "path_service_areas": "/service_areas",
+    "max_workers": int(os.environ.get('BOUNDARY_SERVICE_MAX_WORKERS', '16')),   # parallel requests
+    "timeout": float(os.environ.get('BOUNDARY_SERVICE_TIMEOUT', '30'))         # seconds
+}
+
+# Boundaries are cached in memory (LRU, limited in bytes) and in a SQLite file that is shared by all workers
+boundary_cache_config = {
+    "memory_size": int(os.environ.get('BOUNDARY_CACHE_MEMORY_SIZE', 256 * 1024 * 1024)),
+    "file": os.environ.get('BOUNDARY_CACHE_FILE', '/tmp/esdl_mapeditor_boundary_cache.sqlite'),  # empty: no file
+    "file_size": int(os.environ.get('BOUNDARY_CACHE_FILE_SIZE', 2 * 1024 * 1024 * 1024)),
+    "ttl": int(os.environ.get('BOUNDARY_CACHE_TTL', 30 * 24 * 3600))     # seconds
 }
 
 profile_database_config = {
@@ -62,6 +78,12 @@ profile_database_config = {
     "upload_password": "admin"
 }
 
+profile_upload_config = {
+    "chunk_size": int(os.environ.get('PROFILE_UPLOAD_CHUNK_SIZE', '50000')),    # rows parsed at once
+    "batch_size": int(os.environ.get('PROFILE_UPLOAD_BATCH_SIZE', '5000')),     # points per write request
+    "panel_workers": int(os.environ.get('PROFILE_UPLOAD_PANEL_WORKERS', '8'))   # concurrent panel creation
+}
+
 panel_service_config = {
     "external_url": os.environ.get('PANEL_SERVICE_EXTERNAL_URL', None),  # "http://localhost:3400",
     "internal_url": os.environ.get('PANEL_SERVICE_INTERNAL_URL', None),  # "http://panel-service:5000"
@@ -82,11 +104,41 @@ essim_config = {
     "user": "essim",
     "ESSIM_database_server": os.environ.get('ESSIM_DATABASE_HOST', None),  # "influxdb",
     "ESSIM_database_port": os.environ.get('ESSIM_DATABASE_PORT', 8086),
+    "export_chunk_hours": int(os.environ.get('ESSIM_EXPORT_CHUNK_HOURS', 7 * 24)),  # time range per export query
     "start_datetime": "2015-01-01T00:00:00+0100",
     "end_datetime": "2016-01-01T00:00:00+0100",
     "natsURL": "nats://nats:4222"
 }
 
+# Shared access to the InfluxDB servers with the simulation results and profiles
+influxdb_gateway_config = {
+    "timeout": float(os.environ.get('INFLUXDB_TIMEOUT', '60')),     # seconds
+    "pool_size": int(os.environ.get('INFLUXDB_POOL_SIZE', '10')),  # connections per server
+    "cache_size": int(os.environ.get('INFLUXDB_CACHE_SIZE', 128 * 1024 * 1024))    # bytes, 0: no result cache
+}
+
+# Store of the sessions of the clients: "memory" for a single worker process, "shared" to share the sessions between
+# multiple worker processes through a session store daemon (python -m src.session_store) listening on address
+session_store_config = {
+    "type": os.environ.get('SESSION_STORE', 'memory'),
+    "address": os.environ.get('SESSION_STORE_ADDRESS', 'localhost:8112'),    # host:port or path of a unix socket
+    # required for "shared": the workers and the daemon exchange pickles, so the key must be secret
+    "authkey": os.environ.get('SESSION_STORE_AUTHKEY', None),
+    "worker_id": os.environ.get('SESSION_WORKER_ID', None),    # default: hostname:pid, sent as X-Session-Worker header
+    # Estimated memory for the sessions of a worker, least recently used sessions that are idle for evict_after seconds
+    # are evicted to snapshot_dir when the sessions use more (0: no limit)
+    "memory_budget": int(os.environ.get('SESSION_MEMORY_BUDGET', 2048)) * 1024 * 1024,   # MB
+    "evict_after": int(os.environ.get('SESSION_EVICT_AFTER', 10 * 60)),     # seconds
+    "snapshot_dir": os.environ.get('SESSION_SNAPSHOT_DIR', '/tmp/mapeditor_sessions')
+}
+
+# Profiles of the commands of a session that an admin asked for, see src/session_profiler.py
+profiler_config = {
+    "directory": os.environ.get('PROFILER_DIR', '/tmp/mapeditor_profiles'),    # shared by the workers of a host
+    "max_profiles": int(os.environ.get('PROFILER_MAX_PROFILES', 100)),
+    "sample_interval": float(os.environ.get('PROFILER_SAMPLE_INTERVAL', 0.005)),    # seconds, for sampled profiles
+}
+
 edr_config = {
     "host": os.environ.get('EDR_URL', None),  # "https://edr.hesi.energy",
 }
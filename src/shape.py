@@ -14,7 +14,9 @@
 
 import geojson
 import json
-from shapely import wkt, wkb, to_geojson
+import shapely
+import uuid
+from shapely import wkt, wkb, to_geojson, STRtree
 from shapely.geometry import Point, LineString, Polygon, MultiPolygon, GeometryCollection, shape
 from shapely.ops import transform
 import esdl
@@ -326,4 +328,91 @@ class ShapeGeometryCollection(Shape):
             raise Exception("ShapeMultiPolygon constructor called with unsupported type")
 
     def get_esdl(self):
-        raise Exception("Not implemented yet, GeometryCollection is not a frequent ESDL geometry")
\ No newline at end of file
+        raise Exception("Not implemented yet, GeometryCollection is not a frequent ESDL geometry")
+
+
+class ShapeDictionary(dict):
+    """
+    Dictionary of id -> Shape (e.g. the shapes of the areas of the session) with an STR-tree spatial index over the
+    (prepared) geometries, to find the shapes that contain a geometry without testing all of them.
+    The index is built on the first query after the dictionary has been changed. The generation is incremented on
+    every change, so users of the shapes can detect changes by comparing (token, generation). Both are kept when the
+    dictionary is pickled, e.g. by the shared session store, so a copy of an unchanged dictionary compares equal.
+    """
+    generation = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tree = None
+        self._tree_keys = None
+        self.token = uuid.uuid4().hex
+        self.generation = 0
+
+    def _changed(self):
+        self._tree = None
+        self.generation += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args):
+        self._changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._changed()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self._changed()
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    # the index is not stored, it is rebuilt when required
+    def __getstate__(self):
+        return {'token': self.token, 'generation': self.generation}
+
+    def __setstate__(self, state):
+        self._tree = None
+        self._tree_keys = None
+        self.token = state.get('token') or uuid.uuid4().hex
+        self.generation = state.get('generation', 0)
+
+    def build_index(self):
+        keys = []
+        geometries = []
+        for key, shp in self.items():
+            if shp is not None and shp.shape is not None and not shp.shape.is_empty:
+                shapely.prepare(shp.shape)
+                keys.append(key)
+                geometries.append(shp.shape)
+        self._tree_keys = keys
+        self._tree = STRtree(geometries)
+        return self._tree
+
+    def find_containing(self, geometry):
+        """Returns the keys of all shapes that contain the (shapely) geometry, in the order of the dictionary"""
+        return self.find_containing_bulk([geometry])[0]
+
+    def find_containing_bulk(self, geometries):
+        """For every (shapely) geometry, returns the keys of all shapes that contain it"""
+        tree = self._tree if self._tree is not None else self.build_index()
+        result = [[] for _ in geometries]
+        if not geometries or not self._tree_keys:
+            return result
+        input_indices, tree_indices = tree.query(geometries, predicate='within')
+        for input_index, tree_index in sorted(zip(input_indices.tolist(), tree_indices.tolist())):
+            result[input_index].append(self._tree_keys[tree_index])
+        return result
@@ -0,0 +1,149 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Animation frames of a simulation run for the time dimension player.
+
+The results of a run are loaded once into a (asset index x time index) array. The line geometry, colour and the
+scaling of the stroke width of every asset are calculated once as well, so a range of frames is a few vectorized
+operations that result in compact lists keyed by asset index.
+"""
+import numpy as np
+
+from esdl import esdl
+
+# values with a smaller absolute value are not shown
+MIN_ABS_VALUE = 1e-2
+DEFAULT_COLOR = '#808080'
+
+
+def allocation_boundaries(result):
+    """
+    Returns a dict with network -> (minimum, maximum) from the result of a 'SELECT MIN(x), MAX(x) FROM <networks>'
+    query. The network is the measurement name, as in the keys of the results in SimulationFrames.from_results().
+    """
+    boundaries = dict()
+    for key in result.keys():
+        for item in result[key]:
+            boundaries[key[0]] = (item['min'], item['max'])
+    return boundaries
+
+
+class SimulationFrames:
+    def __init__(self, times, assets, values, scale):
+        """
+        :param times: list with the (ISO formatted) times of the frames
+        :param assets: list with a dict per asset: id, network, color and coordinates (list of [lon, lat])
+        :param values: float array (asset x time) with the values, NaN when there is no value
+        :param scale: array (asset x 2) with the factors to calculate the stroke width of negative and positive values
+        """
+        self.times = times
+        self.assets = assets
+        self.values = values
+        self.scale = scale
+        self.asset_index = {asset['id']: i for i, asset in enumerate(assets)}
+
+    @staticmethod
+    def from_results(results, parameter, get_asset, colors, boundaries):
+        """
+        Creates the frames from the result of an InfluxDB query (with time, assetId, carrierId and the parameter)
+        :param get_asset: function that returns the ESDL asset with an id, or None
+        :param colors: dict with carrier id -> color
+        :param boundaries: dict with network -> (minimum, maximum) of the parameter, see allocation_boundaries()
+        """
+        time_index = dict()
+        assets = []
+        asset_index = dict()
+        rows, columns, data = [], [], []
+        for key in results.keys():
+            network = key[0]
+            for item in results[key]:
+                asset_id = item['assetId']
+                i = asset_index.get(asset_id)
+                if i is None:
+                    asset = get_asset(asset_id)
+                    if asset is None or not isinstance(asset.geometry, esdl.Line):
+                        asset_index[asset_id] = -1
+                        continue
+                    i = asset_index[asset_id] = len(assets)
+                    assets.append({
+                        'id': asset_id,
+                        'network': network,
+                        'color': colors.get(item.get('carrierId'), DEFAULT_COLOR),
+                        'coordinates': [[p.lon, p.lat] for p in asset.geometry.point],
+                    })
+                elif i < 0:
+                    continue
+                t = time_index.setdefault(item['time'], len(time_index))
+                value = item[parameter]
+                rows.append(i)
+                columns.append(t)
+                data.append(np.nan if value is None else value)
+
+        # times in InfluxDB results have the same (RFC3339) format, so they can be sorted as strings
+        times = sorted(time_index)
+        order = np.empty(len(times), dtype=np.intp)
+        order[[time_index[t] for t in times]] = np.arange(len(times))
+        values = np.full((len(assets), len(times)), np.nan, dtype=np.float32)
+        if data:
+            values[np.asarray(rows), order[np.asarray(columns)]] = np.asarray(data, dtype=np.float32)
+
+        scale = np.zeros((len(assets), 2), dtype=np.float32)
+        for i, asset in enumerate(assets):
+            minimum, maximum = boundaries.get(asset['network'], (None, None))
+            if minimum:
+                scale[i, 0] = 10 / abs(minimum)
+            if maximum:
+                scale[i, 1] = 10 / abs(maximum)
+        return SimulationFrames(times, assets, values, scale)
+
+    def time_range(self, start, end):
+        """Indices of the first and last frame between start and end (inclusive, ISO formatted strings in UTC)"""
+        times = np.asarray(self.times)
+        return int(np.searchsorted(times, start)), int(np.searchsorted(times, end, side='right')) - 1
+
+    def stroke_widths(self, values, asset_indices):
+        positive = values >= 0
+        scale = np.where(positive, self.scale[asset_indices, 1], self.scale[asset_indices, 0])
+        return np.abs(values) * scale + 3
+
+    def get_frames(self, start, end):
+        """
+        Returns the frames from index start up to and including end, as a dict with the times and for every frame
+        the indices ('a') of the assets with a value, their values ('v') and stroke widths ('w')
+        """
+        start = max(0, start)
+        end = min(len(self.times) - 1, end)
+        frames = []
+        for t in range(start, end + 1):
+            column = self.values[:, t]
+            asset_indices = np.flatnonzero(np.abs(column) > MIN_ABS_VALUE)    # NaN compares as False
+            values = column[asset_indices].astype(np.float64)
+            frames.append({
+                'a': asset_indices.tolist(),
+                'v': np.round(values, 3).tolist(),
+                'w': np.round(self.stroke_widths(values, asset_indices), 1).tolist(),
+            })
+        return {'start': start, 'end': end, 'times': self.times[start:end + 1], 'frames': frames}
+
+    def get_asset_series(self, asset_id, start, end):
+        """Returns (times, values) of an asset from frame start up to and including end, skipping missing values"""
+        i = self.asset_index.get(asset_id)
+        if i is None:
+            return [], []
+        start = max(0, start)
+        end = min(len(self.times) - 1, end)
+        row = self.values[i, start:end + 1]
+        present = np.flatnonzero(~np.isnan(row))
+        return [self.times[start + t] for t in present], row[present].astype(np.float64).tolist()
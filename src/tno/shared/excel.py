@@ -7,6 +7,7 @@ import io
 from typing import Dict, Iterable
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
@@ -60,6 +61,27 @@ def create_workbook(sheet_name: str) -> Workbook:
     return workbook
 
 
+def create_write_only_workbook() -> Workbook:
+    """
+    Create a workbook in write-only mode, which keeps the rows of its sheets in temporary files instead of memory.
+    Rows can only be appended, use write_only_sheet_header() for the header.
+    """
+    return Workbook(write_only=True)
+
+
+def write_only_sheet_header(sheet, headers: Iterable, width: int = 12) -> None:
+    """
+    Append a bold header row to a sheet of a write-only workbook and set the width of the columns.
+    """
+    cells = []
+    for col, header in enumerate(headers, start=1):
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+        sheet.column_dimensions[get_column_letter(col)].width = width
+    sheet.append(cells)
+
+
 def create_simple_excel_file(
     sheet_name: str, field_map: OrderedDict, entities: Iterable
 ) -> Workbook:
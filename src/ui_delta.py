@@ -0,0 +1,250 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Incremental updates of the assets and connections that are drawn in the UI.
+
+Instead of clearing a layer and sending the complete asset_list or conn_list of the session again, only the entries
+that were added, changed or removed since the last update are sent in a 'ui_delta' message:
+    {'es_id': ..., 'layer': 'assets' | 'connections', 'seq': ..., 'full': False,
+     'add': [entries], 'update': [entries], 'remove': [keys]}
+The key of an asset entry is the asset id, the key of a connection is from-port-id + to-port-id (the same as the id
+of the line in the UI). Entries that are changed are found using a ChangeRecorder that records the ids of all assets
+and ports that were changed in the energy system since the last update.
+
+Every message has a sequence number per energy system and layer. When the client detects a gap, it requests a full
+update with the 'ui_resync' command, which is sent as a 'ui_delta' message with full=True.
+"""
+from flask_socketio import emit
+from pyecore.ecore import EObject
+from pyecore.notification import EObserver, Notification
+
+from esdl import esdl
+from extensions.session_manager import get_session, set_session, get_session_for_esid
+import src.log as log
+
+logger = log.get_logger(__name__)
+
+ASSETS_LAYER = 'assets'
+CONNECTIONS_LAYER = 'connections'
+SESSION_KEY = 'ui_delta_feed'
+
+
+class ChangeRecorder(EObserver):
+    """Records the ids of the assets and ports of a resource that changed since the last call to take()"""
+    def __init__(self, resource):
+        super().__init__()
+        self.resource = resource
+        self.changed_ids = set()
+
+    @staticmethod
+    def get_recorder(resource):
+        for listener in resource.listeners:
+            if isinstance(listener, ChangeRecorder):
+                return listener
+        recorder = ChangeRecorder(resource)
+        recorder.observe(resource)
+        return recorder
+
+    def take(self):
+        changed_ids = self.changed_ids
+        self.changed_ids = set()
+        return changed_ids
+
+    def notifyChanged(self, notification: Notification):
+        # record the port or asset the changed object belongs to, e.g. the asset of a point of a line geometry
+        obj = notification.notifier
+        while obj is not None:
+            if isinstance(obj, esdl.Port):
+                self.changed_ids.add(obj.id)
+                break
+            elif isinstance(obj, esdl.Asset):
+                self._record(obj)
+                break
+            obj = obj.eContainer()
+        feature = notification.feature
+        if feature is not None and getattr(feature, 'containment', False):
+            for value in (notification.old, notification.new):
+                if isinstance(value, EObject):
+                    self._record(value)
+                elif isinstance(value, (list, tuple)):
+                    for v in value:
+                        self._record(v)
+
+    def _record(self, eobject):
+        if not isinstance(eobject, EObject):
+            return
+        for obj in [eobject, *eobject.eAllContents()]:
+            if isinstance(obj, (esdl.Asset, esdl.Port)):
+                self.changed_ids.add(obj.id)
+
+
+def asset_key(entry):
+    return entry[3]
+
+
+def connection_key(entry):
+    return entry['from-port-id'] + entry['to-port-id']
+
+
+def asset_refers_to(entry, ids):
+    if entry[3] in ids:
+        return True
+    if len(entry) > 8 and entry[1] == 'asset':
+        for port in entry[8]:
+            if port['id'] in ids or port.get('carrier') in ids:
+                return True
+    return False
+
+
+def connection_refers_to(entry, ids):
+    return entry['from-port-id'] in ids or entry['to-port-id'] in ids or entry['from-asset-id'] in ids or \
+        entry['to-asset-id'] in ids or entry.get('from-port-carrier') in ids or entry.get('to-port-carrier') in ids
+
+
+LAYERS = {
+    ASSETS_LAYER: (asset_key, asset_refers_to),
+    CONNECTIONS_LAYER: (connection_key, connection_refers_to),
+}
+
+
+class UIDeltaFeed:
+    """The state of the assets and connections layers of every energy system as last sent to the client"""
+    def __init__(self):
+        self.seq = dict()       # (es_id, layer) -> sequence number of the last message
+        self.synced = dict()    # (es_id, layer) -> keys of the entries the client has
+        self.changed = dict()   # (es_id, layer) -> ids of changed objects that have not been sent yet
+
+    def add_changed_ids(self, es_id, changed_ids):
+        for layer in LAYERS:
+            self.changed.setdefault((es_id, layer), set()).update(changed_ids)
+
+    def reset(self, es_id, layer, entries):
+        """Registers that all entries have been sent (e.g. by process_energy_system), returns the sequence number"""
+        key_function, _ = LAYERS[layer]
+        self.synced[(es_id, layer)] = set(key_function(entry) for entry in entries)
+        self.changed.pop((es_id, layer), None)
+        self.seq[(es_id, layer)] = self.seq.get((es_id, layer), 0) + 1
+        return self.seq[(es_id, layer)]
+
+    def mark_sent(self, es_id, layer, entries, replace=False):
+        """
+        Registers entries that were sent without a ui_delta message (e.g. with 'add_connections'), so they are not
+        sent again. The sequence number does not change, as the client does not receive one.
+        :param replace: the entries are all the client has, e.g. after 'clear_connections'
+        """
+        key_function, _ = LAYERS[layer]
+        keys = set(key_function(entry) for entry in entries)
+        if replace:
+            self.synced[(es_id, layer)] = keys
+        elif (es_id, layer) in self.synced:
+            self.synced[(es_id, layer)].update(keys)
+
+    def create_delta(self, es_id, layer, entries):
+        """
+        Compares the entries with the state of the client. Entries that refer to the ids of changed objects (e.g.
+        assets, ports, carriers, see add_changed_ids()) are sent as an update.
+        :return: the delta message, or None if nothing changed
+        """
+        key_function, refers_to = LAYERS[layer]
+        changed_ids = self.changed.pop((es_id, layer), None)
+        synced = self.synced.get((es_id, layer))
+        if synced is None:
+            return self.create_full(es_id, layer, entries)
+
+        current = dict()
+        add = []
+        update = []
+        for entry in entries:
+            key = key_function(entry)
+            current[key] = entry
+            if key not in synced:
+                add.append(entry)
+            elif changed_ids and refers_to(entry, changed_ids):
+                update.append(entry)
+        remove = [key for key in synced if key not in current]
+        if not add and not update and not remove:
+            return None
+
+        self.synced[(es_id, layer)] = set(current.keys())
+        return self._message(es_id, layer, False, add, update, remove)
+
+    def create_full(self, es_id, layer, entries):
+        key_function, _ = LAYERS[layer]
+        self.synced[(es_id, layer)] = set(key_function(entry) for entry in entries)
+        self.changed.pop((es_id, layer), None)
+        return self._message(es_id, layer, True, list(entries), [], [])
+
+    def _message(self, es_id, layer, full, add, update, remove):
+        self.seq[(es_id, layer)] = self.seq.get((es_id, layer), 0) + 1
+        return {'es_id': es_id, 'layer': layer, 'seq': self.seq[(es_id, layer)], 'full': full,
+                'add': add, 'update': update, 'remove': remove}
+
+
+def get_ui_delta_feed() -> UIDeltaFeed:
+    feed = get_session(SESSION_KEY)
+    if feed is None:
+        feed = UIDeltaFeed()
+        set_session(SESSION_KEY, feed)
+    return feed
+
+
+def get_change_recorder(esh, es_id) -> ChangeRecorder:
+    return ChangeRecorder.get_recorder(esh.get_resource(es_id))
+
+
+def reset_ui_delta(esh, es_id, asset_list, conn_list):
+    """
+    To be called after the complete asset_list and conn_list of an energy system have been sent
+    :return: dict with the sequence number per layer, to be sent to the client
+    """
+    get_change_recorder(esh, es_id).take()
+    feed = get_ui_delta_feed()
+    return {
+        ASSETS_LAYER: feed.reset(es_id, ASSETS_LAYER, asset_list),
+        CONNECTIONS_LAYER: feed.reset(es_id, CONNECTIONS_LAYER, conn_list),
+    }
+
+
+def emit_ui_delta(esh, es_id, layers=(ASSETS_LAYER, CONNECTIONS_LAYER), changed_ids=None):
+    """
+    Sends the changes in the asset_list and/or conn_list of the session since the last update to the client
+    :param changed_ids: ids of objects that must be sent again even if the model did not change (e.g. a carrier
+                        of which the color changed)
+    """
+    feed = get_ui_delta_feed()
+    feed.add_changed_ids(es_id, get_change_recorder(esh, es_id).take())
+    if changed_ids:
+        feed.add_changed_ids(es_id, changed_ids)
+    for layer in layers:
+        entries = get_session_for_esid(es_id, 'asset_list' if layer == ASSETS_LAYER else 'conn_list') or []
+        message = feed.create_delta(es_id, layer, entries)
+        if message:
+            logger.debug('ui_delta {} seq={}: {} added, {} updated, {} removed'.format(
+                layer, message['seq'], len(message['add']), len(message['update']), len(message['remove'])))
+            emit('ui_delta', message)
+
+
+def ui_delta_sent(es_id, layer, entries, replace=False):
+    """
+    To be called when entries of the asset_list or conn_list of the session are sent to the client directly, with
+    'add_esdl_objects' or 'add_connections' instead of emit_ui_delta(). See UIDeltaFeed.mark_sent().
+    """
+    get_ui_delta_feed().mark_sent(es_id, layer, entries, replace)
+
+
+def emit_ui_full(es_id, layer):
+    """Sends the complete layer, e.g. when the client detected a missing ui_delta message"""
+    entries = get_session_for_esid(es_id, 'asset_list' if layer == ASSETS_LAYER else 'conn_list') or []
+    emit('ui_delta', get_ui_delta_feed().create_full(es_id, layer, entries))
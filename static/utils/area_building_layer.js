@@ -1145,6 +1145,17 @@ function add_geojson_listener(socket, map) {
         // recreate top right layer control box, as areas in ESDL can influence area layer control (for grouped areas)
         add_layer_control();
     });
+
+    // the areas and potentials with the level of detail for the current zoom level of the map
+    socket.on('area_lod', function(message) {
+        if (message['es_id'] != active_layer_id) return;
+        clear_layers(active_layer_id, 'area_layer');
+        clear_layers(active_layer_id, 'pot_layer');
+        geojson_area_data = message['area_list'];
+        add_area_geojson_layer_with_legend(geojson_area_data);
+        add_potential_geojson_layer(message['pot_list']);
+        add_layer_control();
+    });
 }
 
 // ------------------------------------------------------------------------------------------------------------
@@ -186,7 +186,7 @@ function change_color(obj, carrier_id) {
             color: color
         }
     });
-    socket.emit('command', {cmd: 'redraw_connections'});
+    socket.emit('command', {cmd: 'redraw_connections', carrier_id: carrier_id});
 }
 
 function create_carrier_info_html() {
@@ -127,24 +127,40 @@ function base64_str_to_byte_array(base64_str) {
 }
 
 function download_results(sim_id) {
+    // The server streams the Excel file when the workbook has been written, which can take a while for long runs
     show_loader();
-    $.ajax({
-        url: ESSIM_simulation_URL_prefix + 'simulation/' + sim_id + '/download_results',
-        success: function(data_str){
-            hide_loader();
-            if (data_str) {
-                data = JSON.parse(data_str);
-                download_binary_file_from_base64_str(
-                    data.excel_file_b64,
-                    data.filename,
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                );
-            }
-        },
-        error: function (){
-            hide_loader();
+    let xhr = new XMLHttpRequest();
+    xhr.open('GET', ESSIM_simulation_URL_prefix + 'simulation/' + sim_id + '/download_results', true);
+    xhr.responseType = 'blob';
+    xhr.onload = function() {
+        hide_loader();
+        if (this.status === 204) {
+            alert("No simulation results found to export");
+            return;
         }
-    });
+        if (this.status !== 200) {
+            alert("Error exporting simulation results");
+            return;
+        }
+        let filename = 'simulation_results.xlsx';
+        let disposition = xhr.getResponseHeader('Content-Disposition');
+        let matches = /filename[^;=\n]*=((['"]).*?\2|[^;\n]*)/.exec(disposition || '');
+        if (matches != null && matches[1]) filename = matches[1].replace(/['"]/g, '');
+
+        let url = window.URL.createObjectURL(this.response);
+        let link = document.createElement('a');
+        link.href = url;
+        link.download = filename;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        setTimeout(function () { window.URL.revokeObjectURL(url); }, 100);
+    };
+    xhr.onerror = function() {
+        hide_loader();
+        alert("Error exporting simulation results");
+    };
+    xhr.send();
 }
 
 function show_favorites_list(div_id) {
@@ -65,6 +65,11 @@ class Profiles {
         socket.on('csv_upload_done', function(data) {
             $('#csv-message').text('CSV uploading finished, now writing data to database');
         });
+        socket.on('csv_processing_progress', function(data) {
+            let message = 'Writing data to database: ' + data.rows + ' rows';
+            if (data.percentage !== null) message += ' (' + Math.round(data.percentage) + '%)';
+            $('#csv-message').text(message);
+        });
         socket.on('csv_processing_done', function(data) {
             let uuid = data.uuid;
             self.files[uuid] = null;
@@ -115,6 +115,10 @@ class SpatialOperations {
                         .append($('<select>').attr('id', 'select_connect_asset')))
                     .append($('<p>').text('to the nearest:')
                         .append($('<select>').attr('id', 'select_connect_to_asset')))
+                    .append($('<p>').text('Maximum distance in meters (optional):')
+                        .append($('<input>').attr('id', 'input_connect_max_distance').attr('type', 'number')))
+                    .append($('<p>').text('Maximum number of connections per asset (optional):')
+                        .append($('<input>').attr('id', 'input_connect_max_connections').attr('type', 'number')))
                     .append($('<button>')
                         .text('Go')
                         .click(function() {
@@ -122,7 +126,9 @@ class SpatialOperations {
                             let scta_choice = $('#select_connect_to_asset').val();
                             socket.emit('spatop_connect_unconnected_assets', {
                                     connect_asset_type: sca_choice,
-                                    connect_to_asset_type: scta_choice
+                                    connect_to_asset_type: scta_choice,
+                                    max_distance: $('#input_connect_max_distance').val(),
+                                    max_connections: $('#input_connect_max_connections').val()
                                 }, function(res) {
                                     console.log(res);
                                 }
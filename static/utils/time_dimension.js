@@ -143,21 +143,42 @@ L.TimeDimension.Layer.WindowedGeoJson = L.TimeDimension.Layer.GeoJson.extend({
         var times = map.timeDimension.getAvailableTimes();
         var idx = times.indexOf(this.startDate.getTime());
 
-        this.endDate = new Date(times[Math.min(times.length - 1, idx + 24)]);
+        this.startIndex = Math.max(0, idx);
+        this.endIndex = Math.min(times.length - 1, this.startIndex + this.window_size);
+        this.endDate = new Date(times[this.endIndex]);
+    },
+
+    framesToGeoJSON: function(result) {
+        // Frames contain the values and stroke widths by asset index, the geometry and color are in the asset list
+        var assets = time_dimension.assets;
+        var features = [];
+        for (var f = 0; f < result.frames.length; f++) {
+            var frame = result.frames[f];
+            var time = result.times[f];
+            for (var i = 0; i < frame.a.length; i++) {
+                var asset = assets[frame.a[i]];
+                features.push({
+                    type: 'Feature',
+                    geometry: {type: 'MultiLineString', coordinates: [asset.coordinates]},
+                    properties: {id: asset.id, time: time, load: frame.v[i], stroke: asset.color,
+                        pos: frame.v[i] >= 0, strokeWidth: frame.w[i]}
+                });
+            }
+        }
+        return {type: 'FeatureCollection', features: features};
     },
 
     getTimeWindowFromServer: function() {
         this.determineWindowEndTime();
-        // Obtain new date range.
-        socket.emit('get_windowed_simulation_data', this.startDate.toISOString(), this.endDate.toISOString(), (geojson_result) =>
+        // Obtain new range of frames.
+        socket.emit('timedimension_get_frames', this.startIndex, this.endIndex, (result) =>
         {
-            if(geojson_result == "{}")
+            if (!result || result.frames.length == 0)
             {
                 console.log("No data was available for the current time window.");
                 return;
             }
-            // console.log(geojson_result);
-            var data = JSON.parse(geojson_result);
+            var data = this.framesToGeoJSON(result);
 
             var geoJSONLayer = L.geoJSON(data, {
                 style: function(feature) {
@@ -182,6 +203,7 @@ L.timeDimension.layer.windowedGeoJson = function(layer, options) {
 class TimeDimension {
 
     constructor() {
+        this.assets = [];   // id, color and coordinates of the assets in the frames of the simulation run
 //        this.sim_start_datetime = '2015-01-01T00:00:00+0100';
 //        this.sim_end_datetime = '2016-01-01T00:00:00+0100';
 //
@@ -212,7 +234,12 @@ class TimeDimension {
                 map.timeDimension.setAvailableTimes(time_list, 'replace');
                 // console.log(time_list);
 
-                time_dimension.addGeoJSONLayer(startDate);
+                socket.emit('timedimension_get_assets', function(assets) {
+                    time_dimension.assets = assets;
+                    time_dimension.addGeoJSONLayer(startDate);
+                });
+            } else {
+                hide_loader();
             }
         });
     }
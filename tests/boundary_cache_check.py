@@ -0,0 +1,66 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the in-process and file tiers of the BoundaryCache: size limits, sharing through the file, TTL and prefetch.
+"""
+import os
+import tempfile
+import time
+
+from extensions.boundary_cache import BoundaryCache
+
+
+def boundary(code, size=1000):
+    return {'code': code, 'name': code, 'geom': 'x' * size}
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, 'boundaries.sqlite')
+
+        cache = BoundaryCache(memory_size=10000, file=file, file_size=None, ttl=None)
+        for i in range(20):
+            cache.put(2019, 'NEIGHBOURHOOD', 'BU{:08d}'.format(i), boundary('BU{:08d}'.format(i)))
+        assert cache._memory_bytes <= 10000 and len(cache._memory) < 20
+        assert cache.get(2019, 'NEIGHBOURHOOD', 'BU00000000') == boundary('BU00000000')     # from the file
+        assert cache.get(2020, 'NEIGHBOURHOOD', 'BU00000000') is None
+        print('memory limit: OK')
+
+        other_worker = BoundaryCache(memory_size=100000, file=file, file_size=None, ttl=None)
+        ids = ['BU{:08d}'.format(i) for i in range(25)]
+        assert other_worker.prefetch(2019, 'NEIGHBOURHOOD', ids) == ids[20:]
+        assert len(other_worker._memory) == 20
+        assert other_worker.prefetch(2019, 'NEIGHBOURHOOD', ids[:20]) == []
+        print('shared file and prefetch: OK')
+
+        expiring = BoundaryCache(memory_size=100000, file=file, file_size=None, ttl=0.2)
+        expiring.put(2019, 'MUNICIPALITY', 'GM0003', boundary('GM0003'))
+        assert expiring.get(2019, 'MUNICIPALITY', 'GM0003') is not None
+        time.sleep(0.3)
+        assert expiring.get(2019, 'MUNICIPALITY', 'GM0003') is None
+        assert other_worker.get(2019, 'MUNICIPALITY', 'GM0003') is None
+        print('TTL: OK')
+
+        limited = BoundaryCache(memory_size=100000, file=file, file_size=50000, ttl=None)
+        limited.put_many(2019, 'DISTRICT', {'WK{:06d}'.format(i): boundary('WK{:06d}'.format(i)) for i in range(200)})
+        total, = limited._connection().execute('SELECT SUM(size) FROM boundaries').fetchone()
+        assert total <= 50000, total
+        print('file size budget: OK ({} bytes)'.format(total))
+
+    without_file = BoundaryCache(memory_size=100000)
+    without_file.put(2019, 'PROVINCE', 'PV20', boundary('PV20'))
+    assert without_file.get(2019, 'PROVINCE', 'PV20') is not None
+    assert without_file.prefetch(2019, 'PROVINCE', ['PV20', 'PV21']) == ['PV21']
+    print('without file: OK')
@@ -0,0 +1,97 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the dispatch of commands by the command registry: only the context values a handler has parameters for are
+passed, the latency is recorded in the metrics per command and model size class and slow commands are logged with
+their arguments.
+Also checks that every command of the browser that app.py handled before is registered.
+"""
+import ast
+import os
+import time
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from src.command_registry import CommandRegistry
+
+COMMANDS = ['add_object', 'remove_object', 'add_note', 'remove_area', 'get_asset_ports', 'connect_ports',
+            'get_object_info', 'get_conductor_info', 'get_table_editor_info', 'set_asset_param',
+            'set_area_bld_polygon', 'split_conductor', 'get_port_profile_info', 'add_profile_to_port',
+            'remove_profile_from_port', 'add_port', 'add_port_with_id', 'remove_port', 'remove_connection_portids',
+            'remove_connection', 'set_carrier', 'add_carrier', 'remove_carrier', 'get_storage_strategy_info',
+            'get_curtailment_strategy_info', 'set_control_strategy', 'remove_control_strategy', 'set_marg_costs',
+            'remove_marg_costs', 'layer', 'run_ESSIM_simulation', 'validate_for_ESSIM', 'get_es_info',
+            'set_es_info_param', 'add_sector', 'remove_sector', 'set_sector', 'get_edr_asset',
+            'set_asset_drawing_mode', 'query_esdl_service', 'redraw_connections', 'ui_resync', 'building_editor',
+            'get_building_connections', 'accept_received_esdl', 'rename_energysystem', 'remove_energysystem',
+            'refresh_esdl']
+
+
+def registered_commands(filename):
+    """Returns the commands that are registered with @command_registry.command(...) in a module"""
+    commands = []
+    for node in ast.walk(ast.parse(open(filename).read())):
+        if isinstance(node, ast.FunctionDef):
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and getattr(decorator.func, 'attr', None) == 'command':
+                    commands += [arg.value for arg in decorator.args]
+    return commands
+
+
+if __name__ == '__main__':
+    registry = CommandRegistry(slow_threshold=0.05, metrics_prefix='check_command')
+    calls = []
+
+    @registry.command('rename', 'rename_again')
+    def rename(message, es_edit):
+        es_edit.name = message['name']
+        calls.append('rename')
+
+    @registry.command('slow')
+    def slow(message):
+        time.sleep(0.06)
+        return True
+
+    try:
+        registry.register('slow', slow)
+        assert False, 'a command can only be registered once'
+    except ValueError:
+        pass
+
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('ES', '', 'Instance', 'Area')
+    for i in range(1500):
+        es.instance[0].area.asset.append(esdl.WindTurbine(id='wt{}'.format(i)))
+    context = dict(esh=esh, es_edit=es, active_es_id=es.id, area_bld_list=[], user_email='user@example.com')
+
+    assert registry.dispatch('rename', {'cmd': 'rename', 'name': 'Renamed'}, **context) is None
+    assert registry.dispatch('rename_again', {'cmd': 'rename_again', 'name': 'Again'}, **context) is None
+    assert es.name == 'Again' and calls == ['rename', 'rename']
+    assert registry.dispatch('slow', {'cmd': 'slow', 'data': 'x' * 5000}, **context) is True
+    assert registry.dispatch('unknown', {'cmd': 'unknown'}, **context) is None
+
+    stats = {(s['command'], s['model_size']): s for s in registry.get_stats()}
+    assert set(stats) == {('rename', '10000'), ('rename_again', '10000'), ('slow', '10000')}, stats
+    assert stats[('slow', '10000')]['count'] == 1 and stats[('slow', '10000')]['buckets'][0.05] == 0
+    assert stats[('slow', '10000')]['buckets'][0.1] == 1 and stats[('slow', '10000')]['buckets'][float('inf')] == 1
+    assert len(registry.slow_commands) == 1 and registry.slow.value(command='slow') == 1
+    slow_command = registry.slow_commands[0]
+    assert slow_command['command'] == 'slow' and slow_command['model_size'] == esh.object_count()
+    assert len(slow_command['args']) < 2100 and slow_command['args'].endswith('...')
+    print('command registry: OK')
+
+    commands = registered_commands(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app.py'))
+    assert sorted(commands) == sorted(COMMANDS), set(commands) ^ set(COMMANDS)
+    print('app.py commands: OK')
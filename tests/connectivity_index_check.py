@@ -0,0 +1,95 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks that the ConnectivityIndex returns the same port coordinates as calculating them from the geometry, also after
+the geometry, the ports or the containment of assets have been changed.
+"""
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from src.esdl_helper import get_asset_geom_info, get_asset_and_coord_from_port_id, get_connectivity_index
+
+
+def expected_coord(port):
+    asset = port.eContainer()
+    if not asset.geometry:
+        return ()
+    coord = get_asset_geom_info(asset)
+    if isinstance(asset.geometry, esdl.Line):
+        if asset.port[0] is port:
+            return coord[0]
+        if len(asset.port) > 1 and asset.port[1] is port:
+            return coord[1]
+        return ()
+    return coord
+
+
+def check(esh, step):
+    es = esh.energy_system
+    for port in esh.instances_of(es.id, esdl.Port):
+        result = get_asset_and_coord_from_port_id(esh, es.id, port.id)
+        if result['asset'] is not port.eContainer() or result['coord'] != expected_coord(port):
+            raise Exception('{}: wrong coordinate {} for port {} of {}, expected {}'.format(
+                step, result['coord'], port.name, port.eContainer().name, expected_coord(port)))
+    print('{}: OK'.format(step))
+
+
+def line(esh, name, points):
+    pipe = esdl.Pipe(id=esh.generate_uuid(), name=name)
+    pipe.geometry = esdl.Line(point=[esdl.Point(lat=lat, lon=lon) for lat, lon in points])
+    pipe.port.extend([esdl.InPort(id=esh.generate_uuid(), name='In'), esdl.OutPort(id=esh.generate_uuid(), name='Out')])
+    return pipe
+
+
+if __name__ == '__main__':
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('Test', '', 'Instance', 'Area')
+    area = es.instance[0].area
+
+    producer = esdl.HeatProducer(id=esh.generate_uuid(), name='Producer', geometry=esdl.Point(lat=52.0, lon=4.0))
+    producer.port.append(esdl.OutPort(id=esh.generate_uuid(), name='Out'))
+    pipe = line(esh, 'Pipe', [(52.0, 4.0), (52.1, 4.1), (52.2, 4.2)])
+    building = esdl.Building(id=esh.generate_uuid(), name='Building')
+    building.geometry = esdl.Polygon(exterior=esdl.SubPolygon(point=[
+        esdl.Point(lat=52.2, lon=4.2), esdl.Point(lat=52.3, lon=4.2), esdl.Point(lat=52.3, lon=4.3)]))
+    consumer = esdl.HeatingDemand(id=esh.generate_uuid(), name='Consumer', geometry=esdl.Point(lat=52.25, lon=4.25))
+    consumer.port.append(esdl.InPort(id=esh.generate_uuid(), name='In'))
+    building.asset.append(consumer)
+    area.asset.extend([producer, pipe, building])
+    producer.port[0].connectedTo.append(pipe.port[0])
+    pipe.port[1].connectedTo.append(consumer.port[0])
+    check(esh, 'initial')
+
+    producer.geometry.lat = 51.9
+    check(esh, 'point moved')
+
+    pipe.geometry.point[-1].lon = 4.25
+    check(esh, 'line end moved')
+
+    pipe.port.insert(0, pipe.port.pop(1))
+    check(esh, 'line ports swapped')
+
+    producer.geometry = esdl.Point(lat=51.0, lon=3.0)
+    check(esh, 'geometry replaced')
+
+    area.asset.remove(pipe)
+    pipe.geometry.point[0].lat = 50.0
+    area.asset.append(pipe)
+    check(esh, 'asset changed while detached')
+
+    connectivity = get_connectivity_index(esh, es.id)
+    assert connectivity.building_coord(building) == get_asset_geom_info(building)
+    building.geometry.exterior.point[0].lat = 52.0
+    assert connectivity.building_coord(building) == get_asset_geom_info(building)
+    check(esh, 'building changed')
@@ -0,0 +1,278 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Benchmarks the operations on the model that scale with the size of an energy system, on synthetic energy systems of
+1k, 10k and 100k assets (see synthetic_esdl.py):
+
+- generate: building the energy system with the pyecore classes
+- to_string, load_from_string: serializing and parsing the ESDL
+- deepcopy: support_functions.deepcopy of the energy system
+- merge: ESDLMerger of two energy systems
+- compare: the esdl_compare socket event of ESDLCompare (xmldiff of the two ESDLs)
+- shapefile: ESDL2Shapefile.convert_esdl_to_shapefiles_zipfile
+- process_energy_system: sending the energy system to the map, with the user settings in memory unless the settings
+  storage (MongoDB) is configured with SETTINGS_STORAGE_HOST
+
+The results are written as JSON, with the environment (versions, git commit), and for every benchmark and size the
+number of objects and the time of every run. Benchmarks that are not run have a reason instead.
+
+Usage: PYTHONPATH=. python tests/esdl_benchmark.py [--sizes 1000,10000] [--repeat 3] [--only merge,compare]
+       [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from flask import Flask, session
+from flask_socketio import SocketIO, emit
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from extensions.boundary_service import BoundaryService
+from extensions.esdl_compare import ESDLCompare
+from extensions.mapeditor_settings import MapEditorSettings
+from extensions.session_manager import get_handler, session_store, set_session
+from extensions.settings_storage import SettingsStorage
+from src.esdl2shapefile import ESDL2Shapefile
+from src.merge import ESDLMerger
+from src.process_es_area_bld import process_energy_system
+import src.settings as settings
+from tests.synthetic_esdl import generate_energy_system
+
+BENCHMARKS = ['generate', 'to_string', 'load_from_string', 'deepcopy', 'merge', 'compare', 'shapefile',
+              'process_energy_system']
+DEFAULT_SIZES = [1000, 10000, 100000]
+# largest number of assets of benchmarks that take too long for larger energy systems, unless --no-limits is given
+MAX_ASSETS = {'compare': 10000}
+CLIENT_ID = 'benchmark'
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hides the output of functions that print for every object"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        from importlib.metadata import version
+        pyecore_version = version('pyecore')
+    except Exception:
+        pyecore_version = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'pyecore': pyecore_version,
+            'git_commit': commit, 'time': datetime.now().isoformat()}
+
+
+class Case:
+    """An energy system of a given size, with a second one to merge with"""
+    def __init__(self, assets):
+        self.assets = assets
+        self.esh, self.es = generate_energy_system(assets)
+        self.xml = self.esh.to_string(self.es.id)
+        self._other_xml = None
+
+    def other_xml(self):
+        if self._other_xml is None:
+            esh, es = generate_energy_system(self.assets, seed=1)
+            self._other_xml = esh.to_string(es.id)
+        return self._other_xml
+
+    def load(self):
+        esh = EnergySystemHandler()
+        es, _ = esh.load_from_string(self.xml)
+        return esh, es
+
+
+class MemorySettingsStorage(SettingsStorage):
+    """SettingsStorage in a dict instead of MongoDB, so every user gets the default settings"""
+    def __init__(self):
+        self.settings = {}
+
+    def set(self, setting_type, identifier, setting_name, value):
+        self.settings.setdefault((setting_type.value, identifier), {})[setting_name] = value
+
+    def delete(self, setting_type, identifier, setting_name):
+        return self.settings.get((setting_type.value, identifier), {}).pop(setting_name, None)
+
+    def get(self, setting_type, identifier, setting_name):
+        try:
+            return self.settings[(setting_type.value, identifier)][setting_name]
+        except KeyError:
+            raise KeyError('No such setting \'{}\' for {} {}'.format(setting_name, setting_type.value, identifier))
+
+    def has(self, setting_type, identifier, setting_name):
+        return setting_name in self.settings.get((setting_type.value, identifier), {})
+
+
+def create_settings_storage():
+    """The settings storage in MongoDB when SETTINGS_STORAGE_HOST is set, in memory otherwise"""
+    if settings.settings_storage_config['host']:
+        return SettingsStorage(database_uri='mongodb://' + settings.settings_storage_config["host"] + ':' +
+                               settings.settings_storage_config["port"])
+    return MemorySettingsStorage()
+
+
+def create_app():
+    """A Flask app with the socket handlers that are benchmarked"""
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    socketio = SocketIO(app, async_mode='threading', async_handlers=False)
+    ESDLCompare(app, socketio)
+    settings_storage = create_settings_storage()
+    BoundaryService(app, socketio, settings_storage)
+    MapEditorSettings(app, socketio, settings_storage)
+
+    @socketio.on('connect', namespace='/esdl')
+    def connect():
+        session['client_id'] = CLIENT_ID
+
+    @socketio.on('benchmark_process_energy_system', namespace='/esdl')
+    def benchmark_process_energy_system():
+        set_session('es_info_list', {})
+        start = time.perf_counter()
+        with quiet():
+            process_energy_system(get_handler(), zoom=False)
+        emit('benchmark_result', time.perf_counter() - start)
+
+    return app, socketio
+
+
+def bench_generate(case):
+    start = time.perf_counter()
+    generate_energy_system(case.assets)
+    return time.perf_counter() - start
+
+
+def bench_to_string(case):
+    start = time.perf_counter()
+    case.esh.to_string(case.es.id)
+    return time.perf_counter() - start
+
+
+def bench_load_from_string(case):
+    esh = EnergySystemHandler()
+    start = time.perf_counter()
+    esh.load_from_string(case.xml)
+    return time.perf_counter() - start
+
+
+def bench_deepcopy(case):
+    start = time.perf_counter()
+    case.es.deepcopy()
+    return time.perf_counter() - start
+
+
+def bench_merge(case):
+    # the merge changes both energy systems, so merge fresh copies every run
+    _, left = case.load()
+    right, _ = EnergySystemHandler().load_from_string(case.other_xml())
+    start = time.perf_counter()
+    with quiet():
+        ESDLMerger().merge(left, right)
+    return time.perf_counter() - start
+
+
+def bench_compare(case, socketio, app):
+    # compare with an edited copy: another id and every 100th asset renamed
+    esh, es = case.load()
+    other, _ = esh.add_from_string('other.esdl', case.xml.replace(case.es.id, 'other-' + case.es.id))
+    for i, asset in enumerate(esh.instances_of(other.id, esdl.Asset)):
+        if i % 100 == 0:
+            asset.name += ' (edited)'
+    session_store.create(CLIENT_ID)['esh'] = esh
+    client = socketio.test_client(app, namespace='/esdl')
+    start = time.perf_counter()
+    client.emit('esdl_compare', {'esdl1': es.id, 'esdl2': other.id}, namespace='/esdl')
+    received = client.get_received('/esdl')
+    elapsed = time.perf_counter() - start
+    client.disconnect('/esdl')
+    assert any(r['name'] == 'esdl_compare_window' for r in received), received
+    return elapsed
+
+
+def bench_shapefile(case):
+    start = time.perf_counter()
+    ESDL2Shapefile.convert_esdl_to_shapefiles_zipfile(case.esh, case.es.id)
+    return time.perf_counter() - start
+
+
+def bench_process_energy_system(case, socketio, app):
+    esh, _ = case.load()
+    session_store.create(CLIENT_ID)['esh'] = esh
+    client = socketio.test_client(app, namespace='/esdl')
+    client.emit('benchmark_process_energy_system', namespace='/esdl')
+    received = client.get_received('/esdl')
+    client.disconnect('/esdl')
+    return next(r['args'][0] for r in received if r['name'] == 'benchmark_result')
+
+
+def run(sizes, repeat, only, limits=True):
+    app, socketio = create_app()
+    results = []
+    for assets in sizes:
+        case = Case(assets)
+        objects = case.esh.object_count()
+        for name in only:
+            result = {'benchmark': name, 'assets': assets, 'objects': objects}
+            results.append(result)
+            if limits and assets > MAX_ASSETS.get(name, assets):
+                result['skipped'] = 'more than {} assets, use --no-limits'.format(MAX_ASSETS[name])
+            if 'skipped' in result:
+                print('{:<24} {:>8} skipped: {}'.format(name, assets, result['skipped']), file=sys.stderr)
+                continue
+
+            bench = globals()['bench_' + name]
+            args = (socketio, app) if name in ('compare', 'process_energy_system') else ()
+            runs = [bench(case, *args) for _ in range(repeat)]
+            result.update(seconds=statistics.median(runs), runs=runs)
+            print('{:<24} {:>8} {:>10.3f}s'.format(name, assets, result['seconds']), file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the ESDL operations on synthetic energy systems')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma separated numbers of assets')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of every benchmark, the median is '
+                                                               'reported as seconds')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help='comma separated benchmarks to run')
+    parser.add_argument('--no-limits', action='store_true', help='also run slow benchmarks on large energy systems')
+    parser.add_argument('--output', help='JSON file with the results, printed when not given')
+    args = parser.parse_args()
+
+    only = args.only.split(',')
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks {}, choose from {}'.format(', '.join(sorted(unknown)), ', '.join(BENCHMARKS)))
+    report = {'environment': environment(), 'repeat': args.repeat,
+              'results': run([int(s) for s in args.sizes.split(',')], args.repeat, only, not args.no_limits)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
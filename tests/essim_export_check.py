@@ -0,0 +1,88 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the chunked export of simulation results to a write-only workbook with a fake database, and times the export
+of a year of hourly results of a network with 100 assets.
+"""
+import io
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from influxdb.resultset import ResultSet
+from openpyxl import load_workbook
+
+from src.essim_export import SimulationResultsExport
+
+COLUMNS = ['time', 'allocationEnergy', 'allocationPower', 'assetName', 'capability', 'imbalanceEnergy',
+           'imbalancePower', 'simulationRun']
+
+
+class FakeDatabase:
+    def __init__(self, networks, assets, hours):
+        self.networks = networks
+        self.assets = assets
+        self.start = datetime(2019, 1, 1, tzinfo=timezone.utc)
+        self.hours = hours
+        self.queries = []
+
+    def rows(self, start, end):
+        rows = []
+        for h in range(self.hours):
+            t = self.start + timedelta(hours=h)
+            if not start <= t < end:
+                continue
+            ts = t.strftime('%Y-%m-%dT%H:%M:%SZ')
+            for a in range(self.assets):
+                capability = 'Transport' if a == 0 else 'Consumer'
+                rows.append([ts, float(a + h), float(a + h) / 3600, 'asset{}'.format(a), capability, None, None, 'run'])
+            rows.append([ts, None, None, None, None, float(-h), float(-h) / 3600, 'run'])
+        return rows
+
+    def query(self, query, cache=False):
+        self.queries.append(query)
+        start, end = re.findall(r"time [><]=? '([^']*)'", query)
+        start = datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        end = datetime.strptime(end, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        if 'COUNT' in query:
+            return ResultSet({'series': [{'name': n, 'columns': ['time', 'count'], 'values': [[0, 1]]}
+                                         for n in self.networks]})
+        return ResultSet({'series': [{'name': n, 'columns': COLUMNS, 'values': self.rows(start, end)}
+                                     for n in self.networks]})
+
+
+if __name__ == '__main__':
+    database = FakeDatabase(['MyES_Electricity', 'MyES_Heat'], assets=3, hours=50)
+    export = SimulationResultsExport(database, '/MyES.*/', 'run', database.start,
+                                     database.start + timedelta(hours=50), chunk=timedelta(hours=24))
+    file = io.BytesIO()
+    assert export.write(file)
+    assert len(database.queries) == 4    # count and 3 chunks
+
+    workbook = load_workbook(file)
+    assert workbook.sheetnames == ['Electricity_PinW', 'Electricity_EinJ', 'Heat_PinW', 'Heat_EinJ']
+    rows = [[c.value for c in row] for row in workbook['Electricity_EinJ'].iter_rows()]
+    assert rows[0] == ['time', 'asset1', 'asset2', 'imbalanceEnergy'], rows[0]
+    assert rows[1] == ['2019-01-01T00:00:00Z', 1, 2, 0] and rows[50] == ['2019-01-03T01:00:00Z', 50, 51, -49]
+    assert len(rows) == 51
+    print('export: OK')
+
+    database = FakeDatabase(['MyES_Electricity'], assets=100, hours=8760)
+    export = SimulationResultsExport(database, '/MyES.*/', 'run', database.start,
+                                     database.start + timedelta(hours=8760))
+    start = time.perf_counter()
+    file = io.BytesIO()
+    export.write(file)
+    print('year of 100 assets: {:.1f}s, {:.1f} MB'.format(time.perf_counter() - start, len(file.getvalue()) / 1e6))
@@ -0,0 +1,56 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the level of detail of area geometries: fewer vertices at lower zoom levels, valid geometries, caching and the
+full geometry when zoomed in.
+"""
+import json
+import math
+import random
+
+from shapely.geometry import shape
+
+from src.geometry_lod import geometry_lod, lod_feature_list, feature_list_bounds, zoom_for_bounds
+
+
+def municipality(vertices=20000):
+    # a wobbly circle with a radius of ~10 km
+    random.seed(1)
+    coords = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        radius = 0.1 + 0.002 * math.sin(40 * angle) + random.uniform(-0.0001, 0.0001)
+        coords.append([5.0 + radius * math.cos(angle) * 1.6, 52.0 + radius * math.sin(angle)])
+    coords.append(coords[0])
+    return {'type': 'Polygon', 'coordinates': [coords]}
+
+
+if __name__ == '__main__':
+    feature = {'type': 'Feature', 'geometry': municipality(), 'properties': {'id': 'GM0001'}}
+    area_list = [feature, {'type': 'group', 'name': 'Group', 'area_list': [feature]}]
+    full_size = len(json.dumps(area_list))
+
+    zoom = zoom_for_bounds(feature_list_bounds(area_list))
+    print('estimated zoom level: {}'.format(zoom))
+    for z in (zoom, 12, 15, 18):
+        lod_list = lod_feature_list(area_list, z)
+        geometry = shape(lod_list[0]['geometry'])
+        assert geometry.is_valid and lod_list[1]['area_list'][0]['geometry'] is lod_list[0]['geometry']
+        assert lod_list[0]['properties'] is feature['properties']
+        print('zoom {}: {} vertices, {:.1%} of the size'.format(
+            z, len(geometry.exterior.coords), len(json.dumps(lod_list)) / full_size))
+    assert lod_feature_list(area_list, 18) is area_list
+    assert geometry_lod.get(feature['geometry'], 8) is geometry_lod.get(feature['geometry'], 8)
+    assert feature['geometry'] == municipality()
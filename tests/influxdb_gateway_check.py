@@ -0,0 +1,76 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the InfluxDBGateway with a fake client: one client per server, query normalization, the byte limited LRU
+result cache and invalidation when points are written.
+"""
+import sys
+
+from influxdb.resultset import ResultSet
+
+from src.influxdb_gateway import InfluxDBGateway, estimate_size, normalize_query
+
+
+class FakeClient:
+    created = 0
+
+    def __init__(self, **kwargs):
+        FakeClient.created += 1
+        self.queries = []
+
+    def query(self, query, database=None, epoch=None):
+        self.queries.append((query, database))
+        return ResultSet({'series': [{'name': database, 'columns': ['time', 'value'],
+                                      'values': [['2019-01-01T00:00:00Z', len(self.queries)]] * 10}]})
+
+    def write_points(self, points, database=None, **kwargs):
+        return True
+
+
+if __name__ == '__main__':
+    assert normalize_query('  SELECT *\n  FROM  x   WHERE "a  b" = \'c   d\' ') == 'SELECT * FROM x WHERE "a  b" = \'c   d\''
+    print('normalize: OK')
+
+    gateway = InfluxDBGateway(cache_size=20000, client_factory=FakeClient)
+    db = gateway.database('influxdb', 8086, 'scenario', cache=True)
+    other = gateway.database('influxdb', '8086', 'other')
+    assert gateway.client(db.server) is gateway.client(other.server) and FakeClient.created == 1
+    client = gateway.client(db.server)
+
+    first = db.query('SELECT * FROM  x')
+    assert db.query('SELECT *   FROM x') is first and len(client.queries) == 1
+    other.query('SELECT * FROM x')
+    other.query('SELECT * FROM x')
+    assert len(client.queries) == 3    # not cached by default
+    assert other.query('SELECT * FROM x', cache=True) is not first
+    print('cache: OK')
+
+    result = client.query('SELECT * FROM y')
+    row = result.raw['series'][0]['values'][0]
+    assert estimate_size(result) > 10 * (sys.getsizeof(row) + sys.getsizeof(row[0]) + sys.getsizeof(row[1]))
+    for i in range(20):
+        db.query('SELECT * FROM m{}'.format(i))
+    assert 0 < gateway._cache_bytes <= 20000 and len(gateway._cache) < 20
+    print('size limit: OK')
+
+    other.query('SELECT * FROM x', cache=True)
+    queries = len(client.queries)
+    db.query('SELECT * FROM m19')
+    assert len(client.queries) == queries
+    db.write_points([{'measurement': 'm19', 'fields': {'value': 1}}])
+    db.query('SELECT * FROM m19')
+    assert len(client.queries) == queries + 1
+    assert any(key[1] == 'other' for key in gateway._cache)    # other databases keep their results
+    print('invalidate: OK')
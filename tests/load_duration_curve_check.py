@@ -0,0 +1,70 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the load duration curves against numpy.percentile and the LDCEngine with a fake InfluxDB database: one query
+for many assets and caching per simulation run. Prints the time to calculate the curves of 50 assets.
+"""
+import time
+
+import numpy as np
+from influxdb.resultset import ResultSet
+
+from src.load_duration_curve import LDCEngine, ldc_data, load_duration_curves
+
+
+class FakeDatabase:
+    server = ('influxdb', '8086', 'root', 'root', False)
+    database = 'scenario'
+
+    def __init__(self, values):
+        self.values = values
+        self.queries = []
+
+    def query(self, query, cache=False):
+        self.queries.append(query)
+        series = [{'name': 'Electricity', 'tags': {'assetId': asset_id}, 'columns': ['time', 'allocationEnergy'],
+                   'values': [[t, v] for t, v in enumerate(values)]}
+                  for asset_id, values in self.values.items() if '\'' + asset_id + '\'' in query]
+        return ResultSet({'series': series})
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(1)
+    series = [rng.normal(size=8760), rng.normal(size=100), np.array([5.0])]
+    curves = load_duration_curves(series, points=11)
+    for s, curve in zip(series, curves):
+        assert np.allclose(curve, np.percentile(s, np.linspace(100, 0, 11)))
+    assert ldc_data('x', curves[0], 10) == {'asset_name': 'x', 'ldc_series': curves[0].tolist(),
+                                            'power_pos': 10, 'power_neg': -10}
+    print('curves: OK')
+
+    values = {'asset{}'.format(i): rng.normal(size=8760).tolist() for i in range(50)}
+    values['asset0'][0] = None
+    database = FakeDatabase(values)
+    engine = LDCEngine()
+    start = time.perf_counter()
+    result = engine.get_curves(database, '/es.*/', list(values) + ['unknown'], simulation_run='run1')
+    print('50 curves: {:.3f}s'.format(time.perf_counter() - start))
+    assert len(database.queries) == 1 and 'GROUP BY "assetId"' in database.queries[0]
+    assert len(result) == 50 and 'unknown' not in result
+    assert np.isclose(result['asset0'][-1], np.nanmin(np.array(values['asset0'], dtype=float)))
+
+    start = time.perf_counter()
+    cached = engine.get_curves(database, '/es.*/', list(values), simulation_run='run1')
+    print('50 cached curves: {:.6f}s'.format(time.perf_counter() - start))
+    assert len(database.queries) == 1 and cached['asset1'] is result['asset1']
+    engine.get_curves(database, '/es.*/', ['asset1'], simulation_run='run2')
+    assert len(database.queries) == 2
+    print('cache: OK')
@@ -0,0 +1,109 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the metrics in the text format of Prometheus, and the metrics of the boundary cache, the sessions, the queues
+of the executors and the size of Socket.IO messages.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from socketio import packet
+
+from extensions.boundary_cache import BoundaryCache
+from extensions.session_manager import session_store
+from src.metrics import MetricsRegistry, metrics, socketio_json, track_executor
+
+
+def sample(name, text=None):
+    """Returns the value of a sample (name with labels) in the rendered metrics"""
+    for line in (text or metrics.render()).splitlines():
+        if line.startswith(name + ' '):
+            return float(line.split(' ')[-1])
+    return None
+
+
+if __name__ == '__main__':
+    registry = MetricsRegistry()
+    requests = registry.counter('check_requests_total', 'Requests', ['path'])
+    requests.inc(path='/a')
+    requests.inc(2, path='/a "quoted"\n')
+    temperature = registry.gauge('check_temperature', 'Temperature')
+    temperature.set(21.5)
+    durations = registry.histogram('check_duration_seconds', 'Durations', buckets=(0.1, 1))
+    for duration in (0.05, 0.5, 0.5, 5):
+        durations.observe(duration)
+    assert registry.counter('check_requests_total', 'Requests', ['path']) is requests
+    try:
+        registry.gauge('check_requests_total', 'Requests', ['path'])
+        assert False, 'a metric name can only be used for one type'
+    except ValueError:
+        pass
+    try:
+        requests.inc(method='GET')
+        assert False, 'labels must match'
+    except ValueError:
+        pass
+
+    text = registry.render()
+    print(text)
+    assert '# TYPE check_requests_total counter' in text and '# TYPE check_duration_seconds histogram' in text
+    assert sample('check_requests_total{path="/a"}', text) == 1
+    assert sample('check_requests_total{path="/a \\"quoted\\"\\n"}', text) == 2
+    assert sample('check_temperature', text) == 21.5
+    assert sample('check_duration_seconds_bucket{le="0.1"}', text) == 1
+    assert sample('check_duration_seconds_bucket{le="1"}', text) == 3
+    assert sample('check_duration_seconds_bucket{le="+Inf"}', text) == 4
+    assert sample('check_duration_seconds_count', text) == 4 and sample('check_duration_seconds_sum', text) == 6.05
+    print('text format: OK')
+
+    cache = BoundaryCache(memory_size=10000)
+    cache.put(2023, 'municipality', 'GM0001', {'geom': 'POLYGON'})
+    assert cache.get(2023, 'municipality', 'GM0001') is not None and cache.get(2023, 'municipality', 'GM0002') is None
+    assert cache.prefetch(2023, 'municipality', ['GM0001', 'GM0003']) == ['GM0003']
+    assert sample('mapeditor_boundary_cache_requests_total{tier="memory",result="hit"}') == 2
+    assert sample('mapeditor_boundary_cache_requests_total{tier="memory",result="miss"}') == 2
+    assert sample('mapeditor_boundary_cache_memory_bytes') > 0
+    print('boundary cache: OK')
+
+    session_store.create('client1')['esh'] = None
+    session_store.create('client2')
+    assert sample('mapeditor_sessions{state="resident"}') == 2
+    assert sample('mapeditor_sessions{state="evicted"}') == 0
+    print('sessions: OK')
+
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    track_executor('check', executor)
+    futures = [executor.submit(release.wait) for _ in range(4)]
+    assert sample('mapeditor_executor_queue_depth{executor="check"}') == 3
+    release.set()
+    for future in futures:
+        future.result()
+    assert sample('mapeditor_executor_queue_depth{executor="check"}') == 0
+    assert not track_executor('unknown', None)
+    assert sample('mapeditor_executor_queue_depth{executor="unknown"}') is None
+    print('executor queue depth: OK')
+
+    packet.Packet.json = socketio_json     # as done by SocketIO(app, json=socketio_json)
+    socketio_json.measure('add_esdl_objects')
+    asset_list = [['point', 'asset', 'WindTurbine', 'wt{}'.format(i), 52.0, 4.0] for i in range(1000)]
+    encoded = packet.Packet(packet.EVENT, data=['add_esdl_objects', {'asset_pot_list': asset_list}],
+                            namespace='/esdl').encode()
+    packet.Packet(packet.EVENT, data=['not_measured', {}], namespace='/esdl').encode()
+    assert packet.Packet(encoded_packet=encoded).data[1]['asset_pot_list'][999][3] == 'wt999'
+    size = sample('mapeditor_socketio_emit_bytes_sum{event="add_esdl_objects"}')
+    assert 0.9 * len(encoded) < size <= len(encoded), (size, len(encoded))
+    assert sample('mapeditor_socketio_emit_bytes_count{event="not_measured"}') is None
+    print('socketio message size: OK')
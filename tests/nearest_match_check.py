@@ -0,0 +1,80 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the bulk nearest neighbour matching against comparing all pairs, with a maximum distance and a capacity per
+target, and connecting unconnected assets of an energy system to the nearest joint.
+"""
+import random
+import time
+
+import numpy as np
+import shapely
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from extensions.spatial_operations import SpatialOperations
+from src.nearest_match import match_nearest
+
+
+def brute_force(sources, targets, max_distance, capacity):
+    # greedy: the closest (source, target) pairs first
+    remaining = [capacity] * len(targets)
+    pairs = sorted((shapely.distance(s, t), si, ti) for si, s in enumerate(sources) for ti, t in enumerate(targets))
+    matched = dict()
+    for d, si, ti in pairs:
+        if si in matched or remaining[ti] == 0 or (max_distance is not None and d > max_distance):
+            continue
+        matched[si] = ti
+        remaining[ti] -= 1
+    return matched
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    sources = shapely.points(np.array([(random.uniform(0, 1000), random.uniform(0, 1000)) for _ in range(300)]))
+    targets = shapely.points(np.array([(random.uniform(0, 1000), random.uniform(0, 1000)) for _ in range(40)]))
+    for max_distance, capacity in ((None, None), (100.0, None), (None, 5), (150.0, 3)):
+        s, t, d = match_nearest(sources, targets, max_distance, capacity)
+        expected = brute_force(sources, targets, max_distance, capacity if capacity is not None else len(sources))
+        if dict(zip(s.tolist(), t.tolist())) != expected:
+            raise Exception('max_distance={}, capacity={}: other matches than expected'.format(max_distance, capacity))
+        print('max_distance={}, capacity={}: {} matches OK'.format(max_distance, capacity, len(s)))
+
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('Test', '', 'Instance', 'Area')
+    area = es.instance[0].area
+    joints = []
+    for i in range(50):
+        joint = esdl.Joint(id=esh.generate_uuid(), name='Joint_{}'.format(i),
+                           geometry=esdl.Point(lat=random.uniform(52.0, 52.1), lon=random.uniform(4.0, 4.1)))
+        joint.port.extend([esdl.InPort(id=esh.generate_uuid(), name='In'),
+                           esdl.OutPort(id=esh.generate_uuid(), name='Out')])
+        joints.append(joint)
+    houses = []
+    for i in range(5000):
+        house = esdl.HeatingDemand(id=esh.generate_uuid(), name='House_{}'.format(i),
+                                   geometry=esdl.Point(lat=random.uniform(52.0, 52.1), lon=random.uniform(4.0, 4.1)))
+        house.port.append(esdl.InPort(id=esh.generate_uuid(), name='In'))
+        houses.append(house)
+    area.asset.extend(joints + houses)
+
+    start = time.time()
+    connections = SpatialOperations.connect_to_nearest(esh, es.id, houses, joints, max_connections=120)
+    print('connected {} houses in {:.2f}s'.format(len(connections), time.time() - start))
+    assert len(connections) == len(houses)
+    for joint in joints:
+        assert len(joint.port[1].connectedTo) <= 120
+    assert all(c['to-port-id'] in {j.port[1].id for j in joints} for c in connections)
+    assert SpatialOperations.connect_to_nearest(esh, es.id, houses, joints) == []
@@ -0,0 +1,98 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the streaming CSV profile ingestion with a fake database: line protocol, date formats, missing values,
+duplicate detection over chunk boundaries, no writes for invalid files, and times the ingestion of a year of 15 minute values of 40 columns.
+"""
+import io
+import time
+from datetime import datetime, timedelta
+
+from src.profile_ingestion import ProfileCSVIngestion
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.lines = []
+        self.writes = 0
+
+    def write_points(self, points, database=None, protocol=None, batch_size=None):
+        assert protocol == 'line'
+        self.lines.extend(points)
+        self.writes += 1
+
+
+def ingest(text, chunk_size=2):
+    database = FakeDatabase()
+    ingestion = ProfileCSVIngestion(database, 'profiles', 'my profile', chunk_size=chunk_size)
+    ingestion.ingest(io.BytesIO(text.encode('utf-8-sig')))
+    return ingestion, database
+
+
+if __name__ == '__main__':
+    ingestion, database = ingest('datetime;a;b c;\n'
+                                 '2019-01-01 00:00;1.5;2\n'
+                                 '2019-01-01 00:15;;3\n'
+                                 '2019-01-01 00:30;;\n'
+                                 '2019-01-01 00:45;4;5\n')
+    assert ingestion.field_names == ['a', 'b c']
+    assert database.lines[:2] == ['my\\ profile a=1.5,b\\ c=2.0 1546300800000000000',
+                                  'my\\ profile b\\ c=3.0 1546301700000000000']
+    assert len(database.lines) == 3 and database.writes == 2
+    assert ingestion.start_datetime == '2019-01-01T00:00:00+0000'
+    assert ingestion.end_datetime == '2019-01-01T00:45:00+0000'
+    print('line protocol: OK')
+
+    ingestion, database = ingest('datetime,value\n2019-01-01T01:00:00+01:00,1\n2019-07-01T02:00:00+02:00,2\n')
+    assert database.lines == ['my\\ profile value=1.0 1546300800000000000',
+                              'my\\ profile value=2.0 1561939200000000000']
+    ingestion, database = ingest('datetime;value\n01-01-2019 00:00;1\n01-01-2019 01:00;2\n')
+    assert database.lines[1].endswith(' 1546304400000000000')
+    print('date formats: OK')
+
+    try:
+        ingest('datetime;value\n2019-01-01 00:00;1\n2019-01-01 01:00;2\n2019-01-01 01:00;3\n')
+        assert False, 'duplicate not detected'
+    except Exception as e:
+        assert 'duplicate datetimes (2019-01-01T01:00:00+0000)' in str(e)
+    print('duplicates: OK')
+
+    # an error in a later chunk rejects the file before anything is written
+    for text, error in [('datetime;value\n2019-01-01 00:00;1\n2019-01-01 01:00;2\n2019-01-01 02:00;3\n'
+                         '2019-01-01 02:00;4\n', 'duplicate datetimes'),
+                        ('datetime;value\n2019-01-01 00:00;1\n2019-01-01 01:00;2\n2019-01-01 02:00;3\n'
+                         '2019-01-01 03:00;x\n', 'Unable to parse string')]:
+        database = FakeDatabase()
+        try:
+            ProfileCSVIngestion(database, 'profiles', 'm', chunk_size=2).ingest(io.BytesIO(text.encode('utf-8')))
+            assert False, 'invalid file not detected'
+        except Exception as e:
+            assert error in str(e), e
+        assert database.lines == [] and database.writes == 0, database.lines
+    print('invalid file not written: OK')
+
+    columns = ['column{}'.format(i) for i in range(40)]
+    rows = ['datetime;' + ';'.join(columns)]
+    start = datetime(2019, 1, 1)
+    for t in range(365 * 96):
+        dt = (start + timedelta(minutes=15 * t)).strftime('%Y-%m-%d %H:%M')
+        rows.append(dt + ';' + ';'.join(str((t + i) % 100 / 10) for i in range(40)))
+    csv_bytes = '\n'.join(rows).encode('utf-8')
+    database = FakeDatabase()
+    start_time = time.perf_counter()
+    ingestion = ProfileCSVIngestion(database, 'profiles', 'year')
+    ingestion.ingest(io.BytesIO(csv_bytes), len(csv_bytes))
+    print('{} rows x {} columns: {:.2f}s'.format(ingestion.rows, len(columns), time.perf_counter() - start_time))
+    assert len(database.lines) == 365 * 96
@@ -0,0 +1,108 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the eviction of idle sessions to disk when the sessions of 100 users with a model of 2000 assets use more
+than the memory budget, and the transparent reload of an evicted session.
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from src.session_store import MemorySessionStore
+
+USERS = 100
+ASSETS = 2000
+
+
+def create_handler():
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('ES', '', 'Instance', 'Area')
+    for i in range(ASSETS):
+        asset = esdl.WindTurbine(id='wt{}'.format(i), name='WindTurbine {}'.format(i), power=1e6)
+        asset.port.append(esdl.OutPort(id='op{}'.format(i), name='Out'))
+        es.instance[0].area.asset.append(asset)
+    return esh
+
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp()
+    store = MemorySessionStore(directory)
+    esh = create_handler()
+    snapshot = esh.save_snapshot()
+    for user in range(USERS):
+        session = store.create('client{}'.format(user))
+        session['esh'] = EnergySystemHandler()
+        session['esh'].load_snapshot(snapshot)
+        session['asset_list'] = [['point', 'asset', 'WindTurbine {}'.format(i), 'wt{}'.format(i), 'WindTurbine',
+                                  52.0, 4.0] for i in range(ASSETS)]
+        session['user-email'] = 'user{}@example.com'.format(user)
+    store.load('client99')      # the last user is still active
+
+    stats = store.stats()
+    print('{} sessions, {:.0f} MB'.format(stats['resident_sessions'], stats['resident_bytes'] / 1e6))
+    assert store.evict(stats['resident_bytes'], idle_time=0) == []
+    budget = stats['resident_bytes'] // 10
+    start = time.perf_counter()
+    evicted = store.evict(budget, idle_time=0)
+    print('evicted {} sessions in {:.2f}s'.format(len(evicted), time.perf_counter() - start))
+    stats = store.stats()
+    assert stats['resident_bytes'] <= budget and stats['evicted_sessions'] == len(evicted) > 0
+    assert 'client99' not in evicted and evicted[0] == 'client0'
+    assert len(os.listdir(directory)) == len(evicted)
+    print('resident {:.0f} MB, evicted {:.0f} MB on disk'.format(stats['resident_bytes'] / 1e6,
+                                                                 stats['evicted_bytes'] / 1e6))
+    # small values stay in memory
+    assert store.values(['user-email'])['client0'] == {'user-email': 'user0@example.com'}
+    assert 'esh' not in store.sessions['client0']
+    print('eviction: OK')
+
+    start = time.perf_counter()
+    session = store.load('client0')
+    print('reload: {:.3f}s'.format(time.perf_counter() - start))
+    assert session['esh'].get_energy_system().instance[0].area.asset[ASSETS - 1].port[0].id == 'op{}'.format(ASSETS - 1)
+    assert session['esh'].object_count() == esh.object_count()
+    assert len(session['asset_list']) == ASSETS and 'client0' not in store.snapshots
+    assert not os.path.exists(store.snapshots._path('client0'))
+    print('reload: OK')
+
+    assert store.evict(budget, idle_time=3600) == []
+    store.sessions['client1']['last-accessed'] = datetime.now() - timedelta(days=2)
+    assert store.clean_up(24 * 3600) == ['client1'] and 'client1' not in store.snapshots
+    assert len(os.listdir(directory)) == len(evicted) - 2
+    print('clean up: OK')
+
+    # a request that loads the session while it is evicted gets the complete session
+    save = store.snapshots.save
+    loaded = []
+
+    def save_while_loading(client_id, values):
+        request = threading.Thread(target=lambda: loaded.append(store.load(client_id)))
+        request.start()
+        time.sleep(0.1)
+        save(client_id, values)
+        store.snapshots.save = save
+        return request
+
+    requests = []
+    store.snapshots.save = lambda client_id, values: requests.append(save_while_loading(client_id, values))
+    assert store.evict(0, idle_time=0)
+    for request in requests:
+        request.join()
+    assert loaded and all('esh' in session for session in loaded)
+    print('load during eviction: OK')
@@ -0,0 +1,122 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the ReadWriteLock (concurrent readers, exclusive and reentrant writers, writers before new readers) and the
+session_writer/session_reader decorators and get_handler_snapshot() of the session manager in a Flask request
+context, with edits that run while a long read-only job uses a snapshot.
+"""
+import threading
+import time
+
+from flask import Flask, session
+
+from esdl import esdl
+from extensions.session_manager import get_handler, get_handler_snapshot, get_session_lock, session_reader, \
+    session_writer
+from src.session_lock import ReadWriteLock
+
+
+def in_thread(f, *args):
+    thread = threading.Thread(target=f, args=args)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    lock = ReadWriteLock()
+    events = []
+    release = threading.Event()
+
+    def reader(name):
+        with lock.read():
+            events.append(name)
+            release.wait()
+
+    def writer():
+        with lock.write():
+            events.append('write')
+
+    threads = [in_thread(reader, 'read1'), in_thread(reader, 'read2')]
+    time.sleep(0.05)
+    assert sorted(events) == ['read1', 'read2']     # readers at the same time
+    threads.append(in_thread(writer))
+    time.sleep(0.05)
+    threads.append(in_thread(reader, 'read3'))
+    time.sleep(0.05)
+    assert len(events) == 2     # the writer waits for the readers, the new reader for the writer
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert events[2:] == ['write', 'read3']
+
+    with lock.write():
+        with lock.write(), lock.read():
+            pass
+        timeouts = []
+        in_thread(lambda: timeouts.append(lock.acquire_read(timeout=0.05))).join()
+        assert timeouts == [False]
+    with lock.read():
+        try:
+            lock.acquire_write()
+            assert False, 'a reader cannot start writing'
+        except RuntimeError:
+            pass
+    assert not lock.in_use()
+    print('read write lock: OK')
+
+    app = Flask(__name__)
+    app.secret_key = 'check'
+    order = []
+
+    @session_writer
+    def edit(name):
+        order.append('start ' + name)
+        time.sleep(0.05)
+        esh = get_handler()
+        es = esh.get_energy_system()
+        es.instance[0].area.asset.append(esdl.WindTurbine(id=name, name=name))
+        order.append('end ' + name)
+
+    @session_reader
+    def count():
+        return len(get_handler().get_energy_system().instance[0].area.asset)
+
+    def run(f, *args):
+        with app.test_request_context():
+            session['client_id'] = 'client'
+            return f(*args)
+
+    run(get_handler)
+    threads = [in_thread(run, edit, 'wt{}'.format(i)) for i in range(5)]
+    for thread in threads:
+        thread.join()
+    assert all(order[i].startswith('start') and order[i + 1].startswith('end') for i in range(0, 10, 2)), order
+    assert run(count) == 5
+    print('session_writer: OK')
+
+    def long_export():
+        esh = get_handler_snapshot()
+        time.sleep(0.2)
+        return len(esh.get_energy_system().instance[0].area.asset)
+
+    results = []
+    exporter = in_thread(lambda: results.append(run(long_export)))
+    time.sleep(0.05)
+    start = time.perf_counter()
+    run(edit, 'wt5')
+    assert time.perf_counter() - start < 0.15, 'edit waited for the export'
+    exporter.join()
+    assert results == [5] and run(count) == 6 and not run(get_session_lock).in_use()
+    print('get_handler_snapshot: OK')
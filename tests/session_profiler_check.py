@@ -0,0 +1,124 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the profiling of the next commands of a session on request of an admin: deterministic and sampled profiles,
+commands that call other commands, the model statistics of a profile and the admin API.
+"""
+import os
+import pstats
+import tempfile
+import time
+
+from flask import Flask, request, session
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from extensions.profiler_api import ProfilerAPI
+from extensions.session_manager import session_reader, session_store, session_writer
+from src.session_profiler import session_profiler
+
+ASSETS = 500
+
+
+@session_writer
+def process_command(message):
+    if message['cmd'] == 'nested':
+        return process_energy_system()
+    return sum(i * i for i in range(100000))
+
+
+@session_reader
+def process_energy_system():
+    end = time.perf_counter() + 0.2
+    while time.perf_counter() < end:
+        sum(i * i for i in range(1000))
+
+
+if __name__ == '__main__':
+    session_profiler.directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.secret_key = 'check'
+    ProfilerAPI(app, None)
+
+    @app.before_request
+    def set_client_id():
+        session['client_id'] = request.headers['X-Client-Id']
+
+    session_store.create('admin')['user-mapeditor-role'] = ['mapeditor-admin']
+    session_store.create('other')['user-mapeditor-role'] = []
+    user = session_store.create('user')
+    user['user-email'] = 'user@example.com'
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('ES', '', 'Instance', 'Area')
+    for i in range(ASSETS):
+        asset = esdl.WindTurbine(id='wt{}'.format(i))
+        asset.port.append(esdl.OutPort(id='op{}'.format(i)))
+        es.instance[0].area.asset.append(asset)
+    user['esh'] = esh
+
+    def run(f, *args):
+        with app.test_request_context():
+            session['client_id'] = 'user'
+            return f(*args)
+
+    def client(client_id):
+        test_client = app.test_client()
+        test_client.environ_base['HTTP_X_CLIENT_ID'] = client_id
+        return test_client
+
+    admin = client('admin')
+    assert client('other').post('/admin/profiling', json={'user_email': 'user@example.com'}).status_code == 403
+    assert admin.post('/admin/profiling', json={'user_email': 'nobody@example.com'}).status_code == 404
+    assert admin.post('/admin/profiling', json={'client_id': 'user', 'mode': 'other'}).status_code == 400
+    response = admin.post('/admin/profiling', json={'user_email': 'user@example.com', 'count': 2})
+    assert response.status_code == 200 and response.json['client_ids'] == ['user'], response.data
+    assert admin.get('/admin/profiling').json['requested'] == [
+        {'client_id': 'user', 'user_email': 'user@example.com', 'count': 2, 'mode': 'deterministic'}]
+
+    for cmd in ('first', 'nested', 'not_profiled'):
+        run(process_command, {'cmd': cmd})
+    listing = admin.get('/admin/profiling').json
+    assert listing['requested'] == []
+    profiles = sorted(listing['profiles'], key=lambda p: p['time'])
+    assert [p['command'] for p in profiles] == ['process_command:first', 'process_command:nested'], profiles
+    assert profiles[0]['user_email'] == 'user@example.com' and profiles[0]['model']['objects'] == esh.object_count()
+    assert profiles[0]['model']['energy_systems'][0]['assets'] == ASSETS
+    assert profiles[0]['model']['energy_systems'][0]['ports'] == ASSETS
+
+    info = admin.get('/admin/profiling/{}/info'.format(profiles[1]['id'])).json
+    assert 'process_energy_system' in info['summary'] and info['duration'] >= 0.2
+    download = admin.get('/admin/profiling/{}'.format(profiles[1]['id']))
+    assert download.status_code == 200 and 'attachment' in download.headers['Content-Disposition']
+    path = os.path.join(tempfile.mkdtemp(), 'download.prof')
+    with open(path, 'wb') as f:
+        f.write(download.data)
+    stats = pstats.Stats(path)
+    assert any(name == 'process_energy_system' for (_, _, name) in stats.stats)
+    assert admin.get('/admin/profiling/..%2Fsecret').status_code == 404
+    print('deterministic: OK')
+
+    admin.post('/admin/profiling', json={'client_id': 'user', 'count': 1, 'mode': 'sampled'})
+    run(process_energy_system)
+    sampled = [p for p in admin.get('/admin/profiling').json['profiles'] if p['mode'] == 'sampled']
+    assert len(sampled) == 1 and sampled[0]['samples'] > 10, sampled
+    text = admin.get('/admin/profiling/{}'.format(sampled[0]['id'])).data.decode()
+    assert all(';process_energy_system (session_profiler_check.py:' in line for line in text.splitlines()[:1]), text
+    print('sampled: OK')
+
+    admin.post('/admin/profiling', json={'client_id': 'user', 'count': 5})
+    assert admin.post('/admin/profiling', json={'client_id': 'user', 'count': 0}).status_code == 200
+    run(process_command, {'cmd': 'cancelled'})
+    assert len(admin.get('/admin/profiling').json['profiles']) == 3
+    print('cancel: OK')
@@ -0,0 +1,97 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the shared session store with a session store daemon in a thread and two SharedSessionStores that act as two
+worker processes: sharing values and energy systems, in place changes, removed keys, values that cannot be pickled,
+clean up and the message bus.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from src.session_store import SessionStoreServer, SharedSessionStore
+
+if __name__ == '__main__':
+    address = os.path.join(tempfile.mkdtemp(), 'sessions.sock')
+    server = SessionStoreServer(address, b'secret')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    while not os.path.exists(address):
+        time.sleep(0.01)
+
+    worker1 = SharedSessionStore(address, b'secret', 'worker1')
+    worker2 = SharedSessionStore(address, b'secret', 'worker2')
+    assert worker1.load('client') is None
+    session1 = worker1.create('client')
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('ES', '', 'Instance', 'Area')
+    session1.update({'esh': esh, 'asset_list': [1, 2], 'lock': threading.Lock()})
+    worker1.save('client', ['esh', 'asset_list', 'lock'])
+    assert worker1.routing_hint('client') == 'worker1'
+
+    session2 = worker2.load('client')
+    assert session2['asset_list'] == [1, 2] and 'lock' not in session2
+    assert session2['esh'].get_energy_system(es.id).name == 'ES'
+    assert worker2.routing_hint('client') == 'worker2'
+    print('sharing: OK')
+
+    # unchanged values are not sent again, changes in place are
+    calls = []
+    call = worker2.client.call
+    worker2.client.call = lambda method, *args: calls.append(method) or call(method, *args)
+    worker2.save('client', ['esh', 'asset_list'])
+    assert calls == []
+    session2['asset_list'].append(3)
+    session2['esh'].get_energy_system(es.id).name = 'Changed'
+    worker2.save('client', ['esh', 'asset_list'])
+    assert calls == ['update']
+    assert worker1.load('client') is session1
+    assert session1['asset_list'] == [1, 2, 3] and session1['esh'].get_energy_system(es.id).name == 'Changed'
+    assert isinstance(session1['lock'], type(threading.Lock()))    # local values are kept
+    del session1['asset_list']
+    worker1.save('client', [], ['asset_list'])
+    assert 'asset_list' not in worker2.load('client')
+    assert worker2.values(['esh', 'unknown'])['client'].keys() == {'esh'}
+    print('changes: OK')
+
+    assert worker2.clean_up(3600) == []
+    time.sleep(0.1)
+    assert worker2.clean_up(0.05) == ['client']
+    assert worker1.load('client') is None and 'client' not in worker1.sessions
+    print('clean up: OK')
+
+    subscriber = worker2.client.call('subscribe', 'socketio')
+    worker1.client.call('publish', 'socketio', b'message')
+    assert worker2.client.call('receive', subscriber, 1) == [b'message']
+    assert worker2.client.call('receive', subscriber, 0.01) == []
+    print('message bus: OK')
+
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('ES', '', 'Instance', 'Area')
+    for i in range(10000):
+        es.instance[0].area.asset.append(esdl.WindTurbine(id='wt{}'.format(i), name='WindTurbine {}'.format(i)))
+    worker1.create('large')['esh'] = esh
+    start = time.perf_counter()
+    worker1.save('large', ['esh'])
+    saved = time.perf_counter()
+    worker2.load('large')
+    loaded = time.perf_counter()
+    worker1.save('large', ['esh'])
+    worker2.load('large')
+    print('10000 assets: save {:.3f}s, load {:.3f}s, unchanged save and load {:.4f}s'.format(
+        saved - start, loaded - saved, time.perf_counter() - loaded))
+    server.close()
@@ -0,0 +1,63 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks that the spatial index of a ShapeDictionary finds the same containing areas as checking every shape, also
+after shapes have been added or removed.
+"""
+import pickle
+import random
+
+from esdl import esdl
+from src.shape import Shape, ShapeDictionary
+
+
+def square(lat, lon, size):
+    return esdl.Polygon(exterior=esdl.SubPolygon(point=[
+        esdl.Point(lat=lat, lon=lon), esdl.Point(lat=lat + size, lon=lon),
+        esdl.Point(lat=lat + size, lon=lon + size), esdl.Point(lat=lat, lon=lon + size)]))
+
+
+def check(shape_dictionary, points, step):
+    shapes = [Shape.create(p).shape for p in points]
+    bulk = shape_dictionary.find_containing_bulk(shapes)
+    for shape, found in zip(shapes, bulk):
+        expected = [key for key, area_shape in shape_dictionary.items() if area_shape.shape.contains(shape)]
+        if found != expected or shape_dictionary.find_containing(shape) != expected:
+            raise Exception('{}: found {}, expected {}'.format(step, found, expected))
+    print('{}: OK'.format(step))
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    shape_dictionary = ShapeDictionary()
+    shape_dictionary['top'] = Shape.create(square(50.0, 3.0, 4.0))
+    for i in range(200):
+        shape_dictionary['area_{}'.format(i)] = Shape.create(
+            square(random.uniform(50.0, 53.5), random.uniform(3.0, 6.5), random.uniform(0.05, 0.5)))
+    points = [esdl.Point(lat=random.uniform(49.5, 54.5), lon=random.uniform(2.5, 7.5)) for _ in range(500)]
+    check(shape_dictionary, points, 'initial')
+
+    for i in range(0, 200, 3):
+        del shape_dictionary['area_{}'.format(i)]
+    shape_dictionary['extra'] = Shape.create(square(51.0, 4.0, 1.0))
+    check(shape_dictionary, points, 'shapes added and removed')
+
+    restored = pickle.loads(pickle.dumps(shape_dictionary))
+    assert isinstance(restored, ShapeDictionary) and list(restored.keys()) == list(shape_dictionary.keys())
+    check(restored, points, 'pickled')
+    # users of the shapes compare (token, generation) to detect changes, also of a pickled copy
+    assert (restored.token, restored.generation) == (shape_dictionary.token, shape_dictionary.generation)
+    restored['other'] = Shape.create(square(52.0, 5.0, 1.0))
+    assert (restored.token, restored.generation) != (shape_dictionary.token, shape_dictionary.generation)
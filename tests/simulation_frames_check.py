@@ -0,0 +1,79 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks SimulationFrames with a generated result set: frame ranges, stroke widths and asset series, and times the
+creation and retrieval of the frames of a year of hourly results.
+"""
+import time
+from datetime import datetime, timedelta
+
+from influxdb.resultset import ResultSet
+
+from esdl import esdl
+from src.simulation_frames import SimulationFrames, allocation_boundaries
+
+
+def create_line(i):
+    line = esdl.Line()
+    line.point.append(esdl.Point(lon=5.0 + i * 0.01, lat=52.0))
+    line.point.append(esdl.Point(lon=5.0 + i * 0.01, lat=52.01))
+    return esdl.ElectricityCable(id='cable{}'.format(i), geometry=line)
+
+
+def create_results(n_assets, n_times):
+    start = datetime(2019, 1, 1)
+    values = []
+    for t in range(n_times):
+        time_str = (start + timedelta(hours=t)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for i in range(n_assets):
+            values.append([time_str, 'cable{}'.format(i), 'elec', float((i + t) % 7 - 3)])
+    return ResultSet({'series': [{'name': 'Electricity', 'columns': ['time', 'assetId', 'carrierId', 'allocationEnergy'],
+                                  'values': values}]})
+
+
+def create_boundaries():
+    """The boundaries as created by TimeDimension.preprocess_data() from a MIN/MAX query"""
+    return allocation_boundaries(ResultSet({'series': [{'name': 'Electricity', 'columns': ['time', 'min', 'max'],
+                                                        'values': [['1970-01-01T00:00:00Z', -3, 3]]}]}))
+
+
+if __name__ == '__main__':
+    assets = {'cable{}'.format(i): create_line(i) for i in range(3)}
+    frames = SimulationFrames.from_results(create_results(3, 48), 'allocationEnergy', assets.get,
+                                           {'elec': '#ff0000'}, create_boundaries())
+    assert len(frames.times) == 48 and len(frames.assets) == 3
+    assert frames.assets[0]['coordinates'] == [[5.0, 52.0], [5.0, 52.01]] and frames.assets[0]['color'] == '#ff0000'
+
+    window = frames.get_frames(0, 1)
+    assert window['times'] == ['2019-01-01T00:00:00Z', '2019-01-01T01:00:00Z']
+    # values (i + t) % 7 - 3 at t=0: -3, -2, -1
+    assert window['frames'][0] == {'a': [0, 1, 2], 'v': [-3.0, -2.0, -1.0], 'w': [13.0, 9.7, 6.3]}
+    assert frames.get_frames(46, 100)['end'] == 47
+    assert frames.time_range('2019-01-01T01:30:00Z', '2019-01-01T03:00:00Z') == (2, 3)
+    # value 0 (asset 2 at t=1) is not shown, but is part of the series
+    assert 2 not in frames.get_frames(1, 1)['frames'][0]['a']
+    assert frames.get_asset_series('cable2', 0, 2) == (window['times'] + ['2019-01-01T02:00:00Z'], [-1.0, 0.0, 1.0])
+    print('frames: OK')
+
+    n_assets, n_times = 200, 8760
+    assets = {'cable{}'.format(i): create_line(i) for i in range(n_assets)}
+    results = create_results(n_assets, n_times)
+    start = time.perf_counter()
+    frames = SimulationFrames.from_results(results, 'allocationEnergy', assets.get, {}, create_boundaries())
+    print('loading {} x {} values: {:.2f}s'.format(n_assets, n_times, time.perf_counter() - start))
+    start = time.perf_counter()
+    for s in range(0, n_times, 24):
+        frames.get_frames(s, s + 24)
+    print('retrieving all windows of 24 frames: {:.2f}s'.format(time.perf_counter() - start))
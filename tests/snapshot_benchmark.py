@@ -0,0 +1,91 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Compares storing and restoring an EnergySystemHandler through XML (to_string/load_from_string) with the binary
+snapshot (save_snapshot/load_snapshot). Usage: python snapshot_benchmark.py [number of assets]
+"""
+import sys
+import time
+from lxml import etree
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+
+
+def create_energy_system(esh, num_assets):
+    es = esh.create_empty_energy_system('Benchmark', '', 'Instance', 'Area')
+    area = es.instance[0].area
+    carriers = esdl.Carriers(id=esh.generate_uuid())
+    carrier = esdl.ElectricityCommodity(id=esh.generate_uuid(), name='Electricity', voltage=400.0)
+    carriers.carrier.append(carrier)
+    es.energySystemInformation = esdl.EnergySystemInformation(id=esh.generate_uuid(), carriers=carriers)
+    previous_port = None
+    for i in range(num_assets):
+        asset = esdl.ElectricityDemand(id=esh.generate_uuid(), name='Demand_{}'.format(i), power=1000.0 + i,
+                                       state=esdl.AssetStateEnum.ENABLED)
+        asset.geometry = esdl.Point(lat=52.0 + i / 10000, lon=4.0 + i / 10000)
+        in_port = esdl.InPort(id=esh.generate_uuid(), name='In', carrier=carrier)
+        asset.port.append(in_port)
+        if previous_port is not None:
+            in_port.connectedTo.append(previous_port)
+        out_port = esdl.OutPort(id=esh.generate_uuid(), name='Out', carrier=carrier)
+        asset.port.append(out_port)
+        previous_port = out_port
+        area.asset.append(asset)
+    esh.add_object_to_dict(es.id, es, recursive=True)
+    return es
+
+
+def canonical(element):
+    """Canonical form of an XML element: attribute and feature order do not matter, order within a feature does"""
+    groups = {}
+    for child in element:
+        groups.setdefault(child.tag, []).append(canonical(child))
+    return element.tag, tuple(sorted(element.attrib.items())), tuple(sorted(groups.items()))
+
+
+def xml_equal(xml_a, xml_b):
+    return canonical(etree.fromstring(xml_a.encode('UTF-8'))) == canonical(etree.fromstring(xml_b.encode('UTF-8')))
+
+
+if __name__ == '__main__':
+    num_assets = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    esh = EnergySystemHandler()
+    es = create_energy_system(esh, num_assets)
+    print('Energy system with {} assets, {} objects'.format(num_assets, len(esh.get_resource(es.id).uuid_dict)))
+
+    start = time.time()
+    xml_string = esh.to_string()
+    xml_save = time.time() - start
+    start = time.time()
+    xml_esh = EnergySystemHandler()
+    xml_esh.load_from_string(xml_string)
+    xml_load = time.time() - start
+
+    start = time.time()
+    snapshot = esh.save_snapshot()
+    snapshot_save = time.time() - start
+    start = time.time()
+    snapshot_esh = EnergySystemHandler()
+    snapshot_esh.load_snapshot(snapshot)
+    snapshot_load = time.time() - start
+
+    if not xml_equal(xml_string, snapshot_esh.to_string()):
+        raise Exception("Energy system restored from snapshot differs from the original")
+    if esh.get_resource(es.id).uuid_dict.keys() != snapshot_esh.get_resource(es.id).uuid_dict.keys():
+        raise Exception("uuid_dict restored from snapshot differs from the original")
+
+    print('XML:      save {:.3f}s, load {:.3f}s, {} bytes'.format(xml_save, xml_load, len(xml_string.encode('UTF-8'))))
+    print('Snapshot: save {:.3f}s, load {:.3f}s, {} bytes'.format(snapshot_save, snapshot_load, len(snapshot)))
+    print('Speedup:  save {:.1f}x, load {:.1f}x'.format(xml_save / snapshot_save, xml_load / snapshot_load))
@@ -0,0 +1,40 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+import time
+from esdl.esdl_handler import EnergySystemHandler
+
+
+if __name__ == '__main__':
+    for filename in ['esdl/Left.esdl', 'esdl/Left+Carriers.esdl', 'esdl/Right1.esdl', 'esdl/Right2.esdl']:
+        with open(filename) as f:
+            esdl_string = f.read()
+
+        start = time.time()
+        tree_esh = EnergySystemHandler()
+        tree_esh.load_from_string(esdl_string, streaming=False)
+        tree_time = time.time() - start
+
+        start = time.time()
+        streaming_esh = EnergySystemHandler()
+        streaming_esh.load_from_string(esdl_string, streaming=True)
+        streaming_time = time.time() - start
+
+        if tree_esh.to_string() != streaming_esh.to_string():
+            raise Exception("Streaming load of {} differs from tree load".format(filename))
+        if tree_esh.resource.uuid_dict.keys() != streaming_esh.resource.uuid_dict.keys():
+            raise Exception("Streaming load of {} resulted in a different uuid_dict".format(filename))
+        if tree_esh.resource.get_parse_information() != streaming_esh.resource.get_parse_information():
+            raise Exception("Streaming load of {} resulted in different parse information".format(filename))
+        print('{}: tree {:.4f}s, streaming {:.4f}s'.format(filename, tree_time, streaming_time))
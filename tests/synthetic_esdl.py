@@ -0,0 +1,218 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Generates synthetic energy systems of a given size for benchmarks, built with the pyecore esdl classes.
+
+The energy system has a main area with nested sub areas (with polygons and KPIs). The assets are spread over the
+areas at the lowest level in groups of 9 connected assets: a PV installation, a bus, a heat pump, an electricity
+demand and a heating demand in a building, and the cables and pipe that connect them. Some ports have an InfluxDB
+profile or a single value profile. The same parameters and seed give the same energy system, with the same ids
+except for the ids of the energy system, its instance and the main area, which are set by the EnergySystemHandler.
+
+Usage: python synthetic_esdl.py [number of assets] [output file]
+"""
+import random
+import sys
+import uuid
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+
+# number of energy assets in a group of connected assets
+GROUP_SIZE = 9
+# area of the generated energy systems (WGS84)
+BOUNDS = (52.0, 4.3, 52.2, 4.6)
+AREA_SCOPES = [esdl.AreaScopeEnum.MUNICIPALITY, esdl.AreaScopeEnum.DISTRICT, esdl.AreaScopeEnum.NEIGHBOURHOOD,
+               esdl.AreaScopeEnum.UNDEFINED]
+
+
+class SyntheticESDL:
+    def __init__(self, seed=0, grid=2, levels=3, profile_fraction=0.5, kpis=True):
+        """
+        :param seed: seed of the random numbers for the locations, ids and values
+        :param grid: every area is divided in grid x grid sub areas
+        :param levels: number of levels of sub areas below the main area
+        :param profile_fraction: fraction of the producers and demands that have a profile on their port
+        :param kpis: add KPIs to the areas and buildings
+        """
+        self.random = random.Random(seed)
+        self.grid = grid
+        self.levels = levels
+        self.profile_fraction = profile_fraction
+        self.kpis = kpis
+
+    def generate(self, assets, esh=None, name='Synthetic energy system'):
+        """
+        Returns an energy system with the given number of energy assets (assets that are no buildings), which is added
+        to the EnergySystemHandler (a new one when esh is None) and its resource uuid_dict
+        """
+        if esh is None:
+            esh = EnergySystemHandler()
+        es = esh.create_empty_energy_system(name, 'Generated for benchmarks', 'Instance', 'Main area')
+        es.energySystemInformation = esdl.EnergySystemInformation(id=self.id())
+        self.carriers = esdl.Carriers(id=self.id())
+        self.electricity = esdl.ElectricityCommodity(id=self.id(), name='Electricity', voltage=400.0)
+        self.heat = esdl.HeatCommodity(id=self.id(), name='Heat', supplyTemperature=70.0, returnTemperature=40.0)
+        self.carriers.carrier.extend([self.electricity, self.heat])
+        es.energySystemInformation.carriers = self.carriers
+
+        main_area = es.instance[0].area
+        main_area.scope = esdl.AreaScopeEnum.REGION
+        leaves = []
+        self._add_sub_areas(main_area, BOUNDS, 0, leaves)
+
+        groups, remainder = divmod(assets, GROUP_SIZE)
+        for i in range(groups):
+            area, bounds = leaves[i % len(leaves)]
+            self._add_group(area, bounds, i)
+        for i in range(remainder):
+            area, bounds = leaves[i % len(leaves)]
+            demand = esdl.ElectricityDemand(id=self.id(), name='Extra demand {}'.format(i), power=5000.0,
+                                            geometry=self.point(bounds))
+            demand.port.append(esdl.InPort(id=self.id(), name='In', carrier=self.electricity))
+            area.asset.append(demand)
+        return es
+
+    def id(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def point(self, bounds):
+        lat = self.random.uniform(bounds[0], bounds[2])
+        lon = self.random.uniform(bounds[1], bounds[3])
+        return esdl.Point(lat=lat, lon=lon)
+
+    @staticmethod
+    def polygon(bounds):
+        min_lat, min_lon, max_lat, max_lon = bounds
+        exterior = esdl.SubPolygon()
+        for lat, lon in ((min_lat, min_lon), (min_lat, max_lon), (max_lat, max_lon), (max_lat, min_lon),
+                         (min_lat, min_lon)):
+            exterior.point.append(esdl.Point(lat=lat, lon=lon))
+        return esdl.Polygon(exterior=exterior, CRS='WGS84')
+
+    @staticmethod
+    def line(*points):
+        return esdl.Line(point=[esdl.Point(lat=p.lat, lon=p.lon) for p in points])
+
+    def add_kpis(self, item, prefix):
+        if self.kpis:
+            item.KPIs = esdl.KPIs(id=self.id())
+            item.KPIs.kpi.append(esdl.DoubleKPI(id=self.id(), name='{} demand'.format(prefix),
+                                                value=self.random.uniform(1e3, 1e6)))
+            item.KPIs.kpi.append(esdl.DoubleKPI(id=self.id(), name='{} CO2 emission'.format(prefix),
+                                                value=self.random.uniform(1e2, 1e5)))
+
+    def add_profile(self, port, measurement):
+        if self.random.random() >= self.profile_fraction:
+            return
+        if isinstance(port, esdl.InPort) and self.random.random() < 0.5:
+            port.profile.append(esdl.SingleValue(id=self.id(), value=self.random.uniform(1.0, 10.0)))
+        else:
+            port.profile.append(esdl.InfluxDBProfile(
+                id=self.id(), host='http://influxdb', port=8086, database='energy_profiles', measurement=measurement,
+                field='E{}'.format(self.random.randint(1, 100)), multiplier=self.random.uniform(1.0, 10.0),
+                startDate=esdl.EDate.from_string('2019-01-01T00:00:00.000000+0000'),
+                endDate=esdl.EDate.from_string('2020-01-01T00:00:00.000000+0000')))
+
+    def _add_sub_areas(self, parent, bounds, level, leaves):
+        if level == self.levels:
+            leaves.append((parent, bounds))
+            return
+        min_lat, min_lon, max_lat, max_lon = bounds
+        lat_step = (max_lat - min_lat) / self.grid
+        lon_step = (max_lon - min_lon) / self.grid
+        for row in range(self.grid):
+            for column in range(self.grid):
+                sub_bounds = (min_lat + row * lat_step, min_lon + column * lon_step,
+                              min_lat + (row + 1) * lat_step, min_lon + (column + 1) * lon_step)
+                area = esdl.Area(id=self.id(), name='{} {}.{}'.format(parent.name, row, column),
+                                 scope=AREA_SCOPES[min(level, len(AREA_SCOPES) - 1)],
+                                 geometry=self.polygon(sub_bounds))
+                self.add_kpis(area, 'Area')
+                parent.area.append(area)
+                self._add_sub_areas(area, sub_bounds, level + 1, leaves)
+
+    def _connect(self, conductor, from_port, to_port, carrier):
+        conductor.port.append(esdl.InPort(id=self.id(), name='In', carrier=carrier, connectedTo=[from_port]))
+        out_port = esdl.OutPort(id=self.id(), name='Out', carrier=carrier)
+        conductor.port.append(out_port)
+        to_port.connectedTo.append(out_port)
+
+    def _add_group(self, area, bounds, i):
+        e = self.electricity
+        pv = esdl.PVInstallation(id=self.id(), name='PV {}'.format(i), power=self.random.uniform(1e3, 1e5),
+                                 geometry=self.point(bounds))
+        pv_out = esdl.OutPort(id=self.id(), name='Out', carrier=e)
+        pv.port.append(pv_out)
+        self.add_profile(pv_out, 'solar')
+
+        bus = esdl.Bus(id=self.id(), name='Bus {}'.format(i), geometry=self.point(bounds))
+        bus_in = esdl.InPort(id=self.id(), name='In', carrier=e)
+        bus_out = esdl.OutPort(id=self.id(), name='Out', carrier=e)
+        bus.port.extend([bus_in, bus_out])
+
+        # the demands are in a building
+        center = self.point(bounds)
+        size = 0.0002
+        building = esdl.Building(id=self.id(), name='Building {}'.format(i), floorArea=self.random.uniform(50, 500),
+                                 buildingYear=self.random.randint(1900, 2020),
+                                 geometry=self.polygon((center.lat, center.lon, center.lat + size, center.lon + size)))
+        self.add_kpis(building, 'Building')
+        demand = esdl.ElectricityDemand(id=self.id(), name='Electricity demand {}'.format(i),
+                                        geometry=esdl.Point(lat=center.lat + size / 3, lon=center.lon + size / 3))
+        demand_in = esdl.InPort(id=self.id(), name='In', carrier=e)
+        demand.port.append(demand_in)
+        self.add_profile(demand_in, 'electricity_demand')
+        heat_demand = esdl.HeatingDemand(id=self.id(), name='Heating demand {}'.format(i),
+                                         geometry=esdl.Point(lat=center.lat + 2 * size / 3, lon=center.lon + size / 3))
+        heat_demand_in = esdl.InPort(id=self.id(), name='In', carrier=self.heat)
+        heat_demand.port.append(heat_demand_in)
+        self.add_profile(heat_demand_in, 'heat_demand')
+        building.asset.extend([demand, heat_demand])
+
+        heat_pump = esdl.HeatPump(id=self.id(), name='Heat pump {}'.format(i), power=self.random.uniform(1e3, 1e4),
+                                  COP=self.random.uniform(2.5, 5.0), geometry=self.point(bounds))
+        heat_pump_in = esdl.InPort(id=self.id(), name='In', carrier=e)
+        heat_pump_out = esdl.OutPort(id=self.id(), name='Out', carrier=self.heat)
+        heat_pump.port.extend([heat_pump_in, heat_pump_out])
+
+        conductors = []
+        for from_asset, from_port, to_asset, to_port, cls, carrier in (
+                (pv, pv_out, bus, bus_in, esdl.ElectricityCable, e),
+                (bus, bus_out, demand, demand_in, esdl.ElectricityCable, e),
+                (bus, bus_out, heat_pump, heat_pump_in, esdl.ElectricityCable, e),
+                (heat_pump, heat_pump_out, heat_demand, heat_demand_in, esdl.Pipe, self.heat)):
+            conductor = cls(id=self.id(), name='{} {}.{}'.format(cls.__name__, i, len(conductors)),
+                            length=self.random.uniform(10, 1000),
+                            geometry=self.line(from_asset.geometry, to_asset.geometry))
+            self._connect(conductor, from_port, to_port, carrier)
+            conductors.append(conductor)
+        area.asset.extend([pv, bus, heat_pump, building] + conductors)
+
+
+def generate_energy_system(assets, esh=None, **kwargs):
+    """Returns an EnergySystemHandler and a synthetic energy system with the given number of energy assets"""
+    if esh is None:
+        esh = EnergySystemHandler()
+    es = SyntheticESDL(**kwargs).generate(assets, esh)
+    return esh, es
+
+
+if __name__ == '__main__':
+    num_assets = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    esh, es = generate_energy_system(num_assets)
+    print('Energy system with {} assets, {} objects'.format(num_assets, esh.object_count()))
+    if len(sys.argv) > 2:
+        esh.save(sys.argv[2])
@@ -0,0 +1,89 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks that UIDeltaFeed only sends the connections that changed, based on the ChangeRecorder of the energy system.
+"""
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from src.ui_delta import ChangeRecorder, UIDeltaFeed, CONNECTIONS_LAYER, connection_key
+
+
+def connection(from_port, to_port):
+    return {'from-port-id': from_port.id, 'from-asset-id': from_port.eContainer().id,
+            'from-port-carrier': from_port.carrier.id if from_port.carrier else None,
+            'to-port-id': to_port.id, 'to-asset-id': to_port.eContainer().id,
+            'to-port-carrier': to_port.carrier.id if to_port.carrier else None}
+
+
+if __name__ == '__main__':
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('Test', '', 'Instance', 'Area')
+    area = es.instance[0].area
+    pipes = []
+    for i in range(100):
+        pipe = esdl.Pipe(id='pipe{}'.format(i), port=[esdl.InPort(id='in{}'.format(i)), esdl.OutPort(id='out{}'.format(i))])
+        area.asset.append(pipe)
+        if pipes:
+            pipe.port[0].connectedTo.append(pipes[-1].port[1])
+        pipes.append(pipe)
+    conn_list = [connection(p.port[0], p.port[0].connectedTo[0]) for p in pipes[1:]]
+
+    recorder = ChangeRecorder.get_recorder(esh.get_resource(es.id))
+    feed = UIDeltaFeed()
+    seq = feed.reset(es.id, CONNECTIONS_LAYER, conn_list)
+    recorder.take()
+
+    assert feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list) is None
+
+    # change the carrier of one port
+    carrier = esdl.HeatCommodity(id='heat')
+    pipes[50].port[0].carrier = carrier
+    conn_list[49] = connection(pipes[50].port[0], pipes[49].port[1])
+    feed.add_changed_ids(es.id, recorder.take())
+    delta = feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list)
+    assert delta['seq'] == seq + 1 and not delta['full'], delta
+    assert [connection_key(c) for c in delta['update']] == ['in50out49'], delta['update']
+    assert not delta['add'] and not delta['remove']
+
+    # remove a pipe and its connections
+    pipes[10].port[0].connectedTo.clear()
+    pipes[11].port[0].connectedTo.clear()
+    area.asset.remove(pipes[10])
+    conn_list = [c for c in conn_list if c['from-asset-id'] != 'pipe10' and c['to-asset-id'] != 'pipe10']
+    feed.add_changed_ids(es.id, recorder.take())
+    delta = feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list)
+    assert delta['seq'] == seq + 2
+    assert sorted(delta['remove']) == ['in10out9', 'in11out10'], delta['remove']
+    assert not delta['add'] and not delta['update'], delta
+
+    # the color of a carrier changed: only the connections with that carrier are sent
+    feed.add_changed_ids(es.id, {'heat'})
+    delta = feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list)
+    assert [connection_key(c) for c in delta['update']] == ['in50out49'], delta['update']
+
+    full = feed.create_full(es.id, CONNECTIONS_LAYER, conn_list)
+    assert full['full'] and len(full['add']) == len(conn_list) and full['seq'] == seq + 4
+
+    # a connection that was sent with 'add_connections' is not sent again, and does not change the sequence number
+    pipes[10].port[0].connectedTo.append(pipes[9].port[1])
+    added = connection(pipes[10].port[0], pipes[9].port[1])
+    conn_list.append(added)
+    feed.mark_sent(es.id, CONNECTIONS_LAYER, [added])
+    recorder.take()
+    assert feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list) is None
+    feed.mark_sent(es.id, CONNECTIONS_LAYER, conn_list[:10], replace=True)
+    delta = feed.create_delta(es.id, CONNECTIONS_LAYER, conn_list)
+    assert delta['seq'] == seq + 5 and len(delta['add']) == len(conn_list) - 10, delta['seq']
+    print('OK')
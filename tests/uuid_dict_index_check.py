@@ -0,0 +1,106 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks that the uuid_dict and the index by type (instances_of()) of an EnergySystemHandler stay consistent while the
+energy system is edited, without calling add_object_to_dict() or remove_object_from_dict().
+"""
+import multiprocessing
+
+from esdl import esdl
+from esdl import support_functions
+from esdl.esdl_handler import EnergySystemHandler
+
+
+def check(esh, step):
+    problems = esh.check_uuid_dicts()
+    if problems:
+        raise Exception('{}: {}'.format(step, problems))
+    es_id = esh.energy_system.id
+    for esdl_type in (esdl.Asset, esdl.PowerPlant, esdl.Port, esdl.InPort, esdl.Area, esdl.Point):
+        expected = [obj for obj in esh.energy_system.eAllContents() if isinstance(obj, esdl_type)]
+        indexed = esh.get_all_instances_of_type(esdl_type, es_id)
+        if set(indexed) != set(expected) or len(indexed) != len(expected):
+            raise Exception('{}: instances_of({}) returns {} objects, expected {}'.format(
+                step, esdl_type.eClass.name, len(indexed), len(expected)))
+    print('{}: OK'.format(step))
+
+
+def create_asset(esh, name):
+    # built completely outside of the resource, attached later
+    asset = esdl.PowerPlant(id=esh.generate_uuid(), name=name)
+    asset.port.append(esdl.InPort(id=esh.generate_uuid(), name='In'))
+    asset.port.append(esdl.OutPort(id=esh.generate_uuid(), name='Out'))
+    asset.geometry = esdl.Point(lat=52.0, lon=4.0)
+    return asset
+
+
+if __name__ == '__main__':
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('Test', '', 'Instance', 'Area')
+    area = es.instance[0].area
+    check(esh, 'empty energy system')
+    assert esh.instances_of(es.id, esdl.EnergySystem) == [es]
+
+    asset = create_asset(esh, 'PowerPlant')
+    area.asset.append(asset)
+    assert esh.get_by_id(es.id, asset.port[0].id) is asset.port[0]
+    check(esh, 'asset with ports attached')
+
+    sub_area = esdl.Area(id=esh.generate_uuid(), name='Sub area')
+    sub_area.asset.extend([create_asset(esh, 'PowerPlant_{}'.format(i)) for i in range(3)])
+    area.area.append(sub_area)
+    check(esh, 'sub area with assets attached')
+
+    port = esdl.InPort(id=esh.generate_uuid(), name='Extra')
+    asset.port.append(port)
+    check(esh, 'port added to attached asset')
+
+    version = esh.get_model_version(es.id)
+    port.name = 'Renamed'
+    assert esh.get_model_version(es.id) != version
+    # a forked worker does not create the same versions as its parent
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        assert pool.apply(support_functions._next_version)[0] != version[0]
+
+    old_id = asset.id
+    asset.id = esh.generate_uuid()
+    assert old_id not in esh.get_resource(es.id).uuid_dict
+    check(esh, 'id changed')
+
+    sub_area.asset.remove(sub_area.asset[0])
+    check(esh, 'asset removed')
+
+    moved = sub_area.asset[0]
+    area.asset.append(moved)
+    check(esh, 'asset moved to other area')
+
+    area.area.remove(sub_area)
+    check(esh, 'sub area removed')
+
+    asset.geometry = esdl.Point(lat=53.0, lon=5.0)
+    esh.remove_object_from_dict(es.id, asset, recursive=True)
+    area.asset.remove(asset)
+    check(esh, 'explicitly removed asset')
+
+    loaded = EnergySystemHandler()
+    loaded.load_from_string(esh.to_string())
+    loaded.energy_system.instance[0].area.asset.append(create_asset(loaded, 'Loaded'))
+    check(loaded, 'loaded from string')
+
+    restored = EnergySystemHandler()
+    restored.load_snapshot(esh.save_snapshot())
+    restored.energy_system.instance[0].area.asset.append(create_asset(restored, 'Restored'))
+    restored.energy_system.instance[0].area.asset[0].port.clear()
+    check(restored, 'restored from snapshot')
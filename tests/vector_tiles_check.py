@@ -0,0 +1,75 @@
+#  This work is based on original code developed and copyrighted by TNO 2020.
+#  Subsequent contributions are licensed to you by the developers of such code and are
+#  made available to the Project under one or several contributor license agreements.
+#
+#  This work is licensed to you under the Apache License, Version 2.0.
+#  You may obtain a copy of the license at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Contributors:
+#      TNO         - Initial implementation
+#  Manager:
+#      TNO
+
+"""
+Checks the vector tiles of an energy system: the features in a tile, and that only the cached tiles in which an
+object was or is located are created again after a change.
+"""
+import math
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from extensions.vector_tiles import VectorTileSource
+from src.mvt import decode_tile
+
+
+def tile_of(lat, lon, z):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return z, x, y
+
+
+def names(source, layer, tile):
+    _, data = source.get_tile(layer, *tile)
+    return sorted(f[2]['name'] for f in decode_tile(data).get(layer, []))
+
+
+if __name__ == '__main__':
+    esh = EnergySystemHandler()
+    es = esh.create_empty_energy_system('Test', '', 'Instance', 'Area')
+    area = es.instance[0].area
+    area.geometry = esdl.Polygon(exterior=esdl.SubPolygon(point=[
+        esdl.Point(lat=51.9, lon=3.9), esdl.Point(lat=52.3, lon=3.9),
+        esdl.Point(lat=52.3, lon=4.3), esdl.Point(lat=51.9, lon=4.3)]))
+
+    producer = esdl.HeatProducer(id=esh.generate_uuid(), name='Producer', geometry=esdl.Point(lat=52.0, lon=4.0))
+    producer.port.append(esdl.OutPort(id=esh.generate_uuid(), name='Out'))
+    consumer = esdl.HeatingDemand(id=esh.generate_uuid(), name='Consumer', geometry=esdl.Point(lat=52.2, lon=4.2))
+    consumer.port.append(esdl.InPort(id=esh.generate_uuid(), name='In'))
+    area.asset.extend([producer, consumer])
+    producer.port[0].connectedTo.append(consumer.port[0])
+
+    source = VectorTileSource.get_source(esh.get_resource(es.id))
+    producer_tile = tile_of(52.0, 4.0, 14)
+    consumer_tile = tile_of(52.2, 4.2, 14)
+    assert names(source, 'assets', producer_tile) == ['Producer']
+    assert names(source, 'assets', consumer_tile) == ['Consumer']
+    assert names(source, 'areas', tile_of(52.1, 4.1, 10)) == ['Area']
+    _, data = source.get_tile('connections', *tile_of(52.1, 4.1, 8))
+    assert len(decode_tile(data)['connections']) == 1
+    print('features in tiles: OK')
+
+    etag_producer, _ = source.get_tile('assets', *producer_tile)
+    etag_consumer, _ = source.get_tile('assets', *consumer_tile)
+    consumer.geometry.lat = 52.21
+    assert source.get_tile('assets', *producer_tile)[0] == etag_producer
+    assert source.get_tile('assets', *consumer_tile)[0] != etag_consumer
+    print('tile invalidated after a change: OK')
+
+    area.asset.remove(consumer)
+    assert names(source, 'assets', consumer_tile) == []
+    _, data = source.get_tile('connections', *tile_of(52.1, 4.1, 8))
+    assert 'connections' not in decode_tile(data)
+    print('removed asset and its connections: OK')
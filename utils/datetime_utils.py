@@ -16,44 +16,64 @@ from datetime import datetime
 from contextlib import suppress
 
 
+ISO_FORMAT = 'ISO8601'
+DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y-%m-%dT%H:%M:%S.%f%Z',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S%Z',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+    '%Y-%m-%d %H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M:%S.%f%Z',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%d %H:%M:%S%Z',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+
+    # As a last resort, also try Dutch formatting of dates DD-MM-YYYY
+    '%d-%m-%YT%H:%M:%S.%f%z',
+    '%d-%m-%YT%H:%M:%S.%f%Z',
+    '%d-%m-%YT%H:%M:%S.%f',
+    '%d-%m-%YT%H:%M:%S%z',
+    '%d-%m-%YT%H:%M:%S%Z',
+    '%d-%m-%YT%H:%M:%S',
+    '%d-%m-%YT%H:%M',
+    '%d-%m-%Y %H:%M:%S.%f%z',
+    '%d-%m-%Y %H:%M:%S.%f%Z',
+    '%d-%m-%Y %H:%M:%S.%f',
+    '%d-%m-%Y %H:%M:%S%z',
+    '%d-%m-%Y %H:%M:%S%Z',
+    '%d-%m-%Y %H:%M:%S',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y',
+)
+
+
 def parse_date(str_date):
     try:
         return datetime.fromisoformat(str_date)
     except Exception:
-        formats = ('%Y-%m-%dT%H:%M:%S.%f%z',
-                   '%Y-%m-%dT%H:%M:%S.%f%Z',
-                   '%Y-%m-%dT%H:%M:%S.%f',
-                   '%Y-%m-%dT%H:%M:%S%z',
-                   '%Y-%m-%dT%H:%M:%S%Z',
-                   '%Y-%m-%dT%H:%M:%S',
-                   '%Y-%m-%dT%H:%M',
-                   '%Y-%m-%d %H:%M:%S.%f%z',
-                   '%Y-%m-%d %H:%M:%S.%f%Z',
-                   '%Y-%m-%d %H:%M:%S.%f',
-                   '%Y-%m-%d %H:%M:%S%z',
-                   '%Y-%m-%d %H:%M:%S%Z',
-                   '%Y-%m-%d %H:%M:%S',
-                   '%Y-%m-%d %H:%M',
-                   '%Y-%m-%d',
-
-                   # As a last resort, also try Dutch formatting of dates DD-MM-YYYY
-                   '%d-%m-%YT%H:%M:%S.%f%z',
-                   '%d-%m-%YT%H:%M:%S.%f%Z',
-                   '%d-%m-%YT%H:%M:%S.%f',
-                   '%d-%m-%YT%H:%M:%S%z',
-                   '%d-%m-%YT%H:%M:%S%Z',
-                   '%d-%m-%YT%H:%M:%S',
-                   '%d-%m-%YT%H:%M',
-                   '%d-%m-%Y %H:%M:%S.%f%z',
-                   '%d-%m-%Y %H:%M:%S.%f%Z',
-                   '%d-%m-%Y %H:%M:%S.%f',
-                   '%d-%m-%Y %H:%M:%S%z',
-                   '%d-%m-%Y %H:%M:%S%Z',
-                   '%d-%m-%Y %H:%M:%S',
-                   '%d-%m-%Y %H:%M',
-                   '%d-%m-%Y',
-                   )
-        for fmt in formats:
+        for fmt in DATE_FORMATS:
             with suppress(ValueError):
                 return datetime.strptime(str_date, fmt)
         raise ValueError('Date format is unknown')
+
+
+def detect_date_format(str_date):
+    """
+    Returns the format of a date, to parse a series of dates with the same format without trying all formats for every
+    date: ISO_FORMAT for ISO 8601 dates, or one of DATE_FORMATS
+    """
+    try:
+        datetime.fromisoformat(str_date)
+        return ISO_FORMAT
+    except Exception:
+        for fmt in DATE_FORMATS:
+            with suppress(ValueError):
+                datetime.strptime(str_date, fmt)
+                return fmt
+        raise ValueError('Date format is unknown')